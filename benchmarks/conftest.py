@@ -0,0 +1,223 @@
+import datetime
+import json
+import logging
+import os
+import platform
+import stat
+import statistics
+import sys
+import textwrap
+import time
+
+import pytest
+
+DEFAULT_ROUNDS = 5
+DEFAULT_MAX_REGRESSION = 0.25
+
+RESULTS_KEY = pytest.StashKey[list]()
+REGRESSIONS_KEY = pytest.StashKey[list]()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmark')
+    group.addoption(
+        '--benchmark-rounds',
+        type=int,
+        default=DEFAULT_ROUNDS,
+        help=f'Number of timed rounds to run each benchmark, defaults to {DEFAULT_ROUNDS}',
+    )
+    group.addoption(
+        '--benchmark-json',
+        metavar='PATH',
+        help='Write benchmark results to this JSON file',
+    )
+    group.addoption(
+        '--benchmark-compare',
+        metavar='PATH',
+        help='Compare against benchmark results in this JSON file, failing on any regression',
+    )
+    group.addoption(
+        '--benchmark-max-regression',
+        type=float,
+        default=DEFAULT_MAX_REGRESSION,
+        help=f'Fraction that a benchmark can slow down before it counts as a regression, defaults to {DEFAULT_MAX_REGRESSION}',
+    )
+
+
+def pytest_configure(config):
+    config.stash[RESULTS_KEY] = []
+    config.stash[REGRESSIONS_KEY] = []
+
+
+class Benchmark:
+    '''
+    A timer for a single benchmark. Call it with a function and arguments to run that function for
+    an untimed warm-up round followed by the configured number of timed rounds. Then put any
+    benchmark-specific measurements (e.g. bytes processed per round) into its extra_info dict.
+    '''
+
+    def __init__(self, name, rounds):
+        self.name = name
+        self.rounds = rounds
+        self.durations = []
+        self.extra_info = {}
+
+    def __call__(self, function, *args, **kwargs):
+        function(*args, **kwargs)
+
+        for _ in range(self.rounds):
+            start_time = time.perf_counter()
+            result = function(*args, **kwargs)
+            self.durations.append(time.perf_counter() - start_time)
+
+        return result
+
+    def per_second(self, count):
+        '''
+        Given a count of things processed in each round, return the number processed per second,
+        based on the fastest round.
+        '''
+        return count / max(min(self.durations), 1e-9)
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'rounds': len(self.durations),
+            'min': min(self.durations),
+            'max': max(self.durations),
+            'mean': statistics.mean(self.durations),
+            'median': statistics.median(self.durations),
+            'extra_info': self.extra_info,
+        }
+
+
+@pytest.fixture
+def benchmark(request):
+    timer = Benchmark(request.node.nodeid, request.config.getoption('benchmark_rounds'))
+
+    yield timer
+
+    if timer.durations:
+        request.config.stash[RESULTS_KEY].append(timer.as_dict())
+
+
+@pytest.fixture
+def fake_command(tmp_path, monkeypatch):
+    '''
+    Return a function that takes a command name (e.g. "borg") and the body of a Python script, and
+    installs that script as an executable with that name in a temporary directory at the front of
+    the PATH. The function returns the path to the executable. This lets benchmarks run borgmatic
+    against fake Borg and database binaries that don't touch the network.
+    '''
+    bin_directory = tmp_path / 'bin'
+    bin_directory.mkdir()
+    monkeypatch.setenv('PATH', f"{bin_directory}{os.pathsep}{os.environ.get('PATH', '')}")
+
+    def install(name, script):
+        path = bin_directory / name
+        path.write_text(f'#!{sys.executable}\n' + textwrap.dedent(script))
+        path.chmod(path.stat().st_mode | stat.S_IXUSR)
+
+        return str(path)
+
+    return install
+
+
+@pytest.fixture(autouse=True)
+def quiet_logging(monkeypatch):
+    '''
+    Discard borgmatic's log records without formatting them, but still at the most verbose log
+    level. That way, benchmarks measure the cost of producing log records, not of any particular
+    log handler. And pytest doesn't retain every record in memory.
+    '''
+    logger = logging.getLogger('borgmatic')
+    monkeypatch.setattr(logger, 'handlers', [logging.NullHandler()])
+    monkeypatch.setattr(logger, 'propagate', False)
+    original_level = logger.level
+    logger.setLevel(logging.DEBUG)
+
+    yield
+
+    logger.setLevel(original_level)
+
+
+def find_regressions(results, baseline_results, max_regression):
+    '''
+    Given current benchmark result dicts, baseline benchmark result dicts, and the fraction that a
+    benchmark can slow down before it counts as a regression, return a list of (name, baseline
+    seconds, current seconds) tuples for each regressed benchmark. Compare the fastest rounds, as
+    those are the least affected by noise from the rest of the system.
+    '''
+    baseline_min_for_name = {result['name']: result['min'] for result in baseline_results}
+
+    return [
+        (result['name'], baseline_min_for_name[result['name']], result['min'])
+        for result in results
+        if result['name'] in baseline_min_for_name
+        and result['min'] > baseline_min_for_name[result['name']] * (1 + max_regression)
+    ]
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    results = config.stash[RESULTS_KEY]
+    json_path = config.getoption('benchmark_json')
+    compare_path = config.getoption('benchmark_compare')
+
+    if json_path:
+        with open(json_path, 'w') as json_file:
+            json.dump(
+                {
+                    'datetime': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    'machine_info': {
+                        'python_version': platform.python_version(),
+                        'python_implementation': platform.python_implementation(),
+                        'system': platform.system(),
+                        'machine': platform.machine(),
+                        'cpu_count': os.cpu_count(),
+                    },
+                    'benchmarks': results,
+                },
+                json_file,
+                indent=4,
+            )
+
+    if compare_path:
+        with open(compare_path) as compare_file:
+            baseline_results = json.load(compare_file)['benchmarks']
+
+        regressions = find_regressions(
+            results, baseline_results, config.getoption('benchmark_max_regression')
+        )
+        config.stash[REGRESSIONS_KEY].extend(regressions)
+
+        if regressions and session.exitstatus == pytest.ExitCode.OK:
+            session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+
+def format_extra_info(extra_info):
+    return ', '.join(
+        f'{key}={value:,.0f}' if isinstance(value, (int, float)) else f'{key}={value}'
+        for key, value in extra_info.items()
+    )
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    results = config.stash[RESULTS_KEY]
+
+    if not results:
+        return
+
+    terminalreporter.section('benchmarks')
+
+    for result in results:
+        terminalreporter.write_line(
+            f"{result['name']}: min {result['min'] * 1000:.1f} ms, mean {result['mean'] * 1000:.1f} ms"
+            + (f" ({format_extra_info(result['extra_info'])})" if result['extra_info'] else '')
+        )
+
+    for name, baseline_seconds, current_seconds in config.stash[REGRESSIONS_KEY]:
+        terminalreporter.write_line(
+            f'REGRESSION {name}: {baseline_seconds * 1000:.1f} ms -> {current_seconds * 1000:.1f} ms',
+            red=True,
+        )
@@ -0,0 +1,97 @@
+import pytest
+
+from borgmatic.config import generate, load, validate
+
+CONFIG_TEMPLATE = '''
+location:
+    source_directories:
+{source_directories}
+    repositories:
+        - path: ssh://user@backupserver/./sourcehostname.borg
+          label: backupserver
+        - path: /mnt/backup
+          label: local
+    exclude_patterns:
+{exclude_patterns}
+    one_file_system: true
+
+storage:
+    encryption_passphrase: "{{passphrase}}"
+    compression: lz4
+    archive_name_format: '{{hostname}}-{{now}}'
+    retries: 3
+
+retention:
+    keep_daily: 7
+    keep_weekly: 4
+    keep_monthly: 6
+
+consistency:
+    checks:
+        - name: repository
+        - name: archives
+          frequency: 2 weeks
+
+hooks:
+    before_backup:
+        - echo Starting a backup.
+    postgresql_databases:
+        - name: users
+          hostname: database.example.org
+          format: custom
+    mysql_databases:
+        - name: all
+          format: sql
+
+constants:
+    passphrase: supersecret
+'''
+
+
+def write_config(path, source_directory_count):
+    '''
+    Given a path and a number of source directories, write a representative configuration file
+    there with that many source directories and exclude patterns.
+    '''
+    path.write_text(
+        CONFIG_TEMPLATE.format(
+            source_directories='\n'.join(
+                f'        - /srv/app{index}' for index in range(source_directory_count)
+            ),
+            exclude_patterns='\n'.join(
+                f"        - '/srv/app{index}/*.cache'" for index in range(source_directory_count)
+            ),
+        )
+    )
+
+
+@pytest.mark.parametrize('source_directory_count', (10, 1000))
+def test_load_configuration(benchmark, tmp_path, source_directory_count):
+    config_path = tmp_path / 'config.yaml'
+    write_config(config_path, source_directory_count)
+
+    benchmark(load.load_configuration, str(config_path))
+
+    benchmark.extra_info['source_directory_count'] = source_directory_count
+
+
+@pytest.mark.parametrize('source_directory_count', (10, 1000))
+def test_parse_configuration_loads_and_validates(benchmark, tmp_path, source_directory_count):
+    config_path = tmp_path / 'config.yaml'
+    write_config(config_path, source_directory_count)
+
+    benchmark(validate.parse_configuration, str(config_path), validate.schema_filename())
+
+    benchmark.extra_info['source_directory_count'] = source_directory_count
+
+
+def test_generate_sample_configuration(benchmark, tmp_path):
+    config_path = tmp_path / 'config.yaml'
+
+    benchmark(
+        generate.generate_sample_configuration,
+        None,
+        str(config_path),
+        validate.schema_filename(),
+        overwrite=True,
+    )
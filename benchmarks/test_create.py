@@ -0,0 +1,114 @@
+import os
+
+import pytest
+
+from borgmatic.borg import create as module
+from borgmatic.borg import scan
+
+
+@pytest.mark.parametrize('directory_count', (1000, 10000, 100000))
+def test_deduplicate_directories_scaling(benchmark, directory_count):
+    # Half the directories are children of the other half, and a few parents are on another
+    # device, so every kind of comparison gets exercised.
+    directory_devices = {}
+
+    for index in range(directory_count // 2):
+        directory_devices[f'/srv/data{index}'] = 1 if index % 10 else 2
+        directory_devices[f'/srv/data{index}/nested/child'] = 1
+
+    benchmark(module.deduplicate_directories, directory_devices, {'/srv/data0/other': 1})
+
+    benchmark.extra_info['directory_count'] = directory_count
+    benchmark.extra_info['directories_per_second'] = benchmark.per_second(directory_count)
+
+
+def test_deduplicate_directories_with_glob_expanded_directories(benchmark):
+    # Like what a "/srv/*/data" source directory expands to, along with a parent directory on a
+    # separate filesystem and some nested duplicates.
+    directory_devices = {f'/srv/{index}/data': 1 for index in range(12000)}
+    directory_devices.update({f'/srv/{index}/data/nested': 1 for index in range(0, 12000, 3)})
+    directory_devices['/srv'] = 2
+
+    deduplicated = benchmark(module.deduplicate_directories, directory_devices, {'/srv/0': 1})
+
+    assert len(deduplicated) == 12000
+    benchmark.extra_info['directory_count'] = len(directory_devices)
+    benchmark.extra_info['directories_per_second'] = benchmark.per_second(len(directory_devices))
+
+
+def make_synthetic_tree(root, directory_count, files_per_directory, special_file_count):
+    '''
+    Given a root path, create a tree of directories under it, each containing the given number of
+    regular files. Then add the given number of named pipes spread across those directories, and
+    return the total number of paths in the tree.
+    '''
+    for directory_index in range(directory_count):
+        directory = root / f'dir{directory_index // 10}' / f'sub{directory_index}'
+        directory.mkdir(parents=True)
+
+        for file_index in range(files_per_directory):
+            (directory / f'file{file_index}').write_bytes(b'')
+
+    for special_index in range(special_file_count):
+        os.mkfifo(root / f'dir{special_index % (directory_count // 10)}' / f'fifo{special_index}')
+
+    return sum(len(directories) + len(files) for _, directories, files in os.walk(root)) + 1
+
+
+TREE_SIZES = ((100, 10), (1000, 20))
+
+
+@pytest.mark.parametrize(
+    'directory_count,files_per_directory', TREE_SIZES, ids=('1k-files', '20k-files')
+)
+def test_collect_special_file_paths_on_synthetic_tree(
+    benchmark, fake_command, tmp_path, directory_count, files_per_directory
+):
+    tree = tmp_path / 'tree'
+    path_count = make_synthetic_tree(tree, directory_count, files_per_directory, 10)
+    # A fake "borg create --dry-run --list" that lists every path under its source directories.
+    borg_path = fake_command(
+        'borg',
+        '''
+        import os
+        import sys
+
+        output = sys.stdout
+
+        for source_directory in sys.argv[3:-2]:
+            output.write(f'- {source_directory}\\n')
+
+            for directory, directories, files in os.walk(source_directory):
+                for name in directories + files:
+                    output.write(f'- {os.path.join(directory, name)}\\n')
+        ''',
+    )
+
+    special_file_paths = benchmark(
+        module.collect_special_file_paths,
+        (borg_path, 'create', 'repo::archive', str(tree)),
+        local_path=borg_path,
+        working_directory=None,
+        borg_environment=None,
+        skip_directories=(),
+    )
+
+    assert len(special_file_paths) == 10
+    benchmark.extra_info['path_count'] = path_count
+    benchmark.extra_info['paths_per_second'] = benchmark.per_second(path_count)
+
+
+@pytest.mark.parametrize(
+    'directory_count,files_per_directory', TREE_SIZES, ids=('1k-files', '20k-files')
+)
+def test_find_special_file_paths_on_synthetic_tree(
+    benchmark, tmp_path, directory_count, files_per_directory
+):
+    tree = tmp_path / 'tree'
+    path_count = make_synthetic_tree(tree, directory_count, files_per_directory, 10)
+
+    special_file_paths = benchmark(scan.find_special_file_paths, (str(tree),))
+
+    assert len(special_file_paths) == 10
+    benchmark.extra_info['path_count'] = path_count
+    benchmark.extra_info['paths_per_second'] = benchmark.per_second(path_count)
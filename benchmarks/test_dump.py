@@ -0,0 +1,122 @@
+import shutil
+import subprocess
+
+import pytest
+
+from borgmatic.execute import execute_command_with_processes
+from borgmatic.hooks import dump
+from borgmatic.hooks import postgresql as module
+
+DUMP_SIZE = 64 * 1024 * 1024
+
+# A fake database dump command that writes a compressible dump of a fixed size to stdout, as a
+# "plain" format dump would.
+FAKE_PG_DUMP = f'''
+import sys
+
+chunk = b''.join(
+    f'INSERT INTO users VALUES ({{index}}, "user{{index}}@example.org");\\n'.encode()
+    for index in range(1000)
+)
+output = sys.stdout.buffer
+remaining = {DUMP_SIZE}
+
+while remaining > 0:
+    output.write(chunk[:remaining])
+    remaining -= len(chunk)
+'''
+
+# A fake database client or "borg create" that consumes a dump from stdin or from a file argument.
+FAKE_CONSUMER = '''
+import sys
+
+source = open(sys.argv[-1], 'rb') if sys.argv[-1].startswith('/') else sys.stdin.buffer
+
+while source.read(1024 * 1024):
+    pass
+'''
+
+
+def compressions():
+    return ('none',) + tuple(
+        compression for compression in ('zstd', 'lz4', 'gzip') if shutil.which(compression)
+    )
+
+
+@pytest.mark.parametrize('compression', compressions())
+def test_spooled_dump_throughput(benchmark, fake_command, tmp_path, compression):
+    pg_dump_path = fake_command('pg_dump', FAKE_PG_DUMP)
+    databases = [
+        {'name': 'users', 'format': 'plain', 'pg_dump_command': pg_dump_path},
+    ]
+    location_config = {'borgmatic_source_directory': str(tmp_path / '.borgmatic')}
+
+    if compression != 'none':
+        databases[0]['dump_compression'] = compression
+
+    def run():
+        module.dump_databases(databases, 'bench', location_config, dry_run=False, spool=True)
+        module.remove_database_dumps(databases, 'bench', location_config, dry_run=False)
+
+    benchmark(run)
+
+    benchmark.extra_info['megabytes_per_second'] = benchmark.per_second(DUMP_SIZE) / 1000000
+
+
+def test_streamed_dump_to_borg_throughput(benchmark, fake_command, tmp_path):
+    pg_dump_path = fake_command('pg_dump', FAKE_PG_DUMP)
+    borg_path = fake_command('borg', FAKE_CONSUMER)
+    databases = [
+        {'name': 'users', 'format': 'plain', 'pg_dump_command': pg_dump_path},
+    ]
+    location_config = {'borgmatic_source_directory': str(tmp_path / '.borgmatic')}
+
+    def run():
+        processes = module.dump_databases(databases, 'bench', location_config, dry_run=False)
+        dump_path = dump.make_database_dump_filename(
+            module.make_dump_path(location_config), databases[0]['name']
+        )
+        execute_command_with_processes(
+            (borg_path, 'create', dump_path), processes, borg_local_path=borg_path
+        )
+        module.remove_database_dumps(databases, 'bench', location_config, dry_run=False)
+
+    benchmark(run)
+
+    benchmark.extra_info['megabytes_per_second'] = benchmark.per_second(DUMP_SIZE) / 1000000
+
+
+def test_streamed_restore_throughput(benchmark, fake_command, tmp_path):
+    borg_path = fake_command(
+        'borg',
+        f'''
+        import sys
+
+        chunk = b'x' * 1024 * 1024
+
+        for _ in range({DUMP_SIZE // (1024 * 1024)}):
+            sys.stdout.buffer.write(chunk)
+        ''',
+    )
+    pg_restore_path = fake_command('pg_restore', FAKE_CONSUMER)
+    psql_path = fake_command('psql', '')
+    database_config = [
+        {
+            'name': 'users',
+            'schemas': None,
+            'pg_restore_command': pg_restore_path,
+            'psql_command': psql_path,
+        }
+    ]
+
+    def run():
+        extract_process = subprocess.Popen(
+            (borg_path, 'extract', '--stdout'), stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        module.restore_database_dump(
+            database_config, 'bench', {}, dry_run=False, extract_process=extract_process
+        )
+
+    benchmark(run)
+
+    benchmark.extra_info['megabytes_per_second'] = benchmark.per_second(DUMP_SIZE) / 1000000
@@ -0,0 +1,71 @@
+import logging
+
+import pytest
+
+from borgmatic import execute as module
+
+LINE_COUNT = 50000
+LINE_LENGTH = 100
+
+
+def install_fake_borg(fake_command):
+    '''
+    Install a fake Borg that writes a large number of fixed-length lines to stdout, as "borg create
+    --list" would for every file it backs up.
+    '''
+    return fake_command(
+        'borg',
+        f'''
+        import sys
+
+        line = b'A /var/lib/{'x' * (LINE_LENGTH - 17)}\\n'
+        output = sys.stdout.buffer
+
+        for _ in range({LINE_COUNT}):
+            output.write(line)
+        ''',
+    )
+
+
+@pytest.mark.parametrize('output_log_level', (logging.INFO, None), ids=('log', 'capture'))
+def test_log_outputs_throughput(benchmark, fake_command, output_log_level):
+    borg_path = install_fake_borg(fake_command)
+
+    benchmark(
+        module.execute_command_with_processes,
+        (borg_path, 'create', '--list'),
+        processes=(),
+        output_log_level=output_log_level,
+        borg_local_path=borg_path,
+    )
+
+    benchmark.extra_info['lines_per_second'] = benchmark.per_second(LINE_COUNT)
+    benchmark.extra_info['megabytes_per_second'] = (
+        benchmark.per_second(LINE_COUNT * LINE_LENGTH) / 1000000
+    )
+
+
+def test_log_outputs_throughput_with_concurrent_processes(benchmark, fake_command):
+    borg_path = install_fake_borg(fake_command)
+    dump_path = fake_command(
+        'pg_dump',
+        f'''
+        import sys
+
+        for _ in range({LINE_COUNT // 100}):
+            sys.stderr.write('pg_dump: dumping contents of table\\n')
+        ''',
+    )
+
+    def run():
+        dump_process = module.execute_command((dump_path,), run_to_completion=False)
+        module.execute_command_with_processes(
+            (borg_path, 'create', '--list'),
+            processes=(dump_process,),
+            output_log_level=logging.INFO,
+            borg_local_path=borg_path,
+        )
+
+    benchmark(run)
+
+    benchmark.extra_info['lines_per_second'] = benchmark.per_second(LINE_COUNT + LINE_COUNT // 100)
@@ -9,6 +9,7 @@ logger = logging.getLogger(__name__)
 
 def run_borg(
     repository,
+    location,
     storage,
     local_borg_version,
     borg_arguments,
@@ -29,6 +30,7 @@ def run_borg(
             local_borg_version,
             local_path,
             remote_path,
+            borgmatic_source_directory=location.get('borgmatic_source_directory'),
         )
         borgmatic.borg.borg.run_arbitrary_borg(
             repository['path'],
@@ -6,10 +6,71 @@ import borgmatic.config.validate
 import borgmatic.hooks.command
 import borgmatic.hooks.dispatch
 import borgmatic.hooks.dump
+import borgmatic.metrics
+import borgmatic.timing
 
 logger = logging.getLogger(__name__)
 
 
+def spool_database_dumps(config_filename, location, hooks, global_arguments):
+    '''
+    Given a configuration filename, a location configuration dict, a hooks configuration dict, and
+    the global arguments, dump each configured database exactly once to a regular file within the
+    borgmatic source directory. Then the "create" action for every repository can back up those
+    same dump files, rather than each repository getting its own streaming dump.
+    '''
+    dry_run_label = ' (dry run; not actually dumping anything)' if global_arguments.dry_run else ''
+    logger.info(f'{config_filename}: Spooling database dumps for all repositories{dry_run_label}')
+
+    borgmatic.hooks.dispatch.call_hooks_even_if_unconfigured(
+        'remove_database_dumps',
+        hooks,
+        config_filename,
+        borgmatic.hooks.dump.DATABASE_HOOK_NAMES,
+        location,
+        global_arguments.dry_run,
+    )
+    with borgmatic.timing.span('database dumps', 'step'):
+        borgmatic.hooks.dispatch.call_hooks(
+            'dump_databases',
+            hooks,
+            config_filename,
+            borgmatic.hooks.dump.DATABASE_HOOK_NAMES,
+            location,
+            global_arguments.dry_run,
+            spool=True,
+        )
+
+    if hooks.get('prometheus') and not global_arguments.dry_run:
+        for hook_name in borgmatic.hooks.dump.DATABASE_HOOK_NAMES:
+            if hooks.get(hook_name):
+                borgmatic.metrics.record(
+                    config_filename,
+                    'borgmatic_database_dump_bytes',
+                    borgmatic.metrics.path_size(
+                        borgmatic.hooks.dump.make_database_dump_path(
+                            location.get('borgmatic_source_directory'), hook_name
+                        )
+                    ),
+                    hook=hook_name,
+                )
+
+
+def remove_spooled_database_dumps(config_filename, location, hooks, global_arguments):
+    '''
+    Given a configuration filename, a location configuration dict, a hooks configuration dict, and
+    the global arguments, remove any database dumps previously spooled by spool_database_dumps().
+    '''
+    borgmatic.hooks.dispatch.call_hooks_even_if_unconfigured(
+        'remove_database_dumps',
+        hooks,
+        config_filename,
+        borgmatic.hooks.dump.DATABASE_HOOK_NAMES,
+        location,
+        global_arguments.dry_run,
+    )
+
+
 def run_create(
     config_filename,
     repository,
@@ -27,7 +88,8 @@ def run_create(
     '''
     Run the "create" action for the given repository.
 
-    If create_arguments.json is True, yield the JSON output from creating the archive.
+    If create_arguments.json is True, yield the JSON output from creating the archive. If the
+    Prometheus hook is configured, record metrics from that JSON output as well.
     '''
     if create_arguments.repository and not borgmatic.config.validate.repositories_match(
         repository, create_arguments.repository
@@ -43,23 +105,53 @@ def run_create(
         **hook_context,
     )
     logger.info(f'{repository["path"]}: Creating archive{dry_run_label}')
-    borgmatic.hooks.dispatch.call_hooks_even_if_unconfigured(
-        'remove_database_dumps',
-        hooks,
-        repository['path'],
-        borgmatic.hooks.dump.DATABASE_HOOK_NAMES,
-        location,
-        global_arguments.dry_run,
-    )
-    active_dumps = borgmatic.hooks.dispatch.call_hooks(
-        'dump_databases',
-        hooks,
-        repository['path'],
-        borgmatic.hooks.dump.DATABASE_HOOK_NAMES,
-        location,
-        global_arguments.dry_run,
+    spool_database_dumps = hooks.get('spool_database_dumps', False)
+
+    # If database dumps are spooled, they've already been dumped once for all repositories. So
+    # there's nothing to stream.
+    if spool_database_dumps:
+        stream_processes = []
+    else:
+        borgmatic.hooks.dispatch.call_hooks_even_if_unconfigured(
+            'remove_database_dumps',
+            hooks,
+            repository['path'],
+            borgmatic.hooks.dump.DATABASE_HOOK_NAMES,
+            location,
+            global_arguments.dry_run,
+        )
+        with borgmatic.timing.span('database dumps', 'step', repository=repository['path']):
+            active_dumps = borgmatic.hooks.dispatch.call_hooks(
+                'dump_databases',
+                hooks,
+                repository['path'],
+                borgmatic.hooks.dump.DATABASE_HOOK_NAMES,
+                location,
+                global_arguments.dry_run,
+            )
+        stream_processes = [process for processes in active_dumps.values() for process in processes]
+
+    # Borg's JSON output replaces its other output, including the log output requested at a
+    # verbosity of 1 or above. So only ask for it in order to collect metrics if nothing else has
+    # been requested.
+    record_metrics = (
+        bool(hooks.get('prometheus'))
+        and not global_arguments.dry_run
+        and (
+            bool(create_arguments.json)
+            or not (
+                create_arguments.list_files
+                or create_arguments.progress
+                or create_arguments.stats
+                or logger.isEnabledFor(logging.INFO)
+            )
+        )
     )
-    stream_processes = [process for processes in active_dumps.values() for process in processes]
+
+    if hooks.get('prometheus') and not global_arguments.dry_run and not record_metrics:
+        logger.debug(
+            f'{repository["path"]}: Skipping archive metrics, as Borg can\'t output JSON along with the requested output'
+        )
 
     json_output = borgmatic.borg.create.create_archive(
         global_arguments.dry_run,
@@ -71,21 +163,39 @@ def run_create(
         remote_path=remote_path,
         progress=create_arguments.progress,
         stats=create_arguments.stats,
-        json=create_arguments.json,
+        json=create_arguments.json or record_metrics,
         list_files=create_arguments.list_files,
         stream_processes=stream_processes,
     )
-    if json_output:  # pragma: nocover
-        yield json.loads(json_output)
+    if json_output:
+        try:
+            create_output = json.loads(json_output)
+        except ValueError as error:
+            # The archive got created either way, so don't fail the backup just for want of metrics.
+            if create_arguments.json:
+                raise
 
-    borgmatic.hooks.dispatch.call_hooks_even_if_unconfigured(
-        'remove_database_dumps',
-        hooks,
-        config_filename,
-        borgmatic.hooks.dump.DATABASE_HOOK_NAMES,
-        location,
-        global_arguments.dry_run,
-    )
+            logger.warning(
+                f'{repository["path"]}: Cannot parse Borg JSON output, so not recording archive metrics: {error}'
+            )
+        else:
+            if record_metrics:
+                borgmatic.metrics.record_archive_stats(
+                    config_filename, repository['path'], create_output
+                )
+
+            if create_arguments.json:
+                yield create_output
+
+    if not spool_database_dumps:
+        borgmatic.hooks.dispatch.call_hooks_even_if_unconfigured(
+            'remove_database_dumps',
+            hooks,
+            config_filename,
+            borgmatic.hooks.dump.DATABASE_HOOK_NAMES,
+            location,
+            global_arguments.dry_run,
+        )
     borgmatic.hooks.command.execute_hook(
         hooks.get('after_backup'),
         hooks.get('umask'),
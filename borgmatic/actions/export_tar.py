@@ -9,6 +9,7 @@ logger = logging.getLogger(__name__)
 
 def run_export_tar(
     repository,
+    location,
     storage,
     local_borg_version,
     export_tar_arguments,
@@ -35,6 +36,7 @@ def run_export_tar(
                 local_borg_version,
                 local_path,
                 remote_path,
+                borgmatic_source_directory=location.get('borgmatic_source_directory'),
             ),
             export_tar_arguments.paths,
             export_tar_arguments.destination,
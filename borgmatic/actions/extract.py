@@ -46,6 +46,7 @@ def run_extract(
                 local_borg_version,
                 local_path,
                 remote_path,
+                borgmatic_source_directory=location.get('borgmatic_source_directory'),
             ),
             extract_arguments.paths,
             location,
@@ -10,6 +10,7 @@ logger = logging.getLogger(__name__)
 
 def run_info(
     repository,
+    location,
     storage,
     local_borg_version,
     info_arguments,
@@ -33,6 +34,7 @@ def run_info(
             local_borg_version,
             local_path,
             remote_path,
+            borgmatic_source_directory=location.get('borgmatic_source_directory'),
         )
         json_output = borgmatic.borg.info.display_archives_info(
             repository['path'],
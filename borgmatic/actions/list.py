@@ -9,6 +9,7 @@ logger = logging.getLogger(__name__)
 
 def run_list(
     repository,
+    location,
     storage,
     local_borg_version,
     list_arguments,
@@ -35,6 +36,7 @@ def run_list(
             local_borg_version,
             local_path,
             remote_path,
+            borgmatic_source_directory=location.get('borgmatic_source_directory'),
         )
         json_output = borgmatic.borg.list.list_archive(
             repository['path'],
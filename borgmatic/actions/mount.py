@@ -9,6 +9,7 @@ logger = logging.getLogger(__name__)
 
 def run_mount(
     repository,
+    location,
     storage,
     local_borg_version,
     mount_arguments,
@@ -35,6 +36,7 @@ def run_mount(
                 local_borg_version,
                 local_path,
                 remote_path,
+                borgmatic_source_directory=location.get('borgmatic_source_directory'),
             ),
             mount_arguments.mount_point,
             mount_arguments.paths,
@@ -1,15 +1,23 @@
+import concurrent.futures
 import copy
+import fnmatch
 import logging
 import os
+import tarfile
+import time
 
+import borgmatic.borg.export_tar
 import borgmatic.borg.extract
 import borgmatic.borg.list
 import borgmatic.borg.mount
 import borgmatic.borg.rlist
 import borgmatic.borg.state
 import borgmatic.config.validate
+import borgmatic.execute
 import borgmatic.hooks.dispatch
 import borgmatic.hooks.dump
+import borgmatic.pipe
+import borgmatic.timing
 
 logger = logging.getLogger(__name__)
 
@@ -68,17 +76,20 @@ def restore_single_database(
     archive_name,
     hook_name,
     database,
+    log_prefix=None,
 ):  # pragma: no cover
     '''
-    Given (among other things) an archive name, a database hook name, and a configured database
-    configuration dict, restore that database from the archive.
+    Given (among other things) an archive name, a database hook name, a configured database
+    configuration dict, and an optional log prefix (defaulting to the repository), restore that
+    database from the archive.
     '''
-    logger.info(f'{repository}: Restoring database {database["name"]}')
+    log_prefix = log_prefix or repository
+    logger.info(f'{log_prefix}: Restoring database {database["name"]}')
 
     dump_pattern = borgmatic.hooks.dispatch.call_hooks(
         'make_database_dump_pattern',
         hooks,
-        repository,
+        log_prefix,
         borgmatic.hooks.dump.DATABASE_HOOK_NAMES,
         location,
         database['name'],
@@ -101,17 +112,385 @@ def restore_single_database(
         extract_to_stdout=bool(database.get('format') != 'directory'),
     )
 
+    # Relay the extract stdout (if any) to the database client through a large kernel pipe buffer,
+    # reporting on throughput along the way. Detect the dump's compression from its first few bytes
+    # first, and have the relay put those bytes back.
+    relay = None
+    compression = None
+
+    if extract_process and extract_process.stdout:
+        header = borgmatic.hooks.dump.read_dump_header(extract_process.stdout)
+        compression = borgmatic.hooks.dump.detect_dump_compression(header)
+        (extract_process.stdout, relay) = borgmatic.pipe.start_relay(
+            extract_process.stdout, f'{log_prefix}: Database {database["name"]}', prefix=header
+        )
+
     # Run a single database restore, consuming the extract stdout (if any).
-    borgmatic.hooks.dispatch.call_hooks(
-        'restore_database_dump',
-        {hook_name: [database]},
-        repository,
-        borgmatic.hooks.dump.DATABASE_HOOK_NAMES,
-        location,
+    try:
+        borgmatic.hooks.dispatch.call_hooks(
+            'restore_database_dump',
+            {hook_name: [database]},
+            log_prefix,
+            borgmatic.hooks.dump.DATABASE_HOOK_NAMES,
+            location,
+            global_arguments.dry_run,
+            extract_process,
+            compression=compression,
+        )
+    finally:
+        # Close borgmatic's copy of the relay's output so the relay can't get stuck writing to it.
+        if relay:
+            extract_process.stdout.close()
+
+    if relay:
+        relay.result()
+
+
+def restore_database_from_stream(
+    location, global_arguments, hook_name, database, extract_stream, log_prefix, compression=None
+):
+    '''
+    Given a location configuration dict, global arguments, a database hook name, a configured
+    database configuration dict, an open file object for the database's dump, a log prefix, and the
+    name of the compression that the dump was made with (if any), restore that database by consuming
+    its dump from the file object. Close the file object once the restore finishes.
+    '''
+    try:
+        borgmatic.hooks.dispatch.call_hooks(
+            'restore_database_dump',
+            {hook_name: [database]},
+            log_prefix,
+            borgmatic.hooks.dump.DATABASE_HOOK_NAMES,
+            location,
+            global_arguments.dry_run,
+            None,
+            extract_stream=extract_stream,
+            compression=compression,
+        )
+    finally:
+        extract_stream.close()
+
+
+def feed_extract_stream(source, destination_descriptor, log_prefix, prefix=b''):
+    '''
+    Given an open source file object (e.g. a single member of a tar stream), a destination file
+    descriptor for the write end of a pipe, a log prefix, and any bytes already read from the source
+    to put back in front of its data, copy the prefix and then all data from the source to the
+    destination, close the destination, and log the resulting throughput.
+
+    If the destination's reader goes away early, then stop copying without raising, as the reader
+    is expected to report its own error.
+    '''
+    start_time = time.monotonic()
+    byte_count = 0
+
+    with borgmatic.timing.span(log_prefix, 'stream') as record:
+        try:
+            chunk = prefix or source.read(borgmatic.pipe.PIPE_BUFFER_SIZE)
+
+            while chunk:
+                remaining = memoryview(chunk)
+
+                while remaining:
+                    remaining = remaining[os.write(destination_descriptor, remaining) :]
+
+                byte_count += len(chunk)
+                chunk = source.read(borgmatic.pipe.PIPE_BUFFER_SIZE)
+        except BrokenPipeError:
+            pass
+        finally:
+            os.close(destination_descriptor)
+            record['byte_count'] = byte_count
+
+    elapsed_seconds = time.monotonic() - start_time
+    logger.info(
+        f'{log_prefix}: Streamed {borgmatic.pipe.format_byte_count(byte_count)} in'
+        f' {elapsed_seconds:.1f} seconds'
+        f' ({borgmatic.pipe.format_byte_count(int(byte_count / max(elapsed_seconds, 0.001)))}/s)'
+    )
+
+
+def find_dump_for_member(member_name, pending_dumps):
+    '''
+    Given the name of a member in a tar stream exported from an archive (a path without a leading
+    slash) and a list of pending (database hook name, database configuration dict, dump glob
+    pattern) tuples, remove and return the first pending dump whose pattern matches the member name.
+    Return None if there's no match.
+    '''
+    for index, (hook_name, database, dump_pattern) in enumerate(pending_dumps):
+        if fnmatch.fnmatchcase(member_name, dump_pattern.lstrip(os.path.sep)):
+            return pending_dumps.pop(index)
+
+    return None
+
+
+def restore_databases_in_single_pass(
+    repository,
+    location,
+    storage,
+    hooks,
+    local_borg_version,
+    global_arguments,
+    local_path,
+    remote_path,
+    archive_name,
+    hook_databases,
+    jobs=1,
+):
+    '''
+    Given (among other things) an archive name, a sequence of (database hook name, configured
+    database configuration dict) tuples, and a number of jobs, restore each database from the
+    archive with a single "borg export-tar" command for all of their dumps. This way, Borg only
+    loads the archive and locks the repository once, no matter how many databases there are.
+
+    The resulting tar stream gets demultiplexed on the fly: Each database dump in it is fed through
+    a pipe to a separate database client for restoring, in archive order. If the number of jobs is
+    greater than one, then keep up to that many clients running at once, so that a client can
+    finish restoring one database while the next database's dump streams to another client.
+
+    Directory format dumps aren't single files, so they're not supported here.
+
+    Raise ValueError if a database's dump isn't found in the stream.
+    '''
+    pending_dumps = [
+        (
+            hook_name,
+            database,
+            borgmatic.hooks.dispatch.call_hooks(
+                'make_database_dump_pattern',
+                hooks,
+                repository,
+                borgmatic.hooks.dump.DATABASE_HOOK_NAMES,
+                location,
+                database['name'],
+            )[hook_name],
+        )
+        for hook_name, database in hook_databases
+    ]
+
+    logger.info(
+        f'{repository}: Extracting {len(pending_dumps)} database dumps from archive {archive_name} in a single pass'
+    )
+
+    export_process = borgmatic.borg.export_tar.export_tar_archive(
         global_arguments.dry_run,
-        extract_process,
+        repository,
+        archive_name,
+        borgmatic.hooks.dump.convert_glob_patterns_to_borg_patterns(
+            [dump_pattern for (_, _, dump_pattern) in pending_dumps]
+        ),
+        '-',
+        storage,
+        local_borg_version,
+        local_path=local_path,
+        remote_path=remote_path,
+        run_to_completion=False,
     )
 
+    # With a dry run, there's no stream to restore from. But let each hook log what it would do.
+    if not export_process:
+        for hook_name, database, _ in pending_dumps:
+            borgmatic.hooks.dispatch.call_hooks(
+                'restore_database_dump',
+                {hook_name: [database]},
+                repository,
+                borgmatic.hooks.dump.DATABASE_HOOK_NAMES,
+                location,
+                global_arguments.dry_run,
+                None,
+            )
+
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs + 1) as executor:
+        # Log Borg's stderr (and catch any Borg error) while its stdout gets demultiplexed below.
+        export_future = executor.submit(
+            borgmatic.execute.log_outputs,
+            (export_process,),
+            (export_process.stdout,),
+            logging.INFO,
+            local_path,
+        )
+        restore_futures = set()
+
+        try:
+            with tarfile.open(fileobj=export_process.stdout, mode='r|') as tar_stream:
+                for member in tar_stream:
+                    if not member.isfile():
+                        continue
+
+                    found_dump = find_dump_for_member(member.name, pending_dumps)
+
+                    if not found_dump:
+                        continue
+
+                    (hook_name, database, _) = found_dump
+                    log_prefix = f'{repository}: {database["name"]}' if jobs > 1 else repository
+                    logger.info(f'{log_prefix}: Restoring database {database["name"]}')
+
+                    # Wait for a free job before starting another client, as the client must be
+                    # running to consume the dump fed to it.
+                    while len(restore_futures) >= jobs:
+                        (done, restore_futures) = concurrent.futures.wait(
+                            restore_futures, return_when=concurrent.futures.FIRST_COMPLETED
+                        )
+
+                        for future in done:
+                            future.result()
+
+                    # Detect the dump's compression from its first few bytes before starting its
+                    # client, and then feed those bytes to the client along with the rest.
+                    source = tar_stream.extractfile(member)
+                    header = source.read(borgmatic.hooks.dump.DUMP_HEADER_LENGTH)
+                    (read_descriptor, write_descriptor) = os.pipe()
+                    borgmatic.pipe.set_pipe_size(write_descriptor)
+                    restore_futures.add(
+                        executor.submit(
+                            restore_database_from_stream,
+                            location,
+                            global_arguments,
+                            hook_name,
+                            database,
+                            os.fdopen(read_descriptor, 'rb'),
+                            log_prefix,
+                            borgmatic.hooks.dump.detect_dump_compression(header),
+                        )
+                    )
+                    feed_extract_stream(
+                        source,
+                        write_descriptor,
+                        f'{log_prefix}: Database {database["name"]}',
+                        prefix=header,
+                    )
+
+            # Consume any trailing padding so that Borg doesn't get stuck writing it.
+            while export_process.stdout.read(borgmatic.pipe.PIPE_BUFFER_SIZE):
+                pass
+
+            for future in concurrent.futures.as_completed(restore_futures):
+                future.result()
+        except BaseException as error:
+            if export_process.poll() is None:
+                export_process.kill()
+
+            # A broken tar stream is most likely due to a Borg error, which is more informative.
+            if isinstance(error, tarfile.TarError):
+                export_future.result()
+
+            raise
+
+        export_future.result()
+
+    if pending_dumps:
+        joined_names = ', '.join(f'"{database["name"]}"' for (_, database, _) in pending_dumps)
+        raise ValueError(
+            f'Cannot find dump{"s" if len(pending_dumps) > 1 else ""} for database {joined_names} in archive {archive_name}'
+        )
+
+
+def restore_databases(
+    repository,
+    location,
+    storage,
+    hooks,
+    local_borg_version,
+    global_arguments,
+    local_path,
+    remote_path,
+    archive_name,
+    hook_databases,
+    jobs=1,
+    single_pass=False,
+):
+    '''
+    Given (among other things) an archive name, a sequence of (database hook name, configured
+    database configuration dict) tuples, a number of jobs, and whether to extract in a single pass,
+    restore each database from the archive.
+
+    If single pass is True, then restore all databases except those with directory format dumps
+    from a single extract as per restore_databases_in_single_pass(). Otherwise, extract each
+    database's dump separately.
+
+    If the number of jobs is greater than one, restore up to that many databases at once in
+    separate threads, logging each one with its own log prefix. If any restore fails, then don't
+    start any further restores, and raise the first error once the restores in progress finish.
+    '''
+    if single_pass:
+        streamable_hook_databases = [
+            (hook_name, database)
+            for hook_name, database in hook_databases
+            if database.get('format') != 'directory'
+        ]
+        hook_databases = [
+            (hook_name, database)
+            for hook_name, database in hook_databases
+            if database.get('format') == 'directory'
+        ]
+
+        if streamable_hook_databases:
+            restore_databases_in_single_pass(
+                repository,
+                location,
+                storage,
+                hooks,
+                local_borg_version,
+                global_arguments,
+                local_path,
+                remote_path,
+                archive_name,
+                streamable_hook_databases,
+                jobs=jobs,
+            )
+
+    if jobs <= 1 or len(hook_databases) <= 1:
+        for hook_name, database in hook_databases:
+            restore_single_database(
+                repository,
+                location,
+                storage,
+                hooks,
+                local_borg_version,
+                global_arguments,
+                local_path,
+                remote_path,
+                archive_name,
+                hook_name,
+                database,
+            )
+
+        return
+
+    logger.info(f'{repository}: Restoring up to {jobs} databases at once')
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(
+                restore_single_database,
+                repository,
+                location,
+                storage,
+                hooks,
+                local_borg_version,
+                global_arguments,
+                local_path,
+                remote_path,
+                archive_name,
+                hook_name,
+                database,
+                log_prefix=f'{repository}: {database["name"]}',
+            )
+            for hook_name, database in hook_databases
+        ]
+
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+        except Exception:
+            for future in futures:
+                future.cancel()
+
+            raise
+
 
 def collect_archive_database_names(
     repository,
@@ -136,7 +515,7 @@ def collect_archive_database_names(
     parent_dump_path = os.path.expanduser(
         borgmatic.hooks.dump.make_database_dump_path(borgmatic_source_directory, '*_databases/*/*')
     )
-    dump_paths = borgmatic.borg.list.capture_archive_listing(
+    dump_paths = borgmatic.borg.list.stream_archive_listing(
         repository,
         archive,
         storage,
@@ -281,6 +660,7 @@ def run_restore(
         local_borg_version,
         local_path,
         remote_path,
+        borgmatic_source_directory=location.get('borgmatic_source_directory'),
     )
     archive_database_names = collect_archive_database_names(
         repository['path'],
@@ -294,6 +674,7 @@ def run_restore(
     restore_names = find_databases_to_restore(restore_arguments.databases, archive_database_names)
     found_names = set()
     remaining_restore_names = {}
+    hook_databases = []
 
     for hook_name, database_names in restore_names.items():
         for database_name in database_names:
@@ -308,18 +689,11 @@ def run_restore(
                 continue
 
             found_names.add(database_name)
-            restore_single_database(
-                repository['path'],
-                location,
-                storage,
-                hooks,
-                local_borg_version,
-                global_arguments,
-                local_path,
-                remote_path,
-                archive_name,
-                found_hook_name or hook_name,
-                dict(found_database, **{'schemas': restore_arguments.schemas}),
+            hook_databases.append(
+                (
+                    found_hook_name or hook_name,
+                    dict(found_database, **{'schemas': restore_arguments.schemas}),
+                )
             )
 
     # For any database that weren't found via exact matches in the hooks configuration, try to
@@ -336,21 +710,28 @@ def run_restore(
             found_names.add(database_name)
             database = copy.copy(found_database)
             database['name'] = database_name
-
-            restore_single_database(
-                repository['path'],
-                location,
-                storage,
-                hooks,
-                local_borg_version,
-                global_arguments,
-                local_path,
-                remote_path,
-                archive_name,
-                found_hook_name or hook_name,
-                dict(database, **{'schemas': restore_arguments.schemas}),
+            hook_databases.append(
+                (
+                    found_hook_name or hook_name,
+                    dict(database, **{'schemas': restore_arguments.schemas}),
+                )
             )
 
+    restore_databases(
+        repository['path'],
+        location,
+        storage,
+        hooks,
+        local_borg_version,
+        global_arguments,
+        local_path,
+        remote_path,
+        archive_name,
+        hook_databases,
+        jobs=restore_arguments.restore_jobs,
+        single_pass=restore_arguments.single_pass,
+    )
+
     borgmatic.hooks.dispatch.call_hooks_even_if_unconfigured(
         'remove_database_dumps',
         hooks,
@@ -0,0 +1,69 @@
+import hashlib
+import logging
+import os
+import time
+
+from borgmatic.borg import state
+
+logger = logging.getLogger(__name__)
+
+
+def make_latest_archive_cache_path(borgmatic_source_directory, repository_path):
+    '''
+    Given a borgmatic source directory (or None to use the default) and a local or remote repository
+    path, return a path for caching the name of that repository's latest archive.
+    '''
+    return os.path.join(
+        os.path.expanduser(borgmatic_source_directory or state.DEFAULT_BORGMATIC_SOURCE_DIRECTORY),
+        'archive_cache',
+        hashlib.sha256(os.path.expanduser(repository_path).encode()).hexdigest(),
+    )
+
+
+def read_cached_latest_archive(borgmatic_source_directory, repository_path, max_age_seconds):
+    '''
+    Given a borgmatic source directory (or None to use the default), a local or remote repository
+    path, and a maximum cache age in seconds, return the cached name of the repository's latest
+    archive. Return None if there's no cached name, or if it's older than the maximum age.
+    '''
+    path = make_latest_archive_cache_path(borgmatic_source_directory, repository_path)
+
+    try:
+        if time.time() - os.stat(path).st_mtime > max_age_seconds:
+            return None
+    except OSError:
+        return None
+
+    try:
+        return state.read_state_file(path)['latest_archive']
+    except (KeyError, TypeError):
+        return None
+
+
+def write_cached_latest_archive(borgmatic_source_directory, repository_path, archive_name):
+    '''
+    Given a borgmatic source directory (or None to use the default), a local or remote repository
+    path, and the name of the repository's latest archive, cache that name for subsequent lookups.
+    Writing the cache is best-effort, so log rather than raise if it fails.
+    '''
+    path = make_latest_archive_cache_path(borgmatic_source_directory, repository_path)
+    logger.debug(f'{repository_path}: Caching latest archive name at {path}')
+
+    try:
+        state.write_state_file(
+            path, {'repository': repository_path, 'latest_archive': archive_name}
+        )
+    except OSError as error:
+        logger.debug(f'{repository_path}: Cannot cache latest archive name: {error}')
+
+
+def invalidate_cached_latest_archive(borgmatic_source_directory, repository_path):
+    '''
+    Given a borgmatic source directory (or None to use the default) and a local or remote repository
+    path, remove any cached latest archive name for that repository. Call this before doing anything
+    that may change the repository's archives.
+    '''
+    try:
+        os.remove(make_latest_archive_cache_path(borgmatic_source_directory, repository_path))
+    except FileNotFoundError:
+        pass
@@ -340,6 +340,12 @@ def check_archives(
 
     if 'extract' in checks:
         extract.extract_last_archive_dry_run(
-            storage_config, local_borg_version, repository_path, lock_wait, local_path, remote_path
+            storage_config,
+            local_borg_version,
+            repository_path,
+            lock_wait,
+            local_path,
+            remote_path,
+            borgmatic_source_directory=location_config.get('borgmatic_source_directory'),
         )
         write_check_time(make_check_time_path(location_config, borg_repository_id, 'extract'))
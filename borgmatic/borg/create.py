@@ -1,3 +1,7 @@
+import bisect
+import collections
+import concurrent.futures
+import functools
 import glob
 import itertools
 import logging
@@ -7,17 +11,25 @@ import stat
 import tempfile
 
 import borgmatic.logger
-from borgmatic.borg import environment, feature, flags, state
+from borgmatic import timing
+from borgmatic.borg import environment, feature, flags, scan, state
 from borgmatic.execute import (
     DO_NOT_CAPTURE,
     execute_command,
     execute_command_and_capture_output,
+    execute_command_and_stream_output,
     execute_command_with_processes,
 )
 
 logger = logging.getLogger(__name__)
 
 
+# Maximum number of paths to expand or stat concurrently. This is mostly waiting on the filesystem,
+# which can mean network round trips for NFS or CIFS sources, so it's not limited by CPU count.
+# But it's bounded to avoid hammering network filesystems.
+PREFLIGHT_WORKER_COUNT = 8
+
+
 def expand_directory(directory):
     '''
     Given a directory path, expand any tilde (representing a user's home directory) and any globs
@@ -32,13 +44,14 @@ def expand_directories(directories):
     '''
     Given a sequence of directory paths, expand tildes and globs in each one. Return all the
     resulting directories as a single flattened tuple.
+
+    The directories get expanded concurrently, as globbing each one can mean many filesystem calls.
     '''
     if directories is None:
         return ()
 
-    return tuple(
-        itertools.chain.from_iterable(expand_directory(directory) for directory in directories)
-    )
+    with concurrent.futures.ThreadPoolExecutor(max_workers=PREFLIGHT_WORKER_COUNT) as executor:
+        return tuple(itertools.chain.from_iterable(executor.map(expand_directory, directories)))
 
 
 def expand_home_directories(directories):
@@ -52,18 +65,26 @@ def expand_home_directories(directories):
     return tuple(os.path.expanduser(directory) for directory in directories)
 
 
-def map_directories_to_devices(directories):
+def map_directories_to_devices(directories, stat_cache=None):
     '''
-    Given a sequence of directories, return a map from directory to an identifier for the device on
-    which that directory resides or None if the path doesn't exist.
+    Given a sequence of directories and a dict cache of stat results as per scan.stat_path(), return a
+    map from directory to an identifier for the device on which that directory resides or None if
+    the path doesn't exist. The directories get stat-ed concurrently.
 
     This is handy for determining whether two different directories are on the same filesystem (have
     the same device identifier).
     '''
-    return {
-        directory: os.stat(directory).st_dev if os.path.exists(directory) else None
-        for directory in directories
-    }
+    directories = tuple(directories)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=PREFLIGHT_WORKER_COUNT) as executor:
+        stat_results = executor.map(
+            functools.partial(scan.stat_path, stat_cache=stat_cache), directories
+        )
+
+        return {
+            directory: stat_result.st_dev if stat_result else None
+            for directory, stat_result in zip(directories, stat_results)
+        }
 
 
 def deduplicate_directories(directory_devices, additional_directory_devices):
@@ -85,30 +106,29 @@ def deduplicate_directories(directory_devices, additional_directory_devices):
     If any additional directory devices are given, also deduplicate against them, but don't include
     them in the returned directories.
     '''
-    deduplicated = set()
-    directories = sorted(directory_devices.keys())
-    additional_directories = sorted(additional_directory_devices.keys())
     all_devices = {**directory_devices, **additional_directory_devices}
 
-    for directory in directories:
-        deduplicated.add(directory)
-        parents = pathlib.PurePath(directory).parents
+    # Map from each normalized directory path to the devices it resides on, so that looking up
+    # whether a parent is among the given directories doesn't require comparing every directory
+    # against every other directory.
+    devices_for_path = collections.defaultdict(set)
 
-        # If another directory in the given list (or the additional list) is a parent of current
-        # directory (even n levels up) and both are on the same filesystem, then the current
-        # directory is a duplicate.
-        for other_directory in directories + additional_directories:
-            for parent in parents:
-                if (
-                    pathlib.PurePath(other_directory) == parent
-                    and all_devices[directory] is not None
-                    and all_devices[other_directory] == all_devices[directory]
-                ):
-                    if directory in deduplicated:
-                        deduplicated.remove(directory)
-                    break
+    for directory, device in all_devices.items():
+        devices_for_path[str(pathlib.PurePath(directory))].add(device)
 
-    return tuple(sorted(deduplicated))
+    # If another directory in the given list (or the additional list) is a parent of a directory
+    # (even n levels up) and both are on the same filesystem, then that directory is a duplicate.
+    return tuple(
+        sorted(
+            directory
+            for directory in directory_devices.keys()
+            if all_devices[directory] is None
+            or not any(
+                all_devices[directory] in devices_for_path.get(str(parent), ())
+                for parent in pathlib.PurePath(directory).parents
+            )
+        )
+    )
 
 
 def write_pattern_file(patterns=None, sources=None, pattern_file=None):
@@ -220,16 +240,17 @@ def make_list_filter_flags(local_borg_version, dry_run):
 DEFAULT_ARCHIVE_NAME_FORMAT = '{hostname}-{now:%Y-%m-%dT%H:%M:%S.%f}'  # noqa: FS003
 
 
-def collect_borgmatic_source_directories(borgmatic_source_directory):
+def collect_borgmatic_source_directories(borgmatic_source_directory, stat_cache=None):
     '''
     Return a list of borgmatic-specific source directories used for state like database backups.
+    Use the given dict cache of stat results as per scan.stat_path().
     '''
     if not borgmatic_source_directory:
         borgmatic_source_directory = state.DEFAULT_BORGMATIC_SOURCE_DIRECTORY
 
     return (
         [borgmatic_source_directory]
-        if os.path.exists(os.path.expanduser(borgmatic_source_directory))
+        if scan.stat_path(os.path.expanduser(borgmatic_source_directory), stat_cache) is not None
         else []
     )
 
@@ -251,70 +272,145 @@ def pattern_root_directories(patterns=None):
     ]
 
 
-def special_file(path):
+def special_file(path, stat_cache=None):
     '''
     Return whether the given path is a special file (character device, block device, or named pipe
-    / FIFO).
+    / FIFO). Use the given dict cache of stat results as per scan.stat_path().
     '''
-    try:
-        mode = os.stat(path).st_mode
-    except (FileNotFoundError, OSError):
+    stat_result = scan.stat_path(path, stat_cache)
+
+    if stat_result is None:
         return False
 
+    mode = stat_result.st_mode
+
     return stat.S_ISCHR(mode) or stat.S_ISBLK(mode) or stat.S_ISFIFO(mode)
 
 
-def any_parent_directories(path, candidate_parents):
+def make_parent_directory_prefixes(candidate_parents):
+    '''
+    Given a sequence of candidate parent directories, return a sorted tuple of path prefixes (each
+    ending with a path separator) for use with any_parent_directories(). Omit any candidate that's
+    within another candidate, as it's redundant.
+    '''
+    prefixes = []
+
+    for prefix in sorted(
+        {os.path.normpath(parent).rstrip(os.path.sep) + os.path.sep for parent in candidate_parents}
+    ):
+        # Because the prefixes are sorted, any prefix within another immediately follows it.
+        if not prefixes or not prefix.startswith(prefixes[-1]):
+            prefixes.append(prefix)
+
+    return tuple(prefixes)
+
+
+def any_parent_directories(path, parent_directory_prefixes):
     '''
-    Return whether any of the given candidate parent directories are an actual parent of the given
-    path. This includes grandparents, etc.
+    Given a path and a sorted tuple of parent directory prefixes as returned by
+    make_parent_directory_prefixes(), return whether any of the corresponding parent directories are
+    an actual parent of the given path. This includes grandparents, etc.
+
+    Since none of the prefixes is within another, the only prefix that could possibly match is the
+    greatest one sorting before the path. So this finds it with a binary search.
     '''
-    for parent in candidate_parents:
-        if pathlib.PurePosixPath(parent) in pathlib.PurePath(path).parents:
-            return True
+    index = bisect.bisect_right(parent_directory_prefixes, path)
+
+    return index > 0 and path.startswith(parent_directory_prefixes[index - 1])
+
 
-    return False
+# Maximum number of directories to remember the non-regular files for when collecting special file
+# paths. Borg lists files depth-first, so this only needs to cover a directory and its ancestors.
+NON_REGULAR_FILE_NAMES_CACHE_SIZE = 1024
+
+
+def non_regular_file_names(directory):
+    '''
+    Given a directory path, return the names of entries in that directory that aren't regular files
+    or directories as a frozenset. This uses the entry types that os.scandir() gets along with the
+    names, so usually no entries need to get stat-ed. Return None if the directory can't be scanned.
+    '''
+    try:
+        with os.scandir(directory) as entries:
+            return frozenset(
+                entry.name
+                for entry in entries
+                if not entry.is_file(follow_symlinks=False)
+                and not entry.is_dir(follow_symlinks=False)
+            )
+    except OSError:
+        return None
 
 
 def collect_special_file_paths(
-    create_command, local_path, working_directory, borg_environment, skip_directories
+    create_command,
+    local_path,
+    working_directory,
+    borg_environment,
+    skip_directories,
+    stat_cache=None,
 ):
     '''
     Given a Borg create command as a tuple, a local Borg path, a working directory, and a dict of
-    environment variables to pass to Borg, and a sequence of parent directories to skip, collect the
+    environment variables to pass to Borg, a sequence of parent directories to skip, and a dict
+    cache of stat results as per scan.stat_path(), collect the
     paths for any special files (character devices, block devices, and named pipes / FIFOs) that
     Borg would encounter during a create. These are all paths that could cause Borg to hang if its
     --read-special flag is used.
     '''
-    paths_output = execute_command_and_capture_output(
-        create_command + ('--dry-run', '--list'),
-        capture_stderr=True,
-        working_directory=working_directory,
-        extra_environment=borg_environment,
-    )
-
-    paths = tuple(
+    # Stream Borg's file list rather than capturing it all at once, as it can list millions of files.
+    paths = (
         path_line.split(' ', 1)[1]
-        for path_line in paths_output.split('\n')
-        if path_line and path_line.startswith('- ') or path_line.startswith('+ ')
+        for path_line in execute_command_and_stream_output(
+            create_command + ('--dry-run', '--list'),
+            capture_stderr=True,
+            working_directory=working_directory,
+            extra_environment=borg_environment,
+        )
+        if path_line.startswith('- ') or path_line.startswith('+ ')
     )
-
-    return tuple(
-        path
-        for path in paths
-        if special_file(path) and not any_parent_directories(path, skip_directories)
+    parent_directory_prefixes = make_parent_directory_prefixes(skip_directories)
+    cached_non_regular_file_names = functools.lru_cache(maxsize=NON_REGULAR_FILE_NAMES_CACHE_SIZE)(
+        non_regular_file_names
     )
+    special_file_paths = []
+
+    for path in paths:
+        if any_parent_directories(path, parent_directory_prefixes):
+            continue
+
+        full_path = os.path.join(working_directory or '', path)
+        (directory, name) = os.path.split(full_path)
+        names = cached_non_regular_file_names(directory)
+
+        # Only stat the file if its directory entry says it might be special.
+        if (names is None or name in names) and special_file(full_path, stat_cache):
+            special_file_paths.append(path)
 
+    return tuple(special_file_paths)
 
-def check_all_source_directories_exist(source_directories):
+
+def check_all_source_directories_exist(source_directories, stat_cache=None):
     '''
-    Given a sequence of source directories, check that they all exist. If any do not, raise an
-    exception.
+    Given a sequence of source directories and a dict cache of stat results as per scan.stat_path(),
+    check that they all exist. If any do not, raise an exception. The source directories get
+    expanded and stat-ed concurrently.
     '''
+    with concurrent.futures.ThreadPoolExecutor(max_workers=PREFLIGHT_WORKER_COUNT) as executor:
+        expanded_source_directories = tuple(executor.map(expand_directory, source_directories))
+        exist = tuple(
+            executor.map(
+                lambda directories: all(
+                    scan.stat_path(directory, stat_cache) is not None for directory in directories
+                ),
+                expanded_source_directories,
+            )
+        )
+
     missing_directories = [
         source_directory
-        for source_directory in source_directories
-        if not all([os.path.exists(directory) for directory in expand_directory(source_directory)])
+        for source_directory, source_directory_exists in zip(source_directories, exist)
+        if not source_directory_exists
     ]
     if missing_directories:
         raise ValueError(f"Source directories do not exist: {', '.join(missing_directories)}")
@@ -342,19 +438,28 @@ def create_archive(
     create command while also triggering the given processes to produce output.
     '''
     borgmatic.logger.add_custom_log_levels()
+
+    # Share stat results across the checks below, so that no path gets stat-ed twice.
+    stat_cache = {}
     borgmatic_source_directories = expand_directories(
-        collect_borgmatic_source_directories(location_config.get('borgmatic_source_directory'))
+        collect_borgmatic_source_directories(
+            location_config.get('borgmatic_source_directory'), stat_cache=stat_cache
+        )
     )
     if location_config.get('source_directories_must_exist', False):
-        check_all_source_directories_exist(location_config.get('source_directories'))
+        check_all_source_directories_exist(
+            location_config.get('source_directories'), stat_cache=stat_cache
+        )
     sources = deduplicate_directories(
         map_directories_to_devices(
             expand_directories(
                 tuple(location_config.get('source_directories', ())) + borgmatic_source_directories
-            )
+            ),
+            stat_cache=stat_cache,
         ),
         additional_directory_devices=map_directories_to_devices(
-            expand_directories(pattern_root_directories(location_config.get('patterns')))
+            expand_directories(pattern_root_directories(location_config.get('patterns'))),
+            stat_cache=stat_cache,
         ),
     )
 
@@ -469,13 +574,28 @@ def create_archive(
     # cause Borg to hang. But skip this if the user has explicitly set the "read_special" to True.
     if stream_processes and not location_config.get('read_special'):
         logger.debug(f'{repository_path}: Collecting special file paths')
-        special_file_paths = collect_special_file_paths(
-            create_command,
-            local_path,
-            working_directory,
-            borg_environment,
-            skip_directories=borgmatic_source_directories,
-        )
+
+        # Patterns can include and exclude paths in ways that only Borg itself knows how to
+        # interpret, so in that case ask Borg which files it would encounter. Otherwise, scanning
+        # the source directories directly is much faster and doesn't involve the repository.
+        with timing.span('special files', 'step', repository=repository_path):
+            if pattern_file or location_config.get('patterns_from'):
+                special_file_paths = collect_special_file_paths(
+                    create_command,
+                    local_path,
+                    working_directory,
+                    borg_environment,
+                    skip_directories=borgmatic_source_directories,
+                    stat_cache=stat_cache,
+                )
+            else:
+                special_file_paths = scan.find_special_file_paths(
+                    sources,
+                    working_directory,
+                    exclude_patterns=location_config.get('exclude_patterns'),
+                    skip_directories=borgmatic_source_directories,
+                    stat_cache=stat_cache,
+                )
 
         if special_file_paths:
             logger.warning(
@@ -512,6 +632,7 @@ def create_archive(
             create_command,
             working_directory=working_directory,
             extra_environment=borg_environment,
+            borg_local_path=local_path,
         )
     else:
         execute_command(
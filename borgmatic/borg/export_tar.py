@@ -1,4 +1,5 @@
 import logging
+import subprocess
 
 import borgmatic.logger
 from borgmatic.borg import environment, flags
@@ -20,6 +21,7 @@ def export_tar_archive(
     tar_filter=None,
     list_files=False,
     strip_components=None,
+    run_to_completion=True,
 ):
     '''
     Given a dry-run flag, a local or remote repository path, an archive name, zero or more paths to
@@ -28,7 +30,9 @@ def export_tar_archive(
     include per-file details, and an optional number of path components to strip, export the archive
     into the given destination path as a tar-formatted file.
 
-    If the destination path is "-", then stream the output to stdout instead of to a file.
+    If the destination path is "-", then stream the output to stdout instead of to a file. And if run
+    to completion is False in that case, then return the running process without waiting on it, so
+    that the caller can consume the tar stream from its stdout.
     '''
     borgmatic.logger.add_custom_log_levels()
     umask = storage_config.get('umask', None)
@@ -63,10 +67,16 @@ def export_tar_archive(
         logging.info(f'{repository_path}: Skipping export to tar file (dry run)')
         return
 
-    execute_command(
+    if destination_path == '-':
+        output_file = DO_NOT_CAPTURE if run_to_completion else subprocess.PIPE
+    else:
+        output_file = None
+
+    return execute_command(
         full_command,
-        output_file=DO_NOT_CAPTURE if destination_path == '-' else None,
+        output_file=output_file,
         output_log_level=output_log_level,
         borg_local_path=local_path,
         extra_environment=environment.make_environment(storage_config),
+        run_to_completion=run_to_completion,
     )
@@ -15,10 +15,11 @@ def extract_last_archive_dry_run(
     lock_wait=None,
     local_path='borg',
     remote_path=None,
+    borgmatic_source_directory=None,
 ):
     '''
     Perform an extraction dry-run of the most recent archive. If there are no archives, skip the
-    dry-run.
+    dry-run. The borgmatic source directory is where any cached latest archive name lives.
     '''
     remote_path_flags = ('--remote-path', remote_path) if remote_path else ()
     lock_wait_flags = ('--lock-wait', str(lock_wait)) if lock_wait else ()
@@ -30,7 +31,13 @@ def extract_last_archive_dry_run(
 
     try:
         last_archive_name = rlist.resolve_archive_name(
-            repository_path, 'latest', storage_config, local_borg_version, local_path, remote_path
+            repository_path,
+            'latest',
+            storage_config,
+            local_borg_version,
+            local_path,
+            remote_path,
+            borgmatic_source_directory=borgmatic_source_directory,
         )
     except ValueError:
         logger.warning('No archives found. Skipping extract consistency check.')
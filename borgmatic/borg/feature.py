@@ -1,3 +1,4 @@
+import functools
 from enum import Enum
 
 from packaging.version import parse
@@ -32,9 +33,27 @@ FEATURE_TO_MINIMUM_BORG_VERSION = {
 }
 
 
+@functools.lru_cache(maxsize=None)
+def available_features(borg_version):
+    '''
+    Given a Borg version string, return a frozenset of the Borg Feature constants available in that
+    version of Borg.
+
+    The result is cached per version string, so that parsing and comparing versions only happens
+    once per Borg version rather than on every feature check.
+    '''
+    parsed_version = parse(borg_version)
+
+    return frozenset(
+        feature
+        for feature, minimum_version in FEATURE_TO_MINIMUM_BORG_VERSION.items()
+        if minimum_version <= parsed_version
+    )
+
+
 def available(feature, borg_version):
     '''
     Given a Borg Feature constant and a Borg version string, return whether that feature is
     available in that version of Borg.
     '''
-    return FEATURE_TO_MINIMUM_BORG_VERSION[feature] <= parse(borg_version)
+    return feature in available_features(borg_version)
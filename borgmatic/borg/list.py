@@ -5,7 +5,7 @@ import re
 
 import borgmatic.logger
 from borgmatic.borg import environment, feature, flags, rlist
-from borgmatic.execute import execute_command, execute_command_and_capture_output
+from borgmatic.execute import execute_command, execute_command_and_stream_output
 
 logger = logging.getLogger(__name__)
 
@@ -85,7 +85,7 @@ def make_find_paths(find_paths):
     )
 
 
-def capture_archive_listing(
+def stream_archive_listing(
     repository_path,
     archive,
     storage_config,
@@ -96,33 +96,33 @@ def capture_archive_listing(
 ):
     '''
     Given a local or remote repository path, an archive name, a storage config dict, the local Borg
-    version, the archive path in which to list files, and local and remote Borg paths, capture the
-    output of listing that archive and return it as a list of file paths.
+    version, the archive path in which to list files, and local and remote Borg paths, list that
+    archive and yield each file path as Borg outputs it. This avoids holding huge listings in memory
+    all at once. And if the caller consumes paths slowly, Borg blocks writing to its output rather
+    than buffering the listing in memory.
     '''
     borg_environment = environment.make_environment(storage_config)
 
-    return tuple(
-        execute_command_and_capture_output(
-            make_list_command(
-                repository_path,
-                storage_config,
-                local_borg_version,
-                argparse.Namespace(
-                    repository=repository_path,
-                    archive=archive,
-                    paths=[f'sh:{list_path}'],
-                    find_paths=None,
-                    json=None,
-                    format='{path}{NL}',  # noqa: FS003
-                ),
-                local_path,
-                remote_path,
+    for path in execute_command_and_stream_output(
+        make_list_command(
+            repository_path,
+            storage_config,
+            local_borg_version,
+            argparse.Namespace(
+                repository=repository_path,
+                archive=archive,
+                paths=[f'sh:{list_path}'],
+                find_paths=None,
+                json=None,
+                format='{path}{NL}',  # noqa: FS003
             ),
-            extra_environment=borg_environment,
-        )
-        .strip('\n')
-        .split('\n')
-    )
+            local_path,
+            remote_path,
+        ),
+        extra_environment=borg_environment,
+    ):
+        if path:
+            yield path
 
 
 def list_archive(
@@ -197,9 +197,11 @@ def list_archive(
             last=list_arguments.last,
         )
 
-        # Ask Borg to list archives. Capture its output for use below.
+        # Ask Borg to list archives. Collect the archive names before listing any archive contents
+        # below, so that this Borg process is done with the repository by then.
         archive_lines = tuple(
-            execute_command_and_capture_output(
+            archive_line
+            for archive_line in execute_command_and_stream_output(
                 rlist.make_rlist_command(
                     repository_path,
                     storage_config,
@@ -210,8 +212,7 @@ def list_archive(
                 ),
                 extra_environment=borg_environment,
             )
-            .strip('\n')
-            .split('\n')
+            if archive_line
         )
     else:
         archive_lines = (list_arguments.archive,)
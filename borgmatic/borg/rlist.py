@@ -1,7 +1,7 @@
 import logging
 
 import borgmatic.logger
-from borgmatic.borg import environment, feature, flags
+from borgmatic.borg import archive_cache, environment, feature, flags
 from borgmatic.execute import execute_command, execute_command_and_capture_output
 
 logger = logging.getLogger(__name__)
@@ -14,17 +14,34 @@ def resolve_archive_name(
     local_borg_version,
     local_path='borg',
     remote_path=None,
+    borgmatic_source_directory=None,
 ):
     '''
     Given a local or remote repository path, an archive name, a storage config dict, a local Borg
-    path, and a remote Borg path, return the archive name. But if the archive name is "latest",
-    then instead introspect the repository for the latest archive and return its name.
+    path, a remote Borg path, and the borgmatic source directory, return the archive name. But if
+    the archive name is "latest", then instead introspect the repository for the latest archive and
+    return its name.
+
+    If the "latest_archive_cache_seconds" storage option is set, then first look for a cached latest
+    archive name within the borgmatic source directory that's no older than that, and cache any
+    newly introspected name.
 
     Raise ValueError if "latest" is given but there are no archives in the repository.
     '''
     if archive != 'latest':
         return archive
 
+    cache_seconds = storage_config.get('latest_archive_cache_seconds')
+
+    if cache_seconds:
+        cached_archive = archive_cache.read_cached_latest_archive(
+            borgmatic_source_directory, repository_path, cache_seconds
+        )
+
+        if cached_archive:
+            logger.debug(f'{repository_path}: Latest archive is {cached_archive} (cached)')
+            return cached_archive
+
     lock_wait = storage_config.get('lock_wait', None)
 
     full_command = (
@@ -50,6 +67,11 @@ def resolve_archive_name(
 
     logger.debug(f'{repository_path}: Latest archive is {latest_archive}')
 
+    if cache_seconds:
+        archive_cache.write_cached_latest_archive(
+            borgmatic_source_directory, repository_path, latest_archive
+        )
+
     return latest_archive
 
 
@@ -0,0 +1,256 @@
+import concurrent.futures
+import fnmatch
+import logging
+import os
+import re
+import stat
+
+logger = logging.getLogger(__name__)
+
+
+# Maximum number of directories to scan concurrently. Scanning is mostly waiting on filesystem
+# calls, so this can exceed the CPU count, but it's bounded to avoid hammering network filesystems.
+SCAN_WORKER_COUNT = 8
+
+# Scan inline until at least this many directories are waiting to be scanned, so that small source
+# trees don't pay for starting a thread pool.
+SCAN_THREADED_DIRECTORY_COUNT = SCAN_WORKER_COUNT
+
+
+def stat_path(path, stat_cache=None, follow_symlinks=True):
+    '''
+    Given a path, a dict cache of stat results, and whether to follow symlinks, return the
+    os.stat() result for the path (or the os.lstat() result if not following symlinks). Return None
+    if the path doesn't exist or can't be stat-ed.
+
+    Cache the result, including a None result, so that the same path doesn't get stat-ed twice in
+    the same run. The cache is keyed by (path, follow symlinks) tuple. If the cache is None, then
+    don't cache.
+    '''
+    key = (path, follow_symlinks)
+
+    if stat_cache is not None and key in stat_cache:
+        return stat_cache[key]
+
+    try:
+        stat_result = os.stat(path, follow_symlinks=follow_symlinks)
+    except OSError:
+        stat_result = None
+
+    if stat_cache is not None:
+        stat_cache[key] = stat_result
+
+    return stat_result
+
+
+def make_exclude_matcher(pattern):
+    '''
+    Given a Borg exclude pattern (with an optional "fm:", "pp:", "pf:", or "re:" style prefix),
+    return a function that takes a path and returns whether the pattern excludes that path. This
+    approximates Borg's own pattern matching, so paths are compared without any leading slash.
+
+    Return None if the pattern's style isn't supported here (e.g. "sh:"). Any such pattern is
+    ignored when scanning, which errs on the side of scanning too much rather than too little.
+    '''
+    style, separator, body = pattern.partition(':')
+
+    if not separator or len(style) != 2:
+        (style, body) = ('fm', pattern)
+
+    body = os.path.expanduser(body)
+
+    if style == 'fm':
+        if body.endswith(os.path.sep):
+            body = os.path.normpath(body).rstrip(os.path.sep) + os.path.sep + '*' + os.path.sep
+        else:
+            body = os.path.normpath(body) + os.path.sep + '*'
+
+        regex = re.compile(fnmatch.translate(body.lstrip(os.path.sep)))
+
+        return lambda path: bool(regex.match(path.lstrip(os.path.sep) + os.path.sep))
+
+    if style == 'pp':
+        prefix = os.path.normpath(body).rstrip(os.path.sep).lstrip(os.path.sep) + os.path.sep
+
+        return lambda path: (path.lstrip(os.path.sep) + os.path.sep).startswith(prefix)
+
+    if style == 'pf':
+        full_path = os.path.normpath(body).lstrip(os.path.sep)
+
+        return lambda path: path.lstrip(os.path.sep) == full_path
+
+    if style == 're':
+        regex = re.compile(body)
+
+        return lambda path: bool(regex.search(path.lstrip(os.path.sep)))
+
+    return None
+
+
+def make_exclude_matchers(exclude_patterns):
+    '''
+    Given a sequence of Borg exclude patterns, return a tuple of matcher functions for them as per
+    make_exclude_matcher(), omitting any patterns that aren't supported.
+    '''
+    return tuple(
+        matcher
+        for matcher in (make_exclude_matcher(pattern) for pattern in (exclude_patterns or ()))
+        if matcher
+    )
+
+
+def special_mode(mode):
+    '''
+    Given a file mode as returned by os.stat(), return whether it's the mode of a special file
+    (character device, block device, or named pipe / FIFO).
+    '''
+    return stat.S_ISCHR(mode) or stat.S_ISBLK(mode) or stat.S_ISFIFO(mode)
+
+
+def scan_directory(directory, working_directory, device, exclude_matchers, skip_directories):
+    '''
+    Given a directory path as Borg would see it, a working directory to interpret relative paths
+    against, the device identifier of the filesystem being scanned (or None to cross filesystems),
+    a sequence of exclude matchers, and a set of normalized directories to skip, scan the
+    directory's immediate entries.
+
+    Return a tuple of (special file paths, subdirectory paths to scan next). The directory entry
+    types reported by os.scandir() mean that only non-regular files and subdirectories get stat-ed.
+    Symlinks get followed when checking for special files, because that's what Borg does with its
+    --read-special flag.
+    '''
+    special_paths = []
+    subdirectories = []
+
+    try:
+        entries = os.scandir(os.path.join(working_directory or '', directory))
+    except OSError as error:
+        logger.debug(f'Cannot scan {directory} for special files: {error}')
+        return (special_paths, subdirectories)
+
+    with entries:
+        for entry in entries:
+            path = os.path.join(directory, entry.name)
+
+            if any(matcher(path) for matcher in exclude_matchers):
+                continue
+
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if os.path.normpath(entry.path) in skip_directories:
+                        continue
+
+                    if device is None or entry.stat(follow_symlinks=False).st_dev == device:
+                        subdirectories.append(path)
+                elif not entry.is_file(follow_symlinks=False) and special_mode(
+                    entry.stat(follow_symlinks=True).st_mode
+                ):
+                    special_paths.append(path)
+            except OSError:
+                continue
+
+    return (special_paths, subdirectories)
+
+
+def find_special_file_paths(
+    source_directories,
+    working_directory=None,
+    exclude_patterns=None,
+    skip_directories=None,
+    one_file_system=True,
+    stat_cache=None,
+):
+    '''
+    Given a sequence of source directories (as would be passed to Borg), a working directory to
+    interpret relative paths against, a sequence of Borg exclude patterns, a sequence of parent
+    directories to skip, whether to stay on the filesystem of each source directory, and a dict
+    cache of stat results as per stat_path(), scan the source directories and return the paths for
+    any special files (character devices, block devices, and named pipes / FIFOs) found there,
+    sorted as a tuple.
+
+    This finds the same special files that Borg would encounter during a create, but without
+    actually running Borg. It may also find special files that Borg would skip (e.g. because of an
+    exclude pattern that isn't supported here), but excluding those from Borg is harmless.
+
+    Small trees get scanned inline. Once enough directories are waiting to be scanned, the rest of
+    the scan happens in parallel threads.
+    '''
+    exclude_matchers = make_exclude_matchers(exclude_patterns)
+    skip_directories = {
+        os.path.normpath(os.path.join(working_directory or '', directory))
+        for directory in (skip_directories or ())
+    }
+    special_paths = []
+
+    pending_directories = []
+
+    for source_directory in source_directories:
+        full_path = os.path.join(working_directory or '', source_directory)
+        normalized_path = os.path.normpath(full_path)
+
+        if any(
+            normalized_path == skip_directory
+            or normalized_path.startswith(skip_directory + os.path.sep)
+            for skip_directory in skip_directories
+        ):
+            continue
+
+        source_stat = stat_path(full_path, stat_cache, follow_symlinks=False)
+
+        if source_stat is None:
+            continue
+
+        if not stat.S_ISDIR(source_stat.st_mode):
+            target_stat = stat_path(full_path, stat_cache)
+
+            if target_stat and special_mode(target_stat.st_mode):
+                special_paths.append(source_directory)
+
+            continue
+
+        pending_directories.append(
+            (source_directory, source_stat.st_dev if one_file_system else None)
+        )
+
+    while pending_directories and len(pending_directories) < SCAN_THREADED_DIRECTORY_COUNT:
+        (directory, device) = pending_directories.pop()
+        (directory_special_paths, subdirectories) = scan_directory(
+            directory, working_directory, device, exclude_matchers, skip_directories
+        )
+        special_paths.extend(directory_special_paths)
+        pending_directories.extend((subdirectory, device) for subdirectory in subdirectories)
+
+    if not pending_directories:
+        return tuple(sorted(special_paths))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=SCAN_WORKER_COUNT) as executor:
+        device_for_future = {}
+
+        def submit(directory, device):
+            future = executor.submit(
+                scan_directory,
+                directory,
+                working_directory,
+                device,
+                exclude_matchers,
+                skip_directories,
+            )
+            device_for_future[future] = device
+
+        for directory, device in pending_directories:
+            submit(directory, device)
+
+        while device_for_future:
+            (done, _) = concurrent.futures.wait(
+                tuple(device_for_future), return_when=concurrent.futures.FIRST_COMPLETED
+            )
+
+            for future in done:
+                device = device_for_future.pop(future)
+                (directory_special_paths, subdirectories) = future.result()
+                special_paths.extend(directory_special_paths)
+
+                for subdirectory in subdirectories:
+                    submit(subdirectory, device)
+
+    return tuple(sorted(special_paths))
@@ -1 +1,40 @@
+import json
+import os
+import tempfile
+
 DEFAULT_BORGMATIC_SOURCE_DIRECTORY = '~/.borgmatic'
+
+
+def read_state_file(path):
+    '''
+    Given the path to a JSON state file, return its parsed contents. Return None if the file doesn't
+    exist or can't be parsed.
+    '''
+    try:
+        with open(path) as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_state_file(path, data):
+    '''
+    Given the path to a JSON state file and data to serialize to it, write the data to the file,
+    creating any missing parent directories. Write to a temporary file and then rename it into place,
+    so that concurrent readers never see a partially written state file. If that fails, remove the
+    temporary file.
+
+    Raise OSError if the file can't be written.
+    '''
+    directory = os.path.dirname(path)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    temporary_file = tempfile.NamedTemporaryFile('w', dir=directory, delete=False)
+
+    try:
+        with temporary_file:
+            json.dump(data, temporary_file)
+
+        os.replace(temporary_file.name, path)
+    except Exception:
+        os.remove(temporary_file.name)
+        raise
@@ -1,14 +1,97 @@
 import logging
+import os
+import shutil
 
-from borgmatic.borg import environment
+from borgmatic.borg import environment, state
 from borgmatic.execute import execute_command_and_capture_output
 
 logger = logging.getLogger(__name__)
 
 
-def local_borg_version(storage_config, local_path='borg'):
+BORG_VERSIONS_STATE_FILENAME = 'borg_versions.json'
+
+# In-process cache from Borg binary fingerprint (as returned by borg_binary_fingerprint()) to the
+# version string of that binary.
+cached_borg_versions = {}
+
+
+def borg_binary_fingerprint(local_path):
+    '''
+    Given a local Borg binary path (or just a command name to look up in the PATH), return a tuple
+    of the binary's resolved path, inode number, and modification time in nanoseconds. The idea is
+    that replacing or upgrading the binary changes the fingerprint.
+
+    Return None if the binary can't be found.
+    '''
+    resolved_path = shutil.which(local_path)
+
+    if not resolved_path:
+        return None
+
+    resolved_path = os.path.realpath(resolved_path)
+
+    try:
+        binary_stat = os.stat(resolved_path)
+    except OSError:
+        return None
+
+    return (resolved_path, binary_stat.st_ino, binary_stat.st_mtime_ns)
+
+
+def make_borg_versions_state_path(borgmatic_source_directory):
+    '''
+    Given a borgmatic source directory (or None to use the default), return the path of the state
+    file for caching Borg versions across borgmatic runs.
+    '''
+    return os.path.join(
+        os.path.expanduser(borgmatic_source_directory or state.DEFAULT_BORGMATIC_SOURCE_DIRECTORY),
+        BORG_VERSIONS_STATE_FILENAME,
+    )
+
+
+def read_cached_borg_version(state_path, fingerprint):
+    '''
+    Given the path of the Borg versions state file and a Borg binary fingerprint, return the cached
+    version string for that binary. Return None if there's no cached version for the binary or it
+    has changed since the version was cached.
+    '''
+    (resolved_path, inode, mtime_ns) = fingerprint
+
+    try:
+        entry = state.read_state_file(state_path)[resolved_path]
+
+        if entry['inode'] == inode and entry['mtime_ns'] == mtime_ns:
+            return entry['version']
+    except (KeyError, TypeError):
+        pass
+
+    return None
+
+
+def write_cached_borg_version(state_path, fingerprint, version):
+    '''
+    Given the path of the Borg versions state file, a Borg binary fingerprint, and the binary's
+    version string, cache that version in the state file alongside versions of any other binaries.
+    Writing the cache is best-effort, so log rather than raise if it fails.
+    '''
+    (resolved_path, inode, mtime_ns) = fingerprint
+    versions = state.read_state_file(state_path)
+
+    if not isinstance(versions, dict):
+        versions = {}
+
+    versions[resolved_path] = {'inode': inode, 'mtime_ns': mtime_ns, 'version': version}
+
+    try:
+        state.write_state_file(state_path, versions)
+    except OSError as error:
+        logger.debug(f'Cannot cache Borg version at {state_path}: {error}')
+
+
+def probe_local_borg_version(storage_config, local_path='borg'):
     '''
-    Given a storage configuration dict and a local Borg binary path, return a version string for it.
+    Given a storage configuration dict and a local Borg binary path, run Borg to get its version and
+    return it as a string.
 
     Raise OSError or CalledProcessError if there is a problem running Borg.
     Raise ValueError if the version cannot be parsed.
@@ -27,3 +110,37 @@ def local_borg_version(storage_config, local_path='borg'):
         return output.split(' ')[1].strip()
     except IndexError:
         raise ValueError('Could not parse Borg version string')
+
+
+def local_borg_version(storage_config, local_path='borg', borgmatic_source_directory=None):
+    '''
+    Given a storage configuration dict, a local Borg binary path, and a borgmatic source directory,
+    return a version string for the Borg binary.
+
+    Versions are cached per binary, both in-process and in a state file within the borgmatic source
+    directory, so Borg only actually gets run if the binary has changed since it was last run.
+
+    Raise OSError or CalledProcessError if there is a problem running Borg.
+    Raise ValueError if the version cannot be parsed.
+    '''
+    fingerprint = borg_binary_fingerprint(local_path)
+    state_path = make_borg_versions_state_path(borgmatic_source_directory)
+
+    if fingerprint:
+        version = cached_borg_versions.get(fingerprint) or read_cached_borg_version(
+            state_path, fingerprint
+        )
+
+        if version:
+            logger.debug(f'Using cached Borg version {version} for {fingerprint[0]}')
+            cached_borg_versions[fingerprint] = version
+
+            return version
+
+    version = probe_local_borg_version(storage_config, local_path)
+
+    if fingerprint:
+        cached_borg_versions[fingerprint] = version
+        write_cached_borg_version(state_path, fingerprint, version)
+
+    return version
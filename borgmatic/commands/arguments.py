@@ -187,6 +187,30 @@ def make_parsers():
         type=str,
         help='Log format string used for log messages written to the log file',
     )
+    global_group.add_argument(
+        '--timing',
+        default=False,
+        action='store_true',
+        help='Log a summary table of how long each action, hook, and command took',
+    )
+    global_group.add_argument(
+        '--timing-file',
+        type=str,
+        help='Write how long each action, hook, and command took to this file as JSON lines',
+    )
+    global_group.add_argument(
+        '--jobs',
+        type=int,
+        metavar='N',
+        default=1,
+        help='Run up to N configuration files at once in separate processes, defaults to 1',
+    )
+    global_group.add_argument(
+        '--repository-concurrency',
+        type=int,
+        metavar='N',
+        help='Run actions for up to N repositories within each configuration file concurrently, overriding the repository_concurrency option',
+    )
     global_group.add_argument(
         '--override',
         metavar='SECTION.OPTION=VALUE',
@@ -641,6 +665,19 @@ def make_parsers():
         dest='schemas',
         help='Names of schemas to restore from the database, defaults to all schemas. Schemas are only supported for PostgreSQL and MongoDB databases',
     )
+    restore_group.add_argument(
+        '--restore-jobs',
+        type=int,
+        metavar='N',
+        default=1,
+        help='Restore up to N databases at once, defaults to 1',
+    )
+    restore_group.add_argument(
+        '--single-pass',
+        default=False,
+        action='store_true',
+        help='Extract all database dumps to restore with a single Borg command rather than one per database',
+    )
     restore_group.add_argument(
         '-h', '--help', action='help', help='Show this help message and exit'
     )
@@ -914,4 +951,16 @@ def parse_arguments(*unparsed_arguments):
             'With the info action, only one of --archive, --prefix, or --match-archives flags can be used.'
         )
 
+    if arguments['global'].jobs < 1:
+        raise ValueError('The --jobs flag must be at least 1.')
+
+    if (
+        arguments['global'].repository_concurrency is not None
+        and arguments['global'].repository_concurrency < 1
+    ):
+        raise ValueError('The --repository-concurrency flag must be at least 1.')
+
+    if 'restore' in arguments and arguments['restore'].restore_jobs < 1:
+        raise ValueError('The --restore-jobs flag must be at least 1.')
+
     return arguments
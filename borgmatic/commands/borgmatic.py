@@ -3,7 +3,9 @@ import json
 import logging
 import os
 import sys
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from queue import Queue
 from subprocess import CalledProcessError
 
@@ -31,13 +33,23 @@ import borgmatic.actions.rinfo
 import borgmatic.actions.rlist
 import borgmatic.actions.transfer
 import borgmatic.commands.completion
+import borgmatic.metrics
+from borgmatic import timing
+from borgmatic.borg import archive_cache
 from borgmatic.borg import umount as borg_umount
 from borgmatic.borg import version as borg_version
+from borgmatic.borg.state import DEFAULT_BORGMATIC_SOURCE_DIRECTORY
 from borgmatic.commands.arguments import parse_arguments
 from borgmatic.config import checks, collect, convert, validate
-from borgmatic.hooks import command, dispatch, monitor
-from borgmatic.logger import add_custom_log_levels, configure_logging, should_do_markup
-from borgmatic.signals import configure_signals
+from borgmatic.hooks import command, dispatch, dump, monitor
+from borgmatic.logger import (
+    Log_record_buffering_handler,
+    add_custom_log_levels,
+    configure_logging,
+    flatten_log_record,
+    should_do_markup,
+)
+from borgmatic.signals import configure_signals, restore_default_signals
 from borgmatic.verbosity import verbosity_to_log_level
 
 logger = logging.getLogger(__name__)
@@ -72,7 +84,11 @@ def run_configuration(config_filename, config, arguments):
     monitoring_log_level = verbosity_to_log_level(global_arguments.monitoring_verbosity)
 
     try:
-        local_borg_version = borg_version.local_borg_version(storage, local_path)
+        local_borg_version = borg_version.local_borg_version(
+            storage,
+            local_path,
+            borgmatic_source_directory=location.get('borgmatic_source_directory'),
+        )
     except (OSError, CalledProcessError, ValueError) as error:
         yield from log_error_records(f'{config_filename}: Error getting local Borg version', error)
         return
@@ -104,7 +120,85 @@ def run_configuration(config_filename, config, arguments):
         encountered_error = error
         yield from log_error_records(f'{config_filename}: Error pinging monitor', error)
 
-    if not encountered_error:
+    repository_concurrency = global_arguments.repository_concurrency or storage.get(
+        'repository_concurrency', 1
+    )
+
+    spool_database_dumps = 'create' in arguments and hooks.get('spool_database_dumps', False)
+
+    if (
+        repository_concurrency > 1
+        and 'create' in arguments
+        and not spool_database_dumps
+        and any(hooks.get(hook_name) for hook_name in dump.DATABASE_HOOK_NAMES)
+    ):
+        logger.warning(
+            f'{config_filename}: Running repositories one at a time, as database hooks stream a separate set of dumps per repository unless spool_database_dumps is set'
+        )
+        repository_concurrency = 1
+
+    if not encountered_error and spool_database_dumps:
+        try:
+            borgmatic.actions.create.spool_database_dumps(
+                config_filename, location, hooks, global_arguments
+            )
+        except (OSError, CalledProcessError, ValueError) as error:
+            if command.considered_soft_failure(config_filename, error):
+                return
+
+            encountered_error = error
+            yield from log_error_records(f'{config_filename}: Error spooling database dumps', error)
+
+    if not encountered_error and repository_concurrency > 1:
+        logger.debug(
+            f'{config_filename}: Running actions for up to {repository_concurrency} repositories concurrently'
+        )
+
+        # One event per repository, set when that repository's actions soft fail, so that later
+        # repositories get skipped just like when running one repository at a time.
+        soft_failure_events = [threading.Event() for repository in location['repositories']]
+
+        with ThreadPoolExecutor(max_workers=repository_concurrency) as executor:
+            futures = [
+                executor.submit(
+                    run_actions_with_retries,
+                    soft_failure_event=soft_failure_events[index],
+                    earlier_soft_failure_events=soft_failure_events[:index],
+                    retries=retries,
+                    retry_wait=retry_wait,
+                    arguments=arguments,
+                    config_filename=config_filename,
+                    location=location,
+                    storage=storage,
+                    retention=retention,
+                    consistency=consistency,
+                    hooks=hooks,
+                    local_path=local_path,
+                    remote_path=remote_path,
+                    local_borg_version=local_borg_version,
+                    repository=repository,
+                )
+                for index, repository in enumerate(location['repositories'])
+            ]
+
+        # Merge results in configured repository order, regardless of which repository finished
+        # first.
+        for repository, future in zip(location['repositories'], futures):
+            results, error = future.result()
+            yield from results
+
+            if not error:
+                continue
+
+            if command.considered_soft_failure(config_filename, error):
+                return
+
+            yield from log_error_records(
+                f'{repository["path"]}: Error running actions for repository', error
+            )
+            encountered_error = error
+            error_repository = repository['path']
+    elif not encountered_error:
         repo_queue = Queue()
         for repo in location['repositories']:
             repo_queue.put(
@@ -159,6 +253,17 @@ def run_configuration(config_filename, config, arguments):
                 encountered_error = error
                 error_repository = repository['path']
 
+    if spool_database_dumps:
+        try:
+            borgmatic.actions.create.remove_spooled_database_dumps(
+                config_filename, location, hooks, global_arguments
+            )
+        except OSError as error:
+            encountered_error = error
+            yield from log_error_records(
+                f'{config_filename}: Error removing spooled database dumps', error
+            )
+
     try:
         if using_primary_action:
             # send logs irrespective of error
@@ -241,6 +346,80 @@ def run_configuration(config_filename, config, arguments):
             yield from log_error_records(f'{config_filename}: Error running on-error hook', error)
 
 
+def run_actions_with_retries(
+    *,
+    retries,
+    retry_wait,
+    config_filename,
+    repository,
+    soft_failure_event=None,
+    earlier_soft_failure_events=(),
+    **kwargs,
+):
+    '''
+    Given a number of retries, a retry wait in seconds, the configuration filename, a repository
+    dict, and any other keyword arguments accepted by run_actions(), run all actions on the given
+    repository, retrying upon failure as per the configured retries and retry wait. This is the
+    unit of work for running multiple repositories concurrently.
+
+    If a threading.Event is given as the soft failure event, then set it if the final attempt fails
+    with a soft failure (as per borgmatic.hooks.command.SOFT_FAIL_EXIT_CODE). And if any of the given
+    earlier soft failure events (those of repositories configured before this one) get set before
+    an attempt starts, then skip running actions altogether. That mirrors how a soft failure skips
+    the remaining repositories when running them one at a time.
+
+    Return the results as a tuple of (list of JSON output strings from the final attempt, error from
+    the final attempt or None if it succeeded or got skipped).
+    '''
+    for retry_num in range(retries + 1):
+        timeout = retry_num * retry_wait
+        if timeout:
+            logger.warning(f'{config_filename}: Sleeping {timeout}s before next retry')
+            time.sleep(timeout)
+
+        if any(event.is_set() for event in earlier_soft_failure_events):
+            logger.debug(
+                f'{repository["path"]}: Skipping actions for repository, as an earlier repository soft failed'
+            )
+            return ([], None)
+
+        logger.debug(f'{repository["path"]}: Running actions for repository')
+        results = []
+
+        try:
+            for result in run_actions(
+                config_filename=config_filename, repository=repository, **kwargs
+            ):
+                results.append(result)
+        except (OSError, CalledProcessError, ValueError) as error:
+            if retry_num >= retries:
+                if (
+                    soft_failure_event
+                    and getattr(error, 'returncode', None) == command.SOFT_FAIL_EXIT_CODE
+                ):
+                    soft_failure_event.set()
+
+                return (results, error)
+
+            tuple(  # Consume the generator so as to trigger logging.
+                log_error_records(
+                    f'{repository["path"]}: Error running actions for repository',
+                    error,
+                    levelno=logging.WARNING,
+                    log_command_error_output=True,
+                )
+            )
+            logger.warning(f'{config_filename}: Retrying... attempt {retry_num + 1}/{retries}')
+            continue
+
+        return (results, None)
+
+
+# Actions that may change which archives a repository contains, such that any cached latest archive
+# name for the repository becomes stale.
+ARCHIVE_CHANGING_ACTION_NAMES = ('transfer', 'create', 'prune', 'compact', 'borg')
+
+
 def run_actions(
     *,
     arguments,
@@ -288,186 +467,199 @@ def run_actions(
     )
 
     for action_name, action_arguments in arguments.items():
-        if action_name == 'rcreate':
-            borgmatic.actions.rcreate.run_rcreate(
-                repository,
-                storage,
-                local_borg_version,
-                action_arguments,
-                global_arguments,
-                local_path,
-                remote_path,
-            )
-        elif action_name == 'transfer':
-            borgmatic.actions.transfer.run_transfer(
-                repository,
-                storage,
-                local_borg_version,
-                action_arguments,
-                global_arguments,
-                local_path,
-                remote_path,
+        if action_name in ARCHIVE_CHANGING_ACTION_NAMES and not global_arguments.dry_run:
+            archive_cache.invalidate_cached_latest_archive(
+                location.get('borgmatic_source_directory'), repository_path
             )
-        elif action_name == 'create':
-            yield from borgmatic.actions.create.run_create(
-                config_filename,
-                repository,
-                location,
-                storage,
-                hooks,
-                hook_context,
-                local_borg_version,
-                action_arguments,
-                global_arguments,
-                dry_run_label,
-                local_path,
-                remote_path,
-            )
-        elif action_name == 'prune':
-            borgmatic.actions.prune.run_prune(
-                config_filename,
-                repository,
-                storage,
-                retention,
-                hooks,
-                hook_context,
-                local_borg_version,
-                action_arguments,
-                global_arguments,
-                dry_run_label,
-                local_path,
-                remote_path,
-            )
-        elif action_name == 'compact':
-            borgmatic.actions.compact.run_compact(
-                config_filename,
-                repository,
-                storage,
-                retention,
-                hooks,
-                hook_context,
-                local_borg_version,
-                action_arguments,
-                global_arguments,
-                dry_run_label,
-                local_path,
-                remote_path,
-            )
-        elif action_name == 'check':
-            if checks.repository_enabled_for_checks(repository, consistency):
-                borgmatic.actions.check.run_check(
+
+        with timing.span(
+            action_name, 'action', repository=repository_path, config_filename=config_filename
+        ), borgmatic.metrics.action(config_filename, action_name, repository_path):
+            if action_name == 'rcreate':
+                borgmatic.actions.rcreate.run_rcreate(
+                    repository,
+                    storage,
+                    local_borg_version,
+                    action_arguments,
+                    global_arguments,
+                    local_path,
+                    remote_path,
+                )
+            elif action_name == 'transfer':
+                borgmatic.actions.transfer.run_transfer(
+                    repository,
+                    storage,
+                    local_borg_version,
+                    action_arguments,
+                    global_arguments,
+                    local_path,
+                    remote_path,
+                )
+            elif action_name == 'create':
+                yield from borgmatic.actions.create.run_create(
                     config_filename,
                     repository,
                     location,
                     storage,
-                    consistency,
                     hooks,
                     hook_context,
                     local_borg_version,
                     action_arguments,
                     global_arguments,
+                    dry_run_label,
+                    local_path,
+                    remote_path,
+                )
+            elif action_name == 'prune':
+                borgmatic.actions.prune.run_prune(
+                    config_filename,
+                    repository,
+                    storage,
+                    retention,
+                    hooks,
+                    hook_context,
+                    local_borg_version,
+                    action_arguments,
+                    global_arguments,
+                    dry_run_label,
+                    local_path,
+                    remote_path,
+                )
+            elif action_name == 'compact':
+                borgmatic.actions.compact.run_compact(
+                    config_filename,
+                    repository,
+                    storage,
+                    retention,
+                    hooks,
+                    hook_context,
+                    local_borg_version,
+                    action_arguments,
+                    global_arguments,
+                    dry_run_label,
+                    local_path,
+                    remote_path,
+                )
+            elif action_name == 'check':
+                if checks.repository_enabled_for_checks(repository, consistency):
+                    borgmatic.actions.check.run_check(
+                        config_filename,
+                        repository,
+                        location,
+                        storage,
+                        consistency,
+                        hooks,
+                        hook_context,
+                        local_borg_version,
+                        action_arguments,
+                        global_arguments,
+                        local_path,
+                        remote_path,
+                    )
+            elif action_name == 'extract':
+                borgmatic.actions.extract.run_extract(
+                    config_filename,
+                    repository,
+                    location,
+                    storage,
+                    hooks,
+                    hook_context,
+                    local_borg_version,
+                    action_arguments,
+                    global_arguments,
+                    local_path,
+                    remote_path,
+                )
+            elif action_name == 'export-tar':
+                borgmatic.actions.export_tar.run_export_tar(
+                    repository,
+                    location,
+                    storage,
+                    local_borg_version,
+                    action_arguments,
+                    global_arguments,
+                    local_path,
+                    remote_path,
+                )
+            elif action_name == 'mount':
+                borgmatic.actions.mount.run_mount(
+                    repository,
+                    location,
+                    storage,
+                    local_borg_version,
+                    arguments['mount'],
+                    local_path,
+                    remote_path,
+                )
+            elif action_name == 'restore':
+                borgmatic.actions.restore.run_restore(
+                    repository,
+                    location,
+                    storage,
+                    hooks,
+                    local_borg_version,
+                    action_arguments,
+                    global_arguments,
+                    local_path,
+                    remote_path,
+                )
+            elif action_name == 'rlist':
+                yield from borgmatic.actions.rlist.run_rlist(
+                    repository,
+                    storage,
+                    local_borg_version,
+                    action_arguments,
+                    local_path,
+                    remote_path,
+                )
+            elif action_name == 'list':
+                yield from borgmatic.actions.list.run_list(
+                    repository,
+                    location,
+                    storage,
+                    local_borg_version,
+                    action_arguments,
+                    local_path,
+                    remote_path,
+                )
+            elif action_name == 'rinfo':
+                yield from borgmatic.actions.rinfo.run_rinfo(
+                    repository,
+                    storage,
+                    local_borg_version,
+                    action_arguments,
+                    local_path,
+                    remote_path,
+                )
+            elif action_name == 'info':
+                yield from borgmatic.actions.info.run_info(
+                    repository,
+                    location,
+                    storage,
+                    local_borg_version,
+                    action_arguments,
+                    local_path,
+                    remote_path,
+                )
+            elif action_name == 'break-lock':
+                borgmatic.actions.break_lock.run_break_lock(
+                    repository,
+                    storage,
+                    local_borg_version,
+                    arguments['break-lock'],
+                    local_path,
+                    remote_path,
+                )
+            elif action_name == 'borg':
+                borgmatic.actions.borg.run_borg(
+                    repository,
+                    location,
+                    storage,
+                    local_borg_version,
+                    action_arguments,
                     local_path,
                     remote_path,
                 )
-        elif action_name == 'extract':
-            borgmatic.actions.extract.run_extract(
-                config_filename,
-                repository,
-                location,
-                storage,
-                hooks,
-                hook_context,
-                local_borg_version,
-                action_arguments,
-                global_arguments,
-                local_path,
-                remote_path,
-            )
-        elif action_name == 'export-tar':
-            borgmatic.actions.export_tar.run_export_tar(
-                repository,
-                storage,
-                local_borg_version,
-                action_arguments,
-                global_arguments,
-                local_path,
-                remote_path,
-            )
-        elif action_name == 'mount':
-            borgmatic.actions.mount.run_mount(
-                repository,
-                storage,
-                local_borg_version,
-                arguments['mount'],
-                local_path,
-                remote_path,
-            )
-        elif action_name == 'restore':
-            borgmatic.actions.restore.run_restore(
-                repository,
-                location,
-                storage,
-                hooks,
-                local_borg_version,
-                action_arguments,
-                global_arguments,
-                local_path,
-                remote_path,
-            )
-        elif action_name == 'rlist':
-            yield from borgmatic.actions.rlist.run_rlist(
-                repository,
-                storage,
-                local_borg_version,
-                action_arguments,
-                local_path,
-                remote_path,
-            )
-        elif action_name == 'list':
-            yield from borgmatic.actions.list.run_list(
-                repository,
-                storage,
-                local_borg_version,
-                action_arguments,
-                local_path,
-                remote_path,
-            )
-        elif action_name == 'rinfo':
-            yield from borgmatic.actions.rinfo.run_rinfo(
-                repository,
-                storage,
-                local_borg_version,
-                action_arguments,
-                local_path,
-                remote_path,
-            )
-        elif action_name == 'info':
-            yield from borgmatic.actions.info.run_info(
-                repository,
-                storage,
-                local_borg_version,
-                action_arguments,
-                local_path,
-                remote_path,
-            )
-        elif action_name == 'break-lock':
-            borgmatic.actions.break_lock.run_break_lock(
-                repository,
-                storage,
-                local_borg_version,
-                arguments['break-lock'],
-                local_path,
-                remote_path,
-            )
-        elif action_name == 'borg':
-            borgmatic.actions.borg.run_borg(
-                repository,
-                storage,
-                local_borg_version,
-                action_arguments,
-                local_path,
-                remote_path,
-            )
 
     command.execute_hook(
         hooks.get('after_actions'),
@@ -587,6 +779,191 @@ def get_local_path(configs):
     return next(iter(configs.values())).get('location', {}).get('local_path', 'borg')
 
 
+def run_configuration_with_buffered_logs(config_filename, config, arguments, log_level):
+    '''
+    Given a config filename, the corresponding parsed config dict, command-line arguments as a dict
+    from subparser name to a namespace of parsed arguments, and a log level, run the configuration
+    file as per run_configuration(). But instead of emitting any logs at or above the log level,
+    buffer them and tag them with the config filename. This is intended to run in a worker process,
+    so that the logs of concurrently running configuration files don't get interleaved.
+
+    Return the results as a tuple of (a list of run_configuration() results, with any
+    logging.LogRecord instances flattened so they can be pickled, a list of buffered
+    logging.LogRecord instances, a list of any timing spans recorded while running).
+    '''
+    if timing_requested(arguments['global']):
+        timing.enable()
+
+    root_logger = logging.getLogger()
+    original_handlers = tuple(root_logger.handlers)
+    original_level = root_logger.level
+    buffering_handler = Log_record_buffering_handler(tag=config_filename)
+
+    for handler in original_handlers:
+        root_logger.removeHandler(handler)
+
+    root_logger.addHandler(buffering_handler)
+    root_logger.setLevel(log_level)
+    add_custom_log_levels()
+
+    try:
+        results = [
+            flatten_log_record(result) if isinstance(result, logging.LogRecord) else result
+            for result in run_configuration(config_filename, config, arguments)
+        ]
+    finally:
+        root_logger.removeHandler(buffering_handler)
+        root_logger.setLevel(original_level)
+
+        for handler in original_handlers:
+            root_logger.addHandler(handler)
+
+    return (results, buffering_handler.records, timing.pop_spans())
+
+
+def run_configuration_group_with_buffered_logs(configs, arguments, log_level):
+    '''
+    Given a dict of configuration filename to corresponding parsed configuration, command-line
+    arguments as a dict from subparser name to a namespace of parsed arguments, and a log level,
+    run each configuration file one at a time as per run_configuration_with_buffered_logs(). This
+    is intended to run in a worker process.
+
+    Return a list of run_configuration_with_buffered_logs() results, in configuration order.
+    '''
+    return [
+        run_configuration_with_buffered_logs(config_filename, config, arguments, log_level)
+        for config_filename, config in configs.items()
+    ]
+
+
+def configurations_conflict(config, other_config):
+    '''
+    Given two parsed configuration dicts, return whether they can't safely run at the same time.
+    That's the case when they share a borgmatic source directory and either one has database hooks,
+    as database dumps get written to and removed from that directory, and every archive created
+    there includes them. It's also the case when they share a borgmatic source directory and a
+    repository, as they'd both read and write that repository's state files in the directory.
+    '''
+    source_directories = [
+        os.path.expanduser(
+            each_config.get('location', {}).get('borgmatic_source_directory')
+            or DEFAULT_BORGMATIC_SOURCE_DIRECTORY
+        )
+        for each_config in (config, other_config)
+    ]
+
+    if source_directories[0] != source_directories[1]:
+        return False
+
+    if any(
+        each_config.get('hooks', {}).get(hook_name)
+        for each_config in (config, other_config)
+        for hook_name in dump.DATABASE_HOOK_NAMES
+    ):
+        return True
+
+    repository_paths = [
+        {
+            repository.get('path')
+            for repository in each_config.get('location', {}).get('repositories', ())
+        }
+        for each_config in (config, other_config)
+    ]
+
+    return bool(repository_paths[0] & repository_paths[1])
+
+
+def make_configuration_groups(configs):
+    '''
+    Given a dict of configuration filename to corresponding parsed configuration, return a list of
+    groups (lists) of configuration filenames, such that configuration files conflicting with each
+    other as per configurations_conflict() end up in the same group. Each group runs its
+    configuration files one at a time, while separate groups can run at once. Order the
+    configuration filenames within each group in configuration order.
+    '''
+    config_filenames = list(configs)
+    groups = []
+
+    for config_filename in config_filenames:
+        conflicting_groups = [
+            group
+            for group in groups
+            if any(
+                configurations_conflict(configs[config_filename], configs[other_filename])
+                for other_filename in group
+            )
+        ]
+        groups = [group for group in groups if group not in conflicting_groups] + [
+            sorted(
+                [other_filename for group in conflicting_groups for other_filename in group]
+                + [config_filename],
+                key=config_filenames.index,
+            )
+        ]
+
+    return groups
+
+
+def run_configurations(configs, arguments):
+    '''
+    Given a dict of configuration filename to corresponding parsed configuration, and parsed
+    command-line arguments as a dict from subparser name to a parsed namespace of arguments, run
+    each configuration file and yield a tuple of (configuration filename, list of results from
+    run_configuration()) for each one, in configuration order.
+
+    If the "--jobs" flag requests it, run up to that many configuration files at once in separate
+    processes. In that case, the logs for each configuration file are buffered, and then logged all
+    together (in configuration order) once that configuration file is done running. Configuration
+    files that conflict with each other (see make_configuration_groups()) still run one at a time.
+    '''
+    groups = (
+        make_configuration_groups(configs)
+        if len(configs) > 1 and arguments['global'].jobs > 1
+        else ()
+    )
+
+    if len(groups) <= 1:
+        for config_filename, config in configs.items():
+            yield (config_filename, list(run_configuration(config_filename, config, arguments)))
+
+        return
+
+    for group in groups:
+        if len(group) > 1:
+            logger.debug(
+                f"{', '.join(group)}: Running one at a time, as these configuration files share database dumps or state files"
+            )
+
+    log_level = logging.getLogger().getEffectiveLevel()
+
+    with ProcessPoolExecutor(
+        max_workers=arguments['global'].jobs, initializer=restore_default_signals
+    ) as executor:
+        futures = {}
+
+        for group in groups:
+            future = executor.submit(
+                run_configuration_group_with_buffered_logs,
+                {config_filename: configs[config_filename] for config_filename in group},
+                arguments,
+                log_level,
+            )
+
+            for index, config_filename in enumerate(group):
+                futures[config_filename] = (future, index)
+
+        for config_filename in configs:
+            (future, index) = futures[config_filename]
+            results, buffered_logs, spans = future.result()[index]
+
+            for log in buffered_logs:
+                logger.handle(log)
+
+            timing.record_spans(spans)
+
+            yield (config_filename, results)
+
+
 def collect_configuration_run_summary_logs(configs, arguments):
     '''
     Given a dict of configuration filename to corresponding parsed configuration, and parsed
@@ -637,8 +1014,7 @@ def collect_configuration_run_summary_logs(configs, arguments):
 
     # Execute the actions corresponding to each configuration file.
     json_results = []
-    for config_filename, config in configs.items():
-        results = list(run_configuration(config_filename, config, arguments))
+    for config_filename, results in run_configurations(configs, arguments):
         error_logs = tuple(result for result in results if isinstance(result, logging.LogRecord))
 
         if error_logs:
@@ -683,6 +1059,30 @@ def collect_configuration_run_summary_logs(configs, arguments):
             yield from log_error_records('Error running post-everything hook', error)
 
 
+def timing_requested(global_arguments):
+    '''
+    Given parsed global command-line arguments, return whether they request any timings.
+    '''
+    return bool(global_arguments.timing or global_arguments.timing_file)
+
+
+def emit_timings(global_arguments):
+    '''
+    Given parsed global command-line arguments, write any recorded timing spans to a JSON lines
+    file and/or log a summary table of them, as the arguments request.
+    '''
+    spans = timing.pop_spans()
+
+    if global_arguments.timing_file:
+        try:
+            timing.write_json_lines(spans, global_arguments.timing_file)
+        except OSError as error:
+            logger.warning(f'Error writing timings to {global_arguments.timing_file}: {error}')
+
+    if global_arguments.timing:
+        timing.log_summary(spans)
+
+
 def exit_with_help_link():  # pragma: no cover
     '''
     Display a link to get help and exit with an error code.
@@ -742,6 +1142,9 @@ def main():  # pragma: no cover
         logger.critical(f'Error configuring logging: {error}')
         exit_with_help_link()
 
+    if timing_requested(global_arguments):
+        timing.enable()
+
     logger.debug('Ensuring legacy configuration is upgraded')
     convert.guard_configuration_upgraded(LEGACY_CONFIG_PATH, config_filenames)
 
@@ -758,5 +1161,7 @@ def main():  # pragma: no cover
     for log in summary_logs:
         logger.handle(log)
 
+    emit_timings(global_arguments)
+
     if summary_logs_max_level >= logging.CRITICAL:
         exit_with_help_link()
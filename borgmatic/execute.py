@@ -2,7 +2,11 @@ import collections
 import logging
 import os
 import select
+import selectors
 import subprocess
+import time
+
+from borgmatic import timing
 
 logger = logging.getLogger(__name__)
 
@@ -37,29 +41,89 @@ def command_for_process(process):
 def output_buffer_for_process(process, exclude_stdouts):
     '''
     Given a process as an instance of subprocess.Popen and a sequence of stdouts to exclude, return
-    either the process's stdout or stderr. The idea is that if stdout is excluded for a process, we
-    still have stderr to log.
+    either the process's stdout or stderr. The idea is that if stdout is excluded for a process (or
+    goes directly to another process instead of being captured here), we still have stderr to log.
+    '''
+    return (
+        process.stderr
+        if process.stdout is None or process.stdout.closed or process.stdout in exclude_stdouts
+        else process.stdout
+    )
+
+
+def make_last_lines():
+    '''
+    Return a new, empty rolling buffer for holding onto the last few lines of a process' output, so
+    they're available in case the process errors. Appending beyond ERROR_OUTPUT_MAX_LINE_COUNT lines
+    discards the oldest line in constant time.
+    '''
+    return collections.deque(maxlen=ERROR_OUTPUT_MAX_LINE_COUNT)
+
+
+def format_last_lines(last_lines):
+    '''
+    Given a rolling buffer of last lines as returned by make_last_lines(), join them into a single
+    string suitable for error output. If the buffer is full, indicate that earlier lines may have
+    been discarded.
     '''
-    return process.stderr if process.stdout in exclude_stdouts else process.stdout
+    return '\n'.join(
+        (('...',) if len(last_lines) == ERROR_OUTPUT_MAX_LINE_COUNT else ()) + tuple(last_lines)
+    )
 
 
 def append_last_lines(last_lines, captured_output, line, output_log_level):
     '''
-    Given a rolling list of last lines, a list of captured output, a line to append, and an output
-    log level, append the line to the last lines and (if necessary) the captured output. Then log
-    the line at the requested output log level.
+    Given a rolling buffer of last lines as returned by make_last_lines(), a list of captured output,
+    a line to append, and an output log level, append the line to the last lines and (if necessary)
+    the captured output. Then log the line at the requested output log level.
     '''
     last_lines.append(line)
 
-    if len(last_lines) > ERROR_OUTPUT_MAX_LINE_COUNT:
-        last_lines.pop(0)
-
     if output_log_level is None:
         captured_output.append(line)
     else:
         logger.log(output_log_level, line)
 
 
+OUTPUT_READ_CHUNK_SIZE = 64 * 1024
+PROCESS_POLL_INTERVAL_SECONDS = 0.1
+
+
+def split_output_lines(output_buffer, chunk, partial_lines):
+    '''
+    Given an output buffer, a chunk (bytes) just read from it, and a dict from output buffer to the
+    trailing partial line (bytes) read from it so far, split the chunk into complete lines. Hold
+    onto any new trailing partial line for the next chunk. An empty chunk indicates end of file, in
+    which case any remaining partial line gets treated as a complete line.
+
+    Return the decoded, non-blank lines.
+    '''
+    data = partial_lines.pop(output_buffer, b'') + chunk
+
+    if chunk:
+        (data, _, partial_line) = data.rpartition(b'\n')
+
+        if partial_line:
+            partial_lines[output_buffer] = partial_line
+
+    # Decode the complete lines all at once rather than line by line, as that's much faster for
+    # high-volume output.
+    return [line for line in map(str.rstrip, data.decode().split('\n')) if line]
+
+
+def read_output_lines(output_buffer, partial_lines):
+    '''
+    Given an output buffer that's ready for reading and a dict from output buffer to the trailing
+    partial line (bytes) read from it so far, read a single chunk from the buffer without blocking
+    and split it into complete lines as per split_output_lines().
+
+    Return a tuple of the decoded, non-blank lines along with whether the buffer is at end of file.
+    '''
+    chunk = os.read(output_buffer.fileno(), OUTPUT_READ_CHUNK_SIZE)
+
+    return (split_output_lines(output_buffer, chunk, partial_lines), not chunk)
+
+
 def log_outputs(processes, exclude_stdouts, output_log_level, borg_local_path):
     '''
     Given a sequence of subprocess.Popen() instances for multiple processes, log the output for each
@@ -75,96 +139,150 @@ def log_outputs(processes, exclude_stdouts, output_log_level, borg_local_path):
 
     Note that stdout for a process can be None if output is intentionally not captured. In which
     case it won't be logged.
+
+    Output gets read in chunks from whichever buffers the operating system reports as ready (via
+    epoll or the platform's equivalent), so a process writing a partial line never blocks reading
+    from the other processes.
     '''
     # Map from output buffer to sequence of last lines.
-    buffer_last_lines = collections.defaultdict(list)
-    process_for_output_buffer = {
-        output_buffer_for_process(process, exclude_stdouts): process
-        for process in processes
+    buffer_last_lines = collections.defaultdict(make_last_lines)
+    captured_outputs = collections.defaultdict(list)
+    partial_lines = {}
+    selector = selectors.DefaultSelector()
+
+    # Each registered output buffer carries its process as selector data. Buffers registered only
+    # to vent them carry None instead.
+    output_buffer_for = {
+        process: output_buffer_for_process(process, exclude_stdouts)
         if process.stdout or process.stderr
+        else None
+        for process in processes
     }
-    output_buffers = list(process_for_output_buffer.keys())
-    captured_outputs = collections.defaultdict(list)
+
+    for process, output_buffer in output_buffer_for.items():
+        if output_buffer:
+            selector.register(output_buffer, selectors.EVENT_READ, process)
+
+    seen_buffers = {key.fileobj for key in selector.get_map().values()}
     still_running = True
+    timeout = PROCESS_POLL_INTERVAL_SECONDS
 
     # Log output for each process until they all exit.
     while True:
-        if output_buffers:
-            (ready_buffers, _, _) = select.select(output_buffers, [], [])
-
-            for ready_buffer in ready_buffers:
-                ready_process = process_for_output_buffer.get(ready_buffer)
-
-                # The "ready" process has exited, but it might be a pipe destination with other
-                # processes (pipe sources) waiting to be read from. So as a measure to prevent
-                # hangs, vent all processes when one exits.
-                if ready_process and ready_process.poll() is not None:
-                    for other_process in processes:
-                        if (
-                            other_process.poll() is None
-                            and other_process.stdout
-                            and other_process.stdout not in output_buffers
-                        ):
-                            # Add the process's output to output_buffers to ensure it'll get read.
-                            output_buffers.append(other_process.stdout)
-
-                while True:
-                    line = ready_buffer.readline().rstrip().decode()
-                    if not line or not ready_process:
-                        break
+        if selector.get_map():
+            ready_keys = selector.select(timeout)
+
+            for key, _ in ready_keys:
+                (lines, end_of_file) = read_output_lines(key.fileobj, partial_lines)
+
+                if end_of_file:
+                    selector.unregister(key.fileobj)
 
-                    # Keep the last few lines of output in case the process errors, and we need the output for
-                    # the exception below.
+                # Keep the last few lines of output in case the process errors, and we need the
+                # output for the exception below.
+                for line in lines if key.data else ():
                     append_last_lines(
-                        buffer_last_lines[ready_buffer],
-                        captured_outputs[ready_process],
+                        buffer_last_lines[key.fileobj],
+                        captured_outputs[key.data],
                         line,
                         output_log_level,
                     )
 
+            # Once every process has exited, keep reading until there's no more output waiting.
+            if not still_running and ready_keys:
+                continue
+        elif still_running and seen_buffers:
+            time.sleep(timeout)
+
         if not still_running:
             break
 
         still_running = False
+        any_exited = False
+        reading_buffers = selector.get_map()
+        timeout = None
 
         for process in processes:
-            exit_code = process.poll() if output_buffers else process.wait()
+            exit_code = process.poll() if seen_buffers else process.wait()
 
             if exit_code is None:
                 still_running = True
 
+                # Only block waiting on output if this process is guaranteed to produce some (at
+                # least end of file) when it exits. Otherwise, wake up periodically to poll it.
+                if (
+                    not output_buffer_for[process]
+                    or output_buffer_for[process] not in reading_buffers
+                ):
+                    timeout = PROCESS_POLL_INTERVAL_SECONDS
+            else:
+                any_exited = True
+
             command = process.args.split(' ') if isinstance(process.args, str) else process.args
             # If any process errors, then raise accordingly.
             if exit_code_indicates_error(command, exit_code, borg_local_path):
                 # If an error occurs, include its output in the raised exception so that we don't
                 # inadvertently hide error output.
-                output_buffer = output_buffer_for_process(process, exclude_stdouts)
-                last_lines = buffer_last_lines[output_buffer] if output_buffer else []
+                output_buffer = output_buffer_for[process]
+                last_lines = (
+                    buffer_last_lines[output_buffer] if output_buffer else make_last_lines()
+                )
 
                 # Collect any straggling output lines that came in since we last gathered output.
-                while output_buffer:  # pragma: no cover
-                    line = output_buffer.readline().rstrip().decode()
-                    if not line:
+                while output_buffer and output_buffer in reading_buffers:  # pragma: no cover
+                    if not select.select([output_buffer], [], [], 0)[0]:
                         break
 
-                    append_last_lines(
-                        last_lines, captured_outputs[process], line, output_log_level=logging.ERROR
-                    )
+                    (lines, end_of_file) = read_output_lines(output_buffer, partial_lines)
 
-                if len(last_lines) == ERROR_OUTPUT_MAX_LINE_COUNT:
-                    last_lines.insert(0, '...')
+                    for line in lines:
+                        append_last_lines(
+                            last_lines,
+                            captured_outputs[process],
+                            line,
+                            output_log_level=logging.ERROR,
+                        )
+
+                    if end_of_file:
+                        selector.unregister(output_buffer)
 
                 # Something has gone wrong. So vent each process' output buffer to prevent it from
                 # hanging. And then kill the process.
                 for other_process in processes:
                     if other_process.poll() is None:
-                        other_process.stdout.read(0)
+                        if other_process.stdout and not other_process.stdout.closed:
+                            other_process.stdout.read(0)
+
                         other_process.kill()
 
+                selector.close()
+
                 raise subprocess.CalledProcessError(
-                    exit_code, command_for_process(process), '\n'.join(last_lines)
+                    exit_code, command_for_process(process), format_last_lines(last_lines)
                 )
 
+        # An exited process might be a pipe destination with other processes (pipe sources) waiting
+        # to be read from. So as a measure to prevent hangs, vent all processes when one exits. But
+        # don't vent a process whose output is another process' input while that input is still
+        # being consumed, as that would steal its data.
+        if any_exited and seen_buffers:
+            for other_process in processes:
+                if (
+                    other_process.poll() is None
+                    and other_process.stdout
+                    and not other_process.stdout.closed
+                    and other_process.stdout not in seen_buffers
+                    and (
+                        other_process.stdout not in exclude_stdouts
+                        or processes[-1].poll() is not None
+                    )
+                ):
+                    selector.register(other_process.stdout, selectors.EVENT_READ, None)
+                    seen_buffers.add(other_process.stdout)
+                    timeout = 0
+
+    selector.close()
+
     if captured_outputs:
         return {
             process: '\n'.join(output_lines) for process, output_lines in captured_outputs.items()
@@ -199,12 +317,14 @@ def execute_command(
     working_directory=None,
     borg_local_path=None,
     run_to_completion=True,
+    umask=None,
 ):
     '''
     Execute the given command (a sequence of command/argument strings) and log its output at the
     given log level. If an open output file object is given, then write stdout to the file and only
     log stderr. If an open input file object is given, then read stdin from the file. If shell is
-    True, execute the command within a shell. If an extra environment dict is given, then use it to
+    True, execute the command within a shell, and if an integer umask is given, set it within that
+    shell before running the command. If an extra environment dict is given, then use it to
     augment the current environment, and pass the result into the command. If a working directory is
     given, use that as the present working directory when running the command. If a Borg local path
     is given, and the command matches it (regardless of arguments), treat exit code 1 as a warning
@@ -218,6 +338,11 @@ def execute_command(
     do_not_capture = bool(output_file is DO_NOT_CAPTURE)
     command = ' '.join(full_command) if shell else full_command
 
+    # Set the umask in the shell rather than in borgmatic itself, as borgmatic's umask is shared by
+    # all of its threads.
+    if shell and umask is not None:
+        command = f'umask {umask:03o}; {command}'
+
     process = subprocess.Popen(
         command,
         stdin=input_file,
@@ -230,9 +355,11 @@ def execute_command(
     if not run_to_completion:
         return process
 
-    log_outputs(
-        (process,), (input_file, output_file), output_log_level, borg_local_path=borg_local_path
-    )
+    with timing.span(timing.command_span_name(full_command), 'command') as record:
+        log_outputs(
+            (process,), (input_file, output_file), output_log_level, borg_local_path=borg_local_path
+        )
+        record['exit_code'] = process.returncode
 
 
 def execute_command_and_capture_output(
@@ -241,6 +368,7 @@ def execute_command_and_capture_output(
     shell=False,
     extra_environment=None,
     working_directory=None,
+    borg_local_path=None,
 ):
     '''
     Execute the given command (a sequence of command/argument strings), capturing and returning its
@@ -248,6 +376,8 @@ def execute_command_and_capture_output(
     stdout. If shell is True, execute the command within a shell. If an extra environment dict is
     given, then use it to augment the current environment, and pass the result into the command. If
     a working directory is given, use that as the present working directory when running the command.
+    If a Borg local path is given, and the command matches it (regardless of arguments), treat exit
+    code 1 as a warning instead of an error.
 
     Raise subprocesses.CalledProcessError if an error occurs while running the command.
     '''
@@ -255,20 +385,81 @@ def execute_command_and_capture_output(
     environment = {**os.environ, **extra_environment} if extra_environment else None
     command = ' '.join(full_command) if shell else full_command
 
-    try:
-        output = subprocess.check_output(
+    with timing.span(timing.command_span_name(full_command), 'command') as record:
+        try:
+            output = subprocess.check_output(
+                command,
+                stderr=subprocess.STDOUT if capture_stderr else None,
+                shell=shell,
+                env=environment,
+                cwd=working_directory,
+            )
+            record['exit_code'] = 0
+        except subprocess.CalledProcessError as error:
+            if exit_code_indicates_error(full_command, error.returncode, borg_local_path):
+                raise
+            output = error.output
+            record['exit_code'] = error.returncode
+
+    return output.decode() if output is not None else None
+
+
+def execute_command_and_stream_output(
+    full_command,
+    capture_stderr=False,
+    shell=False,
+    extra_environment=None,
+    working_directory=None,
+    borg_local_path=None,
+):
+    '''
+    Execute the given command (a sequence of command/argument strings) and yield each line of its
+    output (stdout), without trailing newline, as soon as it's available. This allows processing
+    huge outputs without holding them all in memory at once. If capture stderr is True, then yield
+    stderr lines in addition to stdout. If shell is True, execute the command within a shell. If an
+    extra environment dict is given, then use it to augment the current environment, and pass the
+    result into the command. If a working directory is given, use that as the present working
+    directory when running the command. If a Borg local path is given, and the command matches it
+    (regardless of arguments), treat exit code 1 as a warning instead of an error.
+
+    If the caller stops consuming lines early, kill the command.
+
+    Raise subprocesses.CalledProcessError, after yielding all output lines, if an error occurs while
+    running the command. The error output includes the last few lines of output.
+    '''
+    log_command(full_command)
+    environment = {**os.environ, **extra_environment} if extra_environment else None
+    command = ' '.join(full_command) if shell else full_command
+    last_lines = make_last_lines()
+
+    with timing.span(timing.command_span_name(full_command), 'command') as record:
+        process = subprocess.Popen(
             command,
+            stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT if capture_stderr else None,
             shell=shell,
             env=environment,
             cwd=working_directory,
         )
-    except subprocess.CalledProcessError as error:
-        if exit_code_indicates_error(command, error.returncode):
+
+        try:
+            for line in process.stdout:
+                decoded_line = line.decode().rstrip('\n')
+                last_lines.append(decoded_line)
+
+                yield decoded_line
+        except BaseException:  # Including GeneratorExit, when the caller stops consuming lines.
+            process.kill()
             raise
-        output = error.output
+        finally:
+            process.stdout.close()
+            exit_code = process.wait()
+            record['exit_code'] = exit_code
 
-    return output.decode() if output is not None else None
+        if exit_code_indicates_error(full_command, exit_code, borg_local_path):
+            raise subprocess.CalledProcessError(
+                exit_code, command_for_process(process), format_last_lines(last_lines)
+            )
 
 
 def execute_command_with_processes(
@@ -289,8 +480,8 @@ def execute_command_with_processes(
     pipe that the given command is consuming from.
 
     If an open output file object is given, then write stdout to the file and only log stderr. But
-    if output log level is None, instead suppress logging and return the captured output for (only)
-    the given command. If an open input file object is given, then read stdin from the file. If
+    if output log level is None, instead suppress logging and return the captured stdout for (only)
+    the given command, leaving its stderr uncaptured so that it can't corrupt the output. If an open input file object is given, then read stdin from the file. If
     shell is True, execute the command within a shell. If an extra environment dict is given, then
     use it to augment the current environment, and pass the result into the command. If a working
     directory is given, use that as the present working directory when running the command. If a
@@ -311,7 +502,7 @@ def execute_command_with_processes(
             stdin=input_file,
             stdout=None if do_not_capture else (output_file or subprocess.PIPE),
             stderr=None
-            if do_not_capture
+            if do_not_capture or output_log_level is None
             else (subprocess.PIPE if output_file else subprocess.STDOUT),
             shell=shell,
             env=environment,
@@ -322,16 +513,20 @@ def execute_command_with_processes(
         # And then kill the process.
         for process in processes:
             if process.poll() is None:
-                process.stdout.read(0)
+                if process.stdout and not process.stdout.closed:
+                    process.stdout.read(0)
+
                 process.kill()
         raise
 
-    captured_outputs = log_outputs(
-        tuple(processes) + (command_process,),
-        (input_file, output_file),
-        output_log_level,
-        borg_local_path=borg_local_path,
-    )
+    with timing.span(timing.command_span_name(full_command), 'command') as record:
+        captured_outputs = log_outputs(
+            tuple(processes) + (command_process,),
+            (input_file, output_file),
+            output_log_level,
+            borg_local_path=borg_local_path,
+        )
+        record['exit_code'] = command_process.returncode
 
     if output_log_level is None:
         return captured_outputs.get(command_process)
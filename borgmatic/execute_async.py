@@ -0,0 +1,260 @@
+import asyncio
+import collections
+import logging
+import os
+import subprocess
+
+from borgmatic import execute
+
+
+def run_synchronously(coroutine):
+    '''
+    Run the given coroutine to completion in a new event loop and return its result. This is a shim
+    for synchronous code (which is most of borgmatic) to call the coroutines in this module.
+
+    Don't call this from a coroutine that's already running in an event loop. Just await instead.
+    '''
+    return asyncio.run(coroutine)
+
+
+async def start_process(
+    command, stdin=None, stdout=None, stderr=None, shell=False, env=None, cwd=None
+):
+    '''
+    Given a command (a string if shell is True, a sequence of command/argument strings otherwise)
+    along with the same standard stream, shell, environment, and working directory arguments as
+    subprocess.Popen(), start the command as an asyncio.subprocess.Process and return it.
+
+    Like with subprocess.Popen(), the command gets stored on the process as its "args" attribute, so
+    the process works with borgmatic.execute.command_for_process() and so on.
+    '''
+    if shell:
+        process = await asyncio.create_subprocess_shell(
+            command, stdin=stdin, stdout=stdout, stderr=stderr, env=env, cwd=cwd
+        )
+    else:
+        process = await asyncio.create_subprocess_exec(
+            *command, stdin=stdin, stdout=stdout, stderr=stderr, env=env, cwd=cwd
+        )
+
+    process.args = command
+
+    return process
+
+
+async def log_process_output(process, last_lines, captured_output, output_log_level):
+    '''
+    Given an asyncio.subprocess.Process, a rolling buffer of its last lines, a list of its captured
+    output, and an output log level, read the process' output (its stdout, or its stderr if stdout
+    isn't captured) in chunks until end of file. Log or capture each line as per
+    borgmatic.execute.append_last_lines().
+    '''
+    output_stream = process.stdout or process.stderr
+    partial_lines = {}
+
+    if not output_stream:
+        return
+
+    while True:
+        chunk = await output_stream.read(execute.OUTPUT_READ_CHUNK_SIZE)
+
+        for line in execute.split_output_lines(output_stream, chunk, partial_lines):
+            execute.append_last_lines(last_lines, captured_output, line, output_log_level)
+
+        if not chunk:
+            break
+
+
+async def finish_process(process, last_lines, captured_output, output_log_level, borg_local_path):
+    '''
+    Given an asyncio.subprocess.Process, a rolling buffer of its last lines, a list of its captured
+    output, an output log level, and a Borg local path, log the process' output until it exits as
+    per log_process_output().
+
+    Raise a CalledProcessError if the process exits with an error (or a warning for exit code 1, if
+    the process does not match the Borg local path).
+    '''
+    await log_process_output(process, last_lines, captured_output, output_log_level)
+    exit_code = await process.wait()
+
+    command = process.args.split(' ') if isinstance(process.args, str) else process.args
+
+    if execute.exit_code_indicates_error(command, exit_code, borg_local_path):
+        # If an error occurs, include its output in the raised exception so that we don't
+        # inadvertently hide error output.
+        raise subprocess.CalledProcessError(
+            exit_code, execute.command_for_process(process), execute.format_last_lines(last_lines)
+        )
+
+
+async def log_outputs(processes, output_log_level, borg_local_path):
+    '''
+    Given a sequence of asyncio.subprocess.Process instances for multiple processes, log the output
+    for each process with the requested log level, concurrently and until they all exit.
+    Additionally, raise a CalledProcessError if a process exits with an error (or a warning for exit
+    code 1, if that process does not match the Borg local path). In that case, kill any other
+    processes that are still running.
+
+    If output log level is None, then instead of logging, capture output for each process and return
+    it as a dict from the process to its output.
+
+    Output gets logged from each process' stdout or, if that isn't captured, its stderr. So unlike
+    borgmatic.execute.log_outputs(), there's no need to indicate stdouts to exclude.
+    '''
+    captured_outputs = collections.defaultdict(list)
+    tasks = [
+        asyncio.create_task(
+            finish_process(
+                process,
+                execute.make_last_lines(),
+                captured_outputs[process],
+                output_log_level,
+                borg_local_path,
+            )
+        )
+        for process in processes
+    ]
+
+    try:
+        await asyncio.gather(*tasks)
+    except subprocess.CalledProcessError:
+        # Something has gone wrong. So kill each process that's still running, and stop logging its
+        # output.
+        for process, task in zip(processes, tasks):
+            task.cancel()
+
+            if process.returncode is None:
+                process.kill()
+
+        await asyncio.gather(*(process.wait() for process in processes))
+
+        raise
+
+    if output_log_level is None:
+        return {
+            process: '\n'.join(output_lines) for process, output_lines in captured_outputs.items()
+        }
+
+
+async def execute_command(
+    full_command,
+    output_log_level=logging.INFO,
+    output_file=None,
+    input_file=None,
+    shell=False,
+    extra_environment=None,
+    working_directory=None,
+    borg_local_path=None,
+    run_to_completion=True,
+):
+    '''
+    Coroutine version of borgmatic.execute.execute_command(), taking the same arguments. If run to
+    completion is False, then return the asyncio.subprocess.Process for the command without waiting
+    for it to finish.
+
+    Raise subprocesses.CalledProcessError if an error occurs while running the command.
+    '''
+    execute.log_command(full_command, input_file, output_file)
+    environment = {**os.environ, **extra_environment} if extra_environment else None
+    do_not_capture = bool(output_file is execute.DO_NOT_CAPTURE)
+    command = ' '.join(full_command) if shell else full_command
+
+    process = await start_process(
+        command,
+        stdin=input_file,
+        stdout=None if do_not_capture else (output_file or subprocess.PIPE),
+        stderr=None if do_not_capture else (subprocess.PIPE if output_file else subprocess.STDOUT),
+        shell=shell,
+        env=environment,
+        cwd=working_directory,
+    )
+    if not run_to_completion:
+        return process
+
+    await log_outputs((process,), output_log_level, borg_local_path=borg_local_path)
+
+
+async def execute_command_and_capture_output(
+    full_command,
+    capture_stderr=False,
+    shell=False,
+    extra_environment=None,
+    working_directory=None,
+):
+    '''
+    Coroutine version of borgmatic.execute.execute_command_and_capture_output(), taking the same
+    arguments and returning the command's captured output.
+
+    Raise subprocesses.CalledProcessError if an error occurs while running the command.
+    '''
+    execute.log_command(full_command)
+    environment = {**os.environ, **extra_environment} if extra_environment else None
+    command = ' '.join(full_command) if shell else full_command
+
+    process = await start_process(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT if capture_stderr else None,
+        shell=shell,
+        env=environment,
+        cwd=working_directory,
+    )
+    (output, _) = await process.communicate()
+
+    if execute.exit_code_indicates_error(command, process.returncode):
+        raise subprocess.CalledProcessError(process.returncode, command, output)
+
+    return output.decode() if output is not None else None
+
+
+async def execute_command_with_processes(
+    full_command,
+    processes,
+    output_log_level=logging.INFO,
+    output_file=None,
+    input_file=None,
+    shell=False,
+    extra_environment=None,
+    working_directory=None,
+    borg_local_path=None,
+):
+    '''
+    Coroutine version of borgmatic.execute.execute_command_with_processes(), taking the same
+    arguments—except that the given active processes must be asyncio.subprocess.Process instances,
+    for instance as returned by execute_command() with run to completion set to False.
+
+    Raise subprocesses.CalledProcessError if an error occurs while running the command or in the
+    upstream process.
+    '''
+    execute.log_command(full_command, input_file, output_file)
+    environment = {**os.environ, **extra_environment} if extra_environment else None
+    do_not_capture = bool(output_file is execute.DO_NOT_CAPTURE)
+    command = ' '.join(full_command) if shell else full_command
+
+    try:
+        command_process = await start_process(
+            command,
+            stdin=input_file,
+            stdout=None if do_not_capture else (output_file or subprocess.PIPE),
+            stderr=None
+            if do_not_capture
+            else (subprocess.PIPE if output_file else subprocess.STDOUT),
+            shell=shell,
+            env=environment,
+            cwd=working_directory,
+        )
+    except OSError:
+        # Something has gone wrong. So kill each process to prevent it from hanging.
+        for process in processes:
+            if process.returncode is None:
+                process.kill()
+        raise
+
+    captured_outputs = await log_outputs(
+        tuple(processes) + (command_process,),
+        output_log_level,
+        borg_local_path=borg_local_path,
+    )
+
+    if output_log_level is None:
+        return captured_outputs.get(command_process)
@@ -1,8 +1,7 @@
 import logging
-import os
 import re
 
-from borgmatic import execute
+from borgmatic import execute, timing
 
 logger = logging.getLogger(__name__)
 
@@ -58,11 +57,14 @@ def execute_hook(commands, umask, config_filename, description, dry_run, **conte
     if umask:
         parsed_umask = int(str(umask), 8)
         logger.debug(f'{config_filename}: Set hook umask to {oct(parsed_umask)}')
-        original_umask = os.umask(parsed_umask)
     else:
-        original_umask = None
+        parsed_umask = None
 
-    try:
+    with timing.span(
+        description,
+        'command hook',
+        **({'repository': context['repository']} if context.get('repository') else {}),
+    ):
         for command in commands:
             if not dry_run:
                 execute.execute_command(
@@ -71,10 +73,8 @@ def execute_hook(commands, umask, config_filename, description, dry_run, **conte
                     if description == 'on-error'
                     else logging.WARNING,
                     shell=True,
+                    umask=parsed_umask,
                 )
-    finally:
-        if original_umask:
-            os.umask(original_umask)
 
 
 def considered_soft_failure(config_filename, error):
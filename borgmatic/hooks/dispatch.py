@@ -1,5 +1,6 @@
 import logging
 
+from borgmatic import timing
 from borgmatic.hooks import (
     cronhub,
     cronitor,
@@ -9,6 +10,7 @@ from borgmatic.hooks import (
     ntfy,
     pagerduty,
     postgresql,
+    prometheus,
     sqlite,
 )
 
@@ -23,6 +25,7 @@ HOOK_NAME_TO_MODULE = {
     'ntfy': ntfy,
     'pagerduty': pagerduty,
     'postgresql_databases': postgresql,
+    'prometheus': prometheus,
     'sqlite_databases': sqlite,
 }
 
@@ -46,7 +49,9 @@ def call_hook(function_name, hooks, log_prefix, hook_name, *args, **kwargs):
         raise ValueError(f'Unknown hook name: {hook_name}')
 
     logger.debug(f'{log_prefix}: Calling {hook_name} hook function {function_name}')
-    return getattr(module, function_name)(config, log_prefix, *args, **kwargs)
+
+    with timing.span(f'{hook_name} {function_name}', 'hook'):
+        return getattr(module, function_name)(config, log_prefix, *args, **kwargs)
 
 
 def call_hooks(function_name, hooks, log_prefix, hook_names, *args, **kwargs):
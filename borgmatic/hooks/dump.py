@@ -1,8 +1,13 @@
+import concurrent.futures
 import logging
 import os
+import shlex
 import shutil
+import subprocess
 
+from borgmatic import timing
 from borgmatic.borg.state import DEFAULT_BORGMATIC_SOURCE_DIRECTORY
+from borgmatic.execute import execute_command, log_outputs
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +18,29 @@ DATABASE_HOOK_NAMES = (
     'sqlite_databases',
 )
 
+# Commands for each supported dump compression, both to compress a dump from stdin to stdout and to
+# decompress it again. Where available, "--rsyncable" keeps a small change in the database from
+# changing the entire compressed dump, so Borg can still deduplicate most of it across archives.
+COMPRESS_COMMANDS = {
+    'zstd': ('zstd', '--rsyncable', '--quiet', '--stdout'),
+    'gzip': ('gzip', '--rsyncable', '--stdout'),
+    'lz4': ('lz4', '--quiet', '--stdout'),
+}
+DECOMPRESS_COMMANDS = {
+    'zstd': ('zstd', '--decompress', '--quiet', '--stdout'),
+    'gzip': ('gzip', '--decompress', '--stdout'),
+    'lz4': ('lz4', '--decompress', '--quiet', '--stdout'),
+}
+
+# The magic bytes at the start of a dump for each supported dump compression, used to detect the
+# compression of an existing dump when restoring it.
+COMPRESSION_MAGICS = {
+    'zstd': b'\x28\xb5\x2f\xfd',
+    'gzip': b'\x1f\x8b',
+    'lz4': b'\x04\x22\x4d\x18',
+}
+DUMP_HEADER_LENGTH = max(len(magic) for magic in COMPRESSION_MAGICS.values())
+
 
 def make_database_dump_path(borgmatic_source_directory, database_hook_name):
     '''
@@ -77,3 +105,180 @@ def convert_glob_patterns_to_borg_patterns(patterns):
     patterns like "sh:etc/*".
     '''
     return [f'sh:{pattern.lstrip(os.path.sep)}' for pattern in patterns]
+
+
+def run_dumps(dump_functions, max_concurrent_dumps=1):
+    '''
+    Given a sequence of functions that each take no arguments and run a single database dump to
+    completion, ordered by which dumps should start first, and a maximum number of dumps to run at
+    once, call each function.
+
+    If the maximum is greater than one, then run up to that many dumps at once in separate threads,
+    starting them in the given order. If any dump fails, then don't start any further dumps, and
+    raise the first error once the dumps in progress finish.
+    '''
+    if max_concurrent_dumps <= 1 or len(dump_functions) <= 1:
+        for dump_function in dump_functions:
+            dump_function()
+
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrent_dumps) as executor:
+        futures = [executor.submit(dump_function) for dump_function in dump_functions]
+
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+        except Exception:
+            for future in futures:
+                future.cancel()
+
+            raise
+
+
+def dump_compression(database):
+    '''
+    Given a database configuration dict, return the name of its configured dump compression (e.g.
+    "zstd"), or None if its dumps aren't compressed.
+    '''
+    compression = database.get('dump_compression', 'none')
+
+    return None if compression == 'none' else compression
+
+
+def execute_compressed_dump_command(
+    dump_command,
+    compression,
+    dump_filename,
+    shell=False,
+    extra_environment=None,
+    run_to_completion=True,
+):
+    '''
+    Given a dump command (a sequence of command/argument strings) that writes a database dump to
+    stdout, the name of a dump compression, and a dump filename (either a named pipe or a regular
+    file) to write to, run the dump command with its output piped through the corresponding
+    compression command and into the dump file. If shell is True, run the dump command within a
+    shell. If an extra environment dict is given, pass it to the dump command.
+
+    The dump command doesn't start until the compression command has opened the dump file. For a
+    named pipe, that means not until Borg starts reading from it. That way, a dump doesn't connect
+    to its database any earlier than it would without compression.
+
+    If run to completion is False, then return a tuple of the dump and compression processes
+    (instances of subprocess.Popen) without waiting on them. Otherwise, run both to completion and
+    return None.
+
+    Raise subprocess.CalledProcessError if an error occurs while running either command.
+    '''
+    (read_descriptor, write_descriptor) = os.pipe()
+    (ready_read_descriptor, ready_write_descriptor) = os.pipe()
+
+    # Hold off the dump until the end of file on its stdin, the read end of the "ready" pipe.
+    wait_and_dump_command = ('read', '-r', '_', ';') + (
+        tuple(dump_command) if shell else tuple(shlex.quote(part) for part in dump_command)
+    )
+
+    # Use shell redirection to write to the dump file, so that opening a named pipe there blocks
+    # the compression command rather than borgmatic. The redirection also replaces the write end of
+    # the "ready" pipe as the shell's stdout, which closes it and so lets the dump start. "exec"
+    # makes sure that the shell doesn't hold onto that write end in a separate process.
+    compress_command = (
+        ('exec',) + COMPRESS_COMMANDS[compression] + ('>', shlex.quote(dump_filename))
+    )
+
+    try:
+        try:
+            dump_process = execute_command(
+                wait_and_dump_command,
+                output_file=write_descriptor,
+                input_file=ready_read_descriptor,
+                shell=True,
+                extra_environment=extra_environment,
+                run_to_completion=False,
+            )
+        finally:
+            os.close(write_descriptor)
+            os.close(ready_read_descriptor)
+
+        try:
+            compress_process = execute_command(
+                compress_command,
+                output_file=ready_write_descriptor,
+                input_file=read_descriptor,
+                shell=True,
+                run_to_completion=False,
+            )
+        except OSError:
+            dump_process.kill()
+            raise
+    finally:
+        # Close borgmatic's copies of the pipes right away, as the dump can't start while any copy
+        # of the "ready" pipe's write end remains open.
+        os.close(read_descriptor)
+        os.close(ready_write_descriptor)
+
+    if not run_to_completion:
+        return (dump_process, compress_process)
+
+    with timing.span(timing.command_span_name(compress_command), 'command'):
+        log_outputs((dump_process, compress_process), (), logging.INFO, borg_local_path=None)
+
+
+def read_dump_header(input_file):
+    '''
+    Given an open input file for a database dump, read the first few bytes of the dump directly from
+    its file descriptor and return them. Read no more than that, so that a process given the same
+    file descriptor can consume the rest. Return fewer bytes if the dump is shorter than that.
+    '''
+    header = b''
+
+    while len(header) < DUMP_HEADER_LENGTH:
+        chunk = os.read(input_file.fileno(), DUMP_HEADER_LENGTH - len(header))
+
+        if not chunk:
+            break
+
+        header += chunk
+
+    return header
+
+
+def detect_dump_compression(header):
+    '''
+    Given the first few bytes of a database dump, return the name of the compression that the dump
+    was written with (e.g. "zstd"), or None if it isn't compressed.
+    '''
+    for compression, magic in COMPRESSION_MAGICS.items():
+        if header.startswith(magic):
+            return compression
+
+    return None
+
+
+def decompress_restore_input(processes, input_file, compression):
+    '''
+    Given a sequence of processes (instances of subprocess.Popen) for a restore command to poll as it
+    runs, an open input file containing a database dump for the restore command to consume (or None
+    if it's restoring from the filesystem), and the name of the compression that the dump was made
+    with as per detect_dump_compression() (or None), return a tuple of the processes and input file
+    to actually use.
+
+    If the dump is compressed, start a decompression process to consume the input file, add it to
+    the processes, and return its stdout as the input file. In that case, also close borgmatic's own
+    copy of the given input file. That way, borgmatic doesn't also try to read from it when logging
+    the output of any process that the input file comes from. Otherwise, return the processes and
+    input file unchanged, so that the restore command consumes the dump directly.
+    '''
+    if input_file is None or not compression:
+        return (processes, input_file)
+
+    decompress_process = execute_command(
+        DECOMPRESS_COMMANDS[compression],
+        input_file=input_file,
+        output_file=subprocess.PIPE,
+        run_to_completion=False,
+    )
+    input_file.close()
+
+    return (list(processes) + [decompress_process], decompress_process.stdout)
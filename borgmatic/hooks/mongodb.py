@@ -1,5 +1,6 @@
 import logging
 
+from borgmatic import metrics, timing
 from borgmatic.execute import execute_command, execute_command_with_processes
 from borgmatic.hooks import dump
 
@@ -15,15 +16,16 @@ def make_dump_path(location_config):  # pragma: no cover
     )
 
 
-def dump_databases(databases, log_prefix, location_config, dry_run):
+def dump_databases(databases, log_prefix, location_config, dry_run, spool=False):
     '''
     Dump the given MongoDB databases to a named pipe. The databases are supplied as a sequence of
     dicts, one dict describing each database as per the configuration schema. Use the given log
     prefix in any log entries. Use the given location configuration dict to construct the
-    destination path.
+    destination path. If spool is True, dump to regular files instead and run each dump to
+    completion, so that the dumps can be backed up to multiple repositories.
 
     Return a sequence of subprocess.Popen instances for the dump processes ready to spew to a named
-    pipe. But if this is a dry run, then don't actually dump anything and return an empty sequence.
+    pipe. But if this is a dry run or spool is True, then return an empty sequence.
     '''
     dry_run_label = ' (dry run; not actually dumping anything)' if dry_run else ''
 
@@ -36,6 +38,7 @@ def dump_databases(databases, log_prefix, location_config, dry_run):
             make_dump_path(location_config), name, database.get('hostname')
         )
         dump_format = database.get('format', 'archive')
+        compression = None if dump_format == 'directory' else dump.dump_compression(database)
 
         logger.debug(
             f'{log_prefix}: Dumping MongoDB database {name} to {dump_filename}{dry_run_label}',
@@ -43,21 +46,39 @@ def dump_databases(databases, log_prefix, location_config, dry_run):
         if dry_run:
             continue
 
-        command = build_dump_command(database, dump_filename, dump_format)
+        command = build_dump_command(database, dump_filename, dump_format, compression)
 
-        if dump_format == 'directory':
+        if dump_format == 'directory' or spool:
             dump.create_parent_directory_for_dump(dump_filename)
-            execute_command(command, shell=True)
+
+            with timing.span(f'mongodb_databases {name}', 'dump') as record:
+                if compression:
+                    dump.execute_compressed_dump_command(
+                        command, compression, dump_filename, shell=True
+                    )
+                else:
+                    execute_command(command, shell=True)
+
+                record['byte_count'] = metrics.path_size(dump_filename)
         else:
             dump.create_named_pipe_for_dump(dump_filename)
-            processes.append(execute_command(command, shell=True, run_to_completion=False))
+
+            if compression:
+                processes.extend(
+                    dump.execute_compressed_dump_command(
+                        command, compression, dump_filename, shell=True, run_to_completion=False
+                    )
+                )
+            else:
+                processes.append(execute_command(command, shell=True, run_to_completion=False))
 
     return processes
 
 
-def build_dump_command(database, dump_filename, dump_format):
+def build_dump_command(database, dump_filename, dump_format, compression=None):
     '''
-    Return the mongodump command from a single database configuration.
+    Return the mongodump command from a single database configuration. With compression, the
+    command writes its archive to stdout for compressing rather than to the dump file.
     '''
     all_databases = database['name'] == 'all'
     command = ['mongodump']
@@ -78,7 +99,9 @@ def build_dump_command(database, dump_filename, dump_format):
     if 'options' in database:
         command.extend(database['options'].split(' '))
     if dump_format != 'directory':
-        command.extend(('--archive', '>', dump_filename))
+        command.append('--archive')
+    if dump_format != 'directory' and not compression:
+        command.extend(('>', dump_filename))
     return command
 
 
@@ -102,13 +125,23 @@ def make_database_dump_pattern(
     return dump.make_database_dump_filename(make_dump_path(location_config), name, hostname='*')
 
 
-def restore_database_dump(database_config, log_prefix, location_config, dry_run, extract_process):
+def restore_database_dump(
+    database_config,
+    log_prefix,
+    location_config,
+    dry_run,
+    extract_process,
+    extract_stream=None,
+    compression=None,
+):
     '''
     Restore the given MongoDB database from an extract stream. The database is supplied as a
     one-element sequence containing a dict describing the database, as per the configuration schema.
     Use the given log prefix in any log entries. If this is a dry run, then don't actually restore
     anything. Trigger the given active extract process (an instance of subprocess.Popen) to produce
-    output to consume.
+    output to consume. Or, if the extract process is None and an extract stream is given, consume
+    the dump from that open file object instead. If the name of the compression that the dump was
+    made with is given, then decompress the dump while restoring it.
 
     If the extract process is None, then restore the dump from the filesystem rather than from an
     extract stream.
@@ -122,19 +155,27 @@ def restore_database_dump(database_config, log_prefix, location_config, dry_run,
     dump_filename = dump.make_database_dump_filename(
         make_dump_path(location_config), database['name'], database.get('hostname')
     )
-    restore_command = build_restore_command(extract_process, database, dump_filename)
+    restore_command = build_restore_command(
+        extract_process or extract_stream, database, dump_filename
+    )
 
     logger.debug(f"{log_prefix}: Restoring MongoDB database {database['name']}{dry_run_label}")
     if dry_run:
         return
 
+    (processes, input_file) = dump.decompress_restore_input(
+        [extract_process] if extract_process else [],
+        extract_process.stdout if extract_process else extract_stream,
+        compression,
+    )
+
     # Don't give Borg local path so as to error on warnings, as "borg extract" only gives a warning
     # if the restore paths don't exist in the archive.
     execute_command_with_processes(
         restore_command,
-        [extract_process] if extract_process else [],
+        processes,
         output_log_level=logging.DEBUG,
-        input_file=extract_process.stdout if extract_process else None,
+        input_file=input_file,
     )
 
 
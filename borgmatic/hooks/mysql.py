@@ -1,13 +1,18 @@
 import copy
+import functools
 import logging
 import os
+import subprocess
+import time
 
+from borgmatic import timing
 from borgmatic.execute import (
     execute_command,
     execute_command_and_capture_output,
     execute_command_with_processes,
 )
 from borgmatic.hooks import dump
+from borgmatic.pipe import format_byte_count
 
 logger = logging.getLogger(__name__)
 
@@ -57,16 +62,61 @@ def database_names_to_dump(database, extra_environment, log_prefix, dry_run):
     )
 
 
+def database_sizes(database, extra_environment, log_prefix):
+    '''
+    Given a requested database config, query the configured host's information schema for the
+    estimated size of each of its databases (the sum of its tables' data and index lengths). Return
+    the sizes as a dict from database name to size in bytes.
+
+    Raise subprocess.CalledProcessError or OSError if the query fails.
+    '''
+    size_command = (
+        ('mysql',)
+        + (tuple(database['list_options'].split(' ')) if 'list_options' in database else ())
+        + (('--host', database['hostname']) if 'hostname' in database else ())
+        + (('--port', str(database['port'])) if 'port' in database else ())
+        + (('--protocol', 'tcp') if 'hostname' in database or 'port' in database else ())
+        + (('--user', database['username']) if 'username' in database else ())
+        + ('--skip-column-names', '--batch')
+        + (
+            '--execute',
+            'SELECT table_schema, SUM(data_length + index_length)'
+            ' FROM information_schema.tables GROUP BY table_schema',
+        )
+    )
+    logger.debug(f'{log_prefix}: Querying for MySQL database sizes')
+    size_output = execute_command_and_capture_output(
+        size_command, extra_environment=extra_environment
+    )
+    sizes = {}
+
+    for line in size_output.strip().splitlines():
+        (name, _, size) = line.partition('\t')
+        sizes[name] = int(size) if size.isdigit() else 0
+
+    return sizes
+
+
 def execute_dump_command(
-    database, log_prefix, dump_path, database_names, extra_environment, dry_run, dry_run_label
+    database,
+    log_prefix,
+    dump_path,
+    database_names,
+    extra_environment,
+    dry_run,
+    dry_run_label,
+    spool=False,
 ):
     '''
     Kick off a dump for the given MySQL/MariaDB database (provided as a configuration dict) to a
     named pipe constructed from the given dump path and database names. Use the given log prefix in
-    any log entries.
+    any log entries. If spool is True, dump to a regular file instead and run the dump to
+    completion, logging the dump's throughput. If the database's dumps are compressed, pipe the
+    dump through the compression command on its way to the named pipe or file.
 
-    Return a subprocess.Popen instance for the dump process ready to spew to a named pipe. But if
-    this is a dry run, then don't actually dump anything and return None.
+    Return a tuple of subprocess.Popen instances for the dump process (and any compression process)
+    ready to spew to a named pipe. But if this is a dry run or spool is True, then return an empty
+    tuple.
     '''
     database_name = database['name']
     dump_filename = dump.make_database_dump_filename(
@@ -76,7 +126,9 @@ def execute_dump_command(
         logger.warning(
             f'{log_prefix}: Skipping duplicate dump of MySQL database "{database_name}" to {dump_filename}'
         )
-        return None
+        return ()
+
+    compression = dump.dump_compression(database)
 
     dump_command = (
         ('mysqldump',)
@@ -88,33 +140,76 @@ def execute_dump_command(
         + (('--user', database['username']) if 'username' in database else ())
         + ('--databases',)
         + database_names
-        + ('--result-file', dump_filename)
+        # With compression, the dump goes to stdout for compressing.
+        + (() if compression else ('--result-file', dump_filename))
     )
 
     logger.debug(
         f'{log_prefix}: Dumping MySQL database "{database_name}" to {dump_filename}{dry_run_label}'
     )
     if dry_run:
-        return None
+        return ()
+
+    if spool:
+        dump.create_parent_directory_for_dump(dump_filename)
+        start_time = time.monotonic()
+
+        with timing.span(f'mysql_databases {database_name}', 'dump') as record:
+            if compression:
+                dump.execute_compressed_dump_command(
+                    dump_command,
+                    compression,
+                    dump_filename,
+                    extra_environment=extra_environment,
+                )
+            else:
+                execute_command(dump_command, extra_environment=extra_environment)
+
+            byte_count = os.path.getsize(dump_filename)
+            record['byte_count'] = byte_count
+
+        elapsed_seconds = time.monotonic() - start_time
+        logger.info(
+            f'{log_prefix}: Dumped MySQL database "{database_name}" ({format_byte_count(byte_count)})'
+            f' in {elapsed_seconds:.1f} seconds'
+            f' ({format_byte_count(int(byte_count / max(elapsed_seconds, 0.001)))}/s)'
+        )
+        return ()
 
     dump.create_named_pipe_for_dump(dump_filename)
 
-    return execute_command(
-        dump_command,
-        extra_environment=extra_environment,
-        run_to_completion=False,
+    if compression:
+        return dump.execute_compressed_dump_command(
+            dump_command,
+            compression,
+            dump_filename,
+            extra_environment=extra_environment,
+            run_to_completion=False,
+        )
+
+    return (
+        execute_command(
+            dump_command,
+            extra_environment=extra_environment,
+            run_to_completion=False,
+        ),
     )
 
 
-def dump_databases(databases, log_prefix, location_config, dry_run):
+def dump_databases(databases, log_prefix, location_config, dry_run, spool=False):
     '''
     Dump the given MySQL/MariaDB databases to a named pipe. The databases are supplied as a sequence
     of dicts, one dict describing each database as per the configuration schema. Use the given log
     prefix in any log entries. Use the given location configuration dict to construct the
-    destination path.
+    destination path. If spool is True, dump to regular files instead and run each dump to
+    completion, so that the dumps can be backed up to multiple repositories.
 
     Return a sequence of subprocess.Popen instances for the dump processes ready to spew to a named
-    pipe. But if this is a dry run, then don't actually dump anything and return an empty sequence.
+    pipe. But if this is a dry run or spool is True, then return an empty sequence.
+
+    When dumping "all" databases to separate spooled files, run up to the database's
+    "max_concurrent_dumps" dumps at once. When running several at once, the largest databases start
+    first, so that the longest dumps don't hold up the end of the run.
     '''
     dry_run_label = ' (dry run; not actually dumping anything)' if dry_run else ''
     processes = []
@@ -135,22 +230,52 @@ def dump_databases(databases, log_prefix, location_config, dry_run):
             raise ValueError('Cannot find any MySQL databases to dump.')
 
         if database['name'] == 'all' and database.get('format'):
+            renamed_databases = []
+
             for dump_name in dump_database_names:
                 renamed_database = copy.copy(database)
                 renamed_database['name'] = dump_name
-                processes.append(
-                    execute_dump_command(
-                        renamed_database,
-                        log_prefix,
-                        dump_path,
-                        (dump_name,),
-                        extra_environment,
-                        dry_run,
-                        dry_run_label,
+                renamed_databases.append(renamed_database)
+
+            max_concurrent_dumps = database.get('max_concurrent_dumps', 1)
+
+            if spool and max_concurrent_dumps > 1 and len(renamed_databases) > 1:
+                # Dumping the largest databases first is just an optimization, so fall back to the
+                # existing order if the sizes aren't available.
+                try:
+                    sizes = database_sizes(database, extra_environment, log_prefix)
+                except (subprocess.CalledProcessError, OSError) as error:
+                    logger.warning(
+                        f'{log_prefix}: Cannot query MySQL database sizes, so not dumping the largest databases first: {error}'
                     )
+                else:
+                    renamed_databases.sort(
+                        key=lambda renamed_database: sizes.get(renamed_database['name'], 0),
+                        reverse=True,
+                    )
+
+            dump_functions = [
+                functools.partial(
+                    execute_dump_command,
+                    renamed_database,
+                    log_prefix,
+                    dump_path,
+                    (renamed_database['name'],),
+                    extra_environment,
+                    dry_run,
+                    dry_run_label,
+                    spool,
                 )
+                for renamed_database in renamed_databases
+            ]
+
+            if spool:
+                dump.run_dumps(dump_functions, max_concurrent_dumps)
+            else:
+                for dump_function in dump_functions:
+                    processes.extend(dump_function())
         else:
-            processes.append(
+            processes.extend(
                 execute_dump_command(
                     database,
                     log_prefix,
@@ -159,10 +284,11 @@ def dump_databases(databases, log_prefix, location_config, dry_run):
                     extra_environment,
                     dry_run,
                     dry_run_label,
+                    spool,
                 )
             )
 
-    return [process for process in processes if process]
+    return processes
 
 
 def remove_database_dumps(databases, log_prefix, location_config, dry_run):  # pragma: no cover
@@ -185,13 +311,23 @@ def make_database_dump_pattern(
     return dump.make_database_dump_filename(make_dump_path(location_config), name, hostname='*')
 
 
-def restore_database_dump(database_config, log_prefix, location_config, dry_run, extract_process):
+def restore_database_dump(
+    database_config,
+    log_prefix,
+    location_config,
+    dry_run,
+    extract_process,
+    extract_stream=None,
+    compression=None,
+):
     '''
     Restore the given MySQL/MariaDB database from an extract stream. The database is supplied as a
     one-element sequence containing a dict describing the database, as per the configuration schema.
     Use the given log prefix in any log entries. If this is a dry run, then don't actually restore
     anything. Trigger the given active extract process (an instance of subprocess.Popen) to produce
-    output to consume.
+    output to consume. Or, if the extract process is None and an extract stream is given, consume
+    the dump from that open file object instead. If the name of the compression that the dump was
+    made with is given, then decompress the dump while restoring it.
     '''
     dry_run_label = ' (dry run; not actually restoring anything)' if dry_run else ''
 
@@ -213,12 +349,18 @@ def restore_database_dump(database_config, log_prefix, location_config, dry_run,
     if dry_run:
         return
 
+    (processes, input_file) = dump.decompress_restore_input(
+        [extract_process] if extract_process else [],
+        extract_process.stdout if extract_process else extract_stream,
+        compression,
+    )
+
     # Don't give Borg local path so as to error on warnings, as "borg extract" only gives a warning
     # if the restore paths don't exist in the archive.
     execute_command_with_processes(
         restore_command,
-        [extract_process],
+        processes,
         output_log_level=logging.DEBUG,
-        input_file=extract_process.stdout,
+        input_file=input_file,
         extra_environment=extra_environment,
     )
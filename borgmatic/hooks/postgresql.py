@@ -1,9 +1,12 @@
 import csv
+import functools
 import itertools
 import logging
 import os
 import shlex
+import subprocess
 
+from borgmatic import metrics, timing
 from borgmatic.execute import (
     execute_command,
     execute_command_and_capture_output,
@@ -82,15 +85,87 @@ def database_names_to_dump(database, extra_environment, log_prefix, dry_run):
     )
 
 
-def dump_databases(databases, log_prefix, location_config, dry_run):
+def database_sizes(database, extra_environment, log_prefix):
+    '''
+    Given a requested database config, query the configured host for the estimated size of each of
+    its databases. Return the sizes as a dict from database name to size in bytes. Databases that
+    the user can't connect to get a size of zero.
+
+    Connect to the "postgres" database to query, as a database named after the user may not exist.
+    But any "--dbname" in the database's list options takes precedence.
+
+    Raise subprocess.CalledProcessError or OSError if the query fails, or ValueError if its output
+    can't be parsed.
+    '''
+    psql_command = shlex.split(database.get('psql_command') or 'psql')
+    size_command = (
+        tuple(psql_command)
+        + ('--no-password', '--no-psqlrc', '--csv', '--tuples-only')
+        + (('--host', database['hostname']) if 'hostname' in database else ())
+        + (('--port', str(database['port'])) if 'port' in database else ())
+        + (('--username', database['username']) if 'username' in database else ())
+        + ('--dbname', 'postgres')
+        + (tuple(database['list_options'].split(' ')) if 'list_options' in database else ())
+        + (
+            '--command',
+            "SELECT datname, CASE WHEN has_database_privilege(datname, 'CONNECT')"
+            ' THEN pg_database_size(datname) ELSE 0 END FROM pg_database',
+        )
+    )
+    logger.debug(f'{log_prefix}: Querying for PostgreSQL database sizes')
+    size_output = execute_command_and_capture_output(
+        size_command, extra_environment=extra_environment
+    )
+
+    return {
+        row[0]: int(row[1])
+        for row in csv.reader(size_output.splitlines(), delimiter=',', quotechar='"')
+    }
+
+
+def run_dump_command(database_name, command, extra_environment, dump_filename, compression=None):
+    '''
+    Given a database name, a dump command, an extra environment dict, the dump filename that the
+    command writes to, and the name of any dump compression, create the dump's parent directory and
+    run the command to completion within a timing span that records the size of the dump. With
+    compression, the command writes to stdout instead, and its output gets compressed into the dump
+    file.
+    '''
+    dump.create_parent_directory_for_dump(dump_filename)
+
+    with timing.span(f'postgresql_databases {database_name}', 'dump') as record:
+        if compression:
+            dump.execute_compressed_dump_command(
+                command,
+                compression,
+                dump_filename,
+                shell=True,
+                extra_environment=extra_environment,
+            )
+        else:
+            execute_command(
+                command,
+                shell=True,
+                extra_environment=extra_environment,
+            )
+
+        record['byte_count'] = metrics.path_size(dump_filename)
+
+
+def dump_databases(databases, log_prefix, location_config, dry_run, spool=False):
     '''
     Dump the given PostgreSQL databases to a named pipe. The databases are supplied as a sequence of
     dicts, one dict describing each database as per the configuration schema. Use the given log
     prefix in any log entries. Use the given location configuration dict to construct the
-    destination path.
+    destination path. If spool is True, dump to regular files instead and run each dump to
+    completion, so that the dumps can be backed up to multiple repositories.
 
     Return a sequence of subprocess.Popen instances for the dump processes ready to spew to a named
-    pipe. But if this is a dry run, then don't actually dump anything and return an empty sequence.
+    pipe. But if this is a dry run or spool is True, then return an empty sequence.
+
+    Dumps that run to completion (because of spool or the "directory" format) run up to the
+    database's "max_concurrent_dumps" at once. When running several at once, the largest databases
+    start first, so that the longest dumps don't hold up the end of the run.
 
     Raise ValueError if the databases to dump cannot be determined.
     '''
@@ -112,10 +187,15 @@ def dump_databases(databases, log_prefix, location_config, dry_run):
 
             raise ValueError('Cannot find any PostgreSQL databases to dump.')
 
+        # Tuples of (database name, dump command, dump filename, compression) for dumps to run to
+        # completion.
+        completed_dumps = []
+
         for database_name in dump_database_names:
             dump_format = database.get('format', None if database_name == 'all' else 'custom')
             default_dump_command = 'pg_dumpall' if database_name == 'all' else 'pg_dump'
             dump_command = database.get('pg_dump_command') or default_dump_command
+            compression = None if dump_format == 'directory' else dump.dump_compression(database)
             dump_filename = dump.make_database_dump_filename(
                 dump_path, database_name, database.get('hostname')
             )
@@ -137,12 +217,19 @@ def dump_databases(databases, log_prefix, location_config, dry_run):
                 + (('--username', database['username']) if 'username' in database else ())
                 + (('--format', dump_format) if dump_format else ())
                 + (('--file', dump_filename) if dump_format == 'directory' else ())
+                # Only the directory format supports dumping with parallel jobs.
+                + (
+                    ('--jobs', str(database['jobs']))
+                    if 'jobs' in database and dump_format == 'directory'
+                    else ()
+                )
                 + (tuple(database['options'].split(' ')) if 'options' in database else ())
                 + (() if database_name == 'all' else (database_name,))
                 # Use shell redirection rather than the --file flag to sidestep synchronization issues
                 # when pg_dump/pg_dumpall tries to write to a named pipe. But for the directory dump
                 # format in a particular, a named destination is required, and redirection doesn't work.
-                + (('>', dump_filename) if dump_format != 'directory' else ())
+                # And with compression, the dump goes to stdout for compressing.
+                + (('>', dump_filename) if dump_format != 'directory' and not compression else ())
             )
 
             logger.debug(
@@ -151,12 +238,19 @@ def dump_databases(databases, log_prefix, location_config, dry_run):
             if dry_run:
                 continue
 
-            if dump_format == 'directory':
-                dump.create_parent_directory_for_dump(dump_filename)
-                execute_command(
-                    command,
-                    shell=True,
-                    extra_environment=extra_environment,
+            if dump_format == 'directory' or spool:
+                completed_dumps.append((database_name, command, dump_filename, compression))
+            elif compression:
+                dump.create_named_pipe_for_dump(dump_filename)
+                processes.extend(
+                    dump.execute_compressed_dump_command(
+                        command,
+                        compression,
+                        dump_filename,
+                        shell=True,
+                        extra_environment=extra_environment,
+                        run_to_completion=False,
+                    )
                 )
             else:
                 dump.create_named_pipe_for_dump(dump_filename)
@@ -169,6 +263,37 @@ def dump_databases(databases, log_prefix, location_config, dry_run):
                     )
                 )
 
+        max_concurrent_dumps = database.get('max_concurrent_dumps', 1)
+
+        if max_concurrent_dumps > 1 and len(completed_dumps) > 1:
+            # Dumping the largest databases first is just an optimization, so fall back to the
+            # existing order if the sizes aren't available.
+            try:
+                sizes = database_sizes(database, extra_environment, log_prefix)
+            except (subprocess.CalledProcessError, OSError, ValueError) as error:
+                logger.warning(
+                    f'{log_prefix}: Cannot query PostgreSQL database sizes, so not dumping the largest databases first: {error}'
+                )
+            else:
+                completed_dumps.sort(
+                    key=lambda completed_dump: sizes.get(completed_dump[0], 0), reverse=True
+                )
+
+        dump.run_dumps(
+            [
+                functools.partial(
+                    run_dump_command,
+                    database_name,
+                    command,
+                    extra_environment,
+                    dump_filename,
+                    compression=compression,
+                )
+                for (database_name, command, dump_filename, compression) in completed_dumps
+            ],
+            max_concurrent_dumps,
+        )
+
     return processes
 
 
@@ -192,13 +317,23 @@ def make_database_dump_pattern(
     return dump.make_database_dump_filename(make_dump_path(location_config), name, hostname='*')
 
 
-def restore_database_dump(database_config, log_prefix, location_config, dry_run, extract_process):
+def restore_database_dump(
+    database_config,
+    log_prefix,
+    location_config,
+    dry_run,
+    extract_process,
+    extract_stream=None,
+    compression=None,
+):
     '''
     Restore the given PostgreSQL database from an extract stream. The database is supplied as a
     one-element sequence containing a dict describing the database, as per the configuration schema.
     Use the given log prefix in any log entries. If this is a dry run, then don't actually restore
     anything. Trigger the given active extract process (an instance of subprocess.Popen) to produce
-    output to consume.
+    output to consume. Or, if the extract process is None and an extract stream is given, consume
+    the dump from that open file object instead. If the name of the compression that the dump was
+    made with is given, then decompress the dump while restoring it.
 
     If the extract process is None, then restore the dump from the filesystem rather than from an
     extract stream.
@@ -225,6 +360,7 @@ def restore_database_dump(database_config, log_prefix, location_config, dry_run,
         + ('--command', 'ANALYZE')
     )
     use_psql_command = all_databases or database.get('format') == 'plain'
+    restore_from_stream = bool(extract_process or extract_stream)
     pg_restore_command = shlex.split(database.get('pg_restore_command') or 'pg_restore')
     restore_command = (
         tuple(psql_command if use_psql_command else pg_restore_command)
@@ -234,8 +370,14 @@ def restore_database_dump(database_config, log_prefix, location_config, dry_run,
         + (('--host', database['hostname']) if 'hostname' in database else ())
         + (('--port', str(database['port'])) if 'port' in database else ())
         + (('--username', database['username']) if 'username' in database else ())
+        # pg_restore can't restore from a stream with parallel jobs.
+        + (
+            ('--jobs', str(database['jobs']))
+            if 'jobs' in database and not use_psql_command and not restore_from_stream
+            else ()
+        )
         + (tuple(database['restore_options'].split(' ')) if 'restore_options' in database else ())
-        + (() if extract_process else (dump_filename,))
+        + (() if restore_from_stream else (dump_filename,))
         + tuple(
             itertools.chain.from_iterable(('--schema', schema) for schema in database['schemas'])
             if database['schemas']
@@ -249,13 +391,19 @@ def restore_database_dump(database_config, log_prefix, location_config, dry_run,
     if dry_run:
         return
 
+    (processes, input_file) = dump.decompress_restore_input(
+        [extract_process] if extract_process else [],
+        extract_process.stdout if extract_process else extract_stream,
+        compression,
+    )
+
     # Don't give Borg local path so as to error on warnings, as "borg extract" only gives a warning
     # if the restore paths don't exist in the archive.
     execute_command_with_processes(
         restore_command,
-        [extract_process] if extract_process else [],
+        processes,
         output_log_level=logging.DEBUG,
-        input_file=extract_process.stdout if extract_process else None,
+        input_file=input_file,
         extra_environment=extra_environment,
     )
     execute_command(analyze_command, extra_environment=extra_environment)
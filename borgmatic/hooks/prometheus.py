@@ -0,0 +1,83 @@
+import logging
+import time
+
+from borgmatic import metrics
+from borgmatic.hooks import monitor
+
+logger = logging.getLogger(__name__)
+
+
+def initialize_monitor(
+    hook_config, config_filename, monitoring_log_level, dry_run
+):  # pragma: no cover
+    '''
+    No initialization is necessary for this monitor.
+    '''
+    pass
+
+
+def ping_monitor(hook_config, config_filename, state, monitoring_log_level, dry_run):
+    '''
+    When a backup starts, begin collecting metrics for the given configuration filename. When it
+    finishes or fails, write those metrics to the configured Prometheus textfile, along with the
+    duration and success of each action and the time of the last successful run. Use the
+    configuration filename in any log entries. If this is a dry run, then don't actually write
+    anything.
+    '''
+    if state == monitor.State.START:
+        metrics.start_collecting(config_filename)
+        return
+
+    if state not in (monitor.State.FINISH, monitor.State.FAIL):
+        logger.debug(
+            f'{config_filename}: Ignoring unsupported monitoring {state.name.lower()} in Prometheus hook'
+        )
+        return
+
+    textfile = hook_config['textfile']
+    dry_run_label = ' (dry run; not actually writing)' if dry_run else ''
+    logger.info(f'{config_filename}: Writing Prometheus metrics to {textfile}{dry_run_label}')
+
+    now = time.time()
+    succeeded = state == monitor.State.FINISH
+    last_success_timestamp = (
+        now
+        if succeeded
+        else metrics.read_sample_value(textfile, 'borgmatic_last_success_timestamp_seconds')
+    )
+    samples = (
+        metrics.pop_samples(config_filename)
+        + [
+            (config_filename, 'borgmatic_last_run_timestamp_seconds', {}, now),
+            (config_filename, 'borgmatic_last_run_succeeded', {}, int(succeeded)),
+        ]
+        + (
+            [
+                (
+                    config_filename,
+                    'borgmatic_last_success_timestamp_seconds',
+                    {},
+                    last_success_timestamp,
+                )
+            ]
+            if last_success_timestamp is not None
+            else []
+        )
+    )
+
+    if dry_run:
+        return
+
+    try:
+        metrics.write_textfile(metrics.format_samples(samples), textfile)
+    except OSError as error:
+        logger.warning(f'{config_filename}: Error writing Prometheus metrics: {error}')
+
+
+def destroy_monitor(
+    hook_config, config_filename, monitoring_log_level, dry_run
+):  # pragma: no cover
+    '''
+    No destruction is necessary for this monitor.
+    '''
+    pass
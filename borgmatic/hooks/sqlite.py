@@ -1,6 +1,7 @@
 import logging
 import os
 
+from borgmatic import metrics, timing
 from borgmatic.execute import execute_command, execute_command_with_processes
 from borgmatic.hooks import dump
 
@@ -16,12 +17,13 @@ def make_dump_path(location_config):  # pragma: no cover
     )
 
 
-def dump_databases(databases, log_prefix, location_config, dry_run):
+def dump_databases(databases, log_prefix, location_config, dry_run, spool=False):
     '''
     Dump the given SQLite3 databases to a file. The databases are supplied as a sequence of
     configuration dicts, as per the configuration schema. Use the given log prefix in any log
     entries. Use the given location configuration dict to construct the destination path. If this
-    is a dry run, then don't actually dump anything.
+    is a dry run, then don't actually dump anything. If spool is True, run each dump to completion
+    rather than returning its process.
     '''
     dry_run_label = ' (dry run; not actually dumping anything)' if dry_run else ''
     processes = []
@@ -46,13 +48,13 @@ def dump_databases(databases, log_prefix, location_config, dry_run):
             )
             continue
 
+        compression = dump.dump_compression(database)
         command = (
             'sqlite3',
             database_path,
             '.dump',
-            '>',
-            dump_filename,
-        )
+            # With compression, the dump goes to stdout for compressing.
+        ) + (() if compression else ('>', dump_filename))
         logger.debug(
             f'{log_prefix}: Dumping SQLite database at {database_path} to {dump_filename}{dry_run_label}'
         )
@@ -60,7 +62,25 @@ def dump_databases(databases, log_prefix, location_config, dry_run):
             continue
 
         dump.create_parent_directory_for_dump(dump_filename)
-        processes.append(execute_command(command, shell=True, run_to_completion=False))
+
+        if spool:
+            with timing.span(f'sqlite_databases {database["name"]}', 'dump') as record:
+                if compression:
+                    dump.execute_compressed_dump_command(
+                        command, compression, dump_filename, shell=True
+                    )
+                else:
+                    execute_command(command, shell=True)
+
+                record['byte_count'] = metrics.path_size(dump_filename)
+        elif compression:
+            processes.extend(
+                dump.execute_compressed_dump_command(
+                    command, compression, dump_filename, shell=True, run_to_completion=False
+                )
+            )
+        else:
+            processes.append(execute_command(command, shell=True, run_to_completion=False))
 
     return processes
 
@@ -85,13 +105,23 @@ def make_database_dump_pattern(
     return dump.make_database_dump_filename(make_dump_path(location_config), name)
 
 
-def restore_database_dump(database_config, log_prefix, location_config, dry_run, extract_process):
+def restore_database_dump(
+    database_config,
+    log_prefix,
+    location_config,
+    dry_run,
+    extract_process,
+    extract_stream=None,
+    compression=None,
+):
     '''
     Restore the given SQLite3 database from an extract stream. The database is supplied as a
     one-element sequence containing a dict describing the database, as per the configuration schema.
     Use the given log prefix in any log entries. If this is a dry run, then don't actually restore
     anything. Trigger the given active extract process (an instance of subprocess.Popen) to produce
-    output to consume.
+    output to consume. Or, if the extract process is None and an extract stream is given, consume
+    the dump from that open file object instead. If the name of the compression that the dump was
+    made with is given, then decompress the dump while restoring it.
     '''
     dry_run_label = ' (dry run; not actually restoring anything)' if dry_run else ''
 
@@ -115,11 +145,17 @@ def restore_database_dump(database_config, log_prefix, location_config, dry_run,
         database_path,
     )
 
+    (processes, input_file) = dump.decompress_restore_input(
+        [extract_process] if extract_process else [],
+        extract_process.stdout if extract_process else extract_stream,
+        compression,
+    )
+
     # Don't give Borg local path so as to error on warnings, as "borg extract" only gives a warning
     # if the restore paths don't exist in the archive.
     execute_command_with_processes(
         restore_command,
-        [extract_process],
+        processes,
         output_log_level=logging.DEBUG,
-        input_file=extract_process.stdout,
+        input_file=input_file,
     )
@@ -85,6 +85,40 @@ class Multi_stream_handler(logging.Handler):
             handler.setLevel(level)
 
 
+def flatten_log_record(record, tag=None):
+    '''
+    Given a logging.LogRecord instance and an optional tag string, return a new log record with the
+    same level and the fully formatted message as a plain string, prefixed with the tag (unless the
+    message already starts with it). The result doesn't reference any arbitrary objects, so it can
+    be pickled, e.g. to send it between processes.
+    '''
+    message = record.getMessage()
+
+    if tag and not message.startswith(f'{tag}: '):
+        message = f'{tag}: {message}'
+
+    return logging.makeLogRecord(
+        dict(levelno=record.levelno, levelname=record.levelname, msg=message)
+    )
+
+
+class Log_record_buffering_handler(logging.Handler):
+    '''
+    A logging handler that holds onto each log record in memory instead of emitting it, so that the
+    records can be handled later as a group (for instance, back in a parent process). Each buffered
+    record is flattened and tagged as per flatten_log_record().
+    '''
+
+    def __init__(self, tag=None):
+        super().__init__()
+
+        self.tag = tag
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(flatten_log_record(record, self.tag))
+
+
 class Console_color_formatter(logging.Formatter):
     def format(self, record):
         add_custom_log_levels()
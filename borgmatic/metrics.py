@@ -0,0 +1,273 @@
+import collections
+import contextlib
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Metric name to a tuple of (metric type, help text) for each metric that borgmatic exports, in the
+# order that they get written.
+METRICS = collections.OrderedDict(
+    (
+        (
+            'borgmatic_action_duration_seconds',
+            ('gauge', 'Seconds taken by each action for each repository in the most recent run.'),
+        ),
+        (
+            'borgmatic_action_succeeded',
+            ('gauge', 'Whether each action succeeded (1) or failed (0) in the most recent run.'),
+        ),
+        (
+            'borgmatic_archive_original_bytes',
+            ('gauge', 'Original size of the most recently created archive.'),
+        ),
+        (
+            'borgmatic_archive_compressed_bytes',
+            ('gauge', 'Compressed size of the most recently created archive.'),
+        ),
+        (
+            'borgmatic_archive_deduplicated_bytes',
+            ('gauge', 'Deduplicated size of the most recently created archive.'),
+        ),
+        (
+            'borgmatic_archive_files',
+            ('gauge', 'Number of files processed for the most recently created archive.'),
+        ),
+        (
+            'borgmatic_database_dump_bytes',
+            ('gauge', 'Size of spooled database dumps in the most recent run.'),
+        ),
+        (
+            'borgmatic_last_run_timestamp_seconds',
+            ('gauge', 'Time that the most recent run finished, in seconds since the epoch.'),
+        ),
+        (
+            'borgmatic_last_run_succeeded',
+            ('gauge', 'Whether the most recent run succeeded (1) or failed (0).'),
+        ),
+        (
+            'borgmatic_last_success_timestamp_seconds',
+            (
+                'gauge',
+                'Time that the most recent successful run finished, in seconds since the epoch.',
+            ),
+        ),
+    )
+)
+
+# Borg "create --json" archive stats key to the corresponding metric name.
+ARCHIVE_STAT_METRICS = (
+    ('original_size', 'borgmatic_archive_original_bytes'),
+    ('compressed_size', 'borgmatic_archive_compressed_bytes'),
+    ('deduplicated_size', 'borgmatic_archive_deduplicated_bytes'),
+    ('nfiles', 'borgmatic_archive_files'),
+)
+
+# Samples recorded so far in this process, as (config filename, metric name, labels dict, value)
+# tuples.
+SAMPLES = []
+SAMPLES_LOCK = threading.Lock()
+
+# Configuration filenames to time actions for, as per start_collecting(). This is empty unless a
+# monitoring hook asks for metrics, so that a normal run doesn't do any extra work.
+COLLECTING_CONFIG_FILENAMES = set()
+
+
+def record(config_filename, name, value, **labels):
+    '''
+    Given a configuration filename, a metric name from METRICS, a numeric value, and any labels for
+    the sample, record the sample for later export.
+    '''
+    with SAMPLES_LOCK:
+        SAMPLES.append((config_filename, name, labels, value))
+
+
+def record_action(config_filename, action_name, repository_path, duration, succeeded):
+    '''
+    Given a configuration filename, an action name, a repository path, the number of seconds that
+    the action took, and whether it succeeded, record samples for the action's duration and success.
+    If the action already ran for the repository (e.g. due to retries), then add to its existing
+    duration and replace its success with this one.
+    '''
+    labels = {'action': action_name, 'repository': repository_path}
+
+    with SAMPLES_LOCK:
+        for name, value in (
+            ('borgmatic_action_duration_seconds', duration),
+            ('borgmatic_action_succeeded', int(succeeded)),
+        ):
+            index = next(
+                (
+                    index
+                    for index, sample in enumerate(SAMPLES)
+                    if sample[:3] == (config_filename, name, labels)
+                ),
+                None,
+            )
+
+            if index is None:
+                SAMPLES.append((config_filename, name, labels, value))
+            elif name == 'borgmatic_action_duration_seconds':
+                SAMPLES[index] = (config_filename, name, labels, SAMPLES[index][3] + value)
+            else:
+                SAMPLES[index] = (config_filename, name, labels, value)
+
+
+@contextlib.contextmanager
+def action(config_filename, action_name, repository_path):
+    '''
+    Given a configuration filename, an action name, and a repository path, time the action run
+    within this context manager and record its duration and success as per record_action(). But
+    only do that if collecting metrics for the configuration file.
+    '''
+    if config_filename not in COLLECTING_CONFIG_FILENAMES:
+        yield
+        return
+
+    start_time = time.monotonic()
+    succeeded = False
+
+    try:
+        yield
+        succeeded = True
+    finally:
+        record_action(
+            config_filename,
+            action_name,
+            repository_path,
+            time.monotonic() - start_time,
+            succeeded,
+        )
+
+
+def record_archive_stats(config_filename, repository_path, create_output):
+    '''
+    Given a configuration filename, a repository path, and the parsed JSON output of "borg create
+    --json" as a dict, record samples for the created archive's stats. Skip any stats that this
+    version of Borg doesn't report.
+    '''
+    stats = create_output.get('archive', {}).get('stats', {})
+
+    for stat_name, metric_name in ARCHIVE_STAT_METRICS:
+        if stat_name in stats:
+            record(config_filename, metric_name, stats[stat_name], repository=repository_path)
+
+
+def path_size(path):
+    '''
+    Given a path to a file or directory, return its size in bytes, including everything within it
+    in the case of a directory. Don't follow symlinks. Return 0 if the path doesn't exist.
+    '''
+    if not os.path.lexists(path):
+        return 0
+
+    if not os.path.isdir(path) or os.path.islink(path):
+        return os.lstat(path).st_size
+
+    return sum(
+        os.lstat(os.path.join(directory, name)).st_size
+        for directory, subdirectories, names in os.walk(path)
+        for name in subdirectories + names
+    )
+
+
+def start_collecting(config_filename):
+    '''
+    Given a configuration filename, forget any samples recorded for it so far, and start timing its
+    actions via action().
+    '''
+    with SAMPLES_LOCK:
+        SAMPLES[:] = [sample for sample in SAMPLES if sample[0] != config_filename]
+        COLLECTING_CONFIG_FILENAMES.add(config_filename)
+
+
+def pop_samples(config_filename):
+    '''
+    Given a configuration filename, return a list of all samples recorded so far for it, and
+    forget them. Also stop timing its actions.
+    '''
+    with SAMPLES_LOCK:
+        samples = [sample for sample in SAMPLES if sample[0] == config_filename]
+        SAMPLES[:] = [sample for sample in SAMPLES if sample[0] != config_filename]
+        COLLECTING_CONFIG_FILENAMES.discard(config_filename)
+
+    return samples
+
+
+def escape_label_value(value):
+    '''
+    Given a label value, return it escaped as per the Prometheus text exposition format.
+    '''
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_samples(samples):
+    '''
+    Given a sequence of (config filename, metric name, labels dict, value) samples, return them as a
+    string in the Prometheus text exposition format, as read by the node_exporter textfile
+    collector. Label each sample with its configuration filename.
+    '''
+    lines = []
+
+    for name, (metric_type, help_text) in METRICS.items():
+        metric_samples = [sample for sample in samples if sample[1] == name]
+
+        if not metric_samples:
+            continue
+
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+
+        for config_filename, _, labels, value in metric_samples:
+            formatted_labels = ','.join(
+                f'{label_name}="{escape_label_value(label_value)}"'
+                for label_name, label_value in (('config_file', config_filename),)
+                + tuple(labels.items())
+            )
+            lines.append(f'{name}{{{formatted_labels}}} {value}')
+
+    return ''.join(f'{line}\n' for line in lines)
+
+
+def read_sample_value(filename, name):
+    '''
+    Given the path to a textfile previously written by write_textfile() and a metric name, return
+    the value of the first sample for that metric in the file as a float. Return None if the file
+    or the sample doesn't exist or the value can't be parsed.
+    '''
+    try:
+        with open(filename) as textfile:
+            for line in textfile:
+                if line.startswith(f'{name}{{') or line.startswith(f'{name} '):
+                    return float(line.rsplit(' ', 1)[-1])
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+
+def write_textfile(text, filename):
+    '''
+    Given the text for a textfile and a path to write it to, write the text to a temporary file in
+    the same directory and then move it into place. That way, a collector reading the textfile
+    never sees a partially written file.
+    '''
+    directory = os.path.dirname(os.path.abspath(filename))
+    (temporary_descriptor, temporary_filename) = tempfile.mkstemp(
+        dir=directory, prefix='.borgmatic-', suffix='.tmp'
+    )
+
+    try:
+        with os.fdopen(temporary_descriptor, 'w') as temporary_file:
+            temporary_file.write(text)
+
+        # Match the permissions that a collector running as a different user expects.
+        os.chmod(temporary_filename, 0o644)
+        os.replace(temporary_filename, filename)
+    except OSError:
+        os.remove(temporary_filename)
+        raise
@@ -0,0 +1,180 @@
+import concurrent.futures
+import fcntl
+import logging
+import os
+import sys
+import threading
+import time
+
+from borgmatic import timing
+
+logger = logging.getLogger(__name__)
+
+
+# Size to enlarge pipe buffers to, so that the processes on either end of a pipe can transfer data
+# in larger batches with fewer context switches. This is the default maximum that unprivileged
+# processes can set on Linux (see /proc/sys/fs/pipe-max-size).
+PIPE_BUFFER_SIZE = 1024 * 1024
+
+# The fcntl constant for setting a pipe's buffer size. It's only exposed by Python 3.10+, but it's
+# been available on Linux for much longer.
+F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031 if sys.platform.startswith('linux') else None)
+
+# os.splice() is only available on Linux with Python 3.10+.
+SPLICE_AVAILABLE = hasattr(os, 'splice')
+
+
+def set_pipe_size(file_descriptor, size=PIPE_BUFFER_SIZE):
+    '''
+    Given a file descriptor for either end of a pipe and a buffer size in bytes, try to enlarge the
+    pipe's buffer to that size. Return whether it worked. This is best-effort, as it's Linux-only
+    and the size may exceed the system limit.
+    '''
+    if F_SETPIPE_SZ is None:
+        return False
+
+    try:
+        fcntl.fcntl(file_descriptor, F_SETPIPE_SZ, size)
+    except OSError as error:
+        logger.debug(f'Cannot set pipe buffer size to {size} bytes: {error}')
+        return False
+
+    return True
+
+
+def splice_all(source_descriptor, destination_descriptor, chunk_size=PIPE_BUFFER_SIZE):
+    '''
+    Given source and destination file descriptors (at least one of which is a pipe), move data from
+    the source to the destination with os.splice() until the source reaches end of file or the
+    destination's reader goes away. Because os.splice() moves data within the kernel, the data never
+    gets copied through borgmatic.
+
+    Return the number of bytes moved.
+    '''
+    byte_count = 0
+
+    while True:
+        try:
+            spliced_count = os.splice(source_descriptor, destination_descriptor, chunk_size)
+        except BrokenPipeError:
+            break
+
+        if not spliced_count:
+            break
+
+        byte_count += spliced_count
+
+    return byte_count
+
+
+def copy_all(source_descriptor, destination_descriptor, chunk_size=PIPE_BUFFER_SIZE):
+    '''
+    Given source and destination file descriptors, copy data from the source to the destination
+    through borgmatic until the source reaches end of file or the destination's reader goes away.
+    This is the fallback for when os.splice() isn't available.
+
+    Return the number of bytes copied.
+    '''
+    byte_count = 0
+
+    try:
+        while True:
+            chunk = os.read(source_descriptor, chunk_size)
+
+            if not chunk:
+                break
+
+            remaining = memoryview(chunk)
+
+            while remaining:
+                remaining = remaining[os.write(destination_descriptor, remaining) :]
+
+            byte_count += len(chunk)
+    except BrokenPipeError:
+        pass
+
+    return byte_count
+
+
+def format_byte_count(byte_count):
+    '''
+    Given a number of bytes, return it as a human-readable string like "1.5 GiB".
+    '''
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if byte_count < 1024:
+            break
+
+        byte_count /= 1024
+    else:
+        unit = 'TiB'
+
+    return f'{byte_count:.1f} {unit}' if unit != 'B' else f'{byte_count} {unit}'
+
+
+def relay(source, destination_descriptor, log_prefix):
+    '''
+    Given an open source file object, a destination file descriptor, and a log prefix, move all
+    data from the source to the destination as per splice_all() (or copy_all() if os.splice() isn't
+    available), close both, and log the resulting throughput. Return a tuple of (number of bytes
+    moved, elapsed seconds).
+    '''
+    start_time = time.monotonic()
+    move_all = splice_all if SPLICE_AVAILABLE else copy_all
+
+    with timing.span(log_prefix, 'stream') as record:
+        try:
+            byte_count = move_all(source.fileno(), destination_descriptor)
+            record['byte_count'] = byte_count
+        finally:
+            source.close()
+            os.close(destination_descriptor)
+
+    elapsed_seconds = time.monotonic() - start_time
+    logger.info(
+        f'{log_prefix}: Streamed {format_byte_count(byte_count)} in {elapsed_seconds:.1f} seconds'
+        f' ({format_byte_count(int(byte_count / max(elapsed_seconds, 0.001)))}/s)'
+    )
+
+    return (byte_count, elapsed_seconds)
+
+
+def start_relay(source, log_prefix, prefix=b''):
+    '''
+    Given an open file object for the read end of a pipe (e.g. a subprocess.Popen instance's
+    stdout), a log prefix, and any bytes already read from the source to put back in front of its
+    data, start moving data from it into a new pipe with an enlarged buffer, in a background thread. Return a tuple of (file object for the read end of the new pipe, a
+    concurrent.futures.Future for the relay's result as per relay()).
+
+    This is meant for streaming data from one process to another (e.g. from "borg extract" to a
+    database client) while reporting on throughput, without copying the data through borgmatic. So
+    pass the returned file object as the consuming process' stdin, and then close it once that
+    process has finished. The relay finishes when the source reaches end of file or when the
+    consuming process has exited and the returned file object is closed.
+
+    If os.splice() isn't available (non-Linux platforms or Python < 3.10), then the relay copies
+    data through borgmatic instead. So in that case, if there's no prefix to put back, just return
+    the given source along with a None future.
+    '''
+    if not SPLICE_AVAILABLE and not prefix:
+        return (source, None)
+
+    (read_descriptor, write_descriptor) = os.pipe()
+    set_pipe_size(source.fileno())
+    set_pipe_size(write_descriptor)
+
+    # The new pipe is empty, so a prefix shorter than its buffer gets written without blocking.
+    os.write(write_descriptor, prefix)
+
+    future = concurrent.futures.Future()
+
+    def run_relay():
+        try:
+            future.set_result(relay(source, write_descriptor, log_prefix))
+        except BaseException as error:
+            future.set_exception(error)
+
+    # Use a daemon thread so that a relay stuck on a consumer that never reads can't prevent
+    # borgmatic from exiting.
+    threading.Thread(target=run_relay, daemon=True).start()
+
+    return (os.fdopen(read_descriptor, 'rb'), future)
@@ -25,10 +25,23 @@ def handle_signal(signal_number, frame):
         sys.exit(EXIT_CODE_FROM_SIGNAL + signal.SIGTERM)
 
 
+PASSED_THROUGH_SIGNALS = (signal.SIGHUP, signal.SIGTERM, signal.SIGUSR1, signal.SIGUSR2)
+
+
 def configure_signals():
     '''
     Configure borgmatic's signal handlers to pass relevant signals through to any child processes
     like Borg. Note that SIGINT gets passed through even without these changes.
     '''
-    for signal_number in (signal.SIGHUP, signal.SIGTERM, signal.SIGUSR1, signal.SIGUSR2):
+    for signal_number in PASSED_THROUGH_SIGNALS:
         signal.signal(signal_number, handle_signal)
+
+
+def restore_default_signals():
+    '''
+    Restore default handling of the signals that configure_signals() passes through. This is for
+    borgmatic's own worker processes, which are in the same process group and therefore already
+    receive any passed-through signals. Passing them through again would send them right back.
+    '''
+    for signal_number in PASSED_THROUGH_SIGNALS:
+        signal.signal(signal_number, signal.SIG_DFL)
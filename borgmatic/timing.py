@@ -0,0 +1,221 @@
+import collections
+import contextlib
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Whether to record timing spans at all. This is off unless a command-line flag asks for timings,
+# so that a normal run doesn't accumulate spans in memory.
+ENABLED = False
+
+# Spans recorded so far in this process, as dicts. See span() for their contents.
+SPANS = []
+SPANS_LOCK = threading.Lock()
+
+# The spans currently open on each thread, so that a span can inherit the repository of a span
+# enclosing it. For instance, that way a command run for an action gets the action's repository.
+OPEN_SPANS = threading.local()
+
+SUBCOMMAND_PATTERN = re.compile(r'^[a-z][a-z0-9-]*$')
+
+
+def enable():
+    '''
+    Start recording timing spans.
+    '''
+    global ENABLED
+    ENABLED = True
+
+
+def get_open_spans():
+    '''
+    Return a list of the spans currently open on this thread, innermost last.
+    '''
+    if not hasattr(OPEN_SPANS, 'records'):
+        OPEN_SPANS.records = []
+
+    return OPEN_SPANS.records
+
+
+@contextlib.contextmanager
+def span(name, kind, **attributes):
+    '''
+    Given a span name (e.g. "create"), the kind of thing being timed (e.g. "action"), and any other
+    attributes to record (e.g. a repository path), time the code run within this context manager
+    and record the result as a span. The span is a dict with those keys, plus:
+
+      * "start": the start time in seconds since the epoch
+      * "duration": the elapsed seconds
+      * "status": "succeeded" or "failed", the latter if an exception propagated out of the span
+      * "exit_code": the exit code of a failed command, if the exception was a CalledProcessError
+
+    Yield the span dict, so that the code being timed can add its own measurements, e.g. an
+    "exit_code" for a completed command or a "byte_count" for data moved.
+
+    If no repository is given, then inherit the repository of the innermost enclosing span on the
+    same thread, if any.
+
+    If recording isn't enabled, then still yield a dict, but don't record it.
+    '''
+    if not ENABLED:
+        yield {'name': name, 'kind': kind, **attributes}
+        return
+
+    open_spans = get_open_spans()
+    record = {
+        'name': name,
+        'kind': kind,
+        **next(
+            (
+                {'repository': open_span['repository']}
+                for open_span in reversed(open_spans)
+                if 'repository' in open_span
+            ),
+            {},
+        ),
+        **attributes,
+    }
+    record['start'] = time.time()
+    start_time = time.monotonic()
+    status = 'succeeded'
+    open_spans.append(record)
+
+    try:
+        yield record
+    except subprocess.CalledProcessError as error:
+        status = 'failed'
+        record['exit_code'] = error.returncode
+        raise
+    except Exception:
+        status = 'failed'
+        raise
+    finally:
+        record['duration'] = time.monotonic() - start_time
+        record['status'] = status
+
+        # Spans opened within generators don't necessarily close in the order that they opened, so
+        # remove this particular span rather than the innermost one.
+        del open_spans[
+            next(index for index, open_span in enumerate(open_spans) if open_span is record)
+        ]
+
+        with SPANS_LOCK:
+            SPANS.append(record)
+
+
+def command_span_name(full_command):
+    '''
+    Given a command as a sequence of command/argument strings, return a short name for it to use as
+    a span name: the command's base name along with any subcommand, e.g. "borg create". Mark a dry
+    run as such, so that it doesn't get lumped in with the real thing, e.g. "borg create --dry-run".
+    '''
+    name = os.path.basename(full_command[0].split(' ', 1)[0]) if full_command else ''
+
+    if len(full_command) > 1 and SUBCOMMAND_PATTERN.match(full_command[1]):
+        name = f'{name} {full_command[1]}'
+
+    if '--dry-run' in full_command[1:]:
+        return f'{name} --dry-run'
+
+    return name
+
+
+def pop_spans():
+    '''
+    Return a list of all spans recorded so far, and forget them.
+    '''
+    with SPANS_LOCK:
+        spans = list(SPANS)
+        SPANS.clear()
+
+    return spans
+
+
+def record_spans(spans):
+    '''
+    Given a sequence of spans recorded elsewhere (e.g. in a worker process), record them as if they
+    were recorded here.
+    '''
+    with SPANS_LOCK:
+        SPANS.extend(spans)
+
+
+def write_json_lines(spans, filename):
+    '''
+    Given a sequence of spans and a filename, write the spans to that file as JSON lines, one span
+    per line.
+    '''
+    with open(filename, 'w') as timing_file:
+        for recorded_span in spans:
+            timing_file.write(json.dumps(recorded_span, default=str) + '\n')
+
+
+def summarize_spans(spans):
+    '''
+    Given a sequence of spans, return a summary of them as a tuple of table rows (each a tuple of
+    strings), starting with a header row. Spans with the same kind, name, and repository get
+    combined into a single row, in the order that they started.
+    '''
+    totals = collections.OrderedDict()
+
+    for recorded_span in sorted(spans, key=lambda recorded_span: recorded_span['start']):
+        key = (recorded_span['kind'], recorded_span['name'], recorded_span.get('repository', ''))
+        total = totals.setdefault(
+            key, {'count': 0, 'duration': 0.0, 'max_duration': 0.0, 'failed': 0, 'byte_count': None}
+        )
+        total['count'] += 1
+        total['duration'] += recorded_span['duration']
+        total['max_duration'] = max(total['max_duration'], recorded_span['duration'])
+        total['failed'] += int(recorded_span['status'] == 'failed')
+
+        if recorded_span.get('byte_count') is not None:
+            total['byte_count'] = (total['byte_count'] or 0) + recorded_span['byte_count']
+
+    return (
+        ('Kind', 'Name', 'Repository', 'Count', 'Total (s)', 'Max (s)', 'Failed', 'Bytes'),
+    ) + tuple(
+        (
+            kind,
+            name,
+            repository,
+            str(total['count']),
+            f"{total['duration']:.2f}",
+            f"{total['max_duration']:.2f}",
+            str(total['failed']),
+            '' if total['byte_count'] is None else str(total['byte_count']),
+        )
+        for (kind, name, repository), total in totals.items()
+    )
+
+
+def format_table(rows):
+    '''
+    Given a sequence of table rows (each a tuple of strings), return the table as a tuple of text
+    lines with aligned columns.
+    '''
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+
+    return tuple(
+        '  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in rows
+    )
+
+
+def log_summary(spans):
+    '''
+    Given a sequence of spans, log a summary table of them.
+    '''
+    if not spans:
+        return
+
+    logger.answer('')
+    logger.answer('timings:')
+
+    for line in format_table(summarize_spans(spans)):
+        logger.answer(line)
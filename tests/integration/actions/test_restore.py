@@ -0,0 +1,217 @@
+import io
+import subprocess
+import tarfile
+
+import pytest
+from flexmock import flexmock
+
+import borgmatic.actions.restore as module
+
+
+def write_tar_file(path, members):
+    '''
+    Given a path and a dict from member name to member data (or None for a directory), write a tar
+    file containing those members.
+    '''
+    with tarfile.open(path, mode='w') as tar:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+
+            if data is None:
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+                continue
+
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+def mock_hooks(restored_dumps, restore_error_name=None, restored_compressions=None):
+    '''
+    Mock the database hooks to produce dump patterns and to "restore" each database by reading its
+    dump into the given dict from database name to dump data. If a dict for restored compressions is
+    given, then also record the compression that each database's restore was given.
+    '''
+
+    def call_hooks(function_name, hooks, log_prefix, hook_names, *args, **kwargs):
+        if function_name == 'make_database_dump_pattern':
+            (_, database_name) = args
+            hook_name = 'mysql_databases' if database_name == 'bar' else 'postgresql_databases'
+
+            return {hook_name: f'/root/.borgmatic/{hook_name}/*/{database_name}'}
+
+        (database,) = next(iter(hooks.values()))
+
+        if database['name'] == restore_error_name:
+            raise ValueError('Oops')
+
+        if database['name'] == 'early':
+            return
+
+        restored_dumps[database['name']] = kwargs['extract_stream'].read()
+
+        if restored_compressions is not None:
+            restored_compressions[database['name']] = kwargs['compression']
+
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks').replace_with(call_hooks)
+
+
+def restore_in_single_pass(export_process, database_names, jobs=1):
+    flexmock(module.borgmatic.borg.export_tar).should_receive('export_tar_archive').and_return(
+        export_process
+    )
+
+    module.restore_databases_in_single_pass(
+        'repo',
+        location={},
+        storage={},
+        hooks={},
+        local_borg_version='1.2.3',
+        global_arguments=flexmock(dry_run=False),
+        local_path='borg',
+        remote_path=None,
+        archive_name='archive',
+        hook_databases=[
+            ('mysql_databases' if name == 'bar' else 'postgresql_databases', {'name': name})
+            for name in database_names
+        ],
+        jobs=jobs,
+    )
+
+
+@pytest.mark.parametrize('jobs', (1, 2))
+def test_restore_databases_in_single_pass_demultiplexes_dumps_to_each_database(tmp_path, jobs):
+    tar_path = tmp_path / 'archive.tar'
+    foo_dump = b'foo' * 1000000
+    bar_dump = b'bar' * 1000
+    write_tar_file(
+        tar_path,
+        {
+            'root/.borgmatic/postgresql_databases': None,
+            'root/.borgmatic/postgresql_databases/localhost/foo': foo_dump,
+            'root/.borgmatic/mysql_databases/localhost/bar': bar_dump,
+            'root/.borgmatic/postgresql_databases/localhost/unselected': b'nope',
+        },
+    )
+    restored_dumps = {}
+    mock_hooks(restored_dumps)
+
+    restore_in_single_pass(
+        subprocess.Popen(('cat', str(tar_path)), stdout=subprocess.PIPE, stderr=subprocess.PIPE),
+        ('foo', 'bar'),
+        jobs=jobs,
+    )
+
+    assert restored_dumps == {'foo': foo_dump, 'bar': bar_dump}
+
+
+def test_restore_databases_in_single_pass_detects_compression_and_feeds_whole_dump(tmp_path):
+    tar_path = tmp_path / 'archive.tar'
+    foo_dump = b'\x1f\x8b' + b'foo' * 1000
+    bar_dump = b'ba'
+    write_tar_file(
+        tar_path,
+        {
+            'root/.borgmatic/postgresql_databases/localhost/foo': foo_dump,
+            'root/.borgmatic/mysql_databases/localhost/bar': bar_dump,
+        },
+    )
+    restored_dumps = {}
+    restored_compressions = {}
+    mock_hooks(restored_dumps, restored_compressions=restored_compressions)
+
+    restore_in_single_pass(
+        subprocess.Popen(('cat', str(tar_path)), stdout=subprocess.PIPE, stderr=subprocess.PIPE),
+        ('foo', 'bar'),
+    )
+
+    assert restored_dumps == {'foo': foo_dump, 'bar': bar_dump}
+    assert restored_compressions == {'foo': 'gzip', 'bar': None}
+
+
+def test_restore_databases_in_single_pass_consumes_trailing_padding(tmp_path):
+    tar_path = tmp_path / 'archive.tar'
+    write_tar_file(tar_path, {'root/.borgmatic/postgresql_databases/localhost/foo': b'foo'})
+
+    with open(tar_path, 'ab') as tar_file:
+        tar_file.write(bytes(5000000))
+
+    restored_dumps = {}
+    mock_hooks(restored_dumps)
+
+    restore_in_single_pass(
+        subprocess.Popen(('cat', str(tar_path)), stdout=subprocess.PIPE, stderr=subprocess.PIPE),
+        ('foo',),
+    )
+
+    assert restored_dumps == {'foo': b'foo'}
+
+
+def test_restore_databases_in_single_pass_with_client_exiting_early_continues(tmp_path):
+    tar_path = tmp_path / 'archive.tar'
+    bar_dump = b'bar' * 1000
+    write_tar_file(
+        tar_path,
+        {
+            'root/.borgmatic/postgresql_databases/localhost/early': b'early' * 1000000,
+            'root/.borgmatic/mysql_databases/localhost/bar': bar_dump,
+        },
+    )
+    restored_dumps = {}
+    mock_hooks(restored_dumps)
+
+    restore_in_single_pass(
+        subprocess.Popen(('cat', str(tar_path)), stdout=subprocess.PIPE, stderr=subprocess.PIPE),
+        ('early', 'bar'),
+    )
+
+    assert restored_dumps == {'bar': bar_dump}
+
+
+def test_restore_databases_in_single_pass_with_missing_dump_raises(tmp_path):
+    tar_path = tmp_path / 'archive.tar'
+    write_tar_file(tar_path, {'root/.borgmatic/postgresql_databases/localhost/foo': b'foo'})
+    mock_hooks({})
+
+    with pytest.raises(ValueError, match='"bar"'):
+        restore_in_single_pass(
+            subprocess.Popen(
+                ('cat', str(tar_path)), stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            ),
+            ('foo', 'bar'),
+        )
+
+
+def test_restore_databases_in_single_pass_with_restore_error_raises_and_kills_borg(tmp_path):
+    tar_path = tmp_path / 'archive.tar'
+    write_tar_file(
+        tar_path,
+        {
+            'root/.borgmatic/postgresql_databases/localhost/foo': b'foo',
+            'root/.borgmatic/mysql_databases/localhost/bar': b'bar',
+        },
+    )
+    mock_hooks({}, restore_error_name='foo')
+    export_process = subprocess.Popen(
+        f'cat {tar_path}; sleep 10', shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+
+    with pytest.raises(ValueError, match='Oops'):
+        restore_in_single_pass(export_process, ('foo', 'bar'))
+
+    assert export_process.wait(timeout=5) != 0
+
+
+def test_restore_databases_in_single_pass_with_borg_error_raises_it():
+    mock_hooks({})
+
+    with pytest.raises(subprocess.CalledProcessError):
+        restore_in_single_pass(
+            subprocess.Popen(
+                'echo "Archive not found" >&2; exit 2',
+                shell=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            ),
+            ('foo',),
+        )
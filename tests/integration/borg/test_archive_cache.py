@@ -0,0 +1,16 @@
+from borgmatic.borg import archive_cache as module
+
+
+def test_latest_archive_cache_round_trips_until_invalidated(tmp_path):
+    borgmatic_source_directory = str(tmp_path / '.borgmatic')
+
+    assert module.read_cached_latest_archive(borgmatic_source_directory, 'repo', 60) is None
+
+    module.write_cached_latest_archive(borgmatic_source_directory, 'repo', 'archive')
+
+    assert module.read_cached_latest_archive(borgmatic_source_directory, 'repo', 60) == 'archive'
+    assert module.read_cached_latest_archive(borgmatic_source_directory, 'other', 60) is None
+
+    module.invalidate_cached_latest_archive(borgmatic_source_directory, 'repo')
+
+    assert module.read_cached_latest_archive(borgmatic_source_directory, 'repo', 60) is None
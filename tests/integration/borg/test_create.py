@@ -0,0 +1,61 @@
+import pathlib
+import random
+
+from borgmatic.borg import create as module
+
+
+def deduplicate_directories_pairwise(directory_devices, additional_directory_devices):
+    '''
+    Reference implementation of deduplicate_directories() that compares every directory against
+    every other directory.
+    '''
+    all_devices = {**directory_devices, **additional_directory_devices}
+
+    return tuple(
+        sorted(
+            directory
+            for directory in directory_devices
+            if not any(
+                pathlib.PurePath(other_directory) in pathlib.PurePath(directory).parents
+                and all_devices[directory] is not None
+                and all_devices[other_directory] == all_devices[directory]
+                for other_directory in all_devices
+            )
+        )
+    )
+
+
+def make_random_directory_devices(count, seed):
+    generator = random.Random(seed)
+    names = ('srv', 'data', 'foo', 'bar')
+
+    return {
+        '/'
+        + '/'.join(generator.choice(names) for _ in range(generator.randint(1, 4)))
+        + generator.choice(('', '/')): generator.choice((1, 2, None))
+        for _ in range(count)
+    }
+
+
+def test_deduplicate_directories_matches_pairwise_comparison():
+    for seed in range(20):
+        directory_devices = make_random_directory_devices(30, seed)
+        additional_directory_devices = make_random_directory_devices(5, seed + 100)
+
+        assert module.deduplicate_directories(
+            directory_devices, additional_directory_devices
+        ) == deduplicate_directories_pairwise(directory_devices, additional_directory_devices)
+
+
+def test_deduplicate_directories_with_many_glob_expanded_directories():
+    # Like what a "/srv/*/data" source directory expands to, along with a parent directory on a
+    # separate filesystem and some nested duplicates.
+    directory_devices = {f'/srv/{index}/data': 1 for index in range(12000)}
+    directory_devices.update({f'/srv/{index}/data/nested': 1 for index in range(0, 12000, 3)})
+    directory_devices['/srv'] = 2
+
+    deduplicated = module.deduplicate_directories(directory_devices, {'/srv/0': 1})
+
+    assert len(deduplicated) == 12000
+    assert '/srv' in deduplicated
+    assert '/srv/0/data' not in deduplicated
@@ -15,3 +15,17 @@ def test_available_true_for_borg_stable_version_introducing_feature():
 
 def test_available_false_for_too_old_borg_version():
     assert not module.available(module.Feature.COMPACT, '1.1.5')
+
+
+def test_available_features_includes_only_features_available_in_borg_version():
+    assert module.available_features('1.2.0') == {
+        module.Feature.COMPACT,
+        module.Feature.ATIME,
+        module.Feature.NOFLAGS,
+        module.Feature.NUMERIC_IDS,
+        module.Feature.UPLOAD_RATELIMIT,
+    }
+
+
+def test_available_features_caches_result_per_borg_version():
+    assert module.available_features('1.2.0') is module.available_features('1.2.0')
@@ -0,0 +1,125 @@
+import os
+import threading
+
+from flexmock import flexmock
+
+from borgmatic.borg import scan as module
+
+
+def make_source_tree(tmp_path):
+    source = tmp_path / 'source'
+    (source / 'sub' / 'subsub').mkdir(parents=True)
+    (source / 'excluded').mkdir()
+    (source / '.borgmatic').mkdir()
+    (source / 'regular').write_text('content')
+    os.mkfifo(source / 'sub' / 'subsub' / 'fifo')
+    os.mkfifo(source / 'excluded' / 'fifo')
+    os.mkfifo(source / '.borgmatic' / 'fifo')
+    os.symlink('/dev/null', source / 'sub' / 'null')
+    os.symlink(source / 'regular', source / 'sub' / 'regular_link')
+
+    return source
+
+
+def test_find_special_file_paths_finds_special_files_and_symlinks_to_them(tmp_path):
+    source = make_source_tree(tmp_path)
+
+    assert module.find_special_file_paths(
+        (str(source),),
+        exclude_patterns=(str(source / 'excluded'),),
+        skip_directories=(str(source / '.borgmatic'),),
+    ) == (
+        str(source / 'sub' / 'null'),
+        str(source / 'sub' / 'subsub' / 'fifo'),
+    )
+
+
+def test_find_special_file_paths_with_working_directory_returns_relative_paths(tmp_path):
+    make_source_tree(tmp_path)
+
+    assert module.find_special_file_paths(
+        ('source',),
+        working_directory=str(tmp_path),
+        exclude_patterns=('re:^source/ex',),
+        skip_directories=('source/.borgmatic',),
+    ) == ('source/sub/null', 'source/sub/subsub/fifo')
+
+
+def test_find_special_file_paths_skips_source_directory_within_skip_directory(tmp_path):
+    source = make_source_tree(tmp_path)
+
+    assert (
+        module.find_special_file_paths(
+            (str(source / '.borgmatic'),), skip_directories=(str(source),)
+        )
+        == ()
+    )
+
+
+def test_find_special_file_paths_includes_special_source_file(tmp_path):
+    source = make_source_tree(tmp_path)
+
+    assert module.find_special_file_paths(
+        (str(source / 'excluded' / 'fifo'), str(source / 'regular'), str(tmp_path / 'missing'))
+    ) == (str(source / 'excluded' / 'fifo'),)
+
+
+def test_find_special_file_paths_without_one_file_system_finds_special_files(tmp_path):
+    source = make_source_tree(tmp_path)
+
+    assert module.find_special_file_paths((str(source / 'sub'),), one_file_system=False) == (
+        str(source / 'sub' / 'null'),
+        str(source / 'sub' / 'subsub' / 'fifo'),
+    )
+
+
+def test_find_special_file_paths_caches_source_directory_stats(tmp_path):
+    source = make_source_tree(tmp_path)
+    fifo_path = str(source / 'excluded' / 'fifo')
+    stat_cache = {}
+
+    assert module.find_special_file_paths((fifo_path,), stat_cache=stat_cache) == (fifo_path,)
+    assert set(stat_cache) == {(fifo_path, False), (fifo_path, True)}
+
+
+def test_find_special_file_paths_scans_small_tree_without_thread_pool(tmp_path):
+    source = make_source_tree(tmp_path)
+    scan_directory = module.scan_directory
+    scan_threads = set()
+
+    def record_thread(*args):
+        scan_threads.add(threading.current_thread())
+        return scan_directory(*args)
+
+    flexmock(module).should_receive('scan_directory').replace_with(record_thread)
+
+    assert module.find_special_file_paths((str(source / 'sub'),)) == (
+        str(source / 'sub' / 'null'),
+        str(source / 'sub' / 'subsub' / 'fifo'),
+    )
+    assert scan_threads == {threading.main_thread()}
+
+
+def test_find_special_file_paths_scans_wide_tree_in_thread_pool(tmp_path):
+    source = tmp_path / 'source'
+
+    for index in range(module.SCAN_THREADED_DIRECTORY_COUNT * 2):
+        (source / str(index) / 'nested').mkdir(parents=True)
+        os.mkfifo(source / str(index) / 'nested' / 'fifo')
+
+    scan_directory = module.scan_directory
+    scan_threads = set()
+
+    def record_thread(*args):
+        scan_threads.add(threading.current_thread())
+        return scan_directory(*args)
+
+    flexmock(module).should_receive('scan_directory').replace_with(record_thread)
+
+    assert module.find_special_file_paths((str(source),)) == tuple(
+        sorted(
+            str(source / str(index) / 'nested' / 'fifo')
+            for index in range(module.SCAN_THREADED_DIRECTORY_COUNT * 2)
+        )
+    )
+    assert scan_threads - {threading.main_thread()}
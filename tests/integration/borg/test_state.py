@@ -0,0 +1,19 @@
+import pytest
+
+from borgmatic.borg import state as module
+
+
+def test_write_state_file_round_trips_through_read_state_file(tmp_path):
+    path = str(tmp_path / 'state' / 'state.json')
+
+    module.write_state_file(path, {'a': 1})
+
+    assert module.read_state_file(path) == {'a': 1}
+    assert [child.name for child in (tmp_path / 'state').iterdir()] == ['state.json']
+
+
+def test_write_state_file_with_write_error_removes_temporary_file(tmp_path):
+    with pytest.raises(TypeError):
+        module.write_state_file(str(tmp_path / 'state.json'), {'a': object()})
+
+    assert list(tmp_path.iterdir()) == []
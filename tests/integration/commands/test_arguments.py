@@ -57,6 +57,26 @@ def test_parse_arguments_with_syslog_verbosity_overrides_default():
     assert global_arguments.syslog_verbosity == 2
 
 
+def test_parse_arguments_with_jobs_overrides_default():
+    config_paths = ['default']
+    flexmock(module.collect).should_receive('get_default_config_paths').and_return(config_paths)
+
+    arguments = module.parse_arguments('--jobs', '4')
+
+    global_arguments = arguments['global']
+    assert global_arguments.jobs == 4
+
+
+def test_parse_arguments_with_repository_concurrency_overrides_default():
+    config_paths = ['default']
+    flexmock(module.collect).should_receive('get_default_config_paths').and_return(config_paths)
+
+    arguments = module.parse_arguments('--repository-concurrency', '3')
+
+    global_arguments = arguments['global']
+    assert global_arguments.repository_concurrency == 3
+
+
 def test_parse_arguments_with_log_file_verbosity_overrides_default():
     config_paths = ['default']
     flexmock(module.collect).should_receive('get_default_config_paths').and_return(config_paths)
@@ -318,6 +338,43 @@ def test_parse_arguments_allows_archive_with_restore():
     module.parse_arguments('--config', 'myconfig', 'restore', '--archive', 'test')
 
 
+def test_parse_arguments_with_restore_jobs_applies_them_to_restore():
+    flexmock(module.collect).should_receive('get_default_config_paths').and_return(['default'])
+
+    arguments = module.parse_arguments('restore', '--archive', 'test', '--restore-jobs', '4')
+
+    assert arguments['restore'].restore_jobs == 4
+    assert arguments['global'].jobs == 1
+
+
+def test_parse_arguments_with_global_jobs_and_restore_jobs_keeps_them_separate():
+    flexmock(module.collect).should_receive('get_default_config_paths').and_return(['default'])
+
+    arguments = module.parse_arguments(
+        '--jobs', '3', 'restore', '--archive', 'test', '--restore-jobs', '2'
+    )
+
+    assert arguments['global'].jobs == 3
+    assert arguments['restore'].restore_jobs == 2
+
+
+def test_parse_arguments_with_global_jobs_before_restore_leaves_restore_jobs_default():
+    flexmock(module.collect).should_receive('get_default_config_paths').and_return(['default'])
+
+    arguments = module.parse_arguments('--jobs', '3', 'restore', '--archive', 'x')
+
+    assert arguments['global'].jobs == 3
+    assert arguments['restore'].restore_jobs == 1
+
+
+def test_parse_arguments_with_restore_single_pass_applies_it_to_restore():
+    flexmock(module.collect).should_receive('get_default_config_paths').and_return(['default'])
+
+    arguments = module.parse_arguments('restore', '--archive', 'test', '--single-pass')
+
+    assert arguments['restore'].single_pass is True
+
+
 def test_parse_arguments_allows_archive_with_list():
     flexmock(module.collect).should_receive('get_default_config_paths').and_return(['default'])
 
@@ -516,3 +573,24 @@ def test_parse_arguments_extract_with_check_only_extract_does_not_raise():
     flexmock(module.collect).should_receive('get_default_config_paths').and_return(['default'])
 
     module.parse_arguments('extract', '--archive', 'name', 'check', '--only', 'extract')
+
+
+def test_parse_arguments_disallows_jobs_less_than_one():
+    flexmock(module.collect).should_receive('get_default_config_paths').and_return(['default'])
+
+    with pytest.raises(ValueError):
+        module.parse_arguments('--jobs', '0')
+
+
+def test_parse_arguments_disallows_repository_concurrency_less_than_one():
+    flexmock(module.collect).should_receive('get_default_config_paths').and_return(['default'])
+
+    with pytest.raises(ValueError):
+        module.parse_arguments('--repository-concurrency', '0')
+
+
+def test_parse_arguments_disallows_restore_jobs_less_than_one():
+    flexmock(module.collect).should_receive('get_default_config_paths').and_return(['default'])
+
+    with pytest.raises(ValueError):
+        module.parse_arguments('restore', '--archive', 'test', '--restore-jobs', '0')
@@ -229,6 +229,24 @@ def test_parse_configuration_raises_for_validation_error():
         module.parse_configuration('/tmp/config.yaml', '/tmp/schema.yaml')
 
 
+def test_parse_configuration_raises_for_repository_concurrency_below_one():
+    mock_config_and_schema(
+        '''
+        location:
+            source_directories:
+                - /home
+            repositories:
+                - hostname.borg
+
+        storage:
+            repository_concurrency: 0
+        '''
+    )
+
+    with pytest.raises(module.Validation_error):
+        module.parse_configuration('/tmp/config.yaml', '/tmp/schema.yaml')
+
+
 def test_parse_configuration_applies_overrides():
     mock_config_and_schema(
         '''
@@ -0,0 +1,79 @@
+import pytest
+
+import borgmatic.pipe
+from borgmatic.execute import execute_command_with_processes
+from borgmatic.hooks import dump as module
+
+
+@pytest.mark.parametrize('compression', ('gzip', None))
+def test_dump_round_trips_through_restore_input_regardless_of_configured_compression(
+    tmp_path, compression
+):
+    dump_path = str(tmp_path / 'foo bar')
+
+    if compression:
+        module.execute_compressed_dump_command(('printf', 'foo bar'), compression, dump_path)
+
+        with open(dump_path, 'rb') as dump_file:
+            assert dump_file.read(2) == b'\x1f\x8b'
+    else:
+        with open(dump_path, 'wb') as dump_file:
+            dump_file.write(b'foo bar')
+
+    with open(dump_path, 'rb') as dump_file:
+        header = module.read_dump_header(dump_file)
+        (relay_file, relay) = borgmatic.pipe.start_relay(dump_file, 'test', prefix=header)
+        (processes, input_file) = module.decompress_restore_input(
+            [], relay_file, module.detect_dump_compression(header)
+        )
+
+        assert (
+            execute_command_with_processes(
+                ('cat',), processes, output_log_level=None, input_file=input_file
+            )
+            == 'foo bar'
+        )
+
+    relay_file.close()
+    relay.result()
+
+
+def test_compressed_dump_to_named_pipe_waits_for_reader_before_starting_dump(tmp_path):
+    dump_path = str(tmp_path / 'foo')
+    started_path = tmp_path / 'started'
+    module.create_named_pipe_for_dump(dump_path)
+
+    (dump_process, compress_process) = module.execute_compressed_dump_command(
+        (f'touch {started_path}; printf "foo bar"',),
+        'gzip',
+        dump_path,
+        shell=True,
+        run_to_completion=False,
+    )
+
+    try:
+        with pytest.raises(Exception):
+            dump_process.wait(timeout=0.5)
+
+        assert not started_path.exists()
+
+        with open(dump_path, 'rb') as dump_file:
+            header = module.read_dump_header(dump_file)
+            (relay_file, relay) = borgmatic.pipe.start_relay(dump_file, 'test', prefix=header)
+            (processes, input_file) = module.decompress_restore_input(
+                [dump_process, compress_process], relay_file, module.detect_dump_compression(header)
+            )
+
+            assert (
+                execute_command_with_processes(
+                    ('cat',), processes, output_log_level=None, input_file=input_file
+                )
+                == 'foo bar'
+            )
+
+        relay.result()
+        assert started_path.exists()
+    finally:
+        for process in (dump_process, compress_process):
+            if process.poll() is None:
+                process.kill()
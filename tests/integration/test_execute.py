@@ -31,6 +31,41 @@ def test_log_outputs_logs_each_line_separately():
     )
 
 
+def test_log_outputs_logs_lines_written_in_pieces():
+    flexmock(module.logger).should_receive('log').with_args(logging.INFO, 'hi there').once()
+    flexmock(module.logger).should_receive('log').with_args(logging.INFO, 'partial').once()
+    flexmock(module).should_receive('exit_code_indicates_error').and_return(False)
+
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            '-c',
+            "import sys, time; sys.stdout.write('hi '); sys.stdout.flush(); time.sleep(0.1); "
+            + "sys.stdout.write('there\\npartial'); sys.stdout.flush()",
+        ],
+        stdout=subprocess.PIPE,
+    )
+    flexmock(module).should_receive('output_buffer_for_process').and_return(process.stdout)
+
+    module.log_outputs(
+        (process,), exclude_stdouts=(), output_log_level=logging.INFO, borg_local_path='borg'
+    )
+
+
+def test_log_outputs_keeps_polling_process_that_closes_its_output_early():
+    flexmock(module.logger).should_receive('log').with_args(logging.INFO, 'hi').once()
+    flexmock(module).should_receive('exit_code_indicates_error').and_return(False)
+
+    process = subprocess.Popen('echo hi; exec >&-; sleep 0.2', shell=True, stdout=subprocess.PIPE)
+    flexmock(module).should_receive('output_buffer_for_process').and_return(process.stdout)
+
+    module.log_outputs(
+        (process,), exclude_stdouts=(), output_log_level=logging.INFO, borg_local_path='borg'
+    )
+
+    assert process.returncode == 0
+
+
 def test_log_outputs_skips_logs_for_process_with_none_stdout():
     flexmock(module.logger).should_receive('log').with_args(logging.INFO, 'hi').never()
     flexmock(module.logger).should_receive('log').with_args(logging.INFO, 'there').once()
@@ -100,7 +135,9 @@ def test_log_outputs_logs_multiline_error_output():
     of a process' traceback.
     '''
     flexmock(module.logger).should_receive('log')
-    flexmock(module).should_receive('exit_code_indicates_error').and_return(True)
+    flexmock(module).should_receive('exit_code_indicates_error').replace_with(
+        lambda command, exit_code, borg_local_path: bool(exit_code)
+    )
     flexmock(module).should_receive('command_for_process').and_return('grep')
 
     process = subprocess.Popen(
@@ -197,7 +234,10 @@ def test_log_outputs_vents_other_processes_when_one_exits():
     flexmock(module).should_receive('output_buffer_for_process').with_args(
         other_process, (process.stdout,)
     ).and_return(other_process.stdout)
-    flexmock(process.stdout).should_call('readline').at_least().once()
+    flexmock(module.os).should_call('read')
+    flexmock(module.os).should_call('read').with_args(
+        process.stdout.fileno(), module.OUTPUT_READ_CHUNK_SIZE
+    ).at_least().once()
 
     module.log_outputs(
         (process, other_process),
@@ -207,6 +247,34 @@ def test_log_outputs_vents_other_processes_when_one_exits():
     )
 
 
+def test_log_outputs_does_not_vent_excluded_process_while_its_consumer_is_running():
+    '''
+    Execute a command that exits right away, along with a command generating a string that gets
+    piped into a final command that consumes it. The test is to ensure that the exit of the first
+    command doesn't vent (and therefore steal) the string from the final command's input.
+    '''
+    flexmock(module).should_receive('command_for_process').and_return('cat')
+
+    exiting_process = subprocess.Popen(['true'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    process = subprocess.Popen(
+        [sys.executable, '-c', "import time; time.sleep(0.2); print('x' * 40000)"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    other_process = subprocess.Popen(
+        ['cat'], stdin=process.stdout, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+    )
+
+    captured_outputs = module.log_outputs(
+        (exiting_process, process, other_process),
+        exclude_stdouts=(process.stdout,),
+        output_log_level=None,
+        borg_local_path='borg',
+    )
+
+    assert captured_outputs[other_process] == 'x' * 40000
+
+
 def test_log_outputs_does_not_error_when_one_process_exits():
     flexmock(module.logger).should_receive('log')
     flexmock(module).should_receive('command_for_process').and_return('grep')
@@ -283,3 +351,58 @@ def test_log_outputs_with_unfinished_process_re_polls():
     module.log_outputs(
         (process,), exclude_stdouts=(), output_log_level=logging.INFO, borg_local_path='borg'
     )
+
+
+def test_execute_command_and_stream_output_yields_lines_as_they_come():
+    lines = module.execute_command_and_stream_output(
+        [sys.executable, '-c', "print('first', flush=True); import time; time.sleep(10)"]
+    )
+
+    assert next(lines) == 'first'
+
+    # Stopping early kills the process rather than waiting for it to finish.
+    lines.close()
+
+
+def test_execute_command_and_capture_output_with_borg_local_path_tolerates_borg_warning():
+    output = module.execute_command_and_capture_output(
+        ['sh', '-c', 'echo {}; exit 1'], borg_local_path='sh'
+    )
+
+    assert output == '{}\n'
+
+
+def test_execute_command_with_processes_with_output_log_level_none_returns_only_stdout():
+    process = subprocess.Popen(['true'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+    output = module.execute_command_with_processes(
+        ['sh', '-c', 'echo {}; echo warning >&2; exit 1'],
+        [process],
+        output_log_level=None,
+        borg_local_path='sh',
+    )
+
+    assert output == '{}'
+
+
+def test_execute_command_with_timing_enabled_records_command_span():
+    flexmock(module.timing, ENABLED=True, SPANS=[])
+
+    module.execute_command(('true', 'with-subcommand'))
+
+    (span,) = module.timing.SPANS
+    assert span['name'] == 'true with-subcommand'
+    assert span['kind'] == 'command'
+    assert span['status'] == 'succeeded'
+    assert span['exit_code'] == 0
+
+
+def test_execute_command_with_timing_enabled_records_failed_command_span():
+    flexmock(module.timing, ENABLED=True, SPANS=[])
+
+    with pytest.raises(subprocess.CalledProcessError):
+        module.execute_command(('sh', '-c', 'exit 3'))
+
+    (span,) = module.timing.SPANS
+    assert span['status'] == 'failed'
+    assert span['exit_code'] == 3
@@ -0,0 +1,164 @@
+import logging
+import subprocess
+import sys
+
+import pytest
+from flexmock import flexmock
+
+from borgmatic import execute_async as module
+
+
+def test_log_outputs_logs_each_line_separately():
+    flexmock(module.execute.logger).should_receive('log').with_args(logging.INFO, 'hi').once()
+    flexmock(module.execute.logger).should_receive('log').with_args(logging.INFO, 'there').once()
+
+    async def run():
+        hi_process = await module.start_process(['echo', 'hi'], stdout=subprocess.PIPE)
+        there_process = await module.start_process(['echo', 'there'], stdout=subprocess.PIPE)
+
+        return await module.log_outputs(
+            (hi_process, there_process), output_log_level=logging.INFO, borg_local_path='borg'
+        )
+
+    assert module.run_synchronously(run()) is None
+
+
+def test_log_outputs_logs_stderr_for_process_with_stdout_to_file(tmp_path):
+    flexmock(module.execute.logger).should_receive('log').with_args(logging.INFO, 'err').once()
+    output_path = tmp_path / 'output'
+
+    async def run():
+        with open(output_path, 'w') as output_file:
+            process = await module.start_process(
+                'echo out; echo err >&2',
+                stdout=output_file,
+                stderr=subprocess.PIPE,
+                shell=True,
+            )
+
+            await module.log_outputs(
+                (process,), output_log_level=logging.INFO, borg_local_path='borg'
+            )
+
+    module.run_synchronously(run())
+
+    assert output_path.read_text() == 'out\n'
+
+
+def test_log_outputs_skips_logs_for_process_with_none_stdout():
+    flexmock(module.execute.logger).should_receive('log').with_args(logging.INFO, 'there').once()
+
+    async def run():
+        hi_process = await module.start_process(['true'])
+        there_process = await module.start_process(['echo', 'there'], stdout=subprocess.PIPE)
+
+        await module.log_outputs(
+            (hi_process, there_process), output_log_level=logging.INFO, borg_local_path='borg'
+        )
+
+    module.run_synchronously(run())
+
+
+def test_log_outputs_returns_output_without_logging_for_output_log_level_none():
+    flexmock(module.execute.logger).should_receive('log').never()
+
+    async def run():
+        hi_process = await module.start_process(['echo', 'hi'], stdout=subprocess.PIPE)
+        there_process = await module.start_process(
+            [sys.executable, '-c', "print('there'); print('partial', end='')"],
+            stdout=subprocess.PIPE,
+        )
+
+        return (
+            hi_process,
+            there_process,
+            await module.log_outputs(
+                (hi_process, there_process), output_log_level=None, borg_local_path='borg'
+            ),
+        )
+
+    (hi_process, there_process, captured_outputs) = module.run_synchronously(run())
+
+    assert captured_outputs == {hi_process: 'hi', there_process: 'there\npartial'}
+
+
+def test_log_outputs_includes_error_output_in_exception_and_kills_other_processes():
+    flexmock(module.execute.logger).should_receive('log')
+
+    async def run():
+        process = await module.start_process(
+            'echo oops; exit 2', stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True
+        )
+        other_process = await module.start_process(
+            ['sleep', '10'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        )
+
+        with pytest.raises(subprocess.CalledProcessError) as error:
+            await module.log_outputs(
+                (process, other_process), output_log_level=logging.INFO, borg_local_path='borg'
+            )
+
+        return (error.value, other_process)
+
+    (error, other_process) = module.run_synchronously(run())
+
+    assert error.returncode == 2
+    assert error.output == 'oops'
+    assert other_process.returncode == -9
+
+
+def test_log_outputs_treats_borg_exit_code_one_as_warning():
+    flexmock(module.execute.logger).should_receive('log')
+
+    async def run():
+        process = await module.start_process('exit 1', shell=True)
+
+        await module.log_outputs((process,), output_log_level=logging.INFO, borg_local_path='exit')
+
+    module.run_synchronously(run())
+
+
+def test_log_outputs_truncates_long_error_output():
+    flexmock(module.execute.logger).should_receive('log')
+    flexmock(module.execute, ERROR_OUTPUT_MAX_LINE_COUNT=0)
+
+    async def run():
+        process = await module.start_process(
+            'echo oops; exit 2', stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True
+        )
+
+        await module.log_outputs((process,), output_log_level=logging.INFO, borg_local_path='borg')
+
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        module.run_synchronously(run())
+
+    assert error.value.output.startswith('...')
+
+
+def test_execute_command_with_processes_runs_command_along_with_active_processes():
+    flexmock(module.execute.logger).should_receive('log').never()
+
+    async def run():
+        process = await module.execute_command(['echo', 'dump'], run_to_completion=False)
+
+        return await module.execute_command_with_processes(
+            ['echo', 'borg'], [process], output_log_level=None
+        )
+
+    assert module.run_synchronously(run()) == 'borg'
+
+
+def test_execute_command_and_capture_output_returns_stdout():
+    assert module.run_synchronously(module.execute_command_and_capture_output(['echo', 'hi'])) == (
+        'hi\n'
+    )
+
+
+def test_execute_command_and_capture_output_raises_when_command_errors():
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        module.run_synchronously(
+            module.execute_command_and_capture_output(['echo', 'oops;', 'exit', '3'], shell=True)
+        )
+
+    assert error.value.returncode == 3
+    assert error.value.output == b'oops\n'
@@ -0,0 +1,35 @@
+import subprocess
+
+import pytest
+
+from borgmatic import pipe as module
+
+pytestmark = pytest.mark.skipif(not module.SPLICE_AVAILABLE, reason='os.splice() not available')
+
+
+def test_start_relay_streams_all_output_between_processes():
+    producer = subprocess.Popen(('head', '-c', '5000000', '/dev/zero'), stdout=subprocess.PIPE)
+    (relay_output, result) = module.start_relay(producer.stdout, 'test')
+    consumer = subprocess.Popen(('wc', '-c'), stdin=relay_output, stdout=subprocess.PIPE)
+
+    (output, _) = consumer.communicate()
+    relay_output.close()
+    producer.wait()
+
+    assert output.strip() == b'5000000'
+    assert result.result(timeout=5)[0] == 5000000
+
+
+def test_start_relay_finishes_when_consumer_exits_early():
+    producer = subprocess.Popen(('cat', '/dev/zero'), stdout=subprocess.PIPE)
+    (relay_output, result) = module.start_relay(producer.stdout, 'test')
+    consumer = subprocess.Popen(('head', '-c', '10'), stdin=relay_output, stdout=subprocess.PIPE)
+
+    (output, _) = consumer.communicate()
+    relay_output.close()
+
+    assert output == b'\0' * 10
+    assert result.result(timeout=5)[0] >= 10
+
+    producer.kill()
+    producer.wait()
@@ -14,6 +14,7 @@ def test_run_borg_does_not_raise():
 
     module.run_borg(
         repository={'path': 'repos'},
+        location={},
         storage={},
         local_borg_version=None,
         borg_arguments=borg_arguments,
@@ -1,8 +1,77 @@
+import logging
+
+import pytest
 from flexmock import flexmock
 
 from borgmatic.actions import create as module
 
 
+def test_spool_database_dumps_removes_old_dumps_and_dumps_with_spool():
+    flexmock(module.borgmatic.hooks.dispatch).should_receive(
+        'call_hooks_even_if_unconfigured'
+    ).with_args('remove_database_dumps', object, 'test.yaml', object, object, False).once()
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks').with_args(
+        'dump_databases', object, 'test.yaml', object, object, False, spool=True
+    ).once()
+
+    module.spool_database_dumps(
+        'test.yaml',
+        location={},
+        hooks={'postgresql_databases': [{'name': 'foo'}]},
+        global_arguments=flexmock(dry_run=False),
+    )
+
+
+def test_spool_database_dumps_with_prometheus_hook_records_dump_sizes():
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks_even_if_unconfigured')
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks')
+    flexmock(module.borgmatic.hooks.dump).should_receive('make_database_dump_path').with_args(
+        None, 'postgresql_databases'
+    ).and_return('/dumps/postgresql_databases')
+    flexmock(module.borgmatic.metrics).should_receive('path_size').with_args(
+        '/dumps/postgresql_databases'
+    ).and_return(100)
+    flexmock(module.borgmatic.metrics).should_receive('record').with_args(
+        'test.yaml', 'borgmatic_database_dump_bytes', 100, hook='postgresql_databases'
+    ).once()
+
+    module.spool_database_dumps(
+        'test.yaml',
+        location={},
+        hooks={
+            'postgresql_databases': [{'name': 'foo'}],
+            'prometheus': {'textfile': 'borgmatic.prom'},
+        },
+        global_arguments=flexmock(dry_run=False),
+    )
+
+
+def test_spool_database_dumps_with_prometheus_hook_and_dry_run_does_not_record_dump_sizes():
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks_even_if_unconfigured')
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks')
+    flexmock(module.borgmatic.metrics).should_receive('record').never()
+
+    module.spool_database_dumps(
+        'test.yaml',
+        location={},
+        hooks={
+            'postgresql_databases': [{'name': 'foo'}],
+            'prometheus': {'textfile': 'borgmatic.prom'},
+        },
+        global_arguments=flexmock(dry_run=True),
+    )
+
+
+def test_remove_spooled_database_dumps_removes_dumps():
+    flexmock(module.borgmatic.hooks.dispatch).should_receive(
+        'call_hooks_even_if_unconfigured'
+    ).with_args('remove_database_dumps', object, 'test.yaml', object, object, True).once()
+
+    module.remove_spooled_database_dumps(
+        'test.yaml', location={}, hooks={}, global_arguments=flexmock(dry_run=True)
+    )
+
+
 def test_run_create_executes_and_calls_hooks_for_configured_repository():
     flexmock(module.logger).answer = lambda message: None
     flexmock(module.borgmatic.config.validate).should_receive('repositories_match').never()
@@ -103,3 +172,307 @@ def test_run_create_bails_if_repository_does_not_match():
             remote_path=None,
         )
     )
+
+
+def test_run_create_with_spooled_database_dumps_does_not_dump_or_stream():
+    flexmock(module.logger).answer = lambda message: None
+    flexmock(module.borgmatic.config.validate).should_receive('repositories_match').never()
+    flexmock(module.borgmatic.hooks.command).should_receive('execute_hook').times(2)
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks').never()
+    flexmock(module.borgmatic.hooks.dispatch).should_receive(
+        'call_hooks_even_if_unconfigured'
+    ).never()
+    flexmock(module.borgmatic.borg.create).should_receive('create_archive').with_args(
+        False,
+        'repo',
+        {},
+        {},
+        None,
+        local_path=None,
+        remote_path=None,
+        progress=object,
+        stats=object,
+        json=object,
+        list_files=object,
+        stream_processes=[],
+    ).once()
+    create_arguments = flexmock(
+        repository=None,
+        progress=flexmock(),
+        stats=flexmock(),
+        json=flexmock(),
+        list_files=flexmock(),
+    )
+    global_arguments = flexmock(monitoring_verbosity=1, dry_run=False)
+
+    list(
+        module.run_create(
+            config_filename='test.yaml',
+            repository={'path': 'repo'},
+            location={},
+            storage={},
+            hooks={'spool_database_dumps': True, 'postgresql_databases': [{'name': 'foo'}]},
+            hook_context={},
+            local_borg_version=None,
+            create_arguments=create_arguments,
+            global_arguments=global_arguments,
+            dry_run_label='',
+            local_path=None,
+            remote_path=None,
+        )
+    )
+
+
+def test_run_create_with_json_yields_create_output():
+    flexmock(module.logger).answer = lambda message: None
+    flexmock(module.borgmatic.hooks.command).should_receive('execute_hook')
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks').and_return({})
+    flexmock(module.borgmatic.hooks.dispatch).should_receive(
+        'call_hooks_even_if_unconfigured'
+    ).and_return({})
+    flexmock(module.borgmatic.borg.create).should_receive('create_archive').replace_with(
+        lambda *args, **kwargs: '{"archive": {}}'
+    )
+    flexmock(module.borgmatic.metrics).should_receive('record_archive_stats').never()
+    create_arguments = flexmock(
+        repository=None, progress=False, stats=False, json=True, list_files=False
+    )
+
+    assert list(
+        module.run_create(
+            config_filename='test.yaml',
+            repository={'path': 'repo'},
+            location={},
+            storage={},
+            hooks={},
+            hook_context={},
+            local_borg_version=None,
+            create_arguments=create_arguments,
+            global_arguments=flexmock(monitoring_verbosity=1, dry_run=False),
+            dry_run_label='',
+            local_path=None,
+            remote_path=None,
+        )
+    ) == [{'archive': {}}]
+
+
+def test_run_create_with_prometheus_hook_requests_json_and_records_metrics_without_yielding():
+    flexmock(module.logger).answer = lambda message: None
+    flexmock(module.logger).should_receive('isEnabledFor').and_return(False)
+    flexmock(module.borgmatic.hooks.command).should_receive('execute_hook')
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks').and_return({})
+    flexmock(module.borgmatic.hooks.dispatch).should_receive(
+        'call_hooks_even_if_unconfigured'
+    ).and_return({})
+    create_archive_kwargs = {}
+
+    def create_archive(*args, **kwargs):
+        create_archive_kwargs.update(kwargs)
+        return '{"archive": {"stats": {"nfiles": 3}}}'
+
+    flexmock(module.borgmatic.borg.create).should_receive('create_archive').replace_with(
+        create_archive
+    )
+    flexmock(module.borgmatic.metrics).should_receive('record_archive_stats').with_args(
+        'test.yaml', 'repo', {'archive': {'stats': {'nfiles': 3}}}
+    ).once()
+    create_arguments = flexmock(
+        repository=None, progress=False, stats=False, json=False, list_files=False
+    )
+
+    assert (
+        list(
+            module.run_create(
+                config_filename='test.yaml',
+                repository={'path': 'repo'},
+                location={},
+                storage={},
+                hooks={'prometheus': {'textfile': 'borgmatic.prom'}},
+                hook_context={},
+                local_borg_version=None,
+                create_arguments=create_arguments,
+                global_arguments=flexmock(monitoring_verbosity=1, dry_run=False),
+                dry_run_label='',
+                local_path=None,
+                remote_path=None,
+            )
+        )
+        == []
+    )
+    assert create_archive_kwargs['json'] is True
+
+
+def test_run_create_with_prometheus_hook_and_unparseable_json_warns_without_recording_metrics():
+    flexmock(module.logger).answer = lambda message: None
+    flexmock(module.logger).should_receive('isEnabledFor').and_return(False)
+    flexmock(module.logger).should_receive('warning').once()
+    flexmock(module.borgmatic.hooks.command).should_receive('execute_hook')
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks').and_return({})
+    flexmock(module.borgmatic.hooks.dispatch).should_receive(
+        'call_hooks_even_if_unconfigured'
+    ).and_return({})
+    flexmock(module.borgmatic.borg.create).should_receive('create_archive').and_return('nope')
+    flexmock(module.borgmatic.metrics).should_receive('record_archive_stats').never()
+    create_arguments = flexmock(
+        repository=None, progress=False, stats=False, json=False, list_files=False
+    )
+
+    assert (
+        list(
+            module.run_create(
+                config_filename='test.yaml',
+                repository={'path': 'repo'},
+                location={},
+                storage={},
+                hooks={'prometheus': {'textfile': 'borgmatic.prom'}},
+                hook_context={},
+                local_borg_version=None,
+                create_arguments=create_arguments,
+                global_arguments=flexmock(monitoring_verbosity=1, dry_run=False),
+                dry_run_label='',
+                local_path=None,
+                remote_path=None,
+            )
+        )
+        == []
+    )
+
+
+def test_run_create_with_json_and_unparseable_json_raises():
+    flexmock(module.logger).answer = lambda message: None
+    flexmock(module.borgmatic.hooks.command).should_receive('execute_hook')
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks').and_return({})
+    flexmock(module.borgmatic.hooks.dispatch).should_receive(
+        'call_hooks_even_if_unconfigured'
+    ).and_return({})
+    flexmock(module.borgmatic.borg.create).should_receive('create_archive').and_return('nope')
+    create_arguments = flexmock(
+        repository=None, progress=False, stats=False, json=True, list_files=False
+    )
+
+    with pytest.raises(ValueError):
+        list(
+            module.run_create(
+                config_filename='test.yaml',
+                repository={'path': 'repo'},
+                location={},
+                storage={},
+                hooks={},
+                hook_context={},
+                local_borg_version=None,
+                create_arguments=create_arguments,
+                global_arguments=flexmock(monitoring_verbosity=1, dry_run=False),
+                dry_run_label='',
+                local_path=None,
+                remote_path=None,
+            )
+        )
+
+
+def test_run_create_with_prometheus_hook_and_list_files_does_not_request_json():
+    flexmock(module.logger).answer = lambda message: None
+    flexmock(module.borgmatic.hooks.command).should_receive('execute_hook')
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks').and_return({})
+    flexmock(module.borgmatic.hooks.dispatch).should_receive(
+        'call_hooks_even_if_unconfigured'
+    ).and_return({})
+    create_archive_kwargs = {}
+    flexmock(module.borgmatic.borg.create).should_receive('create_archive').replace_with(
+        lambda *args, **kwargs: create_archive_kwargs.update(kwargs)
+    )
+    flexmock(module.borgmatic.metrics).should_receive('record_archive_stats').never()
+    create_arguments = flexmock(
+        repository=None, progress=False, stats=False, json=False, list_files=True
+    )
+
+    list(
+        module.run_create(
+            config_filename='test.yaml',
+            repository={'path': 'repo'},
+            location={},
+            storage={},
+            hooks={'prometheus': {'textfile': 'borgmatic.prom'}},
+            hook_context={},
+            local_borg_version=None,
+            create_arguments=create_arguments,
+            global_arguments=flexmock(monitoring_verbosity=1, dry_run=False),
+            dry_run_label='',
+            local_path=None,
+            remote_path=None,
+        )
+    )
+
+    assert create_archive_kwargs['json'] is False
+
+
+def test_run_create_with_prometheus_hook_and_info_verbosity_does_not_request_json():
+    flexmock(module.logger).answer = lambda message: None
+    flexmock(module.logger).should_receive('isEnabledFor').with_args(logging.INFO).and_return(True)
+    flexmock(module.logger).should_receive('debug').once()
+    flexmock(module.borgmatic.hooks.command).should_receive('execute_hook')
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks').and_return({})
+    flexmock(module.borgmatic.hooks.dispatch).should_receive(
+        'call_hooks_even_if_unconfigured'
+    ).and_return({})
+    create_archive_kwargs = {}
+    flexmock(module.borgmatic.borg.create).should_receive('create_archive').replace_with(
+        lambda *args, **kwargs: create_archive_kwargs.update(kwargs)
+    )
+    flexmock(module.borgmatic.metrics).should_receive('record_archive_stats').never()
+    create_arguments = flexmock(
+        repository=None, progress=False, stats=False, json=False, list_files=False
+    )
+
+    list(
+        module.run_create(
+            config_filename='test.yaml',
+            repository={'path': 'repo'},
+            location={},
+            storage={},
+            hooks={'prometheus': {'textfile': 'borgmatic.prom'}},
+            hook_context={},
+            local_borg_version=None,
+            create_arguments=create_arguments,
+            global_arguments=flexmock(monitoring_verbosity=1, dry_run=False),
+            dry_run_label='',
+            local_path=None,
+            remote_path=None,
+        )
+    )
+
+    assert create_archive_kwargs['json'] is False
+
+
+def test_run_create_with_prometheus_hook_and_json_records_metrics_and_yields_create_output():
+    flexmock(module.logger).answer = lambda message: None
+    flexmock(module.borgmatic.hooks.command).should_receive('execute_hook')
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks').and_return({})
+    flexmock(module.borgmatic.hooks.dispatch).should_receive(
+        'call_hooks_even_if_unconfigured'
+    ).and_return({})
+    flexmock(module.borgmatic.borg.create).should_receive('create_archive').replace_with(
+        lambda *args, **kwargs: '{"archive": {}}'
+    )
+    flexmock(module.borgmatic.metrics).should_receive('record_archive_stats').with_args(
+        'test.yaml', 'repo', {'archive': {}}
+    ).once()
+    create_arguments = flexmock(
+        repository=None, progress=False, stats=False, json=True, list_files=True
+    )
+
+    assert list(
+        module.run_create(
+            config_filename='test.yaml',
+            repository={'path': 'repo'},
+            location={},
+            storage={},
+            hooks={'prometheus': {'textfile': 'borgmatic.prom'}},
+            hook_context={},
+            local_borg_version=None,
+            create_arguments=create_arguments,
+            global_arguments=flexmock(monitoring_verbosity=1, dry_run=False),
+            dry_run_label='',
+            local_path=None,
+            remote_path=None,
+        )
+    ) == [{'archive': {}}]
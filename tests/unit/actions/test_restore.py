@@ -58,7 +58,7 @@ def test_get_configured_database_with_unspecified_hook_matches_database_by_name(
 
 def test_collect_archive_database_names_parses_archive_paths():
     flexmock(module.borgmatic.hooks.dump).should_receive('make_database_dump_path').and_return('')
-    flexmock(module.borgmatic.borg.list).should_receive('capture_archive_listing').and_return(
+    flexmock(module.borgmatic.borg.list).should_receive('stream_archive_listing').and_return(
         [
             '.borgmatic/postgresql_databases/localhost/foo',
             '.borgmatic/postgresql_databases/localhost/bar',
@@ -84,7 +84,7 @@ def test_collect_archive_database_names_parses_archive_paths():
 
 def test_collect_archive_database_names_parses_directory_format_archive_paths():
     flexmock(module.borgmatic.hooks.dump).should_receive('make_database_dump_path').and_return('')
-    flexmock(module.borgmatic.borg.list).should_receive('capture_archive_listing').and_return(
+    flexmock(module.borgmatic.borg.list).should_receive('stream_archive_listing').and_return(
         [
             '.borgmatic/postgresql_databases/localhost/foo/table1',
             '.borgmatic/postgresql_databases/localhost/foo/table2',
@@ -108,7 +108,7 @@ def test_collect_archive_database_names_parses_directory_format_archive_paths():
 
 def test_collect_archive_database_names_skips_bad_archive_paths():
     flexmock(module.borgmatic.hooks.dump).should_receive('make_database_dump_path').and_return('')
-    flexmock(module.borgmatic.borg.list).should_receive('capture_archive_listing').and_return(
+    flexmock(module.borgmatic.borg.list).should_receive('stream_archive_listing').and_return(
         ['.borgmatic/postgresql_databases/localhost/foo', '.borgmatic/invalid', 'invalid/as/well']
     )
 
@@ -211,6 +211,288 @@ def test_ensure_databases_found_with_missing_databases_raises():
         )
 
 
+def test_restore_database_from_stream_restores_via_hook_and_closes_stream():
+    extract_stream = flexmock()
+    extract_stream.should_receive('close').once()
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks').with_args(
+        'restore_database_dump',
+        {'postgresql_databases': [{'name': 'foo'}]},
+        'repo',
+        object,
+        {},
+        False,
+        None,
+        extract_stream=extract_stream,
+        compression='zstd',
+    ).once()
+
+    module.restore_database_from_stream(
+        {},
+        flexmock(dry_run=False),
+        'postgresql_databases',
+        {'name': 'foo'},
+        extract_stream,
+        'repo',
+        'zstd',
+    )
+
+
+def test_restore_database_from_stream_with_restore_error_closes_stream():
+    extract_stream = flexmock()
+    extract_stream.should_receive('close').once()
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks').and_raise(ValueError)
+
+    with pytest.raises(ValueError):
+        module.restore_database_from_stream(
+            {},
+            flexmock(dry_run=False),
+            'postgresql_databases',
+            {'name': 'foo'},
+            extract_stream,
+            'repo',
+        )
+
+
+def test_find_dump_for_member_removes_and_returns_matching_dump():
+    pending_dumps = [
+        ('postgresql_databases', {'name': 'foo'}, '/root/.borgmatic/postgresql_databases/*/foo'),
+        ('mysql_databases', {'name': 'bar'}, '/root/.borgmatic/mysql_databases/*/bar'),
+    ]
+
+    assert module.find_dump_for_member(
+        'root/.borgmatic/mysql_databases/localhost/bar', pending_dumps
+    ) == ('mysql_databases', {'name': 'bar'}, '/root/.borgmatic/mysql_databases/*/bar')
+    assert pending_dumps == [
+        ('postgresql_databases', {'name': 'foo'}, '/root/.borgmatic/postgresql_databases/*/foo'),
+    ]
+
+
+def test_find_dump_for_member_without_matching_dump_returns_none():
+    pending_dumps = [
+        ('postgresql_databases', {'name': 'foo'}, '/root/.borgmatic/postgresql_databases/*/foo'),
+    ]
+
+    assert (
+        module.find_dump_for_member(
+            'root/.borgmatic/postgresql_databases/localhost/food', pending_dumps
+        )
+        is None
+    )
+    assert len(pending_dumps) == 1
+
+
+def test_restore_databases_in_single_pass_with_dry_run_calls_hooks_without_stream():
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks').with_args(
+        'make_database_dump_pattern', object, object, object, object, 'foo'
+    ).and_return({'postgresql_databases': '/dumps/postgresql_databases/*/foo'})
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks').with_args(
+        'make_database_dump_pattern', object, object, object, object, 'bar'
+    ).and_return({'mysql_databases': '/dumps/mysql_databases/*/bar'})
+    flexmock(module.borgmatic.borg.export_tar).should_receive('export_tar_archive').with_args(
+        True,
+        'repo',
+        'archive',
+        ['sh:dumps/postgresql_databases/*/foo', 'sh:dumps/mysql_databases/*/bar'],
+        '-',
+        object,
+        object,
+        local_path='borg',
+        remote_path=None,
+        run_to_completion=False,
+    ).and_return(None)
+    flexmock(module.borgmatic.hooks.dispatch).should_receive('call_hooks').with_args(
+        'restore_database_dump', object, 'repo', object, object, True, None
+    ).twice()
+    flexmock(module.borgmatic.execute).should_receive('log_outputs').never()
+
+    module.restore_databases_in_single_pass(
+        'repo',
+        location={},
+        storage={},
+        hooks={},
+        local_borg_version='1.2.3',
+        global_arguments=flexmock(dry_run=True),
+        local_path='borg',
+        remote_path=None,
+        archive_name='archive',
+        hook_databases=[
+            ('postgresql_databases', {'name': 'foo'}),
+            ('mysql_databases', {'name': 'bar'}),
+        ],
+    )
+
+
+def test_restore_databases_with_single_job_restores_each_database_in_turn():
+    flexmock(module).should_receive('restore_single_database').with_args(
+        'repo',
+        object,
+        object,
+        object,
+        object,
+        object,
+        object,
+        object,
+        'archive',
+        'postgresql_databases',
+        {'name': 'foo'},
+    ).once()
+    flexmock(module).should_receive('restore_single_database').with_args(
+        'repo',
+        object,
+        object,
+        object,
+        object,
+        object,
+        object,
+        object,
+        'archive',
+        'mysql_databases',
+        {'name': 'bar'},
+    ).once()
+
+    module.restore_databases(
+        'repo',
+        location={},
+        storage={},
+        hooks={},
+        local_borg_version='1.2.3',
+        global_arguments=flexmock(dry_run=False),
+        local_path='borg',
+        remote_path=None,
+        archive_name='archive',
+        hook_databases=[
+            ('postgresql_databases', {'name': 'foo'}),
+            ('mysql_databases', {'name': 'bar'}),
+        ],
+        jobs=1,
+    )
+
+
+def test_restore_databases_with_single_pass_restores_directory_format_databases_separately():
+    flexmock(module).should_receive('restore_databases_in_single_pass').with_args(
+        'repo',
+        object,
+        object,
+        object,
+        object,
+        object,
+        object,
+        object,
+        'archive',
+        [('postgresql_databases', {'name': 'foo'}), ('mysql_databases', {'name': 'bar'})],
+        jobs=1,
+    ).once()
+    flexmock(module).should_receive('restore_single_database').with_args(
+        'repo',
+        object,
+        object,
+        object,
+        object,
+        object,
+        object,
+        object,
+        'archive',
+        'postgresql_databases',
+        {'name': 'baz', 'format': 'directory'},
+    ).once()
+
+    module.restore_databases(
+        'repo',
+        location={},
+        storage={},
+        hooks={},
+        local_borg_version='1.2.3',
+        global_arguments=flexmock(dry_run=False),
+        local_path='borg',
+        remote_path=None,
+        archive_name='archive',
+        hook_databases=[
+            ('postgresql_databases', {'name': 'foo'}),
+            ('postgresql_databases', {'name': 'baz', 'format': 'directory'}),
+            ('mysql_databases', {'name': 'bar'}),
+        ],
+        jobs=1,
+        single_pass=True,
+    )
+
+
+def test_restore_databases_with_single_pass_and_only_directory_format_databases_skips_single_pass():
+    flexmock(module).should_receive('restore_databases_in_single_pass').never()
+    flexmock(module).should_receive('restore_single_database').once()
+
+    module.restore_databases(
+        'repo',
+        location={},
+        storage={},
+        hooks={},
+        local_borg_version='1.2.3',
+        global_arguments=flexmock(dry_run=False),
+        local_path='borg',
+        remote_path=None,
+        archive_name='archive',
+        hook_databases=[('postgresql_databases', {'name': 'baz', 'format': 'directory'})],
+        jobs=1,
+        single_pass=True,
+    )
+
+
+def test_restore_databases_with_multiple_jobs_restores_databases_concurrently():
+    restored_names = []
+
+    def restore_single_database(*args, log_prefix):
+        database = args[-1]
+        assert log_prefix == f'repo: {database["name"]}'
+        restored_names.append(database['name'])
+
+    flexmock(module).should_receive('restore_single_database').replace_with(restore_single_database)
+
+    module.restore_databases(
+        'repo',
+        location={},
+        storage={},
+        hooks={},
+        local_borg_version='1.2.3',
+        global_arguments=flexmock(dry_run=False),
+        local_path='borg',
+        remote_path=None,
+        archive_name='archive',
+        hook_databases=[
+            ('postgresql_databases', {'name': 'foo'}),
+            ('mysql_databases', {'name': 'bar'}),
+            ('mysql_databases', {'name': 'baz'}),
+        ],
+        jobs=2,
+    )
+
+    assert sorted(restored_names) == ['bar', 'baz', 'foo']
+
+
+def test_restore_databases_with_multiple_jobs_and_restore_error_raises():
+    def restore_single_database(*args, log_prefix):
+        if args[-1]['name'] == 'bar':
+            raise ValueError('Oops')
+
+    flexmock(module).should_receive('restore_single_database').replace_with(restore_single_database)
+
+    with pytest.raises(ValueError):
+        module.restore_databases(
+            'repo',
+            location={},
+            storage={},
+            hooks={},
+            local_borg_version='1.2.3',
+            global_arguments=flexmock(dry_run=False),
+            local_path='borg',
+            remote_path=None,
+            archive_name='archive',
+            hook_databases=[
+                ('postgresql_databases', {'name': 'foo'}),
+                ('mysql_databases', {'name': 'bar'}),
+            ],
+            jobs=2,
+        )
+
+
 def test_run_restore_restores_each_database():
     restore_names = {
         'postgresql_databases': ['foo', 'bar'],
@@ -256,12 +538,17 @@ def test_run_restore_restores_each_database():
 
     module.run_restore(
         repository={'path': 'repo'},
-        location=flexmock(),
+        location={},
         storage=flexmock(),
         hooks=flexmock(),
         local_borg_version=flexmock(),
         restore_arguments=flexmock(
-            repository='repo', archive='archive', databases=flexmock(), schemas=None
+            repository='repo',
+            archive='archive',
+            databases=flexmock(),
+            schemas=None,
+            restore_jobs=1,
+            single_pass=False,
         ),
         global_arguments=flexmock(dry_run=False),
         local_path=flexmock(),
@@ -280,7 +567,7 @@ def test_run_restore_bails_for_non_matching_repository():
 
     module.run_restore(
         repository={'path': 'repo'},
-        location=flexmock(),
+        location={},
         storage=flexmock(),
         hooks=flexmock(),
         local_borg_version=flexmock(),
@@ -352,12 +639,17 @@ def test_run_restore_restores_database_configured_with_all_name():
 
     module.run_restore(
         repository={'path': 'repo'},
-        location=flexmock(),
+        location={},
         storage=flexmock(),
         hooks=flexmock(),
         local_borg_version=flexmock(),
         restore_arguments=flexmock(
-            repository='repo', archive='archive', databases=flexmock(), schemas=None
+            repository='repo',
+            archive='archive',
+            databases=flexmock(),
+            schemas=None,
+            restore_jobs=1,
+            single_pass=False,
         ),
         global_arguments=flexmock(dry_run=False),
         local_path=flexmock(),
@@ -426,12 +718,17 @@ def test_run_restore_skips_missing_database():
 
     module.run_restore(
         repository={'path': 'repo'},
-        location=flexmock(),
+        location={},
         storage=flexmock(),
         hooks=flexmock(),
         local_borg_version=flexmock(),
         restore_arguments=flexmock(
-            repository='repo', archive='archive', databases=flexmock(), schemas=None
+            repository='repo',
+            archive='archive',
+            databases=flexmock(),
+            schemas=None,
+            restore_jobs=1,
+            single_pass=False,
         ),
         global_arguments=flexmock(dry_run=False),
         local_path=flexmock(),
@@ -494,12 +791,17 @@ def test_run_restore_restores_databases_from_different_hooks():
 
     module.run_restore(
         repository={'path': 'repo'},
-        location=flexmock(),
+        location={},
         storage=flexmock(),
         hooks=flexmock(),
         local_borg_version=flexmock(),
         restore_arguments=flexmock(
-            repository='repo', archive='archive', databases=flexmock(), schemas=None
+            repository='repo',
+            archive='archive',
+            databases=flexmock(),
+            schemas=None,
+            restore_jobs=1,
+            single_pass=False,
         ),
         global_arguments=flexmock(dry_run=False),
         local_path=flexmock(),
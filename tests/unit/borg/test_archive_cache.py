@@ -0,0 +1,87 @@
+from flexmock import flexmock
+
+from borgmatic.borg import archive_cache as module
+
+
+def test_make_latest_archive_cache_path_uses_borgmatic_source_directory_and_hashed_repository():
+    path = module.make_latest_archive_cache_path('/home/user/.borgmatic', 'repo')
+
+    assert path.startswith('/home/user/.borgmatic/archive_cache/')
+    assert path != module.make_latest_archive_cache_path('/home/user/.borgmatic', 'other')
+
+
+def test_make_latest_archive_cache_path_without_borgmatic_source_directory_uses_default():
+    flexmock(module.os.path).should_receive('expanduser').with_args('repo').and_return('repo')
+    flexmock(module.os.path).should_receive('expanduser').with_args(
+        module.state.DEFAULT_BORGMATIC_SOURCE_DIRECTORY
+    ).and_return('/root/.borgmatic').once()
+
+    assert module.make_latest_archive_cache_path(None, 'repo').startswith(
+        '/root/.borgmatic/archive_cache/'
+    )
+
+
+def test_read_cached_latest_archive_returns_fresh_cached_name():
+    flexmock(module).should_receive('make_latest_archive_cache_path').and_return('/cache')
+    flexmock(module.time).should_receive('time').and_return(1000)
+    flexmock(module.os).should_receive('stat').and_return(flexmock(st_mtime=990))
+    flexmock(module.state).should_receive('read_state_file').with_args('/cache').and_return(
+        {'repository': 'repo', 'latest_archive': 'archive'}
+    )
+
+    assert module.read_cached_latest_archive(None, 'repo', max_age_seconds=60) == 'archive'
+
+
+def test_read_cached_latest_archive_with_stale_cache_returns_none():
+    flexmock(module).should_receive('make_latest_archive_cache_path').and_return('/cache')
+    flexmock(module.time).should_receive('time').and_return(1000)
+    flexmock(module.os).should_receive('stat').and_return(flexmock(st_mtime=900))
+    flexmock(module.state).should_receive('read_state_file').never()
+
+    assert module.read_cached_latest_archive(None, 'repo', max_age_seconds=60) is None
+
+
+def test_read_cached_latest_archive_with_missing_cache_returns_none():
+    flexmock(module).should_receive('make_latest_archive_cache_path').and_return('/cache')
+    flexmock(module.os).should_receive('stat').and_raise(FileNotFoundError)
+
+    assert module.read_cached_latest_archive(None, 'repo', max_age_seconds=60) is None
+
+
+def test_read_cached_latest_archive_with_corrupt_cache_returns_none():
+    flexmock(module).should_receive('make_latest_archive_cache_path').and_return('/cache')
+    flexmock(module.time).should_receive('time').and_return(1000)
+    flexmock(module.os).should_receive('stat').and_return(flexmock(st_mtime=990))
+    flexmock(module.state).should_receive('read_state_file').and_return(None)
+
+    assert module.read_cached_latest_archive(None, 'repo', max_age_seconds=60) is None
+
+
+def test_write_cached_latest_archive_writes_state_file():
+    flexmock(module).should_receive('make_latest_archive_cache_path').and_return('/cache/dir/repo')
+    flexmock(module.state).should_receive('write_state_file').with_args(
+        '/cache/dir/repo', {'repository': 'repo', 'latest_archive': 'archive'}
+    ).once()
+
+    module.write_cached_latest_archive(None, 'repo', 'archive')
+
+
+def test_write_cached_latest_archive_with_error_does_not_raise():
+    flexmock(module).should_receive('make_latest_archive_cache_path').and_return('/cache/dir/repo')
+    flexmock(module.state).should_receive('write_state_file').and_raise(PermissionError)
+
+    module.write_cached_latest_archive(None, 'repo', 'archive')
+
+
+def test_invalidate_cached_latest_archive_removes_cache_file():
+    flexmock(module).should_receive('make_latest_archive_cache_path').and_return('/cache')
+    flexmock(module.os).should_receive('remove').with_args('/cache').once()
+
+    module.invalidate_cached_latest_archive(None, 'repo')
+
+
+def test_invalidate_cached_latest_archive_with_missing_cache_file_does_not_raise():
+    flexmock(module).should_receive('make_latest_archive_cache_path').and_return('/cache')
+    flexmock(module.os).should_receive('remove').and_raise(FileNotFoundError)
+
+    module.invalidate_cached_latest_archive(None, 'repo')
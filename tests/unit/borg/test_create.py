@@ -1,4 +1,5 @@
 import logging
+import os
 import sys
 
 import pytest
@@ -60,8 +61,12 @@ def test_expand_home_directories_considers_none_as_no_directories():
 
 
 def test_map_directories_to_devices_gives_device_id_per_path():
-    flexmock(module.os).should_receive('stat').with_args('/foo').and_return(flexmock(st_dev=55))
-    flexmock(module.os).should_receive('stat').with_args('/bar').and_return(flexmock(st_dev=66))
+    flexmock(module.scan).should_receive('stat_path').with_args('/foo', stat_cache=None).and_return(
+        flexmock(st_dev=55)
+    )
+    flexmock(module.scan).should_receive('stat_path').with_args('/bar', stat_cache=None).and_return(
+        flexmock(st_dev=66)
+    )
 
     device_map = module.map_directories_to_devices(('/foo', '/bar'))
 
@@ -71,9 +76,22 @@ def test_map_directories_to_devices_gives_device_id_per_path():
     }
 
 
+def test_map_directories_to_devices_passes_through_stat_cache():
+    stat_cache = flexmock()
+    flexmock(module.scan).should_receive('stat_path').with_args(
+        '/foo', stat_cache=stat_cache
+    ).and_return(flexmock(st_dev=55))
+
+    assert module.map_directories_to_devices(('/foo',), stat_cache=stat_cache) == {'/foo': 55}
+
+
 def test_map_directories_to_devices_with_missing_path_does_not_error():
-    flexmock(module.os).should_receive('stat').with_args('/foo').and_return(flexmock(st_dev=55))
-    flexmock(module.os).should_receive('stat').with_args('/bar').and_raise(FileNotFoundError)
+    flexmock(module.scan).should_receive('stat_path').with_args('/foo', stat_cache=None).and_return(
+        flexmock(st_dev=55)
+    )
+    flexmock(module.scan).should_receive('stat_path').with_args('/bar', stat_cache=None).and_return(
+        None
+    )
 
     device_map = module.map_directories_to_devices(('/foo', '/bar'))
 
@@ -325,22 +343,34 @@ def test_make_list_filter_flags_with_info_and_feature_not_available_omits_x():
     assert module.make_list_filter_flags(local_borg_version=flexmock(), dry_run=False) == 'AME-'
 
 
+def test_collect_borgmatic_source_directories_uses_stat_cache():
+    stat_cache = flexmock()
+    flexmock(module.os.path).should_receive('expanduser').and_return('/root/.borgmatic')
+    flexmock(module.scan).should_receive('stat_path').with_args(
+        '/root/.borgmatic', stat_cache
+    ).and_return(flexmock())
+
+    assert module.collect_borgmatic_source_directories('~/.borgmatic', stat_cache) == [
+        '~/.borgmatic'
+    ]
+
+
 def test_collect_borgmatic_source_directories_set_when_directory_exists():
-    flexmock(module.os.path).should_receive('exists').and_return(True)
+    flexmock(module.scan).should_receive('stat_path').and_return(flexmock())
     flexmock(module.os.path).should_receive('expanduser')
 
     assert module.collect_borgmatic_source_directories('/tmp') == ['/tmp']
 
 
 def test_collect_borgmatic_source_directories_empty_when_directory_does_not_exist():
-    flexmock(module.os.path).should_receive('exists').and_return(False)
+    flexmock(module.scan).should_receive('stat_path').and_return(None)
     flexmock(module.os.path).should_receive('expanduser')
 
     assert module.collect_borgmatic_source_directories('/tmp') == []
 
 
 def test_collect_borgmatic_source_directories_defaults_when_directory_not_given():
-    flexmock(module.os.path).should_receive('exists').and_return(True)
+    flexmock(module.scan).should_receive('stat_path').and_return(flexmock())
     flexmock(module.os.path).should_receive('expanduser')
 
     assert module.collect_borgmatic_source_directories(None) == [
@@ -385,22 +415,61 @@ def test_special_file_treats_broken_symlink_as_non_special():
     assert module.special_file('/broken/symlink') is False
 
 
+def test_make_parent_directory_prefixes_sorts_and_omits_redundant_candidates():
+    assert module.make_parent_directory_prefixes(
+        ('/foo/bar', '/etc', '/foo', '/foo-bar/', '/etc')
+    ) == ('/etc/', '/foo-bar/', '/foo/')
+
+
+def test_make_parent_directory_prefixes_handles_root_directory():
+    assert module.make_parent_directory_prefixes(('/', '/etc')) == ('/',)
+
+
 def test_any_parent_directories_treats_parents_as_match():
-    module.any_parent_directories('/foo/bar.txt', ('/foo', '/etc'))
+    assert module.any_parent_directories('/foo/bar.txt', ('/etc/', '/foo/'))
 
 
 def test_any_parent_directories_treats_grandparents_as_match():
-    module.any_parent_directories('/foo/bar/baz.txt', ('/foo', '/etc'))
+    assert module.any_parent_directories('/foo/bar/baz.txt', ('/etc/', '/foo/'))
 
 
 def test_any_parent_directories_treats_unrelated_paths_as_non_match():
-    module.any_parent_directories('/foo/bar.txt', ('/usr', '/etc'))
+    assert not module.any_parent_directories('/foo/bar.txt', ('/etc/', '/usr/'))
+
+
+def test_any_parent_directories_treats_directory_itself_as_non_match():
+    assert not module.any_parent_directories('/foo', ('/etc/', '/foo/'))
+
+
+def test_any_parent_directories_treats_sibling_with_same_prefix_as_non_match():
+    assert not module.any_parent_directories('/foo-bar/baz.txt', ('/etc/', '/foo/'))
+
+
+def test_any_parent_directories_treats_path_sorting_before_all_prefixes_as_non_match():
+    assert not module.any_parent_directories('/aaa/bar.txt', ('/etc/', '/foo/'))
+
+
+def test_non_regular_file_names_returns_names_of_non_regular_entries(tmp_path):
+    (tmp_path / 'file').write_text('content')
+    (tmp_path / 'directory').mkdir()
+    os.mkfifo(tmp_path / 'fifo')
+    os.symlink('/dev/null', tmp_path / 'symlink')
+
+    assert module.non_regular_file_names(str(tmp_path)) == {'fifo', 'symlink'}
+
+
+def test_non_regular_file_names_with_scandir_error_returns_none():
+    flexmock(module.os).should_receive('scandir').and_raise(PermissionError)
+
+    assert module.non_regular_file_names('/foo') is None
 
 
 def test_collect_special_file_paths_parses_special_files_from_borg_dry_run_file_list():
-    flexmock(module).should_receive('execute_command_and_capture_output').and_return(
-        'Processing files ...\n- /foo\n+ /bar\n- /baz'
+    flexmock(module).should_receive('execute_command_and_stream_output').and_return(
+        iter(('Processing files ...', '- /foo', '+ /bar', '- /baz'))
     )
+    flexmock(module).should_receive('make_parent_directory_prefixes').and_return(())
+    flexmock(module).should_receive('non_regular_file_names').and_return({'foo', 'bar', 'baz'})
     flexmock(module).should_receive('special_file').and_return(True)
     flexmock(module).should_receive('any_parent_directories').and_return(False)
 
@@ -414,9 +483,11 @@ def test_collect_special_file_paths_parses_special_files_from_borg_dry_run_file_
 
 
 def test_collect_special_file_paths_excludes_requested_directories():
-    flexmock(module).should_receive('execute_command_and_capture_output').and_return(
-        '+ /foo\n- /bar\n- /baz'
+    flexmock(module).should_receive('execute_command_and_stream_output').and_return(
+        iter(('+ /foo', '- /bar', '- /baz'))
     )
+    flexmock(module).should_receive('make_parent_directory_prefixes').and_return(())
+    flexmock(module).should_receive('non_regular_file_names').and_return({'foo', 'bar', 'baz'})
     flexmock(module).should_receive('special_file').and_return(True)
     flexmock(module).should_receive('any_parent_directories').and_return(False).and_return(
         True
@@ -432,9 +503,11 @@ def test_collect_special_file_paths_excludes_requested_directories():
 
 
 def test_collect_special_file_paths_excludes_non_special_files():
-    flexmock(module).should_receive('execute_command_and_capture_output').and_return(
-        '+ /foo\n+ /bar\n+ /baz'
+    flexmock(module).should_receive('execute_command_and_stream_output').and_return(
+        iter(('+ /foo', '+ /bar', '+ /baz'))
     )
+    flexmock(module).should_receive('make_parent_directory_prefixes').and_return(())
+    flexmock(module).should_receive('non_regular_file_names').and_return({'foo', 'bar', 'baz'})
     flexmock(module).should_receive('special_file').and_return(True).and_return(False).and_return(
         True
     )
@@ -449,6 +522,51 @@ def test_collect_special_file_paths_excludes_non_special_files():
     ) == ('/foo', '/baz')
 
 
+def test_collect_special_file_paths_only_stats_files_with_non_regular_directory_entries():
+    flexmock(module).should_receive('execute_command_and_stream_output').and_return(
+        iter(('+ /dir/foo', '+ /dir/bar', '+ /other/baz'))
+    )
+    flexmock(module).should_receive('make_parent_directory_prefixes').and_return(())
+    flexmock(module).should_receive('non_regular_file_names').with_args('/dir').and_return(
+        {'bar'}
+    ).once()
+    flexmock(module).should_receive('non_regular_file_names').with_args('/other').and_return(
+        None
+    ).once()
+    flexmock(module).should_receive('special_file').with_args('/dir/foo', None).never()
+    flexmock(module).should_receive('special_file').with_args('/dir/bar', None).and_return(True)
+    flexmock(module).should_receive('special_file').with_args('/other/baz', None).and_return(True)
+    flexmock(module).should_receive('any_parent_directories').and_return(False)
+
+    assert module.collect_special_file_paths(
+        ('borg', 'create'),
+        local_path=None,
+        working_directory=None,
+        borg_environment=None,
+        skip_directories=flexmock(),
+    ) == ('/dir/bar', '/other/baz')
+
+
+def test_collect_special_file_paths_with_working_directory_checks_files_relative_to_it():
+    flexmock(module).should_receive('execute_command_and_stream_output').and_return(
+        iter(('+ foo',))
+    )
+    flexmock(module).should_receive('make_parent_directory_prefixes').and_return(())
+    flexmock(module).should_receive('non_regular_file_names').with_args('/working').and_return(
+        {'foo'}
+    )
+    flexmock(module).should_receive('special_file').with_args('/working/foo', None).and_return(True)
+    flexmock(module).should_receive('any_parent_directories').and_return(False)
+
+    assert module.collect_special_file_paths(
+        ('borg', 'create'),
+        local_path=None,
+        working_directory='/working',
+        borg_environment=None,
+        skip_directories=flexmock(),
+    ) == ('foo',)
+
+
 DEFAULT_ARCHIVE_NAME = '{hostname}-{now:%Y-%m-%dT%H:%M:%S.%f}'  # noqa: FS003
 REPO_ARCHIVE_WITH_PATHS = (f'repo::{DEFAULT_ARCHIVE_NAME}', 'foo', 'bar')
 
@@ -695,6 +813,7 @@ def test_create_archive_with_log_info_and_json_suppresses_most_borg_output():
         ('borg', 'create') + REPO_ARCHIVE_WITH_PATHS + ('--json',),
         working_directory=None,
         extra_environment=None,
+        borg_local_path='borg',
     )
     insert_logging_mock(logging.INFO)
 
@@ -779,6 +898,7 @@ def test_create_archive_with_log_debug_and_json_suppresses_most_borg_output():
         ('borg', 'create') + REPO_ARCHIVE_WITH_PATHS + ('--json',),
         working_directory=None,
         extra_environment=None,
+        borg_local_path='borg',
     )
     insert_logging_mock(logging.DEBUG)
 
@@ -1257,7 +1377,7 @@ def test_create_archive_with_read_special_calls_borg_with_read_special_parameter
         (f'repo::{DEFAULT_ARCHIVE_NAME}',)
     )
     flexmock(module.environment).should_receive('make_environment')
-    flexmock(module).should_receive('collect_special_file_paths').and_return(())
+    flexmock(module.scan).should_receive('find_special_file_paths').and_return(())
     create_command = ('borg', 'create', '--read-special') + REPO_ARCHIVE_WITH_PATHS
     flexmock(module).should_receive('execute_command').with_args(
         create_command + ('--dry-run', '--list'),
@@ -1865,7 +1985,7 @@ def test_create_archive_with_progress_and_stream_processes_calls_borg_with_progr
         (f'repo::{DEFAULT_ARCHIVE_NAME}',)
     )
     flexmock(module.environment).should_receive('make_environment')
-    flexmock(module).should_receive('collect_special_file_paths').and_return(())
+    flexmock(module.scan).should_receive('find_special_file_paths').and_return(())
     create_command = (
         ('borg', 'create', '--one-file-system', '--read-special')
         + REPO_ARCHIVE_WITH_PATHS
@@ -1927,7 +2047,7 @@ def test_create_archive_with_stream_processes_ignores_read_special_false_and_log
         (f'repo::{DEFAULT_ARCHIVE_NAME}',)
     )
     flexmock(module.environment).should_receive('make_environment')
-    flexmock(module).should_receive('collect_special_file_paths').and_return(('/dev/null',))
+    flexmock(module.scan).should_receive('find_special_file_paths').and_return(('/dev/null',))
     create_command = (
         'borg',
         'create',
@@ -1995,7 +2115,7 @@ def test_create_archive_with_stream_processes_adds_special_files_to_excludes():
         (f'repo::{DEFAULT_ARCHIVE_NAME}',)
     )
     flexmock(module.environment).should_receive('make_environment')
-    flexmock(module).should_receive('collect_special_file_paths').and_return(('special',))
+    flexmock(module.scan).should_receive('find_special_file_paths').and_return(('special',))
     create_command = (
         'borg',
         'create',
@@ -2035,6 +2155,57 @@ def test_create_archive_with_stream_processes_adds_special_files_to_excludes():
     )
 
 
+def test_create_archive_with_stream_processes_and_patterns_collects_special_files_via_borg():
+    flexmock(module.borgmatic.logger).should_receive('add_custom_log_levels')
+    flexmock(module.logging).ANSWER = module.borgmatic.logger.ANSWER
+    processes = flexmock()
+    flexmock(module).should_receive('collect_borgmatic_source_directories').and_return([])
+    flexmock(module).should_receive('deduplicate_directories').and_return(('foo', 'bar'))
+    flexmock(module).should_receive('map_directories_to_devices').and_return({})
+    flexmock(module).should_receive('expand_directories').and_return(())
+    flexmock(module).should_receive('pattern_root_directories').and_return([])
+    flexmock(module.os.path).should_receive('expanduser').and_raise(TypeError)
+    flexmock(module).should_receive('expand_home_directories').and_return(())
+    flexmock(module).should_receive('write_pattern_file').and_return(None)
+    flexmock(module).should_receive('make_list_filter_flags').and_return('FOO')
+    flexmock(module.feature).should_receive('available').and_return(True)
+    flexmock(module).should_receive('ensure_files_readable')
+    flexmock(module).should_receive('make_pattern_flags').and_return(
+        ('--patterns-from', 'patterns')
+    )
+    flexmock(module).should_receive('make_exclude_flags').and_return(())
+    flexmock(module.flags).should_receive('make_repository_archive_flags').and_return(
+        (f'repo::{DEFAULT_ARCHIVE_NAME}',)
+    )
+    flexmock(module.environment).should_receive('make_environment')
+    flexmock(module).should_receive('collect_special_file_paths').and_return(()).once()
+    flexmock(module.scan).should_receive('find_special_file_paths').never()
+    flexmock(module).should_receive('execute_command_with_processes').with_args(
+        ('borg', 'create', '--patterns-from', 'patterns', '--one-file-system', '--read-special')
+        + REPO_ARCHIVE_WITH_PATHS,
+        processes=processes,
+        output_log_level=logging.INFO,
+        output_file=None,
+        borg_local_path='borg',
+        working_directory=None,
+        extra_environment=None,
+    )
+
+    module.create_archive(
+        dry_run=False,
+        repository_path='repo',
+        location_config={
+            'source_directories': ['foo', 'bar'],
+            'repositories': ['repo'],
+            'patterns_from': ['patterns'],
+            'exclude_patterns': None,
+        },
+        storage_config={},
+        local_borg_version='1.2.3',
+        stream_processes=processes,
+    )
+
+
 def test_create_archive_with_stream_processes_and_read_special_does_not_add_special_files_to_excludes():
     flexmock(module.borgmatic.logger).should_receive('add_custom_log_levels')
     flexmock(module.logging).ANSWER = module.borgmatic.logger.ANSWER
@@ -2058,7 +2229,7 @@ def test_create_archive_with_stream_processes_and_read_special_does_not_add_spec
         (f'repo::{DEFAULT_ARCHIVE_NAME}',)
     )
     flexmock(module.environment).should_receive('make_environment')
-    flexmock(module).should_receive('collect_special_file_paths').and_return(('special',))
+    flexmock(module.scan).should_receive('find_special_file_paths').and_return(('special',))
     create_command = (
         'borg',
         'create',
@@ -2123,6 +2294,7 @@ def test_create_archive_with_json_calls_borg_with_json_parameter():
         ('borg', 'create') + REPO_ARCHIVE_WITH_PATHS + ('--json',),
         working_directory=None,
         extra_environment=None,
+        borg_local_path='borg',
     ).and_return('[]')
 
     json_output = module.create_archive(
@@ -2165,6 +2337,7 @@ def test_create_archive_with_stats_and_json_calls_borg_without_stats_parameter()
         ('borg', 'create') + REPO_ARCHIVE_WITH_PATHS + ('--json',),
         working_directory=None,
         extra_environment=None,
+        borg_local_path='borg',
     ).and_return('[]')
 
     json_output = module.create_archive(
@@ -2503,7 +2676,7 @@ def test_create_archive_with_stream_processes_calls_borg_with_processes_and_read
         (f'repo::{DEFAULT_ARCHIVE_NAME}',)
     )
     flexmock(module.environment).should_receive('make_environment')
-    flexmock(module).should_receive('collect_special_file_paths').and_return(())
+    flexmock(module.scan).should_receive('find_special_file_paths').and_return(())
     create_command = (
         'borg',
         'create',
@@ -2574,14 +2747,24 @@ def test_check_all_source_directories_exist_with_glob_and_tilde_directories():
     flexmock(module).should_receive('expand_directory').with_args('~/bar').and_return(
         ('/root/bar',)
     )
-    flexmock(module.os.path).should_receive('exists').and_return(False)
-    flexmock(module.os.path).should_receive('exists').with_args('foo').and_return(True)
-    flexmock(module.os.path).should_receive('exists').with_args('food').and_return(True)
-    flexmock(module.os.path).should_receive('exists').with_args('/root/bar').and_return(True)
+    flexmock(module.scan).should_receive('stat_path').and_return(None)
+    flexmock(module.scan).should_receive('stat_path').with_args('foo', None).and_return(flexmock())
+    flexmock(module.scan).should_receive('stat_path').with_args('food', None).and_return(flexmock())
+    flexmock(module.scan).should_receive('stat_path').with_args('/root/bar', None).and_return(
+        flexmock()
+    )
 
     module.check_all_source_directories_exist(['foo*', '~/bar'])
 
 
+def test_check_all_source_directories_exist_uses_stat_cache():
+    stat_cache = {('foo', True): flexmock()}
+    flexmock(module).should_receive('expand_directory').with_args('foo').and_return(('foo',))
+    flexmock(module.os).should_receive('stat').never()
+
+    module.check_all_source_directories_exist(['foo'], stat_cache=stat_cache)
+
+
 def test_check_all_source_directories_exist_with_non_existent_directory_raises():
     flexmock(module).should_receive('expand_directory').with_args('foo').and_return(('foo',))
     flexmock(module.os.path).should_receive('exists').and_return(False)
@@ -8,16 +8,27 @@ from ..test_verbosity import insert_logging_mock
 
 
 def insert_execute_command_mock(
-    command, output_log_level=logging.INFO, borg_local_path='borg', capture=True
+    command,
+    output_log_level=logging.INFO,
+    borg_local_path='borg',
+    capture=True,
+    output_file=None,
+    run_to_completion=True,
 ):
     flexmock(module.environment).should_receive('make_environment')
-    flexmock(module).should_receive('execute_command').with_args(
-        command,
-        output_file=None if capture else module.DO_NOT_CAPTURE,
-        output_log_level=output_log_level,
-        borg_local_path=borg_local_path,
-        extra_environment=None,
-    ).once()
+    return (
+        flexmock(module)
+        .should_receive('execute_command')
+        .with_args(
+            command,
+            output_file=output_file if capture else module.DO_NOT_CAPTURE,
+            output_log_level=output_log_level,
+            borg_local_path=borg_local_path,
+            extra_environment=None,
+            run_to_completion=run_to_completion,
+        )
+        .once()
+    )
 
 
 def test_export_tar_archive_calls_borg_with_path_parameters():
@@ -291,3 +302,31 @@ def test_export_tar_archive_calls_borg_with_stdout_destination_path():
         storage_config={},
         local_borg_version='1.2.3',
     )
+
+
+def test_export_tar_archive_without_run_to_completion_returns_process_streaming_to_stdout():
+    flexmock(module.borgmatic.logger).should_receive('add_custom_log_levels')
+    flexmock(module.logging).ANSWER = module.borgmatic.logger.ANSWER
+    flexmock(module.flags).should_receive('make_repository_archive_flags').and_return(
+        ('repo::archive',)
+    )
+    process = flexmock()
+    insert_execute_command_mock(
+        ('borg', 'export-tar', 'repo::archive', '-'),
+        output_file=module.subprocess.PIPE,
+        run_to_completion=False,
+    ).and_return(process)
+
+    assert (
+        module.export_tar_archive(
+            dry_run=False,
+            repository_path='repo',
+            archive='archive',
+            paths=None,
+            destination_path='-',
+            storage_config={},
+            local_borg_version='1.2.3',
+            run_to_completion=False,
+        )
+        == process
+    )
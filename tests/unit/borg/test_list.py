@@ -253,17 +253,21 @@ def test_make_find_paths_adds_globs_to_path_fragments():
     assert module.make_find_paths(('foo.txt',)) == ('sh:**/*foo.txt*/**',)
 
 
-def test_capture_archive_listing_does_not_raise():
+def test_stream_archive_listing_yields_non_blank_paths():
     flexmock(module.environment).should_receive('make_environment')
-    flexmock(module).should_receive('execute_command_and_capture_output').and_return('')
-    flexmock(module).should_receive('make_list_command')
+    flexmock(module).should_receive('make_list_command').and_return(('borg', 'list'))
+    flexmock(module).should_receive('execute_command_and_stream_output').with_args(
+        ('borg', 'list'), extra_environment=None
+    ).and_return(iter(('foo', '', 'bar baz ')))
 
-    module.capture_archive_listing(
-        repository_path='repo',
-        archive='archive',
-        storage_config=flexmock(),
-        local_borg_version=flexmock(),
-    )
+    assert list(
+        module.stream_archive_listing(
+            repository_path='repo',
+            archive='archive',
+            storage_config=flexmock(),
+            local_borg_version=flexmock(),
+        )
+    ) == ['foo', 'bar baz ']
 
 
 def test_list_archive_calls_borg_with_parameters():
@@ -386,10 +390,10 @@ def test_list_archive_calls_borg_multiple_times_with_find_paths():
 
     flexmock(module.feature).should_receive('available').and_return(False)
     flexmock(module.rlist).should_receive('make_rlist_command').and_return(('borg', 'list', 'repo'))
-    flexmock(module).should_receive('execute_command_and_capture_output').with_args(
+    flexmock(module).should_receive('execute_command_and_stream_output').with_args(
         ('borg', 'list', 'repo'),
         extra_environment=None,
-    ).and_return('archive1\narchive2').once()
+    ).and_return(iter(('archive1', 'archive2', ''))).once()
     flexmock(module).should_receive('make_list_command').and_return(
         ('borg', 'list', 'repo::archive1')
     ).and_return(('borg', 'list', 'repo::archive2'))
@@ -613,10 +617,10 @@ def test_list_archive_with_find_paths_allows_archive_filter_flag_but_only_passes
         remote_path=None,
     ).and_return(('borg', 'rlist', '--repo', 'repo'))
 
-    flexmock(module).should_receive('execute_command_and_capture_output').with_args(
+    flexmock(module).should_receive('execute_command_and_stream_output').with_args(
         ('borg', 'rlist', '--repo', 'repo'),
         extra_environment=None,
-    ).and_return('archive1\narchive2').once()
+    ).and_return(iter(('archive1', 'archive2'))).once()
 
     flexmock(module).should_receive('make_list_command').with_args(
         repository_path='repo',
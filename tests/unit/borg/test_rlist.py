@@ -39,6 +39,61 @@ def test_resolve_archive_name_calls_borg_with_parameters():
     )
 
 
+def test_resolve_archive_name_with_cache_seconds_returns_cached_archive_name():
+    flexmock(module.archive_cache).should_receive('read_cached_latest_archive').with_args(
+        '/.borgmatic', 'repo', 300
+    ).and_return('cached-archive')
+    flexmock(module).should_receive('execute_command_and_capture_output').never()
+    flexmock(module.archive_cache).should_receive('write_cached_latest_archive').never()
+
+    assert (
+        module.resolve_archive_name(
+            'repo',
+            'latest',
+            storage_config={'latest_archive_cache_seconds': 300},
+            local_borg_version='1.2.3',
+            borgmatic_source_directory='/.borgmatic',
+        )
+        == 'cached-archive'
+    )
+
+
+def test_resolve_archive_name_with_cache_seconds_and_cache_miss_calls_borg_and_caches_result():
+    expected_archive = 'archive-name'
+    flexmock(module.archive_cache).should_receive('read_cached_latest_archive').and_return(None)
+    flexmock(module.environment).should_receive('make_environment')
+    flexmock(module).should_receive('execute_command_and_capture_output').with_args(
+        ('borg', 'list') + BORG_LIST_LATEST_ARGUMENTS,
+        extra_environment=None,
+    ).and_return(expected_archive + '\n')
+    flexmock(module.archive_cache).should_receive('write_cached_latest_archive').with_args(
+        '/.borgmatic', 'repo', expected_archive
+    ).once()
+
+    assert (
+        module.resolve_archive_name(
+            'repo',
+            'latest',
+            storage_config={'latest_archive_cache_seconds': 300},
+            local_borg_version='1.2.3',
+            borgmatic_source_directory='/.borgmatic',
+        )
+        == expected_archive
+    )
+
+
+def test_resolve_archive_name_without_cache_seconds_does_not_use_cache():
+    flexmock(module.archive_cache).should_receive('read_cached_latest_archive').never()
+    flexmock(module.archive_cache).should_receive('write_cached_latest_archive').never()
+    flexmock(module.environment).should_receive('make_environment')
+    flexmock(module).should_receive('execute_command_and_capture_output').and_return('archive\n')
+
+    assert (
+        module.resolve_archive_name('repo', 'latest', storage_config={}, local_borg_version='1.2.3')
+        == 'archive'
+    )
+
+
 def test_resolve_archive_name_with_log_info_calls_borg_without_info_parameter():
     expected_archive = 'archive-name'
     flexmock(module.environment).should_receive('make_environment')
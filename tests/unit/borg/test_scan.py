@@ -0,0 +1,131 @@
+import pytest
+from flexmock import flexmock
+
+from borgmatic.borg import scan as module
+
+
+def test_stat_path_stats_path_and_caches_result():
+    stat_result = flexmock()
+    stat_cache = {}
+    flexmock(module.os).should_receive('stat').with_args('/foo', follow_symlinks=True).and_return(
+        stat_result
+    ).once()
+
+    assert module.stat_path('/foo', stat_cache) is stat_result
+    assert module.stat_path('/foo', stat_cache) is stat_result
+    assert stat_cache == {('/foo', True): stat_result}
+
+
+def test_stat_path_caches_missing_path():
+    stat_cache = {}
+    flexmock(module.os).should_receive('stat').with_args('/foo', follow_symlinks=True).and_raise(
+        FileNotFoundError
+    ).once()
+
+    assert module.stat_path('/foo', stat_cache) is None
+    assert module.stat_path('/foo', stat_cache) is None
+    assert stat_cache == {('/foo', True): None}
+
+
+def test_stat_path_without_stat_cache_stats_path_every_time():
+    stat_result = flexmock()
+    flexmock(module.os).should_receive('stat').with_args('/foo', follow_symlinks=True).and_return(
+        stat_result
+    ).twice()
+
+    assert module.stat_path('/foo') is stat_result
+    assert module.stat_path('/foo') is stat_result
+
+
+def test_stat_path_without_following_symlinks_caches_separately():
+    stat_result = flexmock()
+    lstat_result = flexmock()
+    stat_cache = {('/foo', True): stat_result}
+    flexmock(module.os).should_receive('stat').with_args('/foo', follow_symlinks=False).and_return(
+        lstat_result
+    ).once()
+
+    assert module.stat_path('/foo', stat_cache, follow_symlinks=False) is lstat_result
+    assert module.stat_path('/foo', stat_cache) is stat_result
+    assert stat_cache == {('/foo', True): stat_result, ('/foo', False): lstat_result}
+
+
+@pytest.mark.parametrize(
+    'pattern,path,expected_result',
+    (
+        ('/var/cache', '/var/cache', True),
+        ('/var/cache', '/var/cache/foo', True),
+        ('/var/cache', 'var/cache/foo', True),
+        ('/var/cache', '/var/cached', False),
+        ('fm:/var/*/tmp', '/var/foo/tmp/bar', True),
+        ('/var/cache/', '/var/cache', False),
+        ('/var/cache/', '/var/cache/foo', True),
+        ('*.pyc', '/src/foo.pyc', True),
+        ('*.pyc', '/src/foo.py', False),
+        ('pp:/var/cache', '/var/cache/foo', True),
+        ('pp:/var/cache/', '/var/cache', True),
+        ('pp:/var/cache', '/var/cached', False),
+        ('pf:/var/cache/foo', '/var/cache/foo', True),
+        ('pf:/var/cache', '/var/cache/foo', False),
+        ('re:cache/f', '/var/cache/foo', True),
+        ('re:^cache', '/var/cache/foo', False),
+        ('C:/foo', 'C:/foo/bar', True),
+    ),
+)
+def test_make_exclude_matcher_matches_like_borg(pattern, path, expected_result):
+    assert module.make_exclude_matcher(pattern)(path) is expected_result
+
+
+def test_make_exclude_matcher_with_unsupported_style_returns_none():
+    assert module.make_exclude_matcher('sh:/var/**/cache') is None
+
+
+def test_make_exclude_matcher_expands_tilde():
+    flexmock(module.os.path).should_receive('expanduser').with_args('~/cache').and_return(
+        '/root/cache'
+    )
+
+    assert module.make_exclude_matcher('pp:~/cache')('/root/cache/foo')
+
+
+def test_make_exclude_matchers_omits_unsupported_patterns():
+    matchers = module.make_exclude_matchers(('/foo', 'sh:/bar/**', 're:baz'))
+
+    assert len(matchers) == 2
+
+
+def test_make_exclude_matchers_with_no_patterns_returns_empty_tuple():
+    assert module.make_exclude_matchers(None) == ()
+
+
+class Entries(list):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+def test_scan_directory_with_scandir_error_returns_nothing():
+    flexmock(module.os).should_receive('scandir').and_raise(PermissionError)
+
+    assert module.scan_directory('/foo', None, 1, (), set()) == ([], [])
+
+
+def test_scan_directory_skips_subdirectory_on_other_device():
+    entry = flexmock(name='mount', path='/foo/mount')
+    entry.should_receive('is_dir').and_return(True)
+    entry.should_receive('stat').and_return(flexmock(st_dev=2))
+    flexmock(module.os).should_receive('scandir').and_return(Entries((entry,)))
+
+    assert module.scan_directory('/foo', None, 1, (), set()) == ([], [])
+
+
+def test_scan_directory_skips_entry_with_stat_error():
+    entry = flexmock(name='gone', path='/foo/gone')
+    entry.should_receive('is_dir').and_return(False)
+    entry.should_receive('is_file').and_return(False)
+    entry.should_receive('stat').and_raise(FileNotFoundError)
+    flexmock(module.os).should_receive('scandir').and_return(Entries((entry,)))
+
+    assert module.scan_directory('/foo', None, 1, (), set()) == ([], [])
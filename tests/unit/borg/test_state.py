@@ -0,0 +1,60 @@
+import io
+import sys
+
+import pytest
+from flexmock import flexmock
+
+from borgmatic.borg import state as module
+
+
+def test_read_state_file_returns_parsed_contents():
+    builtins = flexmock(sys.modules['builtins'])
+    builtins.should_receive('open').with_args('/state.json').and_return(io.StringIO('{"a": 1}'))
+
+    assert module.read_state_file('/state.json') == {'a': 1}
+
+
+def test_read_state_file_with_missing_file_returns_none():
+    builtins = flexmock(sys.modules['builtins'])
+    builtins.should_receive('open').and_raise(FileNotFoundError)
+
+    assert module.read_state_file('/state.json') is None
+
+
+def test_read_state_file_with_invalid_json_returns_none():
+    builtins = flexmock(sys.modules['builtins'])
+    builtins.should_receive('open').and_return(io.StringIO('{"a'))
+
+    assert module.read_state_file('/state.json') is None
+
+
+def test_write_state_file_writes_to_temporary_file_and_renames_into_place():
+    temporary_file = io.StringIO()
+    temporary_file.name = '/state/tmp1234'
+    flexmock(temporary_file).should_receive('close')
+    flexmock(module.os).should_receive('makedirs').with_args(
+        '/state', mode=0o700, exist_ok=True
+    ).once()
+    flexmock(module.tempfile).should_receive('NamedTemporaryFile').with_args(
+        'w', dir='/state', delete=False
+    ).and_return(temporary_file)
+    flexmock(module.os).should_receive('replace').with_args(
+        '/state/tmp1234', '/state/state.json'
+    ).once()
+
+    module.write_state_file('/state/state.json', {'a': 1})
+
+    assert temporary_file.getvalue() == '{"a": 1}'
+
+
+def test_write_state_file_with_rename_error_removes_temporary_file():
+    temporary_file = io.StringIO()
+    temporary_file.name = '/state/tmp1234'
+    flexmock(temporary_file).should_receive('close')
+    flexmock(module.os).should_receive('makedirs')
+    flexmock(module.tempfile).should_receive('NamedTemporaryFile').and_return(temporary_file)
+    flexmock(module.os).should_receive('replace').and_raise(PermissionError)
+    flexmock(module.os).should_receive('remove').with_args('/state/tmp1234').once()
+
+    with pytest.raises(PermissionError):
+        module.write_state_file('/state/state.json', {'a': 1})
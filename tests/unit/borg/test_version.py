@@ -13,6 +13,7 @@ VERSION = '1.2.3'
 def insert_execute_command_and_capture_output_mock(
     command, borg_local_path='borg', version_output=f'borg {VERSION}'
 ):
+    flexmock(module).should_receive('borg_binary_fingerprint').and_return(None)
     flexmock(module.environment).should_receive('make_environment')
     flexmock(module).should_receive('execute_command_and_capture_output').with_args(
         command,
@@ -56,3 +57,150 @@ def test_local_borg_version_with_invalid_version_raises():
 
     with pytest.raises(ValueError):
         module.local_borg_version({})
+
+
+def test_borg_binary_fingerprint_returns_resolved_path_inode_and_mtime():
+    flexmock(module.shutil).should_receive('which').with_args('borg').and_return('/usr/bin/borg')
+    flexmock(module.os.path).should_receive('realpath').with_args('/usr/bin/borg').and_return(
+        '/opt/borg/bin/borg'
+    )
+    flexmock(module.os).should_receive('stat').with_args('/opt/borg/bin/borg').and_return(
+        flexmock(st_ino=123, st_mtime_ns=456)
+    )
+
+    assert module.borg_binary_fingerprint('borg') == ('/opt/borg/bin/borg', 123, 456)
+
+
+def test_borg_binary_fingerprint_with_binary_not_found_returns_none():
+    flexmock(module.shutil).should_receive('which').and_return(None)
+    flexmock(module.os).should_receive('stat').never()
+
+    assert module.borg_binary_fingerprint('borg') is None
+
+
+def test_borg_binary_fingerprint_with_stat_error_returns_none():
+    flexmock(module.shutil).should_receive('which').and_return('/usr/bin/borg')
+    flexmock(module.os.path).should_receive('realpath').and_return('/usr/bin/borg')
+    flexmock(module.os).should_receive('stat').and_raise(OSError)
+
+    assert module.borg_binary_fingerprint('borg') is None
+
+
+def test_make_borg_versions_state_path_uses_borgmatic_source_directory():
+    assert (
+        module.make_borg_versions_state_path('/home/user/.borgmatic')
+        == '/home/user/.borgmatic/borg_versions.json'
+    )
+
+
+def test_make_borg_versions_state_path_without_borgmatic_source_directory_uses_default():
+    flexmock(module.os.path).should_receive('expanduser').with_args('~/.borgmatic').and_return(
+        '/root/.borgmatic'
+    )
+
+    assert module.make_borg_versions_state_path(None) == '/root/.borgmatic/borg_versions.json'
+
+
+def test_read_cached_borg_version_with_matching_fingerprint_returns_version():
+    flexmock(module.state).should_receive('read_state_file').and_return(
+        {'/usr/bin/borg': {'inode': 123, 'mtime_ns': 456, 'version': VERSION}}
+    )
+
+    assert module.read_cached_borg_version('/state', ('/usr/bin/borg', 123, 456)) == VERSION
+
+
+def test_read_cached_borg_version_with_changed_binary_returns_none():
+    flexmock(module.state).should_receive('read_state_file').and_return(
+        {'/usr/bin/borg': {'inode': 123, 'mtime_ns': 456, 'version': VERSION}}
+    )
+
+    assert module.read_cached_borg_version('/state', ('/usr/bin/borg', 123, 789)) is None
+
+
+def test_read_cached_borg_version_with_uncached_binary_returns_none():
+    flexmock(module.state).should_receive('read_state_file').and_return(
+        {'/usr/bin/borg': {'inode': 123, 'mtime_ns': 456, 'version': VERSION}}
+    )
+
+    assert module.read_cached_borg_version('/state', ('/usr/bin/borg1', 123, 456)) is None
+
+
+def test_read_cached_borg_version_with_missing_state_file_returns_none():
+    flexmock(module.state).should_receive('read_state_file').and_return(None)
+
+    assert module.read_cached_borg_version('/state', ('/usr/bin/borg', 123, 456)) is None
+
+
+def test_write_cached_borg_version_adds_to_existing_versions():
+    flexmock(module.state).should_receive('read_state_file').and_return(
+        {'/usr/bin/borg1': {'inode': 1, 'mtime_ns': 2, 'version': '1.1.0'}}
+    )
+    flexmock(module.state).should_receive('write_state_file').with_args(
+        '/state',
+        {
+            '/usr/bin/borg1': {'inode': 1, 'mtime_ns': 2, 'version': '1.1.0'},
+            '/usr/bin/borg': {'inode': 123, 'mtime_ns': 456, 'version': VERSION},
+        },
+    ).once()
+
+    module.write_cached_borg_version('/state', ('/usr/bin/borg', 123, 456), VERSION)
+
+
+def test_write_cached_borg_version_with_invalid_state_file_replaces_it():
+    flexmock(module.state).should_receive('read_state_file').and_return(['wtf'])
+    flexmock(module.state).should_receive('write_state_file').with_args(
+        '/state', {'/usr/bin/borg': {'inode': 123, 'mtime_ns': 456, 'version': VERSION}}
+    ).once()
+
+    module.write_cached_borg_version('/state', ('/usr/bin/borg', 123, 456), VERSION)
+
+
+def test_write_cached_borg_version_with_write_error_swallows_it():
+    flexmock(module.state).should_receive('read_state_file').and_return(None)
+    flexmock(module.state).should_receive('write_state_file').and_raise(OSError)
+
+    module.write_cached_borg_version('/state', ('/usr/bin/borg', 123, 456), VERSION)
+
+
+def test_local_borg_version_with_in_process_cached_version_does_not_call_borg():
+    fingerprint = ('/usr/bin/borg', 123, 456)
+    flexmock(module, cached_borg_versions={fingerprint: VERSION})
+    flexmock(module).should_receive('borg_binary_fingerprint').and_return(fingerprint)
+    flexmock(module).should_receive('read_cached_borg_version').never()
+    flexmock(module).should_receive('execute_command_and_capture_output').never()
+    flexmock(module).should_receive('write_cached_borg_version').never()
+
+    assert module.local_borg_version({}) == VERSION
+
+
+def test_local_borg_version_with_state_file_cached_version_does_not_call_borg():
+    fingerprint = ('/usr/bin/borg', 123, 456)
+    cached_borg_versions = {}
+    flexmock(module, cached_borg_versions=cached_borg_versions)
+    flexmock(module).should_receive('borg_binary_fingerprint').and_return(fingerprint)
+    flexmock(module).should_receive('read_cached_borg_version').with_args(
+        '/root/.borgmatic/borg_versions.json', fingerprint
+    ).and_return(VERSION)
+    flexmock(module).should_receive('execute_command_and_capture_output').never()
+    flexmock(module).should_receive('write_cached_borg_version').never()
+
+    assert module.local_borg_version({}, borgmatic_source_directory='/root/.borgmatic') == VERSION
+    assert cached_borg_versions == {fingerprint: VERSION}
+
+
+def test_local_borg_version_without_cached_version_calls_borg_and_caches_version():
+    fingerprint = ('/usr/bin/borg', 123, 456)
+    cached_borg_versions = {}
+    flexmock(module, cached_borg_versions=cached_borg_versions)
+    flexmock(module).should_receive('borg_binary_fingerprint').and_return(fingerprint)
+    flexmock(module).should_receive('read_cached_borg_version').and_return(None)
+    flexmock(module.environment).should_receive('make_environment')
+    flexmock(module).should_receive('execute_command_and_capture_output').and_return(
+        f'borg {VERSION}'
+    ).once()
+    flexmock(module).should_receive('write_cached_borg_version').with_args(
+        '/root/.borgmatic/borg_versions.json', fingerprint, VERSION
+    ).once()
+
+    assert module.local_borg_version({}, borgmatic_source_directory='/root/.borgmatic') == VERSION
+    assert cached_borg_versions == {fingerprint: VERSION}
@@ -16,7 +16,7 @@ def test_run_configuration_runs_actions_for_each_repository():
         expected_results[1:]
     )
     config = {'location': {'repositories': [{'path': 'foo'}, {'path': 'bar'}]}}
-    arguments = {'global': flexmock(monitoring_verbosity=1)}
+    arguments = {'global': flexmock(monitoring_verbosity=1, repository_concurrency=None)}
 
     results = list(module.run_configuration('test.yaml', config, arguments))
 
@@ -30,7 +30,10 @@ def test_run_configuration_with_invalid_borg_version_errors():
     flexmock(module.dispatch).should_receive('call_hooks').never()
     flexmock(module).should_receive('run_actions').never()
     config = {'location': {'repositories': ['foo']}}
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'prune': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'prune': flexmock(),
+    }
 
     list(module.run_configuration('test.yaml', config, arguments))
 
@@ -45,7 +48,10 @@ def test_run_configuration_logs_monitor_start_error():
     flexmock(module).should_receive('log_error_records').and_return(expected_results)
     flexmock(module).should_receive('run_actions').never()
     config = {'location': {'repositories': ['foo']}}
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'create': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
 
     results = list(module.run_configuration('test.yaml', config, arguments))
 
@@ -60,7 +66,10 @@ def test_run_configuration_bails_for_monitor_start_soft_failure():
     flexmock(module).should_receive('log_error_records').never()
     flexmock(module).should_receive('run_actions').never()
     config = {'location': {'repositories': ['foo']}}
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'create': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
 
     results = list(module.run_configuration('test.yaml', config, arguments))
 
@@ -76,7 +85,9 @@ def test_run_configuration_logs_actions_error():
     flexmock(module).should_receive('log_error_records').and_return(expected_results)
     flexmock(module).should_receive('run_actions').and_raise(OSError)
     config = {'location': {'repositories': [{'path': 'foo'}]}}
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False)}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False)
+    }
 
     results = list(module.run_configuration('test.yaml', config, arguments))
 
@@ -92,7 +103,10 @@ def test_run_configuration_bails_for_actions_soft_failure():
     flexmock(module).should_receive('log_error_records').never()
     flexmock(module.command).should_receive('considered_soft_failure').and_return(True)
     config = {'location': {'repositories': [{'path': 'foo'}]}}
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'create': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
 
     results = list(module.run_configuration('test.yaml', config, arguments))
 
@@ -109,7 +123,10 @@ def test_run_configuration_logs_monitor_log_error():
     flexmock(module).should_receive('log_error_records').and_return(expected_results)
     flexmock(module).should_receive('run_actions').and_return([])
     config = {'location': {'repositories': [{'path': 'foo'}]}}
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'create': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
 
     results = list(module.run_configuration('test.yaml', config, arguments))
 
@@ -127,7 +144,10 @@ def test_run_configuration_bails_for_monitor_log_soft_failure():
     flexmock(module).should_receive('run_actions').and_return([])
     flexmock(module.command).should_receive('considered_soft_failure').and_return(True)
     config = {'location': {'repositories': [{'path': 'foo'}]}}
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'create': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
 
     results = list(module.run_configuration('test.yaml', config, arguments))
 
@@ -144,7 +164,10 @@ def test_run_configuration_logs_monitor_finish_error():
     flexmock(module).should_receive('log_error_records').and_return(expected_results)
     flexmock(module).should_receive('run_actions').and_return([])
     config = {'location': {'repositories': [{'path': 'foo'}]}}
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'create': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
 
     results = list(module.run_configuration('test.yaml', config, arguments))
 
@@ -162,7 +185,10 @@ def test_run_configuration_bails_for_monitor_finish_soft_failure():
     flexmock(module).should_receive('run_actions').and_return([])
     flexmock(module.command).should_receive('considered_soft_failure').and_return(True)
     config = {'location': {'repositories': [{'path': 'foo'}]}}
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'create': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
 
     results = list(module.run_configuration('test.yaml', config, arguments))
 
@@ -179,7 +205,10 @@ def test_run_configuration_logs_on_error_hook_error():
     ).and_return(expected_results[1:])
     flexmock(module).should_receive('run_actions').and_raise(OSError)
     config = {'location': {'repositories': [{'path': 'foo'}]}}
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'create': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
 
     results = list(module.run_configuration('test.yaml', config, arguments))
 
@@ -195,7 +224,10 @@ def test_run_configuration_bails_for_on_error_hook_soft_failure():
     flexmock(module).should_receive('log_error_records').and_return(expected_results)
     flexmock(module).should_receive('run_actions').and_raise(OSError)
     config = {'location': {'repositories': [{'path': 'foo'}]}}
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'create': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
 
     results = list(module.run_configuration('test.yaml', config, arguments))
 
@@ -210,7 +242,10 @@ def test_run_configuration_retries_soft_error():
     flexmock(module).should_receive('run_actions').and_raise(OSError).and_return([])
     flexmock(module).should_receive('log_error_records').and_return([flexmock()]).once()
     config = {'location': {'repositories': [{'path': 'foo'}]}, 'storage': {'retries': 1}}
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'create': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
     results = list(module.run_configuration('test.yaml', config, arguments))
     assert results == []
 
@@ -233,7 +268,10 @@ def test_run_configuration_retries_hard_error():
         OSError,
     ).and_return(error_logs)
     config = {'location': {'repositories': [{'path': 'foo'}]}, 'storage': {'retries': 1}}
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'create': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
     results = list(module.run_configuration('test.yaml', config, arguments))
     assert results == error_logs
 
@@ -251,7 +289,10 @@ def test_run_configuration_repos_ordered():
         'bar: Error running actions for repository', OSError
     ).and_return(expected_results[1:]).ordered()
     config = {'location': {'repositories': [{'path': 'foo'}, {'path': 'bar'}]}}
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'create': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
     results = list(module.run_configuration('test.yaml', config, arguments))
     assert results == expected_results
 
@@ -285,7 +326,10 @@ def test_run_configuration_retries_round_robin():
         'location': {'repositories': [{'path': 'foo'}, {'path': 'bar'}]},
         'storage': {'retries': 1},
     }
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'create': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
     results = list(module.run_configuration('test.yaml', config, arguments))
     assert results == foo_error_logs + bar_error_logs
 
@@ -317,7 +361,10 @@ def test_run_configuration_retries_one_passes():
         'location': {'repositories': [{'path': 'foo'}, {'path': 'bar'}]},
         'storage': {'retries': 1},
     }
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'create': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
     results = list(module.run_configuration('test.yaml', config, arguments))
     assert results == error_logs
 
@@ -359,7 +406,10 @@ def test_run_configuration_retry_wait():
         'location': {'repositories': [{'path': 'foo'}]},
         'storage': {'retries': 3, 'retry_wait': 10},
     }
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'create': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
     results = list(module.run_configuration('test.yaml', config, arguments))
     assert results == error_logs
 
@@ -397,11 +447,343 @@ def test_run_configuration_retries_timeout_multiple_repos():
         'location': {'repositories': [{'path': 'foo'}, {'path': 'bar'}]},
         'storage': {'retries': 1, 'retry_wait': 10},
     }
-    arguments = {'global': flexmock(monitoring_verbosity=1, dry_run=False), 'create': flexmock()}
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
     results = list(module.run_configuration('test.yaml', config, arguments))
     assert results == error_logs
 
 
+def test_run_configuration_with_repository_concurrency_runs_repositories_concurrently():
+    flexmock(module).should_receive('verbosity_to_log_level').and_return(logging.INFO)
+    flexmock(module.borg_version).should_receive('local_borg_version').and_return(flexmock())
+    expected_results = [flexmock(), flexmock()]
+    repository_results = {'foo': expected_results[:1], 'bar': expected_results[1:]}
+    flexmock(module).should_receive('run_actions_with_retries').replace_with(
+        lambda repository, **kwargs: (repository_results[repository['path']], None)
+    ).twice()
+    flexmock(module).should_receive('run_actions').never()
+    config = {
+        'location': {'repositories': [{'path': 'foo'}, {'path': 'bar'}]},
+        'storage': {'repository_concurrency': 2},
+    }
+    arguments = {'global': flexmock(monitoring_verbosity=1, repository_concurrency=None)}
+
+    results = list(module.run_configuration('test.yaml', config, arguments))
+
+    assert results == expected_results
+
+
+def test_run_configuration_with_repository_concurrency_flag_overrides_configuration():
+    flexmock(module).should_receive('verbosity_to_log_level').and_return(logging.INFO)
+    flexmock(module.borg_version).should_receive('local_borg_version').and_return(flexmock())
+    flexmock(module).should_receive('run_actions_with_retries').and_return(([], None)).twice()
+    flexmock(module).should_receive('run_actions').never()
+    config = {'location': {'repositories': [{'path': 'foo'}, {'path': 'bar'}]}}
+    arguments = {'global': flexmock(monitoring_verbosity=1, repository_concurrency=2)}
+
+    results = list(module.run_configuration('test.yaml', config, arguments))
+
+    assert results == []
+
+
+def test_run_configuration_with_repository_concurrency_logs_actions_errors_in_repository_order():
+    flexmock(module).should_receive('verbosity_to_log_level').and_return(logging.INFO)
+    flexmock(module.borg_version).should_receive('local_borg_version').and_return(flexmock())
+    flexmock(module.command).should_receive('execute_hook')
+    flexmock(module.dispatch).should_receive('call_hooks')
+    flexmock(module).should_receive('run_actions_with_retries').and_return(
+        ([], OSError())
+    ).and_return(([], OSError()))
+    expected_results = [flexmock(), flexmock()]
+    flexmock(module).should_receive('log_error_records').with_args(
+        'foo: Error running actions for repository', OSError
+    ).and_return(expected_results[:1]).ordered()
+    flexmock(module).should_receive('log_error_records').with_args(
+        'bar: Error running actions for repository', OSError
+    ).and_return(expected_results[1:]).ordered()
+    config = {
+        'location': {'repositories': [{'path': 'foo'}, {'path': 'bar'}]},
+        'storage': {'repository_concurrency': 2},
+    }
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
+
+    results = list(module.run_configuration('test.yaml', config, arguments))
+
+    assert results == expected_results
+
+
+def test_run_configuration_with_repository_concurrency_bails_for_actions_soft_failure():
+    flexmock(module).should_receive('verbosity_to_log_level').and_return(logging.INFO)
+    flexmock(module.borg_version).should_receive('local_borg_version').and_return(flexmock())
+    flexmock(module.dispatch).should_receive('call_hooks')
+    error = subprocess.CalledProcessError(borgmatic.hooks.command.SOFT_FAIL_EXIT_CODE, 'try again')
+    flexmock(module).should_receive('run_actions_with_retries').and_return(([], error))
+    flexmock(module).should_receive('log_error_records').never()
+    flexmock(module.command).should_receive('considered_soft_failure').and_return(True)
+    config = {
+        'location': {'repositories': [{'path': 'foo'}, {'path': 'bar'}]},
+        'storage': {'repository_concurrency': 2},
+    }
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
+
+    results = list(module.run_configuration('test.yaml', config, arguments))
+
+    assert results == []
+
+
+def test_run_configuration_with_repository_concurrency_and_database_hooks_runs_create_serially():
+    flexmock(module).should_receive('verbosity_to_log_level').and_return(logging.INFO)
+    flexmock(module.borg_version).should_receive('local_borg_version').and_return(flexmock())
+    flexmock(module.dispatch).should_receive('call_hooks')
+    flexmock(module).should_receive('run_actions_with_retries').never()
+    flexmock(module).should_receive('run_actions').and_return([]).twice()
+    config = {
+        'location': {'repositories': [{'path': 'foo'}, {'path': 'bar'}]},
+        'storage': {'repository_concurrency': 2},
+        'hooks': {'postgresql_databases': [{'name': 'users'}]},
+    }
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
+
+    results = list(module.run_configuration('test.yaml', config, arguments))
+
+    assert results == []
+
+
+def test_run_configuration_with_spooled_database_dumps_runs_create_concurrently():
+    flexmock(module).should_receive('verbosity_to_log_level').and_return(logging.INFO)
+    flexmock(module.borg_version).should_receive('local_borg_version').and_return(flexmock())
+    flexmock(module.dispatch).should_receive('call_hooks')
+    flexmock(borgmatic.actions.create).should_receive('spool_database_dumps').once()
+    flexmock(module).should_receive('run_actions_with_retries').replace_with(
+        lambda repository, **kwargs: ([], None)
+    ).twice()
+    flexmock(borgmatic.actions.create).should_receive('remove_spooled_database_dumps').once()
+    flexmock(module).should_receive('run_actions').never()
+    config = {
+        'location': {'repositories': [{'path': 'foo'}, {'path': 'bar'}]},
+        'storage': {'repository_concurrency': 2},
+        'hooks': {'postgresql_databases': [{'name': 'users'}], 'spool_database_dumps': True},
+    }
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
+
+    results = list(module.run_configuration('test.yaml', config, arguments))
+
+    assert results == []
+
+
+def test_run_configuration_with_spooled_database_dumps_dumps_before_running_actions():
+    flexmock(module).should_receive('verbosity_to_log_level').and_return(logging.INFO)
+    flexmock(module.borg_version).should_receive('local_borg_version').and_return(flexmock())
+    flexmock(module.dispatch).should_receive('call_hooks')
+    calls = []
+    flexmock(borgmatic.actions.create).should_receive('spool_database_dumps').replace_with(
+        lambda *args: calls.append('spool')
+    )
+    flexmock(module).should_receive('run_actions').replace_with(
+        lambda **kwargs: calls.append('actions') or []
+    )
+    flexmock(borgmatic.actions.create).should_receive('remove_spooled_database_dumps')
+    config = {
+        'location': {'repositories': [{'path': 'foo'}]},
+        'hooks': {'postgresql_databases': [{'name': 'users'}], 'spool_database_dumps': True},
+    }
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
+
+    list(module.run_configuration('test.yaml', config, arguments))
+
+    assert calls == ['spool', 'actions']
+
+
+def test_run_configuration_with_spooled_database_dumps_error_skips_actions():
+    flexmock(module).should_receive('verbosity_to_log_level').and_return(logging.INFO)
+    flexmock(module.borg_version).should_receive('local_borg_version').and_return(flexmock())
+    flexmock(module.dispatch).should_receive('call_hooks')
+    flexmock(module.command).should_receive('execute_hook')
+    flexmock(borgmatic.actions.create).should_receive('spool_database_dumps').and_raise(OSError)
+    flexmock(module).should_receive('run_actions').never()
+    flexmock(borgmatic.actions.create).should_receive('remove_spooled_database_dumps').once()
+    expected_results = [flexmock()]
+    flexmock(module).should_receive('log_error_records').with_args(
+        'test.yaml: Error spooling database dumps', OSError
+    ).and_return(expected_results)
+    config = {
+        'location': {'repositories': [{'path': 'foo'}]},
+        'hooks': {'spool_database_dumps': True},
+    }
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
+
+    results = list(module.run_configuration('test.yaml', config, arguments))
+
+    assert results == expected_results
+
+
+def test_run_configuration_with_spooled_database_dumps_bails_for_soft_failure():
+    flexmock(module).should_receive('verbosity_to_log_level').and_return(logging.INFO)
+    flexmock(module.borg_version).should_receive('local_borg_version').and_return(flexmock())
+    flexmock(module.dispatch).should_receive('call_hooks')
+    error = subprocess.CalledProcessError(borgmatic.hooks.command.SOFT_FAIL_EXIT_CODE, 'try again')
+    flexmock(borgmatic.actions.create).should_receive('spool_database_dumps').and_raise(error)
+    flexmock(module).should_receive('run_actions').never()
+    flexmock(module).should_receive('log_error_records').never()
+    config = {
+        'location': {'repositories': [{'path': 'foo'}]},
+        'hooks': {'spool_database_dumps': True},
+    }
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
+
+    results = list(module.run_configuration('test.yaml', config, arguments))
+
+    assert results == []
+
+
+def test_run_configuration_logs_error_removing_spooled_database_dumps():
+    flexmock(module).should_receive('verbosity_to_log_level').and_return(logging.INFO)
+    flexmock(module.borg_version).should_receive('local_borg_version').and_return(flexmock())
+    flexmock(module.dispatch).should_receive('call_hooks')
+    flexmock(module.command).should_receive('execute_hook')
+    flexmock(borgmatic.actions.create).should_receive('spool_database_dumps')
+    flexmock(module).should_receive('run_actions').and_return([])
+    flexmock(borgmatic.actions.create).should_receive('remove_spooled_database_dumps').and_raise(
+        OSError
+    )
+    expected_results = [flexmock()]
+    flexmock(module).should_receive('log_error_records').with_args(
+        'test.yaml: Error removing spooled database dumps', OSError
+    ).and_return(expected_results)
+    config = {
+        'location': {'repositories': [{'path': 'foo'}]},
+        'hooks': {'spool_database_dumps': True},
+    }
+    arguments = {
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+        'create': flexmock(),
+    }
+
+    results = list(module.run_configuration('test.yaml', config, arguments))
+
+    assert results == expected_results
+
+
+def test_run_actions_with_retries_returns_results():
+    expected_results = [flexmock(), flexmock()]
+    flexmock(module).should_receive('run_actions').and_return(expected_results)
+    flexmock(time).should_receive('sleep').never()
+
+    results, error = module.run_actions_with_retries(
+        retries=1, retry_wait=10, config_filename='test.yaml', repository={'path': 'foo'}
+    )
+
+    assert results == expected_results
+    assert error is None
+
+
+def test_run_actions_with_retries_retries_after_waiting():
+    expected_results = [flexmock()]
+    flexmock(module).should_receive('run_actions').and_raise(OSError).and_return(expected_results)
+    flexmock(module).should_receive('log_error_records').with_args(
+        'foo: Error running actions for repository',
+        OSError,
+        levelno=logging.WARNING,
+        log_command_error_output=True,
+    ).and_return([flexmock()]).once()
+    flexmock(time).should_receive('sleep').with_args(10).once()
+
+    results, error = module.run_actions_with_retries(
+        retries=1, retry_wait=10, config_filename='test.yaml', repository={'path': 'foo'}
+    )
+
+    assert results == expected_results
+    assert error is None
+
+
+def test_run_actions_with_retries_returns_error_once_retries_are_exhausted():
+    error = OSError()
+    flexmock(module).should_receive('run_actions').and_raise(error).times(2)
+    flexmock(module).should_receive('log_error_records').and_return([flexmock()]).once()
+    flexmock(time).should_receive('sleep')
+
+    results, returned_error = module.run_actions_with_retries(
+        retries=1, retry_wait=0, config_filename='test.yaml', repository={'path': 'foo'}
+    )
+
+    assert results == []
+    assert returned_error is error
+
+
+def test_run_actions_with_retries_with_soft_failure_sets_soft_failure_event():
+    error = subprocess.CalledProcessError(borgmatic.hooks.command.SOFT_FAIL_EXIT_CODE, 'try again')
+    flexmock(module).should_receive('run_actions').and_raise(error)
+    soft_failure_event = flexmock()
+    soft_failure_event.should_receive('set').once()
+
+    results, returned_error = module.run_actions_with_retries(
+        retries=0,
+        retry_wait=0,
+        config_filename='test.yaml',
+        repository={'path': 'foo'},
+        soft_failure_event=soft_failure_event,
+    )
+
+    assert results == []
+    assert returned_error is error
+
+
+def test_run_actions_with_retries_with_other_error_does_not_set_soft_failure_event():
+    error = OSError()
+    flexmock(module).should_receive('run_actions').and_raise(error)
+    soft_failure_event = flexmock()
+    soft_failure_event.should_receive('set').never()
+
+    results, returned_error = module.run_actions_with_retries(
+        retries=0,
+        retry_wait=0,
+        config_filename='test.yaml',
+        repository={'path': 'foo'},
+        soft_failure_event=soft_failure_event,
+    )
+
+    assert results == []
+    assert returned_error is error
+
+
+def test_run_actions_with_retries_with_earlier_soft_failure_skips_actions():
+    flexmock(module).should_receive('run_actions').never()
+
+    results, error = module.run_actions_with_retries(
+        retries=1,
+        retry_wait=0,
+        config_filename='test.yaml',
+        repository={'path': 'foo'},
+        earlier_soft_failure_events=(flexmock(is_set=lambda: False), flexmock(is_set=lambda: True)),
+    )
+
+    assert results == []
+    assert error is None
+
+
 def test_run_actions_runs_rcreate():
     flexmock(module).should_receive('add_custom_log_levels')
     flexmock(module.command).should_receive('execute_hook')
@@ -463,6 +845,7 @@ def test_run_actions_adds_log_file_to_hook_context():
 
 def test_run_actions_runs_transfer():
     flexmock(module).should_receive('add_custom_log_levels')
+    flexmock(module.archive_cache).should_receive('invalidate_cached_latest_archive').once()
     flexmock(module.command).should_receive('execute_hook')
     flexmock(borgmatic.actions.transfer).should_receive('run_transfer').once()
 
@@ -485,6 +868,9 @@ def test_run_actions_runs_transfer():
 
 def test_run_actions_runs_create():
     flexmock(module).should_receive('add_custom_log_levels')
+    flexmock(module.archive_cache).should_receive('invalidate_cached_latest_archive').with_args(
+        None, 'repo'
+    ).once()
     flexmock(module.command).should_receive('execute_hook')
     expected = flexmock()
     flexmock(borgmatic.actions.create).should_receive('run_create').and_yield(expected).once()
@@ -507,8 +893,32 @@ def test_run_actions_runs_create():
     assert result == (expected,)
 
 
+def test_run_actions_with_dry_run_does_not_invalidate_cached_latest_archive():
+    flexmock(module).should_receive('add_custom_log_levels')
+    flexmock(module.command).should_receive('execute_hook')
+    flexmock(module.archive_cache).should_receive('invalidate_cached_latest_archive').never()
+    flexmock(borgmatic.actions.create).should_receive('run_create').and_yield(flexmock())
+
+    tuple(
+        module.run_actions(
+            arguments={'global': flexmock(dry_run=True, log_file='foo'), 'create': flexmock()},
+            config_filename=flexmock(),
+            location={'repositories': []},
+            storage=flexmock(),
+            retention=flexmock(),
+            consistency=flexmock(),
+            hooks={},
+            local_path=flexmock(),
+            remote_path=flexmock(),
+            local_borg_version=flexmock(),
+            repository={'path': 'repo'},
+        )
+    )
+
+
 def test_run_actions_runs_prune():
     flexmock(module).should_receive('add_custom_log_levels')
+    flexmock(module.archive_cache).should_receive('invalidate_cached_latest_archive').once()
     flexmock(module.command).should_receive('execute_hook')
     flexmock(borgmatic.actions.prune).should_receive('run_prune').once()
 
@@ -531,6 +941,7 @@ def test_run_actions_runs_prune():
 
 def test_run_actions_runs_compact():
     flexmock(module).should_receive('add_custom_log_levels')
+    flexmock(module.archive_cache).should_receive('invalidate_cached_latest_archive').once()
     flexmock(module.command).should_receive('execute_hook')
     flexmock(borgmatic.actions.compact).should_receive('run_compact').once()
 
@@ -711,6 +1122,7 @@ def test_run_actions_runs_rlist():
 
 def test_run_actions_runs_list():
     flexmock(module).should_receive('add_custom_log_levels')
+    flexmock(module.archive_cache).should_receive('invalidate_cached_latest_archive').never()
     flexmock(module.command).should_receive('execute_hook')
     expected = flexmock()
     flexmock(borgmatic.actions.list).should_receive('run_list').and_yield(expected).once()
@@ -805,6 +1217,7 @@ def test_run_actions_runs_break_lock():
 
 def test_run_actions_runs_borg():
     flexmock(module).should_receive('add_custom_log_levels')
+    flexmock(module.archive_cache).should_receive('invalidate_cached_latest_archive').once()
     flexmock(module.command).should_receive('execute_hook')
     flexmock(borgmatic.actions.borg).should_receive('run_borg').once()
 
@@ -949,6 +1362,280 @@ def test_get_local_path_without_local_path_defaults_to_borg():
     assert module.get_local_path({'test.yaml': {'location': {}}}) == 'borg'
 
 
+def test_run_configuration_with_buffered_logs_buffers_tagged_logs_and_flattens_results():
+    json_result = flexmock()
+
+    def run_configuration(config_filename, config, arguments):
+        module.logger.warning('Something happened')
+        yield json_result
+        yield logging.makeLogRecord(
+            dict(levelno=logging.CRITICAL, levelname='CRITICAL', msg=OSError('uh oh'))
+        )
+
+    flexmock(module).should_receive('run_configuration').replace_with(run_configuration)
+    flexmock(module.timing).should_receive('enable').never()
+    spans = [flexmock()]
+    flexmock(module.timing).should_receive('pop_spans').and_return(spans)
+    root_logger = logging.getLogger()
+    original_handlers = tuple(root_logger.handlers)
+
+    results, buffered_logs, returned_spans = module.run_configuration_with_buffered_logs(
+        'test.yaml', {}, {'global': flexmock(timing=False, timing_file=None)}, logging.INFO
+    )
+
+    assert results[0] is json_result
+    assert results[1].msg == 'uh oh'
+    assert [log.msg for log in buffered_logs] == ['test.yaml: Something happened']
+    assert returned_spans == spans
+    assert tuple(root_logger.handlers) == original_handlers
+
+
+def test_run_configuration_with_buffered_logs_with_timing_requested_enables_timing():
+    flexmock(module).should_receive('run_configuration').and_return([])
+    flexmock(module.timing).should_receive('enable').once()
+    flexmock(module.timing).should_receive('pop_spans').and_return([])
+
+    module.run_configuration_with_buffered_logs(
+        'test.yaml', {}, {'global': flexmock(timing=True, timing_file=None)}, logging.INFO
+    )
+
+
+def test_run_configurations_without_jobs_runs_configurations_in_process():
+    flexmock(module).should_receive('ProcessPoolExecutor').never()
+    flexmock(module).should_receive('run_configuration').and_return(['foo']).and_return(['bar'])
+    arguments = {'global': flexmock(jobs=1)}
+
+    results = tuple(
+        module.run_configurations({'test.yaml': {}, 'test2.yaml': {}}, arguments=arguments)
+    )
+
+    assert results == (('test.yaml', ['foo']), ('test2.yaml', ['bar']))
+
+
+def test_run_configurations_with_single_configuration_does_not_use_processes():
+    flexmock(module).should_receive('ProcessPoolExecutor').never()
+    flexmock(module).should_receive('run_configuration').and_return(['foo'])
+    arguments = {'global': flexmock(jobs=4)}
+
+    results = tuple(module.run_configurations({'test.yaml': {}}, arguments=arguments))
+
+    assert results == (('test.yaml', ['foo']),)
+
+
+def test_run_configuration_group_with_buffered_logs_runs_each_configuration_in_order():
+    flexmock(module).should_receive('run_configuration_with_buffered_logs').with_args(
+        'test.yaml', {'foo': 1}, object, logging.INFO
+    ).and_return('result').once().ordered()
+    flexmock(module).should_receive('run_configuration_with_buffered_logs').with_args(
+        'test2.yaml', {'foo': 2}, object, logging.INFO
+    ).and_return('result2').once().ordered()
+
+    assert module.run_configuration_group_with_buffered_logs(
+        {'test.yaml': {'foo': 1}, 'test2.yaml': {'foo': 2}}, flexmock(), logging.INFO
+    ) == ['result', 'result2']
+
+
+def test_configurations_conflict_with_different_source_directories_returns_false():
+    assert not module.configurations_conflict(
+        {
+            'location': {'borgmatic_source_directory': '/one', 'repositories': [{'path': 'repo'}]},
+            'hooks': {'postgresql_databases': [{'name': 'foo'}]},
+        },
+        {
+            'location': {'borgmatic_source_directory': '/two', 'repositories': [{'path': 'repo'}]},
+            'hooks': {'postgresql_databases': [{'name': 'foo'}]},
+        },
+    )
+
+
+def test_configurations_conflict_with_shared_source_directory_and_database_hooks_returns_true():
+    assert module.configurations_conflict(
+        {
+            'location': {'repositories': [{'path': 'repo'}]},
+            'hooks': {'mysql_databases': [{'name': 'foo'}]},
+        },
+        {'location': {'repositories': [{'path': 'other'}]}},
+    )
+
+
+def test_configurations_conflict_with_shared_source_directory_and_repository_returns_true():
+    assert module.configurations_conflict(
+        {'location': {'repositories': [{'path': 'repo'}, {'path': 'other'}]}},
+        {'location': {'repositories': [{'path': 'repo'}]}},
+    )
+
+
+def test_configurations_conflict_with_shared_source_directory_and_nothing_else_returns_false():
+    assert not module.configurations_conflict(
+        {
+            'location': {'repositories': [{'path': 'repo'}]},
+            'hooks': {'before_backup': ['echo']},
+        },
+        {'location': {'repositories': [{'path': 'other'}]}},
+    )
+
+
+def test_make_configuration_groups_groups_conflicting_configurations_in_order():
+    configs = {name: {'name': name} for name in ('a.yaml', 'b.yaml', 'c.yaml', 'd.yaml')}
+    conflicts = {
+        frozenset(('b.yaml', 'd.yaml')),
+        frozenset(('a.yaml', 'c.yaml')),
+        frozenset(('c.yaml', 'd.yaml')),
+    }
+    flexmock(module).should_receive('configurations_conflict').replace_with(
+        lambda config, other_config: frozenset((config['name'], other_config['name'])) in conflicts
+    )
+
+    assert module.make_configuration_groups(configs) == [['a.yaml', 'b.yaml', 'c.yaml', 'd.yaml']]
+
+
+def test_make_configuration_groups_without_conflicts_puts_each_configuration_in_own_group():
+    flexmock(module).should_receive('configurations_conflict').and_return(False)
+
+    assert module.make_configuration_groups({'a.yaml': {}, 'b.yaml': {}}) == [
+        ['a.yaml'],
+        ['b.yaml'],
+    ]
+
+
+def test_run_configurations_with_jobs_runs_configurations_in_processes_and_logs_in_order():
+    buffered_logs = {'test.yaml': [flexmock()], 'test2.yaml': [flexmock()]}
+    spans = {'test.yaml': [flexmock()], 'test2.yaml': [flexmock()]}
+    executor = flexmock()
+    executor.should_receive('__enter__').and_return(executor)
+    executor.should_receive('__exit__').and_return(False)
+    executor.should_receive('submit').replace_with(
+        lambda function, configs, arguments, log_level: flexmock(
+            result=lambda: [
+                (
+                    [config_filename],
+                    buffered_logs[config_filename],
+                    spans[config_filename],
+                )
+                for config_filename in configs
+            ]
+        )
+    )
+    flexmock(module).should_receive('make_configuration_groups').and_return(
+        [['test.yaml'], ['test2.yaml']]
+    )
+    flexmock(module).should_receive('ProcessPoolExecutor').with_args(
+        max_workers=2, initializer=module.restore_default_signals
+    ).and_return(executor).once()
+    flexmock(module).should_receive('run_configuration').never()
+    flexmock(module.logger).should_receive('handle').with_args(
+        buffered_logs['test.yaml'][0]
+    ).once().ordered()
+    flexmock(module.logger).should_receive('handle').with_args(
+        buffered_logs['test2.yaml'][0]
+    ).once().ordered()
+    flexmock(module.timing).should_receive('record_spans').with_args(spans['test.yaml']).once()
+    flexmock(module.timing).should_receive('record_spans').with_args(spans['test2.yaml']).once()
+    arguments = {'global': flexmock(jobs=2)}
+
+    results = tuple(
+        module.run_configurations({'test.yaml': {}, 'test2.yaml': {}}, arguments=arguments)
+    )
+
+    assert results == (('test.yaml', ['test.yaml']), ('test2.yaml', ['test2.yaml']))
+
+
+def test_run_configurations_with_jobs_runs_conflicting_configurations_one_at_a_time():
+    spans = {'test.yaml': [], 'test2.yaml': [], 'test3.yaml': []}
+    submitted_groups = []
+    executor = flexmock()
+    executor.should_receive('__enter__').and_return(executor)
+    executor.should_receive('__exit__').and_return(False)
+
+    def submit(function, configs, arguments, log_level):
+        submitted_groups.append(list(configs))
+
+        return flexmock(
+            result=lambda: [
+                ([config_filename], [], spans[config_filename]) for config_filename in configs
+            ]
+        )
+
+    executor.should_receive('submit').replace_with(submit)
+    flexmock(module).should_receive('make_configuration_groups').and_return(
+        [['test.yaml', 'test3.yaml'], ['test2.yaml']]
+    )
+    flexmock(module).should_receive('ProcessPoolExecutor').and_return(executor).once()
+    flexmock(module).should_receive('run_configuration').never()
+    flexmock(module.logger).should_receive('debug')
+    flexmock(module.timing).should_receive('record_spans')
+    arguments = {'global': flexmock(jobs=2)}
+
+    results = tuple(
+        module.run_configurations(
+            {'test.yaml': {}, 'test2.yaml': {}, 'test3.yaml': {}}, arguments=arguments
+        )
+    )
+
+    assert submitted_groups == [['test.yaml', 'test3.yaml'], ['test2.yaml']]
+    assert results == (
+        ('test.yaml', ['test.yaml']),
+        ('test2.yaml', ['test2.yaml']),
+        ('test3.yaml', ['test3.yaml']),
+    )
+
+
+def test_run_configurations_with_jobs_and_only_conflicting_configurations_runs_in_process():
+    flexmock(module).should_receive('make_configuration_groups').and_return(
+        [['test.yaml', 'test2.yaml']]
+    )
+    flexmock(module).should_receive('ProcessPoolExecutor').never()
+    flexmock(module).should_receive('run_configuration').and_return(['foo']).and_return(['bar'])
+    arguments = {'global': flexmock(jobs=2)}
+
+    results = tuple(
+        module.run_configurations({'test.yaml': {}, 'test2.yaml': {}}, arguments=arguments)
+    )
+
+    assert results == (('test.yaml', ['foo']), ('test2.yaml', ['bar']))
+
+
+def test_timing_requested_with_timing_flag_returns_true():
+    assert module.timing_requested(flexmock(timing=True, timing_file=None))
+
+
+def test_timing_requested_with_timing_file_returns_true():
+    assert module.timing_requested(flexmock(timing=False, timing_file='timings.jsonl'))
+
+
+def test_timing_requested_without_timing_flags_returns_false():
+    assert not module.timing_requested(flexmock(timing=False, timing_file=None))
+
+
+def test_emit_timings_writes_timing_file_and_logs_summary():
+    spans = [flexmock()]
+    flexmock(module.timing).should_receive('pop_spans').and_return(spans)
+    flexmock(module.timing).should_receive('write_json_lines').with_args(
+        spans, 'timings.jsonl'
+    ).once()
+    flexmock(module.timing).should_receive('log_summary').with_args(spans).once()
+
+    module.emit_timings(flexmock(timing=True, timing_file='timings.jsonl'))
+
+
+def test_emit_timings_without_timing_flags_does_nothing_with_spans():
+    flexmock(module.timing).should_receive('pop_spans').and_return([])
+    flexmock(module.timing).should_receive('write_json_lines').never()
+    flexmock(module.timing).should_receive('log_summary').never()
+
+    module.emit_timings(flexmock(timing=False, timing_file=None))
+
+
+def test_emit_timings_with_timing_file_error_warns_and_still_logs_summary():
+    spans = [flexmock()]
+    flexmock(module.timing).should_receive('pop_spans').and_return(spans)
+    flexmock(module.timing).should_receive('write_json_lines').and_raise(PermissionError)
+    flexmock(module.logger).should_receive('warning').once()
+    flexmock(module.timing).should_receive('log_summary').with_args(spans).once()
+
+    module.emit_timings(flexmock(timing=True, timing_file='timings.jsonl'))
+
+
 def test_collect_configuration_run_summary_logs_info_for_success():
     flexmock(module.command).should_receive('execute_hook').never()
     flexmock(module.validate).should_receive('guard_configuration_contains_repository')
@@ -965,7 +1652,10 @@ def test_collect_configuration_run_summary_logs_info_for_success():
 def test_collect_configuration_run_summary_executes_hooks_for_create():
     flexmock(module.validate).should_receive('guard_configuration_contains_repository')
     flexmock(module).should_receive('run_configuration').and_return([])
-    arguments = {'create': flexmock(), 'global': flexmock(monitoring_verbosity=1, dry_run=False)}
+    arguments = {
+        'create': flexmock(),
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+    }
 
     logs = tuple(
         module.collect_configuration_run_summary_logs({'test.yaml': {}}, arguments=arguments)
@@ -1044,7 +1734,10 @@ def test_collect_configuration_run_summary_logs_pre_hook_error():
     flexmock(module.command).should_receive('execute_hook').and_raise(ValueError)
     expected_logs = (flexmock(),)
     flexmock(module).should_receive('log_error_records').and_return(expected_logs)
-    arguments = {'create': flexmock(), 'global': flexmock(monitoring_verbosity=1, dry_run=False)}
+    arguments = {
+        'create': flexmock(),
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+    }
 
     logs = tuple(
         module.collect_configuration_run_summary_logs({'test.yaml': {}}, arguments=arguments)
@@ -1059,7 +1752,10 @@ def test_collect_configuration_run_summary_logs_post_hook_error():
     flexmock(module).should_receive('run_configuration').and_return([])
     expected_logs = (flexmock(),)
     flexmock(module).should_receive('log_error_records').and_return(expected_logs)
-    arguments = {'create': flexmock(), 'global': flexmock(monitoring_verbosity=1, dry_run=False)}
+    arguments = {
+        'create': flexmock(),
+        'global': flexmock(monitoring_verbosity=1, repository_concurrency=None, dry_run=False),
+    }
 
     logs = tuple(
         module.collect_configuration_run_summary_logs({'test.yaml': {}}, arguments=arguments)
@@ -1134,7 +1830,7 @@ def test_collect_configuration_run_summary_logs_outputs_merged_json_results():
     stdout = flexmock()
     stdout.should_receive('write').with_args('["foo", "bar", "baz"]').once()
     flexmock(module.sys).stdout = stdout
-    arguments = {}
+    arguments = {'global': flexmock(jobs=1)}
 
     tuple(
         module.collect_configuration_run_summary_logs(
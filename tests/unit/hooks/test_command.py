@@ -30,7 +30,7 @@ def test_execute_hook_invokes_each_command():
         lambda config_file, hook_description, command, context: command
     )
     flexmock(module.execute).should_receive('execute_command').with_args(
-        [':'], output_log_level=logging.WARNING, shell=True
+        [':'], output_log_level=logging.WARNING, shell=True, umask=None
     ).once()
 
     module.execute_hook([':'], None, 'config.yaml', 'pre-backup', dry_run=False)
@@ -41,24 +41,22 @@ def test_execute_hook_with_multiple_commands_invokes_each_command():
         lambda config_file, hook_description, command, context: command
     )
     flexmock(module.execute).should_receive('execute_command').with_args(
-        [':'], output_log_level=logging.WARNING, shell=True
+        [':'], output_log_level=logging.WARNING, shell=True, umask=None
     ).once()
     flexmock(module.execute).should_receive('execute_command').with_args(
-        ['true'], output_log_level=logging.WARNING, shell=True
+        ['true'], output_log_level=logging.WARNING, shell=True, umask=None
     ).once()
 
     module.execute_hook([':', 'true'], None, 'config.yaml', 'pre-backup', dry_run=False)
 
 
-def test_execute_hook_with_umask_sets_that_umask():
+def test_execute_hook_with_umask_passes_that_umask_to_command():
     flexmock(module).should_receive('interpolate_context').replace_with(
         lambda config_file, hook_description, command, context: command
     )
-    flexmock(module.os).should_receive('umask').with_args(0o77).and_return(0o22).once()
-    flexmock(module.os).should_receive('umask').with_args(0o22).once()
     flexmock(module.execute).should_receive('execute_command').with_args(
-        [':'], output_log_level=logging.WARNING, shell=True
-    )
+        [':'], output_log_level=logging.WARNING, shell=True, umask=0o77
+    ).once()
 
     module.execute_hook([':'], 77, 'config.yaml', 'pre-backup', dry_run=False)
 
@@ -81,7 +79,7 @@ def test_execute_hook_on_error_logs_as_error():
         lambda config_file, hook_description, command, context: command
     )
     flexmock(module.execute).should_receive('execute_command').with_args(
-        [':'], output_log_level=logging.ERROR, shell=True
+        [':'], output_log_level=logging.ERROR, shell=True, umask=None
     ).once()
 
     module.execute_hook([':'], None, 'config.yaml', 'on-error', dry_run=False)
@@ -73,3 +73,219 @@ def test_remove_database_dumps_without_dump_path_present_skips_removal():
 
 def test_convert_glob_patterns_to_borg_patterns_removes_leading_slash():
     assert module.convert_glob_patterns_to_borg_patterns(('/etc/foo/bar',)) == ['sh:etc/foo/bar']
+
+
+def test_run_dumps_with_single_dump_at_once_runs_each_dump_in_order():
+    calls = []
+
+    module.run_dumps([lambda: calls.append('foo'), lambda: calls.append('bar')])
+
+    assert calls == ['foo', 'bar']
+
+
+def test_run_dumps_with_multiple_dumps_at_once_runs_every_dump():
+    calls = []
+
+    module.run_dumps(
+        [lambda: calls.append('foo'), lambda: calls.append('bar'), lambda: calls.append('baz')],
+        max_concurrent_dumps=2,
+    )
+
+    assert sorted(calls) == ['bar', 'baz', 'foo']
+
+
+def test_run_dumps_with_multiple_dumps_at_once_and_dump_error_raises():
+    def fail():
+        raise ValueError('Oops')
+
+    with pytest.raises(ValueError):
+        module.run_dumps([lambda: None, fail, lambda: None], max_concurrent_dumps=2)
+
+
+def test_dump_compression_returns_configured_compression():
+    assert module.dump_compression({'name': 'foo', 'dump_compression': 'zstd'}) == 'zstd'
+
+
+def test_dump_compression_without_compression_returns_none():
+    assert module.dump_compression({'name': 'foo'}) is None
+
+
+def test_dump_compression_with_none_compression_returns_none():
+    assert module.dump_compression({'name': 'foo', 'dump_compression': 'none'}) is None
+
+
+def test_execute_compressed_dump_command_runs_dump_and_compression_commands_to_completion():
+    dump_process = flexmock()
+    flexmock(module.os).should_receive('pipe').and_return((3, 4)).and_return((5, 6))
+    flexmock(module).should_receive('execute_command').with_args(
+        ('read', '-r', '_', ';', 'dump', '>', 'out'),
+        output_file=4,
+        input_file=5,
+        shell=True,
+        extra_environment={'PASSWORD': 'secret'},
+        run_to_completion=False,
+    ).and_return(dump_process).once()
+    compress_process = flexmock()
+    flexmock(module).should_receive('execute_command').with_args(
+        ('exec', 'zstd', '--rsyncable', '--quiet', '--stdout', '>', "'/dump/foo bar'"),
+        output_file=6,
+        input_file=3,
+        shell=True,
+        run_to_completion=False,
+    ).and_return(compress_process).once()
+    flexmock(module).should_receive('log_outputs').with_args(
+        (dump_process, compress_process), (), module.logging.INFO, borg_local_path=None
+    ).once()
+    for descriptor in (3, 4, 5, 6):
+        flexmock(module.os).should_receive('close').with_args(descriptor).once()
+
+    assert (
+        module.execute_compressed_dump_command(
+            ('dump', '>', 'out'),
+            'zstd',
+            '/dump/foo bar',
+            shell=True,
+            extra_environment={'PASSWORD': 'secret'},
+        )
+        is None
+    )
+
+
+def test_execute_compressed_dump_command_without_shell_quotes_dump_command():
+    dump_process = flexmock()
+    flexmock(module.os).should_receive('pipe').and_return((3, 4)).and_return((5, 6))
+    flexmock(module).should_receive('execute_command').with_args(
+        ('read', '-r', '_', ';', 'dump', "'my database'"),
+        output_file=4,
+        input_file=5,
+        shell=True,
+        extra_environment=None,
+        run_to_completion=False,
+    ).and_return(dump_process).once()
+    flexmock(module).should_receive('execute_command').with_args(
+        ('exec', 'zstd', '--rsyncable', '--quiet', '--stdout', '>', '/dump/foo'),
+        output_file=6,
+        input_file=3,
+        shell=True,
+        run_to_completion=False,
+    ).and_return(flexmock()).once()
+    flexmock(module).should_receive('log_outputs').once()
+    flexmock(module.os).should_receive('close')
+
+    module.execute_compressed_dump_command(('dump', 'my database'), 'zstd', '/dump/foo')
+
+
+def test_execute_compressed_dump_command_without_run_to_completion_returns_processes():
+    dump_process = flexmock()
+    compress_process = flexmock()
+    flexmock(module.os).should_receive('pipe').and_return((3, 4)).and_return((5, 6))
+    flexmock(module).should_receive('execute_command').with_args(
+        ('read', '-r', '_', ';', 'dump'),
+        output_file=4,
+        input_file=5,
+        shell=True,
+        extra_environment=None,
+        run_to_completion=False,
+    ).and_return(dump_process).once()
+    flexmock(module).should_receive('execute_command').with_args(
+        ('exec', 'gzip', '--rsyncable', '--stdout', '>', '/dump/foo'),
+        output_file=6,
+        input_file=3,
+        shell=True,
+        run_to_completion=False,
+    ).and_return(compress_process).once()
+    flexmock(module).should_receive('log_outputs').never()
+    for descriptor in (3, 4, 5, 6):
+        flexmock(module.os).should_receive('close').with_args(descriptor).once()
+
+    assert module.execute_compressed_dump_command(
+        ('dump',), 'gzip', '/dump/foo', run_to_completion=False
+    ) == (dump_process, compress_process)
+
+
+def test_execute_compressed_dump_command_with_dump_error_closes_pipes():
+    flexmock(module.os).should_receive('pipe').and_return((3, 4)).and_return((5, 6))
+    flexmock(module).should_receive('execute_command').and_raise(OSError)
+    flexmock(module).should_receive('log_outputs').never()
+    for descriptor in (3, 4, 5, 6):
+        flexmock(module.os).should_receive('close').with_args(descriptor).once()
+
+    with pytest.raises(OSError):
+        module.execute_compressed_dump_command(('dump',), 'lz4', '/dump/foo')
+
+
+def test_execute_compressed_dump_command_with_compression_error_kills_dump_and_closes_pipes():
+    dump_process = flexmock()
+    dump_process.should_receive('kill').once()
+    flexmock(module.os).should_receive('pipe').and_return((3, 4)).and_return((5, 6))
+    flexmock(module).should_receive('execute_command').and_return(dump_process).and_raise(OSError)
+    flexmock(module).should_receive('log_outputs').never()
+    for descriptor in (3, 4, 5, 6):
+        flexmock(module.os).should_receive('close').with_args(descriptor).once()
+
+    with pytest.raises(OSError):
+        module.execute_compressed_dump_command(('dump',), 'lz4', '/dump/foo')
+
+
+def test_read_dump_header_reads_until_header_length():
+    flexmock(module.os).should_receive('read').with_args(3, 4).and_return(b'ab')
+    flexmock(module.os).should_receive('read').with_args(3, 2).and_return(b'cd')
+
+    assert module.read_dump_header(flexmock(fileno=lambda: 3)) == b'abcd'
+
+
+def test_read_dump_header_with_short_dump_returns_short_header():
+    flexmock(module.os).should_receive('read').with_args(3, 4).and_return(b'a')
+    flexmock(module.os).should_receive('read').with_args(3, 3).and_return(b'')
+
+    assert module.read_dump_header(flexmock(fileno=lambda: 3)) == b'a'
+
+
+@pytest.mark.parametrize(
+    'header,expected_compression',
+    (
+        (b'\x28\xb5\x2f\xfd', 'zstd'),
+        (b'\x1f\x8b\x08\x00', 'gzip'),
+        (b'\x04\x22\x4d\x18', 'lz4'),
+        (b'PGDM', None),
+        (b'', None),
+    ),
+)
+def test_detect_dump_compression_matches_magic_bytes(header, expected_compression):
+    assert module.detect_dump_compression(header) == expected_compression
+
+
+def test_decompress_restore_input_with_compression_starts_decompression_process():
+    extract_process = flexmock()
+    input_file = flexmock()
+    input_file.should_receive('close').once()
+    decompress_process = flexmock(stdout=flexmock())
+    flexmock(module).should_receive('execute_command').with_args(
+        ('zstd', '--decompress', '--quiet', '--stdout'),
+        input_file=input_file,
+        output_file=module.subprocess.PIPE,
+        run_to_completion=False,
+    ).and_return(decompress_process).once()
+
+    assert module.decompress_restore_input([extract_process], input_file, 'zstd') == (
+        [extract_process, decompress_process],
+        decompress_process.stdout,
+    )
+
+
+def test_decompress_restore_input_without_compression_returns_input_unchanged():
+    extract_process = flexmock()
+    input_file = flexmock()
+    input_file.should_receive('close').never()
+    flexmock(module).should_receive('execute_command').never()
+
+    assert module.decompress_restore_input([extract_process], input_file, None) == (
+        [extract_process],
+        input_file,
+    )
+
+
+def test_decompress_restore_input_without_input_file_returns_input_unchanged():
+    flexmock(module).should_receive('execute_command').never()
+
+    assert module.decompress_restore_input([], None, 'zstd') == ([], None)
@@ -121,6 +121,99 @@ def test_dump_databases_runs_mongodump_with_directory_format():
     assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False) == []
 
 
+def test_dump_databases_with_spool_runs_mongodump_to_completion_into_regular_file():
+    databases = [{'name': 'foo'}]
+    flexmock(module).should_receive('make_dump_path').and_return('')
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return(
+        'databases/localhost/foo'
+    )
+    flexmock(module.dump).should_receive('create_parent_directory_for_dump')
+    flexmock(module.dump).should_receive('create_named_pipe_for_dump').never()
+
+    flexmock(module).should_receive('execute_command').with_args(
+        ['mongodump', '--db', 'foo', '--archive', '>', 'databases/localhost/foo'],
+        shell=True,
+    ).and_return(flexmock()).once()
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False, spool=True) == []
+
+
+def test_dump_databases_with_spool_records_dump_span_with_byte_count():
+    databases = [{'name': 'foo'}]
+    flexmock(module.timing, ENABLED=True, SPANS=[])
+    flexmock(module).should_receive('make_dump_path').and_return('')
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return(
+        'databases/localhost/foo'
+    )
+    flexmock(module.dump).should_receive('create_parent_directory_for_dump')
+    flexmock(module).should_receive('execute_command')
+    flexmock(module.metrics).should_receive('path_size').with_args(
+        'databases/localhost/foo'
+    ).and_return(5)
+
+    module.dump_databases(databases, 'test.yaml', {}, dry_run=False, spool=True)
+
+    (record,) = module.timing.SPANS
+    assert record['name'] == 'mongodb_databases foo'
+    assert record['kind'] == 'dump'
+    assert record['byte_count'] == 5
+
+
+def test_dump_databases_with_compression_pipes_mongodump_through_compression_command():
+    databases = [{'name': 'foo', 'dump_compression': 'zstd'}]
+    processes = (flexmock(), flexmock())
+    flexmock(module).should_receive('make_dump_path').and_return('')
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return(
+        'databases/localhost/foo'
+    )
+    flexmock(module.dump).should_receive('create_named_pipe_for_dump').once()
+    flexmock(module).should_receive('execute_command').never()
+    flexmock(module.dump).should_receive('execute_compressed_dump_command').with_args(
+        ['mongodump', '--db', 'foo', '--archive'],
+        'zstd',
+        'databases/localhost/foo',
+        shell=True,
+        run_to_completion=False,
+    ).and_return(processes).once()
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False) == list(processes)
+
+
+def test_dump_databases_with_compression_and_spool_compresses_mongodump_to_completion():
+    databases = [{'name': 'foo', 'dump_compression': 'zstd'}]
+    flexmock(module).should_receive('make_dump_path').and_return('')
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return(
+        'databases/localhost/foo'
+    )
+    flexmock(module.dump).should_receive('create_parent_directory_for_dump')
+    flexmock(module.dump).should_receive('create_named_pipe_for_dump').never()
+    flexmock(module).should_receive('execute_command').never()
+    flexmock(module.dump).should_receive('execute_compressed_dump_command').with_args(
+        ['mongodump', '--db', 'foo', '--archive'],
+        'zstd',
+        'databases/localhost/foo',
+        shell=True,
+    ).once()
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False, spool=True) == []
+
+
+def test_dump_databases_with_compression_and_directory_format_skips_compression():
+    databases = [{'name': 'foo', 'format': 'directory', 'dump_compression': 'zstd'}]
+    flexmock(module).should_receive('make_dump_path').and_return('')
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return(
+        'databases/localhost/foo'
+    )
+    flexmock(module.dump).should_receive('create_parent_directory_for_dump')
+    flexmock(module.dump).should_receive('execute_compressed_dump_command').never()
+    flexmock(module).should_receive('execute_command').with_args(
+        ['mongodump', '--out', 'databases/localhost/foo', '--db', 'foo'],
+        shell=True,
+    ).and_return(flexmock()).once()
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False) == []
+
+
 def test_dump_databases_runs_mongodump_with_options():
     databases = [{'name': 'foo', 'options': '--stuff=such'}]
     process = flexmock()
@@ -163,6 +256,9 @@ def test_restore_database_dump_runs_mongorestore():
 
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         ['mongorestore', '--archive', '--drop', '--db', 'foo'],
         processes=[extract_process],
@@ -175,11 +271,67 @@ def test_restore_database_dump_runs_mongorestore():
     )
 
 
+def test_restore_database_dump_with_compression_restores_from_decompression_process():
+    database_config = [{'name': 'foo', 'schemas': None, 'dump_compression': 'zstd'}]
+    extract_process = flexmock(stdout=flexmock())
+    decompress_process = flexmock(stdout=flexmock())
+
+    flexmock(module).should_receive('make_dump_path')
+    flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').with_args(
+        [extract_process], extract_process.stdout, 'zstd'
+    ).and_return(([extract_process, decompress_process], decompress_process.stdout)).once()
+    flexmock(module).should_receive('execute_command_with_processes').with_args(
+        ['mongorestore', '--archive', '--drop', '--db', 'foo'],
+        processes=[extract_process, decompress_process],
+        output_log_level=logging.DEBUG,
+        input_file=decompress_process.stdout,
+    ).once()
+
+    module.restore_database_dump(
+        database_config,
+        'test.yaml',
+        {},
+        dry_run=False,
+        extract_process=extract_process,
+        compression='zstd',
+    )
+
+
+def test_restore_database_dump_with_extract_stream_runs_mongorestore_from_it():
+    database_config = [{'name': 'foo', 'schemas': None}]
+    extract_stream = flexmock()
+
+    flexmock(module).should_receive('make_dump_path')
+    flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
+    flexmock(module).should_receive('execute_command_with_processes').with_args(
+        ['mongorestore', '--archive', '--drop', '--db', 'foo'],
+        processes=[],
+        output_log_level=logging.DEBUG,
+        input_file=extract_stream,
+    ).once()
+
+    module.restore_database_dump(
+        database_config,
+        'test.yaml',
+        {},
+        dry_run=False,
+        extract_process=None,
+        extract_stream=extract_stream,
+    )
+
+
 def test_restore_database_dump_errors_on_multiple_database_config():
     database_config = [{'name': 'foo'}, {'name': 'bar'}]
 
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').never()
     flexmock(module).should_receive('execute_command').never()
 
@@ -197,6 +349,9 @@ def test_restore_database_dump_runs_mongorestore_with_hostname_and_port():
 
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         [
             'mongorestore',
@@ -233,6 +388,9 @@ def test_restore_database_dump_runs_mongorestore_with_username_and_password():
 
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         [
             'mongorestore',
@@ -263,6 +421,9 @@ def test_restore_database_dump_runs_mongorestore_with_options():
 
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         ['mongorestore', '--archive', '--drop', '--db', 'foo', '--harder'],
         processes=[extract_process],
@@ -281,6 +442,9 @@ def test_restore_databases_dump_runs_mongorestore_with_schemas():
 
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         [
             'mongorestore',
@@ -309,6 +473,9 @@ def test_restore_database_dump_runs_psql_for_all_database_dump():
 
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         ['mongorestore', '--archive'],
         processes=[extract_process],
@@ -338,6 +505,9 @@ def test_restore_database_dump_without_extract_process_restores_from_disk():
 
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename').and_return('/dump/path')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         ['mongorestore', '--dir', '/dump/path', '--drop', '--db', 'foo'],
         processes=[],
@@ -61,7 +61,8 @@ def test_dump_databases_dumps_each_database():
             extra_environment=object,
             dry_run=object,
             dry_run_label=object,
-        ).and_return(process).once()
+            spool=False,
+        ).and_return((process,)).once()
 
     assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False) == processes
 
@@ -82,7 +83,8 @@ def test_dump_databases_dumps_with_password():
         extra_environment={'MYSQL_PWD': 'trustsome1'},
         dry_run=object,
         dry_run_label=object,
-    ).and_return(process).once()
+        spool=False,
+    ).and_return((process,)).once()
 
     assert module.dump_databases([database], 'test.yaml', {}, dry_run=False) == [process]
 
@@ -100,7 +102,8 @@ def test_dump_databases_dumps_all_databases_at_once():
         extra_environment=object,
         dry_run=object,
         dry_run_label=object,
-    ).and_return(process).once()
+        spool=False,
+    ).and_return((process,)).once()
 
     assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False) == [process]
 
@@ -120,11 +123,69 @@ def test_dump_databases_dumps_all_databases_separately_when_format_configured():
             extra_environment=object,
             dry_run=object,
             dry_run_label=object,
-        ).and_return(process).once()
+            spool=False,
+        ).and_return((process,)).once()
 
     assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False) == processes
 
 
+def test_dump_databases_with_spool_and_max_concurrent_dumps_dumps_largest_databases_first():
+    databases = [{'name': 'all', 'format': 'sql', 'max_concurrent_dumps': 2}]
+    flexmock(module).should_receive('make_dump_path').and_return('')
+    flexmock(module).should_receive('database_names_to_dump').and_return(('foo', 'bar', 'baz'))
+    flexmock(module).should_receive('database_sizes').and_return({'foo': 10, 'bar': 30})
+    dumped_names = []
+    flexmock(module).should_receive('execute_dump_command').replace_with(
+        lambda database, *args: dumped_names.append(database['name'])
+    )
+
+    def run_dumps(dump_functions, max_concurrent_dumps):
+        assert max_concurrent_dumps == 2
+
+        for dump_function in dump_functions:
+            dump_function()
+
+    flexmock(module.dump).should_receive('run_dumps').replace_with(run_dumps)
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False, spool=True) == []
+    assert dumped_names == ['bar', 'foo', 'baz']
+
+
+def test_dump_databases_with_spool_and_size_query_error_warns_and_keeps_database_order():
+    databases = [{'name': 'all', 'format': 'sql', 'max_concurrent_dumps': 2}]
+    flexmock(module).should_receive('make_dump_path').and_return('')
+    flexmock(module).should_receive('database_names_to_dump').and_return(('foo', 'bar'))
+    flexmock(module).should_receive('database_sizes').and_raise(OSError)
+    flexmock(module.logger).should_receive('warning').once()
+    dumped_names = []
+    flexmock(module).should_receive('execute_dump_command').replace_with(
+        lambda database, *args: dumped_names.append(database['name'])
+    )
+    flexmock(module.dump).should_receive('run_dumps').replace_with(
+        lambda dump_functions, max_concurrent_dumps: [
+            dump_function() for dump_function in dump_functions
+        ]
+    )
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False, spool=True) == []
+    assert dumped_names == ['foo', 'bar']
+
+
+def test_dump_databases_with_spool_and_without_max_concurrent_dumps_skips_size_query():
+    databases = [{'name': 'all', 'format': 'sql'}]
+    flexmock(module).should_receive('make_dump_path').and_return('')
+    flexmock(module).should_receive('database_names_to_dump').and_return(('foo', 'bar'))
+    flexmock(module).should_receive('database_sizes').never()
+    flexmock(module).should_receive('execute_dump_command').twice()
+    flexmock(module.dump).should_receive('run_dumps').replace_with(
+        lambda dump_functions, max_concurrent_dumps: [
+            dump_function() for dump_function in dump_functions
+        ]
+    ).once()
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False, spool=True) == []
+
+
 def test_database_names_to_dump_runs_mysql_with_list_options():
     database = {'name': 'all', 'list_options': '--defaults-extra-file=my.cnf'}
     flexmock(module).should_receive('execute_command_and_capture_output').with_args(
@@ -142,6 +203,27 @@ def test_database_names_to_dump_runs_mysql_with_list_options():
     assert module.database_names_to_dump(database, None, 'test.yaml', '') == ('foo', 'bar')
 
 
+def test_database_sizes_queries_information_schema_for_size_of_each_database():
+    database = {'name': 'all', 'hostname': 'database.example.org'}
+    flexmock(module).should_receive('execute_command_and_capture_output').with_args(
+        (
+            'mysql',
+            '--host',
+            'database.example.org',
+            '--protocol',
+            'tcp',
+            '--skip-column-names',
+            '--batch',
+            '--execute',
+            'SELECT table_schema, SUM(data_length + index_length)'
+            ' FROM information_schema.tables GROUP BY table_schema',
+        ),
+        extra_environment=None,
+    ).and_return('foo\t1234\nbar\tNULL\n').once()
+
+    assert module.database_sizes(database, None, 'test.yaml') == {'foo': 1234, 'bar': 0}
+
+
 def test_execute_dump_command_runs_mysqldump():
     process = flexmock()
     flexmock(module.dump).should_receive('make_database_dump_filename').and_return('dump')
@@ -161,6 +243,36 @@ def test_execute_dump_command_runs_mysqldump():
         run_to_completion=False,
     ).and_return(process).once()
 
+    assert module.execute_dump_command(
+        database={'name': 'foo'},
+        log_prefix='log',
+        dump_path=flexmock(),
+        database_names=('foo',),
+        extra_environment=None,
+        dry_run=False,
+        dry_run_label='',
+    ) == (process,)
+
+
+def test_execute_dump_command_with_spool_runs_mysqldump_to_completion_into_regular_file():
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return('dump')
+    flexmock(module.os.path).should_receive('exists').and_return(False)
+    flexmock(module.os.path).should_receive('getsize').with_args('dump').and_return(1024).once()
+    flexmock(module.dump).should_receive('create_parent_directory_for_dump')
+    flexmock(module.dump).should_receive('create_named_pipe_for_dump').never()
+
+    flexmock(module).should_receive('execute_command').with_args(
+        (
+            'mysqldump',
+            '--add-drop-database',
+            '--databases',
+            'foo',
+            '--result-file',
+            'dump',
+        ),
+        extra_environment=None,
+    ).once()
+
     assert (
         module.execute_dump_command(
             database={'name': 'foo'},
@@ -170,8 +282,66 @@ def test_execute_dump_command_runs_mysqldump():
             extra_environment=None,
             dry_run=False,
             dry_run_label='',
+            spool=True,
         )
-        == process
+        == ()
+    )
+
+
+def test_execute_dump_command_with_compression_and_spool_compresses_mysqldump_output():
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return('dump')
+    flexmock(module.os.path).should_receive('exists').and_return(False)
+    flexmock(module.os.path).should_receive('getsize').with_args('dump').and_return(1024).once()
+    flexmock(module.dump).should_receive('create_parent_directory_for_dump')
+    flexmock(module.dump).should_receive('create_named_pipe_for_dump').never()
+    flexmock(module).should_receive('execute_command').never()
+    flexmock(module.dump).should_receive('execute_compressed_dump_command').with_args(
+        ('mysqldump', '--add-drop-database', '--databases', 'foo'),
+        'zstd',
+        'dump',
+        extra_environment=None,
+    ).once()
+
+    assert (
+        module.execute_dump_command(
+            database={'name': 'foo', 'dump_compression': 'zstd'},
+            log_prefix='log',
+            dump_path=flexmock(),
+            database_names=('foo',),
+            extra_environment=None,
+            dry_run=False,
+            dry_run_label='',
+            spool=True,
+        )
+        == ()
+    )
+
+
+def test_execute_dump_command_with_compression_pipes_mysqldump_through_compression_command():
+    processes = (flexmock(), flexmock())
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return('dump')
+    flexmock(module.os.path).should_receive('exists').and_return(False)
+    flexmock(module.dump).should_receive('create_named_pipe_for_dump').once()
+    flexmock(module).should_receive('execute_command').never()
+    flexmock(module.dump).should_receive('execute_compressed_dump_command').with_args(
+        ('mysqldump', '--add-drop-database', '--databases', 'foo'),
+        'gzip',
+        'dump',
+        extra_environment=None,
+        run_to_completion=False,
+    ).and_return(processes).once()
+
+    assert (
+        module.execute_dump_command(
+            database={'name': 'foo', 'dump_compression': 'gzip'},
+            log_prefix='log',
+            dump_path=flexmock(),
+            database_names=('foo',),
+            extra_environment=None,
+            dry_run=False,
+            dry_run_label='',
+        )
+        == processes
     )
 
 
@@ -193,18 +363,15 @@ def test_execute_dump_command_runs_mysqldump_without_add_drop_database():
         run_to_completion=False,
     ).and_return(process).once()
 
-    assert (
-        module.execute_dump_command(
-            database={'name': 'foo', 'add_drop_database': False},
-            log_prefix='log',
-            dump_path=flexmock(),
-            database_names=('foo',),
-            extra_environment=None,
-            dry_run=False,
-            dry_run_label='',
-        )
-        == process
-    )
+    assert module.execute_dump_command(
+        database={'name': 'foo', 'add_drop_database': False},
+        log_prefix='log',
+        dump_path=flexmock(),
+        database_names=('foo',),
+        extra_environment=None,
+        dry_run=False,
+        dry_run_label='',
+    ) == (process,)
 
 
 def test_execute_dump_command_runs_mysqldump_with_hostname_and_port():
@@ -232,18 +399,15 @@ def test_execute_dump_command_runs_mysqldump_with_hostname_and_port():
         run_to_completion=False,
     ).and_return(process).once()
 
-    assert (
-        module.execute_dump_command(
-            database={'name': 'foo', 'hostname': 'database.example.org', 'port': 5433},
-            log_prefix='log',
-            dump_path=flexmock(),
-            database_names=('foo',),
-            extra_environment=None,
-            dry_run=False,
-            dry_run_label='',
-        )
-        == process
-    )
+    assert module.execute_dump_command(
+        database={'name': 'foo', 'hostname': 'database.example.org', 'port': 5433},
+        log_prefix='log',
+        dump_path=flexmock(),
+        database_names=('foo',),
+        extra_environment=None,
+        dry_run=False,
+        dry_run_label='',
+    ) == (process,)
 
 
 def test_execute_dump_command_runs_mysqldump_with_username_and_password():
@@ -267,18 +431,15 @@ def test_execute_dump_command_runs_mysqldump_with_username_and_password():
         run_to_completion=False,
     ).and_return(process).once()
 
-    assert (
-        module.execute_dump_command(
-            database={'name': 'foo', 'username': 'root', 'password': 'trustsome1'},
-            log_prefix='log',
-            dump_path=flexmock(),
-            database_names=('foo',),
-            extra_environment={'MYSQL_PWD': 'trustsome1'},
-            dry_run=False,
-            dry_run_label='',
-        )
-        == process
-    )
+    assert module.execute_dump_command(
+        database={'name': 'foo', 'username': 'root', 'password': 'trustsome1'},
+        log_prefix='log',
+        dump_path=flexmock(),
+        database_names=('foo',),
+        extra_environment={'MYSQL_PWD': 'trustsome1'},
+        dry_run=False,
+        dry_run_label='',
+    ) == (process,)
 
 
 def test_execute_dump_command_runs_mysqldump_with_options():
@@ -301,18 +462,15 @@ def test_execute_dump_command_runs_mysqldump_with_options():
         run_to_completion=False,
     ).and_return(process).once()
 
-    assert (
-        module.execute_dump_command(
-            database={'name': 'foo', 'options': '--stuff=such'},
-            log_prefix='log',
-            dump_path=flexmock(),
-            database_names=('foo',),
-            extra_environment=None,
-            dry_run=False,
-            dry_run_label='',
-        )
-        == process
-    )
+    assert module.execute_dump_command(
+        database={'name': 'foo', 'options': '--stuff=such'},
+        log_prefix='log',
+        dump_path=flexmock(),
+        database_names=('foo',),
+        extra_environment=None,
+        dry_run=False,
+        dry_run_label='',
+    ) == (process,)
 
 
 def test_execute_dump_command_with_duplicate_dump_skips_mysqldump():
@@ -331,7 +489,7 @@ def test_execute_dump_command_with_duplicate_dump_skips_mysqldump():
             dry_run=True,
             dry_run_label='SO DRY',
         )
-        is None
+        == ()
     )
 
 
@@ -352,7 +510,7 @@ def test_execute_dump_command_with_dry_run_skips_mysqldump():
             dry_run=True,
             dry_run_label='SO DRY',
         )
-        is None
+        == ()
     )
 
 
@@ -383,6 +541,9 @@ def test_restore_database_dump_runs_mysql_to_restore():
     database_config = [{'name': 'foo'}]
     extract_process = flexmock(stdout=flexmock())
 
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         ('mysql', '--batch'),
         processes=[extract_process],
@@ -396,9 +557,63 @@ def test_restore_database_dump_runs_mysql_to_restore():
     )
 
 
+def test_restore_database_dump_with_compression_restores_from_decompression_process():
+    database_config = [{'name': 'foo', 'dump_compression': 'zstd'}]
+    extract_process = flexmock(stdout=flexmock())
+    decompress_process = flexmock(stdout=flexmock())
+
+    flexmock(module.dump).should_receive('decompress_restore_input').with_args(
+        [extract_process], extract_process.stdout, 'zstd'
+    ).and_return(([extract_process, decompress_process], decompress_process.stdout)).once()
+    flexmock(module).should_receive('execute_command_with_processes').with_args(
+        ('mysql', '--batch'),
+        processes=[extract_process, decompress_process],
+        output_log_level=logging.DEBUG,
+        input_file=decompress_process.stdout,
+        extra_environment=None,
+    ).once()
+
+    module.restore_database_dump(
+        database_config,
+        'test.yaml',
+        {},
+        dry_run=False,
+        extract_process=extract_process,
+        compression='zstd',
+    )
+
+
+def test_restore_database_dump_with_extract_stream_runs_mysql_to_restore_from_it():
+    database_config = [{'name': 'foo'}]
+    extract_stream = flexmock()
+
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
+    flexmock(module).should_receive('execute_command_with_processes').with_args(
+        ('mysql', '--batch'),
+        processes=[],
+        output_log_level=logging.DEBUG,
+        input_file=extract_stream,
+        extra_environment=None,
+    ).once()
+
+    module.restore_database_dump(
+        database_config,
+        'test.yaml',
+        {},
+        dry_run=False,
+        extract_process=None,
+        extract_stream=extract_stream,
+    )
+
+
 def test_restore_database_dump_errors_on_multiple_database_config():
     database_config = [{'name': 'foo'}, {'name': 'bar'}]
 
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').never()
     flexmock(module).should_receive('execute_command').never()
 
@@ -412,6 +627,9 @@ def test_restore_database_dump_runs_mysql_with_options():
     database_config = [{'name': 'foo', 'restore_options': '--harder'}]
     extract_process = flexmock(stdout=flexmock())
 
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         ('mysql', '--batch', '--harder'),
         processes=[extract_process],
@@ -429,6 +647,9 @@ def test_restore_database_dump_runs_mysql_with_hostname_and_port():
     database_config = [{'name': 'foo', 'hostname': 'database.example.org', 'port': 5433}]
     extract_process = flexmock(stdout=flexmock())
 
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         (
             'mysql',
@@ -455,6 +676,9 @@ def test_restore_database_dump_runs_mysql_with_username_and_password():
     database_config = [{'name': 'foo', 'username': 'root', 'password': 'trustsome1'}]
     extract_process = flexmock(stdout=flexmock())
 
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         ('mysql', '--batch', '--user', 'root'),
         processes=[extract_process],
@@ -49,6 +49,54 @@ def test_database_names_to_dump_with_all_and_format_lists_databases():
     )
 
 
+def test_database_sizes_queries_size_of_each_database():
+    database = {'name': 'all', 'format': 'custom', 'hostname': 'localhost', 'username': 'root'}
+    flexmock(module).should_receive('execute_command_and_capture_output').with_args(
+        (
+            'psql',
+            '--no-password',
+            '--no-psqlrc',
+            '--csv',
+            '--tuples-only',
+            '--host',
+            'localhost',
+            '--username',
+            'root',
+            '--dbname',
+            'postgres',
+            '--command',
+            "SELECT datname, CASE WHEN has_database_privilege(datname, 'CONNECT')"
+            ' THEN pg_database_size(datname) ELSE 0 END FROM pg_database',
+        ),
+        extra_environment=object,
+    ).and_return('foo,1234\nbar,0\n')
+
+    assert module.database_sizes(database, flexmock(), 'test.yaml') == {'foo': 1234, 'bar': 0}
+
+
+def test_database_sizes_with_list_options_passes_them_after_default_database_name():
+    database = {'name': 'all', 'format': 'custom', 'list_options': '--dbname template1'}
+    flexmock(module).should_receive('execute_command_and_capture_output').with_args(
+        (
+            'psql',
+            '--no-password',
+            '--no-psqlrc',
+            '--csv',
+            '--tuples-only',
+            '--dbname',
+            'postgres',
+            '--dbname',
+            'template1',
+            '--command',
+            "SELECT datname, CASE WHEN has_database_privilege(datname, 'CONNECT')"
+            ' THEN pg_database_size(datname) ELSE 0 END FROM pg_database',
+        ),
+        extra_environment=object,
+    ).and_return('foo,1234\n')
+
+    assert module.database_sizes(database, flexmock(), 'test.yaml') == {'foo': 1234}
+
+
 def test_database_names_to_dump_with_all_and_format_lists_databases_with_hostname_and_port():
     database = {'name': 'all', 'format': 'custom', 'hostname': 'localhost', 'port': 1234}
     flexmock(module).should_receive('execute_command_and_capture_output').with_args(
@@ -355,6 +403,302 @@ def test_dump_databases_runs_pg_dump_with_directory_format():
     assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False) == []
 
 
+def test_dump_databases_runs_pg_dump_with_directory_format_and_jobs():
+    databases = [{'name': 'foo', 'format': 'directory', 'jobs': 4}]
+    flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
+    flexmock(module).should_receive('make_dump_path').and_return('')
+    flexmock(module).should_receive('database_names_to_dump').and_return(('foo',))
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return(
+        'databases/localhost/foo'
+    )
+    flexmock(module.os.path).should_receive('exists').and_return(False)
+    flexmock(module.dump).should_receive('create_parent_directory_for_dump')
+    flexmock(module.dump).should_receive('create_named_pipe_for_dump').never()
+
+    flexmock(module).should_receive('execute_command').with_args(
+        (
+            'pg_dump',
+            '--no-password',
+            '--clean',
+            '--if-exists',
+            '--format',
+            'directory',
+            '--file',
+            'databases/localhost/foo',
+            '--jobs',
+            '4',
+            'foo',
+        ),
+        shell=True,
+        extra_environment={'PGSSLMODE': 'disable'},
+    ).and_return(flexmock()).once()
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False) == []
+
+
+def test_dump_databases_with_jobs_and_non_directory_format_omits_jobs():
+    databases = [{'name': 'foo', 'format': 'custom', 'jobs': 4}]
+    process = flexmock()
+    flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
+    flexmock(module).should_receive('make_dump_path').and_return('')
+    flexmock(module).should_receive('database_names_to_dump').and_return(('foo',))
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return(
+        'databases/localhost/foo'
+    )
+    flexmock(module.os.path).should_receive('exists').and_return(False)
+    flexmock(module.dump).should_receive('create_named_pipe_for_dump')
+
+    flexmock(module).should_receive('execute_command').with_args(
+        (
+            'pg_dump',
+            '--no-password',
+            '--clean',
+            '--if-exists',
+            '--format',
+            'custom',
+            'foo',
+            '>',
+            'databases/localhost/foo',
+        ),
+        shell=True,
+        extra_environment={'PGSSLMODE': 'disable'},
+        run_to_completion=False,
+    ).and_return(process).once()
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False) == [process]
+
+
+def test_dump_databases_with_spool_runs_pg_dump_to_completion_into_regular_file():
+    databases = [{'name': 'foo'}]
+    flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
+    flexmock(module).should_receive('make_dump_path').and_return('')
+    flexmock(module).should_receive('database_names_to_dump').and_return(('foo',))
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return(
+        'databases/localhost/foo'
+    )
+    flexmock(module.os.path).should_receive('exists').and_return(False)
+    flexmock(module.dump).should_receive('create_parent_directory_for_dump')
+    flexmock(module.dump).should_receive('create_named_pipe_for_dump').never()
+
+    flexmock(module).should_receive('execute_command').with_args(
+        (
+            'pg_dump',
+            '--no-password',
+            '--clean',
+            '--if-exists',
+            '--format',
+            'custom',
+            'foo',
+            '>',
+            'databases/localhost/foo',
+        ),
+        shell=True,
+        extra_environment={'PGSSLMODE': 'disable'},
+    ).and_return(flexmock()).once()
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False, spool=True) == []
+
+
+def test_dump_databases_with_max_concurrent_dumps_runs_largest_dumps_first():
+    databases = [{'name': 'all', 'format': 'custom', 'max_concurrent_dumps': 2}]
+    flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
+    flexmock(module).should_receive('make_dump_path').and_return('')
+    flexmock(module).should_receive('database_names_to_dump').and_return(('foo', 'bar', 'baz'))
+    flexmock(module).should_receive('database_sizes').and_return({'foo': 10, 'bar': 30})
+    flexmock(module.dump).should_receive('make_database_dump_filename').replace_with(
+        lambda dump_path, name, hostname: f'databases/localhost/{name}'
+    )
+    flexmock(module.os.path).should_receive('exists').and_return(False)
+    flexmock(module.dump).should_receive('create_named_pipe_for_dump').never()
+    dumped_filenames = []
+    flexmock(module).should_receive('run_dump_command').replace_with(
+        lambda database_name, command, extra_environment, dump_filename, compression: dumped_filenames.append(
+            dump_filename
+        )
+    )
+
+    def run_dumps(dump_functions, max_concurrent_dumps):
+        assert max_concurrent_dumps == 2
+
+        for dump_function in dump_functions:
+            dump_function()
+
+    flexmock(module.dump).should_receive('run_dumps').replace_with(run_dumps)
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False, spool=True) == []
+    assert dumped_filenames == [
+        'databases/localhost/bar',
+        'databases/localhost/foo',
+        'databases/localhost/baz',
+    ]
+
+
+def test_dump_databases_with_max_concurrent_dumps_and_size_query_error_warns_and_keeps_order():
+    databases = [{'name': 'all', 'format': 'custom', 'max_concurrent_dumps': 2}]
+    flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
+    flexmock(module).should_receive('make_dump_path').and_return('')
+    flexmock(module).should_receive('database_names_to_dump').and_return(('foo', 'bar'))
+    flexmock(module).should_receive('database_sizes').and_raise(
+        module.subprocess.CalledProcessError(2, 'psql')
+    )
+    flexmock(module.logger).should_receive('warning').once()
+    flexmock(module.dump).should_receive('make_database_dump_filename').replace_with(
+        lambda dump_path, name, hostname: f'databases/localhost/{name}'
+    )
+    flexmock(module.os.path).should_receive('exists').and_return(False)
+    dumped_filenames = []
+    flexmock(module).should_receive('run_dump_command').replace_with(
+        lambda database_name, command, extra_environment, dump_filename, compression: dumped_filenames.append(
+            dump_filename
+        )
+    )
+    flexmock(module.dump).should_receive('run_dumps').replace_with(
+        lambda dump_functions, max_concurrent_dumps: [
+            dump_function() for dump_function in dump_functions
+        ]
+    )
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False, spool=True) == []
+    assert dumped_filenames == ['databases/localhost/foo', 'databases/localhost/bar']
+
+
+def test_dump_databases_with_max_concurrent_dumps_and_streaming_dumps_skips_size_query():
+    databases = [{'name': 'all', 'format': 'custom', 'max_concurrent_dumps': 2}]
+    processes = [flexmock(), flexmock()]
+    flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
+    flexmock(module).should_receive('make_dump_path').and_return('')
+    flexmock(module).should_receive('database_names_to_dump').and_return(('foo', 'bar'))
+    flexmock(module).should_receive('database_sizes').never()
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return(
+        'databases/localhost/foo'
+    ).and_return('databases/localhost/bar')
+    flexmock(module.os.path).should_receive('exists').and_return(False)
+    flexmock(module.dump).should_receive('create_named_pipe_for_dump')
+    flexmock(module).should_receive('execute_command').and_return(processes[0]).and_return(
+        processes[1]
+    )
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False) == processes
+
+
+def test_run_dump_command_creates_parent_directory_and_runs_command_to_completion():
+    flexmock(module.dump).should_receive('create_parent_directory_for_dump').with_args(
+        'databases/localhost/foo'
+    ).once()
+    flexmock(module).should_receive('execute_command').with_args(
+        ('pg_dump', 'foo'), shell=True, extra_environment={'PGSSLMODE': 'disable'}
+    ).once()
+    flexmock(module.metrics).should_receive('path_size').and_return(5)
+
+    module.run_dump_command(
+        'foo', ('pg_dump', 'foo'), {'PGSSLMODE': 'disable'}, 'databases/localhost/foo'
+    )
+
+
+def test_run_dump_command_records_dump_span_with_byte_count():
+    flexmock(module.timing, ENABLED=True, SPANS=[])
+    flexmock(module.dump).should_receive('create_parent_directory_for_dump')
+    flexmock(module).should_receive('execute_command')
+    flexmock(module.metrics).should_receive('path_size').with_args(
+        'databases/localhost/foo'
+    ).and_return(5)
+
+    module.run_dump_command(
+        'foo', ('pg_dump', 'foo'), {'PGSSLMODE': 'disable'}, 'databases/localhost/foo'
+    )
+
+    (record,) = module.timing.SPANS
+    assert record['name'] == 'postgresql_databases foo'
+    assert record['kind'] == 'dump'
+    assert record['byte_count'] == 5
+
+
+def test_run_dump_command_with_compression_runs_compressed_dump_command():
+    flexmock(module.dump).should_receive('create_parent_directory_for_dump').with_args(
+        'databases/localhost/foo'
+    ).once()
+    flexmock(module).should_receive('execute_command').never()
+    flexmock(module.dump).should_receive('execute_compressed_dump_command').with_args(
+        ('pg_dump', 'foo'),
+        'zstd',
+        'databases/localhost/foo',
+        shell=True,
+        extra_environment={'PGSSLMODE': 'disable'},
+    ).once()
+    flexmock(module.metrics).should_receive('path_size').and_return(5)
+
+    module.run_dump_command(
+        'foo',
+        ('pg_dump', 'foo'),
+        {'PGSSLMODE': 'disable'},
+        'databases/localhost/foo',
+        compression='zstd',
+    )
+
+
+def test_dump_databases_with_compression_pipes_pg_dump_through_compression_command():
+    databases = [{'name': 'foo', 'dump_compression': 'zstd'}]
+    processes = (flexmock(), flexmock())
+    flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
+    flexmock(module).should_receive('make_dump_path').and_return('')
+    flexmock(module).should_receive('database_names_to_dump').and_return(('foo',))
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return(
+        'databases/localhost/foo'
+    )
+    flexmock(module.os.path).should_receive('exists').and_return(False)
+    flexmock(module.dump).should_receive('create_named_pipe_for_dump').once()
+    flexmock(module).should_receive('execute_command').never()
+    flexmock(module.dump).should_receive('execute_compressed_dump_command').with_args(
+        (
+            'pg_dump',
+            '--no-password',
+            '--clean',
+            '--if-exists',
+            '--format',
+            'custom',
+            'foo',
+        ),
+        'zstd',
+        'databases/localhost/foo',
+        shell=True,
+        extra_environment={'PGSSLMODE': 'disable'},
+        run_to_completion=False,
+    ).and_return(processes).once()
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False) == list(processes)
+
+
+def test_dump_databases_with_compression_and_directory_format_skips_compression():
+    databases = [{'name': 'foo', 'format': 'directory', 'dump_compression': 'zstd'}]
+    flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
+    flexmock(module).should_receive('make_dump_path').and_return('')
+    flexmock(module).should_receive('database_names_to_dump').and_return(('foo',))
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return(
+        'databases/localhost/foo'
+    )
+    flexmock(module.os.path).should_receive('exists').and_return(False)
+    flexmock(module).should_receive('run_dump_command').with_args(
+        'foo',
+        (
+            'pg_dump',
+            '--no-password',
+            '--clean',
+            '--if-exists',
+            '--format',
+            'directory',
+            '--file',
+            'databases/localhost/foo',
+            'foo',
+        ),
+        {'PGSSLMODE': 'disable'},
+        'databases/localhost/foo',
+        compression=None,
+    ).once()
+    flexmock(module.dump).should_receive('execute_compressed_dump_command').never()
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False) == []
+
+
 def test_dump_databases_runs_pg_dump_with_options():
     databases = [{'name': 'foo', 'options': '--stuff=such'}]
     process = flexmock()
@@ -449,6 +793,9 @@ def test_restore_database_dump_runs_pg_restore():
     flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         (
             'pg_restore',
@@ -483,12 +830,102 @@ def test_restore_database_dump_runs_pg_restore():
     )
 
 
+def test_restore_database_dump_with_extract_stream_runs_pg_restore_from_it():
+    database_config = [{'name': 'foo', 'schemas': None}]
+    extract_stream = flexmock()
+
+    flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
+    flexmock(module).should_receive('make_dump_path')
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return('/dump/path')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
+    flexmock(module).should_receive('execute_command_with_processes').with_args(
+        (
+            'pg_restore',
+            '--no-password',
+            '--if-exists',
+            '--exit-on-error',
+            '--clean',
+            '--dbname',
+            'foo',
+        ),
+        processes=[],
+        output_log_level=logging.DEBUG,
+        input_file=extract_stream,
+        extra_environment={'PGSSLMODE': 'disable'},
+    ).once()
+    flexmock(module).should_receive('execute_command').with_args(
+        (
+            'psql',
+            '--no-password',
+            '--no-psqlrc',
+            '--quiet',
+            '--dbname',
+            'foo',
+            '--command',
+            'ANALYZE',
+        ),
+        extra_environment={'PGSSLMODE': 'disable'},
+    ).once()
+
+    module.restore_database_dump(
+        database_config,
+        'test.yaml',
+        {},
+        dry_run=False,
+        extract_process=None,
+        extract_stream=extract_stream,
+    )
+
+
+def test_restore_database_dump_with_compression_restores_from_decompression_process():
+    database_config = [{'name': 'foo', 'schemas': None, 'dump_compression': 'zstd'}]
+    extract_process = flexmock(stdout=flexmock())
+    decompress_process = flexmock(stdout=flexmock())
+
+    flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
+    flexmock(module).should_receive('make_dump_path')
+    flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').with_args(
+        [extract_process], extract_process.stdout, 'zstd'
+    ).and_return(([extract_process, decompress_process], decompress_process.stdout)).once()
+    flexmock(module).should_receive('execute_command_with_processes').with_args(
+        (
+            'pg_restore',
+            '--no-password',
+            '--if-exists',
+            '--exit-on-error',
+            '--clean',
+            '--dbname',
+            'foo',
+        ),
+        processes=[extract_process, decompress_process],
+        output_log_level=logging.DEBUG,
+        input_file=decompress_process.stdout,
+        extra_environment={'PGSSLMODE': 'disable'},
+    ).once()
+    flexmock(module).should_receive('execute_command')
+
+    module.restore_database_dump(
+        database_config,
+        'test.yaml',
+        {},
+        dry_run=False,
+        extract_process=extract_process,
+        compression='zstd',
+    )
+
+
 def test_restore_database_dump_errors_on_multiple_database_config():
     database_config = [{'name': 'foo'}, {'name': 'bar'}]
 
     flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').never()
     flexmock(module).should_receive('execute_command').never()
 
@@ -507,6 +944,9 @@ def test_restore_database_dump_runs_pg_restore_with_hostname_and_port():
     flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         (
             'pg_restore',
@@ -560,6 +1000,9 @@ def test_restore_database_dump_runs_pg_restore_with_username_and_password():
     )
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         (
             'pg_restore',
@@ -612,6 +1055,9 @@ def test_restore_database_dump_runs_pg_restore_with_options():
     flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         (
             'pg_restore',
@@ -655,6 +1101,9 @@ def test_restore_database_dump_runs_psql_for_all_database_dump():
     flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         (
             'psql',
@@ -683,6 +1132,9 @@ def test_restore_database_dump_runs_psql_for_plain_database_dump():
     flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         ('psql', '--no-password', '--no-psqlrc', '--dbname', 'foo'),
         processes=[extract_process],
@@ -723,6 +1175,9 @@ def test_restore_database_dump_runs_non_default_pg_restore_and_psql():
     flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         (
             'docker',
@@ -782,6 +1237,9 @@ def test_restore_database_dump_without_extract_process_restores_from_disk():
     flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename').and_return('/dump/path')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         (
             'pg_restore',
@@ -817,12 +1275,105 @@ def test_restore_database_dump_without_extract_process_restores_from_disk():
     )
 
 
+def test_restore_database_dump_from_disk_with_jobs_runs_pg_restore_in_parallel():
+    database_config = [{'name': 'foo', 'schemas': None, 'format': 'directory', 'jobs': 4}]
+
+    flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
+    flexmock(module).should_receive('make_dump_path')
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return('/dump/path')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
+    flexmock(module).should_receive('execute_command_with_processes').with_args(
+        (
+            'pg_restore',
+            '--no-password',
+            '--if-exists',
+            '--exit-on-error',
+            '--clean',
+            '--dbname',
+            'foo',
+            '--jobs',
+            '4',
+            '/dump/path',
+        ),
+        processes=[],
+        output_log_level=logging.DEBUG,
+        input_file=None,
+        extra_environment={'PGSSLMODE': 'disable'},
+    ).once()
+    flexmock(module).should_receive('execute_command').with_args(
+        (
+            'psql',
+            '--no-password',
+            '--no-psqlrc',
+            '--quiet',
+            '--dbname',
+            'foo',
+            '--command',
+            'ANALYZE',
+        ),
+        extra_environment={'PGSSLMODE': 'disable'},
+    ).once()
+
+    module.restore_database_dump(
+        database_config, 'test.yaml', {}, dry_run=False, extract_process=None
+    )
+
+
+def test_restore_database_dump_from_stream_with_jobs_omits_jobs():
+    database_config = [{'name': 'foo', 'schemas': None, 'jobs': 4}]
+    extract_process = flexmock(stdout=flexmock())
+
+    flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
+    flexmock(module).should_receive('make_dump_path')
+    flexmock(module.dump).should_receive('make_database_dump_filename')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
+    flexmock(module).should_receive('execute_command_with_processes').with_args(
+        (
+            'pg_restore',
+            '--no-password',
+            '--if-exists',
+            '--exit-on-error',
+            '--clean',
+            '--dbname',
+            'foo',
+        ),
+        processes=[extract_process],
+        output_log_level=logging.DEBUG,
+        input_file=extract_process.stdout,
+        extra_environment={'PGSSLMODE': 'disable'},
+    ).once()
+    flexmock(module).should_receive('execute_command').with_args(
+        (
+            'psql',
+            '--no-password',
+            '--no-psqlrc',
+            '--quiet',
+            '--dbname',
+            'foo',
+            '--command',
+            'ANALYZE',
+        ),
+        extra_environment={'PGSSLMODE': 'disable'},
+    ).once()
+
+    module.restore_database_dump(
+        database_config, 'test.yaml', {}, dry_run=False, extract_process=extract_process
+    )
+
+
 def test_restore_database_dump_with_schemas_restores_schemas():
     database_config = [{'name': 'foo', 'schemas': ['bar', 'baz']}]
 
     flexmock(module).should_receive('make_extra_environment').and_return({'PGSSLMODE': 'disable'})
     flexmock(module).should_receive('make_dump_path')
     flexmock(module.dump).should_receive('make_database_dump_filename').and_return('/dump/path')
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').with_args(
         (
             'pg_restore',
@@ -0,0 +1,135 @@
+from flexmock import flexmock
+
+from borgmatic.hooks import prometheus as module
+
+
+def test_ping_monitor_for_start_state_starts_collecting_metrics():
+    flexmock(module.metrics).should_receive('start_collecting').with_args('test.yaml').once()
+    flexmock(module.metrics).should_receive('write_textfile').never()
+
+    module.ping_monitor(
+        {'textfile': 'borgmatic.prom'},
+        'test.yaml',
+        module.monitor.State.START,
+        monitoring_log_level=1,
+        dry_run=False,
+    )
+
+
+def test_ping_monitor_for_finish_state_writes_metrics_with_last_success_of_now():
+    flexmock(module.time).should_receive('time').and_return(1000.0)
+    flexmock(module.metrics).should_receive('read_sample_value').never()
+    flexmock(module.metrics).should_receive('pop_samples').and_return(
+        [
+            ('test.yaml', 'borgmatic_archive_files', {'repository': 'repo'}, 3),
+            ('test.yaml', 'borgmatic_action_succeeded', {}, 1),
+        ]
+    )
+    flexmock(module.metrics).should_receive('format_samples').with_args(
+        [
+            ('test.yaml', 'borgmatic_archive_files', {'repository': 'repo'}, 3),
+            ('test.yaml', 'borgmatic_action_succeeded', {}, 1),
+            ('test.yaml', 'borgmatic_last_run_timestamp_seconds', {}, 1000.0),
+            ('test.yaml', 'borgmatic_last_run_succeeded', {}, 1),
+            ('test.yaml', 'borgmatic_last_success_timestamp_seconds', {}, 1000.0),
+        ]
+    ).and_return('text')
+    flexmock(module.metrics).should_receive('write_textfile').with_args(
+        'text', 'borgmatic.prom'
+    ).once()
+
+    module.ping_monitor(
+        {'textfile': 'borgmatic.prom'},
+        'test.yaml',
+        module.monitor.State.FINISH,
+        monitoring_log_level=1,
+        dry_run=False,
+    )
+
+
+def test_ping_monitor_for_fail_state_writes_metrics_with_previous_last_success():
+    flexmock(module.time).should_receive('time').and_return(1000.0)
+    flexmock(module.metrics).should_receive('read_sample_value').with_args(
+        'borgmatic.prom', 'borgmatic_last_success_timestamp_seconds'
+    ).and_return(500.0)
+    flexmock(module.metrics).should_receive('pop_samples').and_return([])
+    flexmock(module.metrics).should_receive('format_samples').with_args(
+        [
+            ('test.yaml', 'borgmatic_last_run_timestamp_seconds', {}, 1000.0),
+            ('test.yaml', 'borgmatic_last_run_succeeded', {}, 0),
+            ('test.yaml', 'borgmatic_last_success_timestamp_seconds', {}, 500.0),
+        ]
+    ).and_return('text')
+    flexmock(module.metrics).should_receive('write_textfile').with_args(
+        'text', 'borgmatic.prom'
+    ).once()
+
+    module.ping_monitor(
+        {'textfile': 'borgmatic.prom'},
+        'test.yaml',
+        module.monitor.State.FAIL,
+        monitoring_log_level=1,
+        dry_run=False,
+    )
+
+
+def test_ping_monitor_for_fail_state_without_previous_success_omits_last_success():
+    flexmock(module.time).should_receive('time').and_return(1000.0)
+    flexmock(module.metrics).should_receive('read_sample_value').and_return(None)
+    flexmock(module.metrics).should_receive('pop_samples').and_return([])
+    flexmock(module.metrics).should_receive('format_samples').with_args(
+        [
+            ('test.yaml', 'borgmatic_last_run_timestamp_seconds', {}, 1000.0),
+            ('test.yaml', 'borgmatic_last_run_succeeded', {}, 0),
+        ]
+    ).and_return('text')
+    flexmock(module.metrics).should_receive('write_textfile').once()
+
+    module.ping_monitor(
+        {'textfile': 'borgmatic.prom'},
+        'test.yaml',
+        module.monitor.State.FAIL,
+        monitoring_log_level=1,
+        dry_run=False,
+    )
+
+
+def test_ping_monitor_with_write_error_logs_warning():
+    flexmock(module.metrics).should_receive('pop_samples').and_return([])
+    flexmock(module.metrics).should_receive('format_samples').and_return('text')
+    flexmock(module.metrics).should_receive('write_textfile').and_raise(OSError)
+    flexmock(module.logger).should_receive('warning').once()
+
+    module.ping_monitor(
+        {'textfile': 'borgmatic.prom'},
+        'test.yaml',
+        module.monitor.State.FINISH,
+        monitoring_log_level=1,
+        dry_run=False,
+    )
+
+
+def test_ping_monitor_dry_run_does_not_write_metrics():
+    flexmock(module.metrics).should_receive('pop_samples').and_return([])
+    flexmock(module.metrics).should_receive('write_textfile').never()
+
+    module.ping_monitor(
+        {'textfile': 'borgmatic.prom'},
+        'test.yaml',
+        module.monitor.State.FINISH,
+        monitoring_log_level=1,
+        dry_run=True,
+    )
+
+
+def test_ping_monitor_with_unsupported_state_does_not_write_metrics():
+    flexmock(module.metrics).should_receive('start_collecting').never()
+    flexmock(module.metrics).should_receive('write_textfile').never()
+
+    module.ping_monitor(
+        {'textfile': 'borgmatic.prom'},
+        'test.yaml',
+        module.monitor.State.LOG,
+        monitoring_log_level=1,
+        dry_run=False,
+    )
@@ -1,3 +1,5 @@
+import logging
+
 import pytest
 from flexmock import flexmock
 
@@ -38,6 +40,87 @@ def test_dump_databases_dumps_each_database():
     assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False) == processes
 
 
+def test_dump_databases_with_spool_runs_dumps_to_completion():
+    databases = [{'path': '/path/to/database1', 'name': 'database1'}]
+
+    flexmock(module).should_receive('make_dump_path').and_return('/path/to/dump')
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return(
+        '/path/to/dump/database'
+    )
+    flexmock(module.os.path).should_receive('exists').and_return(False)
+    flexmock(module.dump).should_receive('create_parent_directory_for_dump')
+    flexmock(module).should_receive('execute_command').with_args(
+        ('sqlite3', '/path/to/database1', '.dump', '>', '/path/to/dump/database'),
+        shell=True,
+    ).once()
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False, spool=True) == []
+
+
+def test_dump_databases_with_spool_records_dump_span_with_byte_count():
+    databases = [{'path': '/path/to/database1', 'name': 'database1'}]
+    flexmock(module.timing, ENABLED=True, SPANS=[])
+    flexmock(module).should_receive('make_dump_path').and_return('/path/to/dump')
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return(
+        '/path/to/dump/database'
+    )
+    flexmock(module.os.path).should_receive('exists').and_return(False)
+    flexmock(module.dump).should_receive('create_parent_directory_for_dump')
+    flexmock(module).should_receive('execute_command')
+    flexmock(module.metrics).should_receive('path_size').with_args(
+        '/path/to/dump/database'
+    ).and_return(5)
+
+    module.dump_databases(databases, 'test.yaml', {}, dry_run=False, spool=True)
+
+    (record,) = module.timing.SPANS
+    assert record['name'] == 'sqlite_databases database1'
+    assert record['kind'] == 'dump'
+    assert record['byte_count'] == 5
+
+
+def test_dump_databases_with_compression_pipes_dump_through_compression_command():
+    databases = [{'path': '/path/to/database1', 'name': 'database1', 'dump_compression': 'zstd'}]
+    processes = (flexmock(), flexmock())
+
+    flexmock(module).should_receive('make_dump_path').and_return('/path/to/dump')
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return(
+        '/path/to/dump/database'
+    )
+    flexmock(module.os.path).should_receive('exists').and_return(False)
+    flexmock(module.dump).should_receive('create_parent_directory_for_dump')
+    flexmock(module).should_receive('execute_command').never()
+    flexmock(module.dump).should_receive('execute_compressed_dump_command').with_args(
+        ('sqlite3', '/path/to/database1', '.dump'),
+        'zstd',
+        '/path/to/dump/database',
+        shell=True,
+        run_to_completion=False,
+    ).and_return(processes).once()
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False) == list(processes)
+
+
+def test_dump_databases_with_compression_and_spool_compresses_dump_to_completion():
+    databases = [{'path': '/path/to/database1', 'name': 'database1', 'dump_compression': 'zstd'}]
+
+    flexmock(module).should_receive('make_dump_path').and_return('/path/to/dump')
+    flexmock(module.dump).should_receive('make_database_dump_filename').and_return(
+        '/path/to/dump/database'
+    )
+    flexmock(module.os.path).should_receive('exists').and_return(False)
+    flexmock(module.dump).should_receive('create_parent_directory_for_dump')
+    flexmock(module).should_receive('execute_command').never()
+    flexmock(module.dump).should_receive('execute_compressed_dump_command').with_args(
+        ('sqlite3', '/path/to/database1', '.dump'),
+        'zstd',
+        '/path/to/dump/database',
+        shell=True,
+    ).once()
+
+    assert module.dump_databases(databases, 'test.yaml', {}, dry_run=False, spool=True) == []
+
+
 def test_dumping_database_with_non_existent_path_warns_and_dumps_database():
     databases = [
         {'path': '/path/to/database1', 'name': 'database1'},
@@ -94,6 +177,9 @@ def test_restore_database_dump_restores_database():
     database_config = [{'path': '/path/to/database', 'name': 'database'}]
     extract_process = flexmock(stdout=flexmock())
 
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
     flexmock(module).should_receive('execute_command_with_processes').once()
 
     flexmock(module.os).should_receive('remove').once()
@@ -103,6 +189,60 @@ def test_restore_database_dump_restores_database():
     )
 
 
+def test_restore_database_dump_with_compression_restores_from_decompression_process():
+    database_config = [
+        {'path': '/path/to/database', 'name': 'database', 'dump_compression': 'zstd'}
+    ]
+    extract_process = flexmock(stdout=flexmock())
+    decompress_process = flexmock(stdout=flexmock())
+
+    flexmock(module.dump).should_receive('decompress_restore_input').with_args(
+        [extract_process], extract_process.stdout, 'zstd'
+    ).and_return(([extract_process, decompress_process], decompress_process.stdout)).once()
+    flexmock(module).should_receive('execute_command_with_processes').with_args(
+        ('sqlite3', '/path/to/database'),
+        [extract_process, decompress_process],
+        output_log_level=logging.DEBUG,
+        input_file=decompress_process.stdout,
+    ).once()
+    flexmock(module.os).should_receive('remove').once()
+
+    module.restore_database_dump(
+        database_config,
+        'test.yaml',
+        {},
+        dry_run=False,
+        extract_process=extract_process,
+        compression='zstd',
+    )
+
+
+def test_restore_database_dump_with_extract_stream_restores_database_from_it():
+    database_config = [{'path': '/path/to/database', 'name': 'database'}]
+    extract_stream = flexmock()
+
+    flexmock(module.dump).should_receive('decompress_restore_input').replace_with(
+        lambda processes, input_file, compression: (processes, input_file)
+    )
+    flexmock(module).should_receive('execute_command_with_processes').with_args(
+        ('sqlite3', '/path/to/database'),
+        processes=[],
+        output_log_level=logging.DEBUG,
+        input_file=extract_stream,
+    ).once()
+
+    flexmock(module.os).should_receive('remove').once()
+
+    module.restore_database_dump(
+        database_config,
+        'test.yaml',
+        {},
+        dry_run=False,
+        extract_process=None,
+        extract_stream=extract_stream,
+    )
+
+
 def test_restore_database_dump_does_not_restore_database_if_dry_run():
     database_config = [{'path': '/path/to/database', 'name': 'database'}]
     extract_process = flexmock(stdout=flexmock())
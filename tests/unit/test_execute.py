@@ -48,7 +48,7 @@ def test_command_for_process_passes_through_string_command():
 
 
 def test_output_buffer_for_process_returns_stderr_when_stdout_excluded():
-    stdout = flexmock()
+    stdout = flexmock(closed=False)
     stderr = flexmock()
     process = flexmock(stdout=stdout, stderr=stderr)
 
@@ -56,7 +56,7 @@ def test_output_buffer_for_process_returns_stderr_when_stdout_excluded():
 
 
 def test_output_buffer_for_process_returns_stdout_when_not_excluded():
-    stdout = flexmock()
+    stdout = flexmock(closed=False)
     process = flexmock(stdout=stdout)
 
     assert (
@@ -65,31 +65,70 @@ def test_output_buffer_for_process_returns_stdout_when_not_excluded():
     )
 
 
+def test_output_buffer_for_process_returns_stderr_when_stdout_not_captured():
+    stderr = flexmock()
+    process = flexmock(stdout=None, stderr=stderr)
+
+    assert module.output_buffer_for_process(process, exclude_stdouts=[flexmock()]) == stderr
+
+
+def test_output_buffer_for_process_returns_stderr_when_stdout_closed():
+    stderr = flexmock()
+    process = flexmock(stdout=flexmock(closed=True), stderr=stderr)
+
+    assert module.output_buffer_for_process(process, exclude_stdouts=[flexmock()]) == stderr
+
+
+def test_make_last_lines_returns_empty_buffer_bounded_to_max_line_count():
+    last_lines = module.make_last_lines()
+
+    assert list(last_lines) == []
+    assert last_lines.maxlen == module.ERROR_OUTPUT_MAX_LINE_COUNT
+
+
+def test_format_last_lines_under_max_line_count_joins_lines():
+    last_lines = module.make_last_lines()
+    last_lines.extend(('foo', 'bar'))
+
+    assert module.format_last_lines(last_lines) == 'foo\nbar'
+
+
+def test_format_last_lines_at_max_line_count_indicates_truncation():
+    last_lines = module.make_last_lines()
+    last_lines.extend(str(number) for number in range(0, module.ERROR_OUTPUT_MAX_LINE_COUNT + 1))
+
+    assert module.format_last_lines(last_lines) == '\n'.join(
+        ['...'] + [str(number) for number in range(1, module.ERROR_OUTPUT_MAX_LINE_COUNT + 1)]
+    )
+
+
 def test_append_last_lines_under_max_line_count_appends():
-    last_lines = ['last']
+    last_lines = module.make_last_lines()
+    last_lines.append('last')
     flexmock(module.logger).should_receive('log').once()
 
     module.append_last_lines(
         last_lines, captured_output=flexmock(), line='line', output_log_level=flexmock()
     )
 
-    assert last_lines == ['last', 'line']
+    assert list(last_lines) == ['last', 'line']
 
 
 def test_append_last_lines_over_max_line_count_trims_and_appends():
     original_last_lines = [str(number) for number in range(0, module.ERROR_OUTPUT_MAX_LINE_COUNT)]
-    last_lines = list(original_last_lines)
+    last_lines = module.make_last_lines()
+    last_lines.extend(original_last_lines)
     flexmock(module.logger).should_receive('log').once()
 
     module.append_last_lines(
         last_lines, captured_output=flexmock(), line='line', output_log_level=flexmock()
     )
 
-    assert last_lines == original_last_lines[1:] + ['line']
+    assert list(last_lines) == original_last_lines[1:] + ['line']
 
 
 def test_append_last_lines_with_output_log_level_none_appends_captured_output():
-    last_lines = ['last']
+    last_lines = module.make_last_lines()
     captured_output = ['captured']
     flexmock(module.logger).should_receive('log').never()
 
@@ -100,6 +139,40 @@ def test_append_last_lines_with_output_log_level_none_appends_captured_output():
     assert captured_output == ['captured', 'line']
 
 
+def test_read_output_lines_splits_chunk_into_lines_and_holds_onto_partial_line():
+    output_buffer = flexmock(fileno=lambda: 3)
+    partial_lines = {}
+    flexmock(module.os).should_receive('read').and_return(b'foo\nbar  \n\nba')
+
+    assert module.read_output_lines(output_buffer, partial_lines) == (['foo', 'bar'], False)
+    assert partial_lines == {output_buffer: b'ba'}
+
+
+def test_read_output_lines_joins_partial_line_with_next_chunk():
+    output_buffer = flexmock(fileno=lambda: 3)
+    partial_lines = {output_buffer: b'ba'}
+    flexmock(module.os).should_receive('read').and_return(b'z\nqu')
+
+    assert module.read_output_lines(output_buffer, partial_lines) == (['baz'], False)
+    assert partial_lines == {output_buffer: b'qu'}
+
+
+def test_read_output_lines_at_end_of_file_returns_remaining_partial_line():
+    output_buffer = flexmock(fileno=lambda: 3)
+    partial_lines = {output_buffer: b'qux'}
+    flexmock(module.os).should_receive('read').and_return(b'')
+
+    assert module.read_output_lines(output_buffer, partial_lines) == (['qux'], True)
+    assert partial_lines == {}
+
+
+def test_read_output_lines_at_end_of_file_without_partial_line_returns_no_lines():
+    output_buffer = flexmock(fileno=lambda: 3)
+    flexmock(module.os).should_receive('read').and_return(b'')
+
+    assert module.read_output_lines(output_buffer, {}) == ([], True)
+
+
 def test_execute_command_calls_full_command():
     full_command = ['foo', 'bar']
     flexmock(module.os, environ={'a': 'b'})
@@ -111,7 +184,7 @@ def test_execute_command_calls_full_command():
         shell=False,
         env=None,
         cwd=None,
-    ).and_return(flexmock(stdout=None)).once()
+    ).and_return(flexmock(stdout=None, returncode=0)).once()
     flexmock(module).should_receive('log_outputs')
 
     output = module.execute_command(full_command)
@@ -131,7 +204,7 @@ def test_execute_command_calls_full_command_with_output_file():
         shell=False,
         env=None,
         cwd=None,
-    ).and_return(flexmock(stderr=None)).once()
+    ).and_return(flexmock(stderr=None, returncode=0)).once()
     flexmock(module).should_receive('log_outputs')
 
     output = module.execute_command(full_command, output_file=output_file)
@@ -144,7 +217,7 @@ def test_execute_command_calls_full_command_without_capturing_output():
     flexmock(module.os, environ={'a': 'b'})
     flexmock(module.subprocess).should_receive('Popen').with_args(
         full_command, stdin=None, stdout=None, stderr=None, shell=False, env=None, cwd=None
-    ).and_return(flexmock(wait=lambda: 0)).once()
+    ).and_return(flexmock(wait=lambda: 0, returncode=0)).once()
     flexmock(module).should_receive('exit_code_indicates_error').and_return(False)
     flexmock(module).should_receive('log_outputs')
 
@@ -165,7 +238,7 @@ def test_execute_command_calls_full_command_with_input_file():
         shell=False,
         env=None,
         cwd=None,
-    ).and_return(flexmock(stdout=None)).once()
+    ).and_return(flexmock(stdout=None, returncode=0)).once()
     flexmock(module).should_receive('log_outputs')
 
     output = module.execute_command(full_command, input_file=input_file)
@@ -184,7 +257,7 @@ def test_execute_command_calls_full_command_with_shell():
         shell=True,
         env=None,
         cwd=None,
-    ).and_return(flexmock(stdout=None)).once()
+    ).and_return(flexmock(stdout=None, returncode=0)).once()
     flexmock(module).should_receive('log_outputs')
 
     output = module.execute_command(full_command, shell=True)
@@ -192,6 +265,25 @@ def test_execute_command_calls_full_command_with_shell():
     assert output is None
 
 
+def test_execute_command_calls_full_command_with_shell_and_umask():
+    full_command = ['foo', 'bar']
+    flexmock(module.os, environ={'a': 'b'})
+    flexmock(module.subprocess).should_receive('Popen').with_args(
+        'umask 077; foo bar',
+        stdin=None,
+        stdout=module.subprocess.PIPE,
+        stderr=module.subprocess.STDOUT,
+        shell=True,
+        env=None,
+        cwd=None,
+    ).and_return(flexmock(stdout=None, returncode=0)).once()
+    flexmock(module).should_receive('log_outputs')
+
+    output = module.execute_command(full_command, shell=True, umask=0o77)
+
+    assert output is None
+
+
 def test_execute_command_calls_full_command_with_extra_environment():
     full_command = ['foo', 'bar']
     flexmock(module.os, environ={'a': 'b'})
@@ -203,7 +295,7 @@ def test_execute_command_calls_full_command_with_extra_environment():
         shell=False,
         env={'a': 'b', 'c': 'd'},
         cwd=None,
-    ).and_return(flexmock(stdout=None)).once()
+    ).and_return(flexmock(stdout=None, returncode=0)).once()
     flexmock(module).should_receive('log_outputs')
 
     output = module.execute_command(full_command, extra_environment={'c': 'd'})
@@ -222,7 +314,7 @@ def test_execute_command_calls_full_command_with_working_directory():
         shell=False,
         env=None,
         cwd='/working',
-    ).and_return(flexmock(stdout=None)).once()
+    ).and_return(flexmock(stdout=None, returncode=0)).once()
     flexmock(module).should_receive('log_outputs')
 
     output = module.execute_command(full_command, working_directory='/working')
@@ -289,6 +381,21 @@ def test_execute_command_and_capture_output_returns_output_when_process_error_is
     assert output == expected_output
 
 
+def test_execute_command_and_capture_output_passes_borg_local_path_when_checking_exit_code():
+    full_command = ['borg', 'create']
+    flexmock(module.os, environ={'a': 'b'})
+    flexmock(module.subprocess).should_receive('check_output').and_raise(
+        subprocess.CalledProcessError(1, full_command, b'[]')
+    ).once()
+    flexmock(module).should_receive('exit_code_indicates_error').with_args(
+        full_command, 1, 'borg'
+    ).and_return(False).once()
+
+    output = module.execute_command_and_capture_output(full_command, borg_local_path='borg')
+
+    assert output == '[]'
+
+
 def test_execute_command_and_capture_output_raises_when_command_errors():
     full_command = ['foo', 'bar']
     expected_output = '[]'
@@ -349,6 +456,85 @@ def test_execute_command_and_capture_output_returns_output_with_working_director
     assert output == expected_output
 
 
+def test_execute_command_and_stream_output_yields_lines():
+    full_command = ['foo', 'bar']
+    flexmock(module.os, environ={'a': 'b'})
+    process = flexmock(stdout=flexmock(close=lambda: None), args=full_command)
+    process.stdout.should_receive('__iter__').and_return(iter((b'line\n', b' spaced \n')))
+    process.should_receive('wait').and_return(0)
+    flexmock(module.subprocess).should_receive('Popen').with_args(
+        full_command,
+        stdout=module.subprocess.PIPE,
+        stderr=None,
+        shell=False,
+        env=None,
+        cwd=None,
+    ).and_return(process).once()
+
+    assert list(module.execute_command_and_stream_output(full_command)) == ['line', ' spaced ']
+
+
+def test_execute_command_and_stream_output_with_options_passes_them_through():
+    full_command = ['foo', 'bar']
+    flexmock(module.os, environ={'a': 'b'})
+    process = flexmock(stdout=flexmock(close=lambda: None), args='foo bar')
+    process.stdout.should_receive('__iter__').and_return(iter(()))
+    process.should_receive('wait').and_return(1)
+    flexmock(module.subprocess).should_receive('Popen').with_args(
+        'foo bar',
+        stdout=module.subprocess.PIPE,
+        stderr=module.subprocess.STDOUT,
+        shell=True,
+        env={'a': 'b', 'c': 'd'},
+        cwd='/working',
+    ).and_return(process).once()
+
+    assert (
+        list(
+            module.execute_command_and_stream_output(
+                full_command,
+                capture_stderr=True,
+                shell=True,
+                extra_environment={'c': 'd'},
+                working_directory='/working',
+                borg_local_path='foo',
+            )
+        )
+        == []
+    )
+
+
+def test_execute_command_and_stream_output_raises_with_last_lines_after_yielding_lines():
+    full_command = ['foo', 'bar']
+    process = flexmock(stdout=flexmock(close=lambda: None), args=full_command)
+    process.stdout.should_receive('__iter__').and_return(iter((b'oops\n',)))
+    process.should_receive('wait').and_return(2)
+    flexmock(module.subprocess).should_receive('Popen').and_return(process)
+    lines = []
+
+    with pytest.raises(module.subprocess.CalledProcessError) as error:
+        for line in module.execute_command_and_stream_output(full_command):
+            lines.append(line)
+
+    assert lines == ['oops']
+    assert error.value.returncode == 2
+    assert error.value.output == 'oops'
+
+
+def test_execute_command_and_stream_output_kills_process_when_consumer_stops_early():
+    full_command = ['foo', 'bar']
+    process = flexmock(stdout=flexmock(close=lambda: None), args=full_command)
+    process.stdout.should_receive('__iter__').and_return(iter((b'one\n', b'two\n')))
+    process.should_receive('kill').once()
+    process.should_receive('wait').and_return(-9)
+    flexmock(module.subprocess).should_receive('Popen').and_return(process)
+
+    lines = module.execute_command_and_stream_output(full_command)
+
+    assert next(lines) == 'one'
+    lines.close()
+
+
 def test_execute_command_with_processes_calls_full_command():
     full_command = ['foo', 'bar']
     processes = (flexmock(),)
@@ -361,7 +547,7 @@ def test_execute_command_with_processes_calls_full_command():
         shell=False,
         env=None,
         cwd=None,
-    ).and_return(flexmock(stdout=None)).once()
+    ).and_return(flexmock(stdout=None, returncode=0)).once()
     flexmock(module).should_receive('log_outputs')
 
     output = module.execute_command_with_processes(full_command, processes)
@@ -369,16 +555,16 @@ def test_execute_command_with_processes_calls_full_command():
     assert output is None
 
 
-def test_execute_command_with_processes_returns_output_with_output_log_level_none():
+def test_execute_command_with_processes_returns_stdout_with_output_log_level_none():
     full_command = ['foo', 'bar']
     processes = (flexmock(),)
     flexmock(module.os, environ={'a': 'b'})
-    process = flexmock(stdout=None)
+    process = flexmock(stdout=None, returncode=0)
     flexmock(module.subprocess).should_receive('Popen').with_args(
         full_command,
         stdin=None,
         stdout=module.subprocess.PIPE,
-        stderr=module.subprocess.STDOUT,
+        stderr=None,
         shell=False,
         env=None,
         cwd=None,
@@ -403,7 +589,7 @@ def test_execute_command_with_processes_calls_full_command_with_output_file():
         shell=False,
         env=None,
         cwd=None,
-    ).and_return(flexmock(stderr=None)).once()
+    ).and_return(flexmock(stderr=None, returncode=0)).once()
     flexmock(module).should_receive('log_outputs')
 
     output = module.execute_command_with_processes(full_command, processes, output_file=output_file)
@@ -417,7 +603,7 @@ def test_execute_command_with_processes_calls_full_command_without_capturing_out
     flexmock(module.os, environ={'a': 'b'})
     flexmock(module.subprocess).should_receive('Popen').with_args(
         full_command, stdin=None, stdout=None, stderr=None, shell=False, env=None, cwd=None
-    ).and_return(flexmock(wait=lambda: 0)).once()
+    ).and_return(flexmock(wait=lambda: 0, returncode=0)).once()
     flexmock(module).should_receive('exit_code_indicates_error').and_return(False)
     flexmock(module).should_receive('log_outputs')
 
@@ -441,7 +627,7 @@ def test_execute_command_with_processes_calls_full_command_with_input_file():
         shell=False,
         env=None,
         cwd=None,
-    ).and_return(flexmock(stdout=None)).once()
+    ).and_return(flexmock(stdout=None, returncode=0)).once()
     flexmock(module).should_receive('log_outputs')
 
     output = module.execute_command_with_processes(full_command, processes, input_file=input_file)
@@ -461,7 +647,7 @@ def test_execute_command_with_processes_calls_full_command_with_shell():
         shell=True,
         env=None,
         cwd=None,
-    ).and_return(flexmock(stdout=None)).once()
+    ).and_return(flexmock(stdout=None, returncode=0)).once()
     flexmock(module).should_receive('log_outputs')
 
     output = module.execute_command_with_processes(full_command, processes, shell=True)
@@ -481,7 +667,7 @@ def test_execute_command_with_processes_calls_full_command_with_extra_environmen
         shell=False,
         env={'a': 'b', 'c': 'd'},
         cwd=None,
-    ).and_return(flexmock(stdout=None)).once()
+    ).and_return(flexmock(stdout=None, returncode=0)).once()
     flexmock(module).should_receive('log_outputs')
 
     output = module.execute_command_with_processes(
@@ -503,7 +689,7 @@ def test_execute_command_with_processes_calls_full_command_with_working_director
         shell=False,
         env=None,
         cwd='/working',
-    ).and_return(flexmock(stdout=None)).once()
+    ).and_return(flexmock(stdout=None, returncode=0)).once()
     flexmock(module).should_receive('log_outputs')
 
     output = module.execute_command_with_processes(
@@ -515,7 +701,7 @@ def test_execute_command_with_processes_calls_full_command_with_working_director
 
 def test_execute_command_with_processes_kills_processes_on_error():
     full_command = ['foo', 'bar']
-    process = flexmock(stdout=flexmock(read=lambda count: None))
+    process = flexmock(stdout=flexmock(read=lambda count: None, closed=False))
     process.should_receive('poll')
     process.should_receive('kill').once()
     processes = (process,)
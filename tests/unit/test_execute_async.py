@@ -0,0 +1,181 @@
+import pytest
+from flexmock import flexmock
+
+from borgmatic import execute_async as module
+
+
+def returning(value):
+    '''
+    Return a coroutine function that ignores its arguments and returns the given value.
+    '''
+
+    async def coroutine(*args, **kwargs):
+        return value
+
+    return coroutine
+
+
+def test_run_synchronously_returns_coroutine_result():
+    assert module.run_synchronously(returning('result')()) == 'result'
+
+
+def test_start_process_without_shell_execs_command_and_stores_args():
+    process = flexmock()
+    flexmock(module.asyncio).should_receive('create_subprocess_exec').with_args(
+        'foo', 'bar', stdin=None, stdout=None, stderr=None, env=None, cwd=None
+    ).replace_with(returning(process)).once()
+    flexmock(module.asyncio).should_receive('create_subprocess_shell').never()
+
+    assert module.run_synchronously(module.start_process(['foo', 'bar'])) == process
+    assert process.args == ['foo', 'bar']
+
+
+def test_start_process_with_shell_runs_command_in_shell():
+    process = flexmock()
+    flexmock(module.asyncio).should_receive('create_subprocess_exec').never()
+    flexmock(module.asyncio).should_receive('create_subprocess_shell').with_args(
+        'foo bar', stdin=None, stdout=None, stderr=None, env=None, cwd=None
+    ).replace_with(returning(process)).once()
+
+    assert module.run_synchronously(module.start_process('foo bar', shell=True)) == process
+    assert process.args == 'foo bar'
+
+
+def test_execute_command_starts_process_and_logs_outputs():
+    full_command = ['foo', 'bar']
+    process = flexmock()
+    flexmock(module.os, environ={'a': 'b'})
+    flexmock(module).should_receive('start_process').with_args(
+        full_command,
+        stdin=None,
+        stdout=module.subprocess.PIPE,
+        stderr=module.subprocess.STDOUT,
+        shell=False,
+        env={'a': 'b', 'c': 'd'},
+        cwd='/working',
+    ).replace_with(returning(process)).once()
+    flexmock(module).should_receive('log_outputs').with_args(
+        (process,), 'level', borg_local_path='borg'
+    ).replace_with(returning(None)).once()
+
+    output = module.run_synchronously(
+        module.execute_command(
+            full_command,
+            output_log_level='level',
+            extra_environment={'c': 'd'},
+            working_directory='/working',
+            borg_local_path='borg',
+        )
+    )
+
+    assert output is None
+
+
+def test_execute_command_with_output_file_and_shell_logs_stderr_only():
+    full_command = ['foo', 'bar']
+    output_file = flexmock(name='test')
+    flexmock(module).should_receive('start_process').with_args(
+        'foo bar',
+        stdin=None,
+        stdout=output_file,
+        stderr=module.subprocess.PIPE,
+        shell=True,
+        env=None,
+        cwd=None,
+    ).replace_with(returning(flexmock())).once()
+    flexmock(module).should_receive('log_outputs').replace_with(returning(None))
+
+    module.run_synchronously(
+        module.execute_command(full_command, output_file=output_file, shell=True)
+    )
+
+
+def test_execute_command_without_capturing_output_passes_through_streams():
+    full_command = ['foo', 'bar']
+    flexmock(module).should_receive('start_process').with_args(
+        full_command,
+        stdin=None,
+        stdout=None,
+        stderr=None,
+        shell=False,
+        env=None,
+        cwd=None,
+    ).replace_with(returning(flexmock())).once()
+    flexmock(module).should_receive('log_outputs').replace_with(returning(None))
+
+    module.run_synchronously(
+        module.execute_command(full_command, output_file=module.execute.DO_NOT_CAPTURE)
+    )
+
+
+def test_execute_command_without_run_to_completion_returns_process():
+    process = flexmock()
+    flexmock(module).should_receive('start_process').replace_with(returning(process))
+    flexmock(module).should_receive('log_outputs').never()
+
+    assert (
+        module.run_synchronously(module.execute_command(['foo'], run_to_completion=False))
+        == process
+    )
+
+
+def test_execute_command_and_capture_output_with_capture_stderr_returns_output():
+    process = flexmock(returncode=0, communicate=returning((b'out', None)))
+    flexmock(module).should_receive('start_process').with_args(
+        ['foo'],
+        stdout=module.subprocess.PIPE,
+        stderr=module.subprocess.STDOUT,
+        shell=False,
+        env=None,
+        cwd=None,
+    ).replace_with(returning(process)).once()
+
+    assert (
+        module.run_synchronously(
+            module.execute_command_and_capture_output(['foo'], capture_stderr=True)
+        )
+        == 'out'
+    )
+
+
+def test_execute_command_and_capture_output_with_no_output_returns_none():
+    process = flexmock(returncode=0, communicate=returning((None, None)))
+    flexmock(module).should_receive('start_process').replace_with(returning(process))
+
+    assert module.run_synchronously(module.execute_command_and_capture_output(['foo'])) is None
+
+
+def test_execute_command_with_processes_logs_outputs_for_all_processes():
+    processes = (flexmock(),)
+    command_process = flexmock()
+    flexmock(module).should_receive('start_process').replace_with(returning(command_process))
+    flexmock(module).should_receive('log_outputs').with_args(
+        processes + (command_process,), None, borg_local_path=None
+    ).replace_with(returning({command_process: 'out'})).once()
+
+    output = module.run_synchronously(
+        module.execute_command_with_processes(['foo'], processes, output_log_level=None)
+    )
+
+    assert output == 'out'
+
+
+def test_execute_command_with_processes_kills_processes_on_error():
+    process = flexmock(returncode=None)
+    process.should_receive('kill').once()
+    exited_process = flexmock(returncode=0)
+    exited_process.should_receive('kill').never()
+    flexmock(module).should_receive('start_process').and_raise(OSError)
+    flexmock(module).should_receive('log_outputs').never()
+
+    with pytest.raises(OSError):
+        module.run_synchronously(
+            module.execute_command_with_processes(['foo'], (process, exited_process))
+        )
+
+
+def test_execute_command_with_processes_with_output_log_level_returns_none():
+    flexmock(module).should_receive('start_process').replace_with(returning(flexmock()))
+    flexmock(module).should_receive('log_outputs').replace_with(returning(None))
+
+    assert module.run_synchronously(module.execute_command_with_processes(['foo'], ())) is None
@@ -354,3 +354,44 @@ def test_configure_logging_skips_log_file_if_argument_is_none():
     flexmock(module.logging.handlers).should_receive('WatchedFileHandler').never()
 
     module.configure_logging(console_log_level=logging.INFO, log_file=None)
+
+
+def test_flatten_log_record_formats_message_and_prefixes_tag():
+    record = logging.makeLogRecord(
+        dict(levelno=logging.INFO, levelname='INFO', msg='Hi %s', args=('there',))
+    )
+
+    flattened = module.flatten_log_record(record, tag='test.yaml')
+
+    assert flattened.levelno == logging.INFO
+    assert flattened.levelname == 'INFO'
+    assert flattened.msg == 'test.yaml: Hi there'
+
+
+def test_flatten_log_record_does_not_double_prefix_tag():
+    record = logging.makeLogRecord(
+        dict(levelno=logging.INFO, levelname='INFO', msg='test.yaml: Hi')
+    )
+
+    assert module.flatten_log_record(record, tag='test.yaml').msg == 'test.yaml: Hi'
+
+
+def test_flatten_log_record_without_tag_converts_message_to_string():
+    record = logging.makeLogRecord(
+        dict(levelno=logging.ERROR, levelname='ERROR', msg=ValueError('oops'))
+    )
+
+    assert module.flatten_log_record(record).msg == 'oops'
+
+
+def test_log_record_buffering_handler_buffers_flattened_records():
+    record = flexmock()
+    flattened_record = flexmock()
+    flexmock(module).should_receive('flatten_log_record').with_args(record, 'test.yaml').and_return(
+        flattened_record
+    )
+    handler = module.Log_record_buffering_handler(tag='test.yaml')
+
+    handler.emit(record)
+
+    assert handler.records == [flattened_record]
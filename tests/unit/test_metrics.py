@@ -0,0 +1,281 @@
+import os
+
+import pytest
+from flexmock import flexmock
+
+from borgmatic import metrics as module
+
+
+def test_record_adds_sample():
+    flexmock(module, SAMPLES=[])
+
+    module.record('test.yaml', 'borgmatic_archive_files', 5, repository='repo')
+
+    assert module.SAMPLES == [('test.yaml', 'borgmatic_archive_files', {'repository': 'repo'}, 5)]
+
+
+def test_record_archive_stats_records_each_stat():
+    flexmock(module).should_receive('record').with_args(
+        'test.yaml', 'borgmatic_archive_original_bytes', 100, repository='repo'
+    ).once()
+    flexmock(module).should_receive('record').with_args(
+        'test.yaml', 'borgmatic_archive_compressed_bytes', 50, repository='repo'
+    ).once()
+    flexmock(module).should_receive('record').with_args(
+        'test.yaml', 'borgmatic_archive_deduplicated_bytes', 10, repository='repo'
+    ).once()
+    flexmock(module).should_receive('record').with_args(
+        'test.yaml', 'borgmatic_archive_files', 3, repository='repo'
+    ).once()
+
+    module.record_archive_stats(
+        'test.yaml',
+        'repo',
+        {
+            'archive': {
+                'stats': {
+                    'original_size': 100,
+                    'compressed_size': 50,
+                    'deduplicated_size': 10,
+                    'nfiles': 3,
+                }
+            }
+        },
+    )
+
+
+def test_record_archive_stats_skips_missing_stats():
+    flexmock(module).should_receive('record').with_args(
+        'test.yaml', 'borgmatic_archive_original_bytes', 100, repository='repo'
+    ).once()
+
+    module.record_archive_stats('test.yaml', 'repo', {'archive': {'stats': {'original_size': 100}}})
+
+
+def test_record_archive_stats_without_archive_records_nothing():
+    flexmock(module).should_receive('record').never()
+
+    module.record_archive_stats('test.yaml', 'repo', {})
+
+
+def test_path_size_with_file_returns_file_size(tmp_path):
+    path = tmp_path / 'dump'
+    path.write_bytes(b'x' * 10)
+
+    assert module.path_size(str(path)) == 10
+
+
+def test_path_size_with_directory_totals_contents(tmp_path):
+    (tmp_path / 'dump').mkdir()
+    (tmp_path / 'dump' / 'one').write_bytes(b'x' * 10)
+    (tmp_path / 'dump' / 'sub').mkdir()
+    (tmp_path / 'dump' / 'sub' / 'two').write_bytes(b'x' * 5)
+
+    assert (
+        module.path_size(str(tmp_path / 'dump'))
+        == 15 + os.lstat(str(tmp_path / 'dump' / 'sub')).st_size
+    )
+
+
+def test_path_size_with_missing_path_returns_zero(tmp_path):
+    assert module.path_size(str(tmp_path / 'missing')) == 0
+
+
+def test_start_collecting_forgets_samples_for_config_filename_and_starts_collecting():
+    flexmock(
+        module,
+        SAMPLES=[
+            ('test.yaml', 'borgmatic_archive_files', {}, 1),
+            ('other.yaml', 'borgmatic_archive_files', {}, 2),
+        ],
+        COLLECTING_CONFIG_FILENAMES=set(),
+    )
+
+    module.start_collecting('test.yaml')
+
+    assert module.SAMPLES == [('other.yaml', 'borgmatic_archive_files', {}, 2)]
+    assert module.COLLECTING_CONFIG_FILENAMES == {'test.yaml'}
+
+
+def test_pop_samples_returns_and_forgets_samples_for_config_filename_and_stops_collecting():
+    flexmock(
+        module,
+        SAMPLES=[
+            ('test.yaml', 'borgmatic_archive_files', {}, 1),
+            ('other.yaml', 'borgmatic_archive_files', {}, 2),
+        ],
+        COLLECTING_CONFIG_FILENAMES={'test.yaml', 'other.yaml'},
+    )
+
+    assert module.pop_samples('test.yaml') == [('test.yaml', 'borgmatic_archive_files', {}, 1)]
+    assert module.SAMPLES == [('other.yaml', 'borgmatic_archive_files', {}, 2)]
+    assert module.COLLECTING_CONFIG_FILENAMES == {'other.yaml'}
+
+
+def test_record_action_adds_duration_and_success_samples():
+    flexmock(module, SAMPLES=[])
+
+    module.record_action('test.yaml', 'create', 'repo', 3.0, True)
+
+    assert module.SAMPLES == [
+        (
+            'test.yaml',
+            'borgmatic_action_duration_seconds',
+            {'action': 'create', 'repository': 'repo'},
+            3.0,
+        ),
+        ('test.yaml', 'borgmatic_action_succeeded', {'action': 'create', 'repository': 'repo'}, 1),
+    ]
+
+
+def test_record_action_for_repeated_action_totals_durations_and_takes_final_success():
+    flexmock(module, SAMPLES=[])
+
+    module.record_action('test.yaml', 'create', 'repo', 1.0, False)
+    module.record_action('test.yaml', 'prune', 'repo', 5.0, True)
+    module.record_action('test.yaml', 'create', 'repo', 3.0, True)
+
+    assert module.SAMPLES == [
+        (
+            'test.yaml',
+            'borgmatic_action_duration_seconds',
+            {'action': 'create', 'repository': 'repo'},
+            4.0,
+        ),
+        ('test.yaml', 'borgmatic_action_succeeded', {'action': 'create', 'repository': 'repo'}, 1),
+        (
+            'test.yaml',
+            'borgmatic_action_duration_seconds',
+            {'action': 'prune', 'repository': 'repo'},
+            5.0,
+        ),
+        ('test.yaml', 'borgmatic_action_succeeded', {'action': 'prune', 'repository': 'repo'}, 1),
+    ]
+
+
+def test_action_when_collecting_records_action_success():
+    flexmock(module, COLLECTING_CONFIG_FILENAMES={'test.yaml'})
+    flexmock(module.time).should_receive('monotonic').and_return(1.0).and_return(3.5)
+    flexmock(module).should_receive('record_action').with_args(
+        'test.yaml', 'create', 'repo', 2.5, True
+    ).once()
+
+    with module.action('test.yaml', 'create', 'repo'):
+        pass
+
+
+def test_action_when_collecting_with_error_records_action_failure():
+    flexmock(module, COLLECTING_CONFIG_FILENAMES={'test.yaml'})
+    flexmock(module.time).should_receive('monotonic').and_return(1.0).and_return(3.5)
+    flexmock(module).should_receive('record_action').with_args(
+        'test.yaml', 'create', 'repo', 2.5, False
+    ).once()
+
+    with pytest.raises(ValueError):
+        with module.action('test.yaml', 'create', 'repo'):
+            raise ValueError()
+
+
+def test_action_when_not_collecting_records_nothing():
+    flexmock(module, COLLECTING_CONFIG_FILENAMES={'other.yaml'})
+    flexmock(module).should_receive('record_action').never()
+
+    with module.action('test.yaml', 'create', 'repo'):
+        pass
+
+
+@pytest.mark.parametrize(
+    'value,expected_value',
+    (
+        ('repo', 'repo'),
+        ('C:\\repo', 'C:\\\\repo'),
+        ('"repo"', '\\"repo\\"'),
+        ('re\npo', 're\\npo'),
+    ),
+)
+def test_escape_label_value_escapes_special_characters(value, expected_value):
+    assert module.escape_label_value(value) == expected_value
+
+
+def test_format_samples_groups_samples_by_metric_with_help_and_type():
+    samples = [
+        ('test.yaml', 'borgmatic_last_run_succeeded', {}, 1),
+        ('test.yaml', 'borgmatic_archive_files', {'repository': 'repo'}, 3),
+        ('test.yaml', 'borgmatic_archive_files', {'repository': 'other'}, 4),
+    ]
+
+    assert module.format_samples(samples) == (
+        '# HELP borgmatic_archive_files Number of files processed for the most recently created archive.\n'
+        '# TYPE borgmatic_archive_files gauge\n'
+        'borgmatic_archive_files{config_file="test.yaml",repository="repo"} 3\n'
+        'borgmatic_archive_files{config_file="test.yaml",repository="other"} 4\n'
+        '# HELP borgmatic_last_run_succeeded Whether the most recent run succeeded (1) or failed (0).\n'
+        '# TYPE borgmatic_last_run_succeeded gauge\n'
+        'borgmatic_last_run_succeeded{config_file="test.yaml"} 1\n'
+    )
+
+
+def test_format_samples_without_samples_returns_empty_string():
+    assert module.format_samples([]) == ''
+
+
+def test_read_sample_value_returns_value_of_metric(tmp_path):
+    textfile = tmp_path / 'borgmatic.prom'
+    textfile.write_text(
+        '# HELP borgmatic_last_success_timestamp_seconds Time.\n'
+        'borgmatic_last_run_timestamp_seconds{config_file="test.yaml"} 2000.5\n'
+        'borgmatic_last_success_timestamp_seconds{config_file="test.yaml"} 1000.5\n'
+    )
+
+    assert (
+        module.read_sample_value(str(textfile), 'borgmatic_last_success_timestamp_seconds')
+        == 1000.5
+    )
+
+
+def test_read_sample_value_with_missing_metric_returns_none(tmp_path):
+    textfile = tmp_path / 'borgmatic.prom'
+    textfile.write_text('borgmatic_last_run_timestamp_seconds{config_file="test.yaml"} 2000.5\n')
+
+    assert (
+        module.read_sample_value(str(textfile), 'borgmatic_last_success_timestamp_seconds') is None
+    )
+
+
+def test_read_sample_value_with_invalid_value_returns_none(tmp_path):
+    textfile = tmp_path / 'borgmatic.prom'
+    textfile.write_text('borgmatic_last_success_timestamp_seconds nope\n')
+
+    assert (
+        module.read_sample_value(str(textfile), 'borgmatic_last_success_timestamp_seconds') is None
+    )
+
+
+def test_read_sample_value_with_missing_file_returns_none(tmp_path):
+    assert (
+        module.read_sample_value(
+            str(tmp_path / 'borgmatic.prom'), 'borgmatic_last_success_timestamp_seconds'
+        )
+        is None
+    )
+
+
+def test_write_textfile_replaces_file_contents_and_cleans_up(tmp_path):
+    textfile = tmp_path / 'borgmatic.prom'
+    textfile.write_text('old\n')
+
+    module.write_textfile('new\n', str(textfile))
+
+    assert textfile.read_text() == 'new\n'
+    assert oct(textfile.stat().st_mode & 0o777) == oct(0o644)
+    assert os.listdir(str(tmp_path)) == ['borgmatic.prom']
+
+
+def test_write_textfile_with_error_removes_temporary_file(tmp_path):
+    textfile = tmp_path / 'borgmatic.prom'
+    flexmock(module.os).should_receive('replace').and_raise(OSError)
+
+    with pytest.raises(OSError):
+        module.write_textfile('new\n', str(textfile))
+
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,160 @@
+import pytest
+from flexmock import flexmock
+
+from borgmatic import pipe as module
+
+
+def test_set_pipe_size_sets_size_with_fcntl():
+    flexmock(module, F_SETPIPE_SZ=1031)
+    flexmock(module.fcntl).should_receive('fcntl').with_args(3, 1031, 1024).once()
+
+    assert module.set_pipe_size(3, 1024)
+
+
+def test_set_pipe_size_with_fcntl_error_returns_false():
+    flexmock(module, F_SETPIPE_SZ=1031)
+    flexmock(module.fcntl).should_receive('fcntl').and_raise(PermissionError)
+
+    assert not module.set_pipe_size(3, 1024)
+
+
+def test_set_pipe_size_without_platform_support_returns_false():
+    flexmock(module, F_SETPIPE_SZ=None)
+    flexmock(module.fcntl).should_receive('fcntl').never()
+
+    assert not module.set_pipe_size(3, 1024)
+
+
+def test_splice_all_splices_until_end_of_file():
+    flexmock(module.os).should_receive('splice').with_args(3, 4, 1024).and_return(1024).and_return(
+        100
+    ).and_return(0)
+
+    assert module.splice_all(3, 4, chunk_size=1024) == 1124
+
+
+def test_splice_all_stops_when_destination_reader_goes_away():
+    flexmock(module.os).should_receive('splice').and_return(1024).and_raise(BrokenPipeError)
+
+    assert module.splice_all(3, 4, chunk_size=1024) == 1024
+
+
+def test_copy_all_copies_until_end_of_file():
+    flexmock(module.os).should_receive('read').with_args(3, 1024).and_return(b'abc').and_return(b'')
+    flexmock(module.os).should_receive('write').with_args(4, object).and_return(2).and_return(1)
+
+    assert module.copy_all(3, 4, chunk_size=1024) == 3
+
+
+def test_copy_all_stops_when_destination_reader_goes_away():
+    flexmock(module.os).should_receive('read').and_return(b'abc')
+    flexmock(module.os).should_receive('write').and_raise(BrokenPipeError)
+
+    assert module.copy_all(3, 4, chunk_size=1024) == 0
+
+
+@pytest.mark.parametrize(
+    'byte_count,expected_result',
+    (
+        (0, '0 B'),
+        (1023, '1023 B'),
+        (1536, '1.5 KiB'),
+        (5 * 1024 * 1024, '5.0 MiB'),
+        (3 * 1024**3, '3.0 GiB'),
+        (2 * 1024**4, '2.0 TiB'),
+        (2 * 1024**5, '2048.0 TiB'),
+    ),
+)
+def test_format_byte_count_uses_human_readable_units(byte_count, expected_result):
+    assert module.format_byte_count(byte_count) == expected_result
+
+
+def test_relay_splices_closes_and_logs_throughput():
+    source = flexmock(fileno=lambda: 3)
+    flexmock(module, SPLICE_AVAILABLE=True)
+    source.should_receive('close').once()
+    flexmock(module).should_receive('splice_all').with_args(3, 4).and_return(2048)
+    flexmock(module.os).should_receive('close').with_args(4).once()
+    flexmock(module.time).should_receive('monotonic').and_return(10).and_return(12)
+    flexmock(module.logger).should_receive('info').with_args(
+        'test: Streamed 2.0 KiB in 2.0 seconds (1.0 KiB/s)'
+    ).once()
+
+    assert module.relay(source, 4, 'test') == (2048, 2)
+
+
+def test_relay_without_splice_support_copies():
+    source = flexmock(fileno=lambda: 3)
+    source.should_receive('close').once()
+    flexmock(module, SPLICE_AVAILABLE=False)
+    flexmock(module).should_receive('splice_all').never()
+    flexmock(module).should_receive('copy_all').with_args(3, 4).and_return(2048)
+    flexmock(module.os).should_receive('close').with_args(4).once()
+
+    assert module.relay(source, 4, 'test')[0] == 2048
+
+
+def test_relay_with_splice_error_still_closes():
+    source = flexmock(fileno=lambda: 3)
+    flexmock(module, SPLICE_AVAILABLE=True)
+    source.should_receive('close').once()
+    flexmock(module).should_receive('splice_all').and_raise(OSError)
+    flexmock(module.os).should_receive('close').with_args(4).once()
+
+    with pytest.raises(OSError):
+        module.relay(source, 4, 'test')
+
+
+def test_start_relay_without_splice_support_returns_source():
+    source = flexmock()
+    flexmock(module, SPLICE_AVAILABLE=False)
+    flexmock(module.os).should_receive('pipe').never()
+
+    assert module.start_relay(source, 'test') == (source, None)
+
+
+def test_start_relay_relays_in_thread_and_returns_read_end_and_result():
+    source = flexmock(fileno=lambda: 3)
+    read_file = flexmock()
+    flexmock(module, SPLICE_AVAILABLE=True)
+    flexmock(module.os).should_receive('pipe').and_return((5, 6))
+    flexmock(module).should_receive('set_pipe_size')
+    flexmock(module.os).should_receive('write').with_args(6, b'')
+    flexmock(module).should_receive('relay').with_args(source, 6, 'test').and_return((10, 1))
+    flexmock(module.os).should_receive('fdopen').with_args(5, 'rb').and_return(read_file)
+
+    (relay_output, result) = module.start_relay(source, 'test')
+
+    assert relay_output == read_file
+    assert result.result(timeout=5) == (10, 1)
+
+
+def test_start_relay_without_splice_support_but_with_prefix_writes_prefix_and_relays():
+    source = flexmock(fileno=lambda: 3)
+    read_file = flexmock()
+    flexmock(module, SPLICE_AVAILABLE=False)
+    flexmock(module.os).should_receive('pipe').and_return((5, 6))
+    flexmock(module).should_receive('set_pipe_size')
+    flexmock(module.os).should_receive('write').with_args(6, b'PGDM').once()
+    flexmock(module).should_receive('relay').with_args(source, 6, 'test').and_return((10, 1))
+    flexmock(module.os).should_receive('fdopen').with_args(5, 'rb').and_return(read_file)
+
+    (relay_output, result) = module.start_relay(source, 'test', prefix=b'PGDM')
+
+    assert relay_output == read_file
+    assert result.result(timeout=5) == (10, 1)
+
+
+def test_start_relay_with_relay_error_sets_it_on_result():
+    source = flexmock(fileno=lambda: 3)
+    flexmock(module, SPLICE_AVAILABLE=True)
+    flexmock(module.os).should_receive('pipe').and_return((5, 6))
+    flexmock(module).should_receive('set_pipe_size')
+    flexmock(module.os).should_receive('write')
+    flexmock(module).should_receive('relay').and_raise(OSError)
+    flexmock(module.os).should_receive('fdopen').and_return(flexmock())
+
+    (_, result) = module.start_relay(source, 'test')
+
+    with pytest.raises(OSError):
+        result.result(timeout=5)
@@ -38,3 +38,11 @@ def test_configure_signals_installs_signal_handlers():
     flexmock(module.signal).should_receive('signal').at_least().once()
 
     module.configure_signals()
+
+
+def test_restore_default_signals_restores_default_handlers():
+    flexmock(module.signal).should_receive('signal').with_args(object, module.signal.SIG_DFL).times(
+        len(module.PASSED_THROUGH_SIGNALS)
+    )
+
+    module.restore_default_signals()
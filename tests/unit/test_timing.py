@@ -0,0 +1,229 @@
+import subprocess
+
+import pytest
+from flexmock import flexmock
+
+from borgmatic import timing as module
+
+
+def test_enable_starts_recording_spans():
+    flexmock(module, ENABLED=False)
+
+    module.enable()
+
+    assert module.ENABLED
+
+
+def test_span_when_enabled_records_span():
+    flexmock(module, ENABLED=True, SPANS=[])
+    flexmock(module.time).should_receive('time').and_return(1000.0)
+    flexmock(module.time).should_receive('monotonic').and_return(5.0).and_return(7.5)
+
+    with module.span('create', 'action', repository='repo') as record:
+        record['byte_count'] = 99
+
+    assert module.SPANS == [
+        {
+            'name': 'create',
+            'kind': 'action',
+            'repository': 'repo',
+            'start': 1000.0,
+            'duration': 2.5,
+            'status': 'succeeded',
+            'byte_count': 99,
+        }
+    ]
+
+
+def test_span_inherits_repository_of_enclosing_span():
+    flexmock(module, ENABLED=True, SPANS=[])
+
+    with module.span('create', 'action', repository='repo'):
+        with module.span('special files', 'step'):
+            with module.span('borg create', 'command'):
+                pass
+
+    assert [(record['name'], record.get('repository')) for record in module.SPANS] == [
+        ('borg create', 'repo'),
+        ('special files', 'repo'),
+        ('create', 'repo'),
+    ]
+    assert module.get_open_spans() == []
+
+
+def test_span_with_own_repository_does_not_inherit_repository():
+    flexmock(module, ENABLED=True, SPANS=[])
+
+    with module.span('create', 'action', repository='repo'):
+        with module.span('borg create', 'command', repository='other'):
+            pass
+
+    assert module.SPANS[0]['repository'] == 'other'
+
+
+def test_span_without_enclosing_repository_omits_repository():
+    flexmock(module, ENABLED=True, SPANS=[])
+
+    with module.span('before_everything', 'command hook'):
+        pass
+
+    assert 'repository' not in module.SPANS[0]
+
+
+def test_span_closed_out_of_order_forgets_that_span():
+    flexmock(module, ENABLED=True, SPANS=[])
+    outer = module.span('outer', 'action', repository='repo')
+    inner = module.span('inner', 'command')
+    outer.__enter__()
+    inner.__enter__()
+
+    outer.__exit__(None, None, None)
+
+    assert [open_span['name'] for open_span in module.get_open_spans()] == ['inner']
+
+    inner.__exit__(None, None, None)
+
+    assert module.get_open_spans() == []
+
+
+def test_span_when_disabled_does_not_record_span():
+    flexmock(module, ENABLED=False, SPANS=[])
+
+    with module.span('create', 'action') as record:
+        record['byte_count'] = 99
+
+    assert module.SPANS == []
+
+
+def test_span_with_command_error_records_failure_and_exit_code():
+    flexmock(module, ENABLED=True, SPANS=[])
+
+    with pytest.raises(subprocess.CalledProcessError):
+        with module.span('borg create', 'command'):
+            raise subprocess.CalledProcessError(2, 'borg create')
+
+    (record,) = module.SPANS
+    assert record['status'] == 'failed'
+    assert record['exit_code'] == 2
+
+
+def test_span_with_other_error_records_failure():
+    flexmock(module, ENABLED=True, SPANS=[])
+
+    with pytest.raises(ValueError):
+        with module.span('create', 'action'):
+            raise ValueError()
+
+    (record,) = module.SPANS
+    assert record['status'] == 'failed'
+    assert 'exit_code' not in record
+
+
+def test_command_span_name_includes_subcommand():
+    assert module.command_span_name(('/usr/bin/borg', 'create', '--stats', 'repo::archive')) == (
+        'borg create'
+    )
+
+
+def test_command_span_name_with_dry_run_marks_dry_run():
+    assert module.command_span_name(('borg', 'create', '--dry-run', '--list', 'repo::archive')) == (
+        'borg create --dry-run'
+    )
+
+
+def test_command_span_name_without_subcommand_returns_command_name():
+    assert module.command_span_name(('pg_dump', '--no-password', 'foo')) == 'pg_dump'
+
+
+def test_command_span_name_with_shell_command_returns_command_name():
+    assert module.command_span_name(('echo "hi" >> /tmp/log',)) == 'echo'
+
+
+def test_pop_spans_returns_and_forgets_spans():
+    spans = [{'name': 'create'}]
+    flexmock(module, SPANS=spans)
+
+    assert module.pop_spans() == [{'name': 'create'}]
+    assert module.SPANS == []
+
+
+def test_record_spans_adds_spans():
+    flexmock(module, SPANS=[{'name': 'create'}])
+
+    module.record_spans([{'name': 'prune'}])
+
+    assert module.SPANS == [{'name': 'create'}, {'name': 'prune'}]
+
+
+def test_write_json_lines_writes_one_span_per_line(tmp_path):
+    timing_path = tmp_path / 'timings.jsonl'
+
+    module.write_json_lines(
+        [{'name': 'create', 'duration': 1.5}, {'name': 'prune', 'duration': 0.5}], str(timing_path)
+    )
+
+    assert timing_path.read_text() == (
+        '{"name": "create", "duration": 1.5}\n{"name": "prune", "duration": 0.5}\n'
+    )
+
+
+def test_summarize_spans_combines_spans_with_same_kind_name_and_repository_in_start_order():
+    spans = [
+        {
+            'name': 'borg create',
+            'kind': 'command',
+            'start': 2,
+            'duration': 3.0,
+            'status': 'succeeded',
+        },
+        {
+            'name': 'create',
+            'kind': 'action',
+            'repository': 'repo',
+            'start': 1,
+            'duration': 4.0,
+            'status': 'succeeded',
+        },
+        {
+            'name': 'borg create',
+            'kind': 'command',
+            'start': 3,
+            'duration': 1.0,
+            'status': 'failed',
+            'byte_count': 10,
+        },
+    ]
+
+    assert module.summarize_spans(spans) == (
+        ('Kind', 'Name', 'Repository', 'Count', 'Total (s)', 'Max (s)', 'Failed', 'Bytes'),
+        ('action', 'create', 'repo', '1', '4.00', '4.00', '0', ''),
+        ('command', 'borg create', '', '2', '4.00', '3.00', '1', '10'),
+    )
+
+
+def test_format_table_aligns_columns():
+    assert module.format_table((('Kind', 'Name'), ('action', 'create'), ('hook', 'x'))) == (
+        'Kind    Name',
+        'action  create',
+        'hook    x',
+    )
+
+
+def test_log_summary_logs_table():
+    flexmock(module).should_receive('summarize_spans').and_return(flexmock())
+    flexmock(module).should_receive('format_table').and_return(('Kind  Name', 'action  create'))
+    logged_lines = []
+    flexmock(module.logger).answer = logged_lines.append
+
+    module.log_summary([flexmock()])
+
+    assert logged_lines == ['', 'timings:', 'Kind  Name', 'action  create']
+
+
+def test_log_summary_without_spans_logs_nothing():
+    logged_lines = []
+    flexmock(module.logger).answer = logged_lines.append
+
+    module.log_summary([])
+
+    assert logged_lines == []